@@ -0,0 +1,602 @@
+"""
+请求日志、链路追踪、截止时间、准入控制、错误处理、响应压缩和健康检查中间件
+
+均实现为纯ASGI中间件（而非BaseHTTPMiddleware），不为每个请求额外创建任务，
+也不复制请求/响应体，只截取用于日志的前 MAX_BODY_LOG_SIZE 字节。
+
+请求日志采样:
+    - 头部采样：请求开始时按 LOG_SAMPLE_RATE 决定是否记录
+    - 尾部采样：请求结束时，错误（状态码>=400）和慢请求（>SLOW_REQUEST_THRESHOLD）始终记录
+
+请求日志缓冲（LOG_BUFFER_ENABLED）:
+    请求处理期间的低级别日志先放入该请求的环形缓冲区，只有请求失败、过慢或按
+    LOG_BUFFER_SAMPLE_RATE 被采样时才写出，否则丢弃，只保留一行请求摘要。
+
+截止时间与准入控制（只作用于 URL_CRAWL_PATHS 和 BATCH_CRAWL_PATHS）:
+    DeadlineMiddleware 按 X-Request-Timeout 设置请求截止时间（批量请求默认 BATCH_MAX_DEADLINE，
+    请求体中的 deadline 更早时以其为准），并在客户端断开时取消处理；
+    AdmissionMiddleware 限制并发，过载时返回429和 Retry-After。批量请求在已有请求排队时整批拒绝，
+    否则放行，其中每个URL由批量服务各自获取槽位。健康检查、指标和其他接口不排队也不会被拒绝。
+
+链路追踪:
+    TracingMiddleware 为每个请求创建 server span（沿用上游 traceparent），服务层的
+    span 都挂在它下面；请求摘要日志附带 trace_id，便于从日志跳转到链路。
+
+响应压缩:
+    CompressionMiddleware 按 Accept-Encoding 协商 zstd / br / gzip，压缩不小于 COMPRESSION_MIN_SIZE
+    字节的JSON/文本响应和流式响应；位于请求日志外层，日志中的响应体仍是未压缩的内容。
+"""
+import os
+import re
+import json
+import time
+import asyncio
+import random
+import logging
+from typing import Iterable
+
+from src.config.logging_config import start_request_buffer, end_request_buffer
+from src.core.util.tracing import start_span, current_span, use_span
+from src.core.util.loop_monitor import bind_task_context
+from src.core.service.admission_service import AdmissionController, AdmissionRejected
+from src.core.util.deadline import deadline_scope, current_deadline
+from src.core.util.metrics import REQUESTS_PAST_DEADLINE, CLIENT_DISCONNECTS, RESPONSE_BYTES
+from src.core.util.http_compression import Compressor, available_encodings, negotiate_encoding
+from src.config.settings import (
+    LOG_REQUEST_BODY, LOG_RESPONSE_BODY, MAX_BODY_LOG_SIZE,
+    LOG_SAMPLE_RATE, SLOW_REQUEST_THRESHOLD, LOG_BUFFER_ENABLED, LOG_BUFFER_SAMPLE_RATE,
+    REQUEST_DEFAULT_TIMEOUT, BATCH_MAX_DEADLINE, COMPRESSION_ENCODINGS, COMPRESSION_MIN_SIZE,
+    COMPRESSION_THREAD_SIZE, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY, COMPRESSION_ZSTD_LEVEL
+)
+
+logger = logging.getLogger("api.middleware")
+
+REQUEST_ID_HEADER = b"x-request-id"
+TRACEPARENT_HEADER = b"traceparent"
+REQUEST_TIMEOUT_HEADER = b"x-request-timeout"
+ACCEPT_ENCODING_HEADER = b"accept-encoding"
+URL_CRAWL_PATHS = ("/api/v1/text/urlCrawl",)
+BATCH_CRAWL_PATHS = ("/api/v1/text/urlCrawl/batch",)
+HEALTH_CHECK_PATHS = ("/health", "/metrics")
+
+# 只接受合理的外部请求ID，避免把任意内容写入日志和响应头
+_REQUEST_ID_PATTERN = re.compile(rb"[A-Za-z0-9._:\-]{1,128}")
+
+def _get_header(headers, name: bytes):
+    for key, value in headers:
+        if key == name:
+            return value
+    return None
+
+def _body_preview(chunks, truncated: bool) -> str:
+    text = b"".join(chunks).decode("utf-8", errors="replace")
+    return text + "...(truncated)" if truncated else text
+
+class HealthCheckMiddleware:
+    """
+    健康检查中间件（最外层）
+
+    对健康检查路径设置 skip_logging，内层的日志和错误处理中间件直接放行，不产生任何日志。
+    """
+
+    def __init__(self, app, paths: Iterable[str] = HEALTH_CHECK_PATHS):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            scope.setdefault("state", {})["skip_logging"] = True
+        await self.app(scope, receive, send)
+
+class CompressionMiddleware:
+    """
+    响应压缩中间件
+
+    响应头延迟到第一块响应体时发送：一次发完且小于 min_size 的响应、已有 Content-Encoding 的响应、
+    非JSON/文本类型的响应原样发送；流式响应（more_body）无论大小都压缩，每块压缩后立即刷新发送。
+    超过 thread_size 字节的块在线程中压缩。
+    """
+
+    COMPRESSIBLE_TYPES = (b"application/json", b"application/x-ndjson", b"text/")
+
+    def __init__(
+        self,
+        app,
+        encodings: str = COMPRESSION_ENCODINGS,
+        min_size: int = COMPRESSION_MIN_SIZE,
+        thread_size: int = COMPRESSION_THREAD_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+        zstd_level: int = COMPRESSION_ZSTD_LEVEL
+    ):
+        self.app = app
+        self.encodings = available_encodings(item.strip().lower() for item in encodings.split(",") if item.strip())
+        self.min_size = min_size
+        self.thread_size = thread_size
+        self.levels = {"gzip_level": gzip_level, "brotli_quality": brotli_quality, "zstd_level": zstd_level}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = _get_header(scope["headers"], ACCEPT_ENCODING_HEADER)
+        encoding = negotiate_encoding(
+            accept_encoding.decode("latin-1") if accept_encoding else None, self.encodings
+        )
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start_message is not None:
+                start, start_message = start_message, None
+                headers = list(start.get("headers", ()))
+                if not self._compressible(headers, len(body), more_body):
+                    RESPONSE_BYTES.labels("identity", "sent").inc(len(body))
+                    await send(start)
+                    await send(message)
+                    return
+                compressor = Compressor(encoding, **self.levels)
+                headers = [(key, value) for key, value in headers if key not in (b"content-length", b"vary")]
+                vary = b", ".join(value for key, value in start.get("headers", ()) if key == b"vary")
+                headers.append((b"content-encoding", encoding.encode("latin-1")))
+                headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+                if not more_body:
+                    data = await self._compress(compressor, body, True)
+                    headers.append((b"content-length", str(len(data)).encode("latin-1")))
+                    self._record(encoding, len(body), len(data))
+                    await send(dict(start, headers=headers))
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                await send(dict(start, headers=headers))
+            elif compressor is None:
+                if body:
+                    RESPONSE_BYTES.labels("identity", "sent").inc(len(body))
+                await send(message)
+                return
+
+            data = await self._compress(compressor, body, not more_body)
+            self._record(encoding, len(body), len(data))
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _compressible(self, headers, size: int, more_body: bool) -> bool:
+        if not more_body and size < self.min_size:
+            return False
+        content_type = b""
+        for key, value in headers:
+            if key == b"content-encoding":
+                return False
+            if key == b"content-type":
+                content_type = value.lower()
+        return content_type.startswith(self.COMPRESSIBLE_TYPES)
+
+    async def _compress(self, compressor: Compressor, body: bytes, final: bool) -> bytes:
+        if len(body) > self.thread_size:
+            return await asyncio.to_thread(compressor.compress, body, final)
+        return compressor.compress(body, final)
+
+    @staticmethod
+    def _record(encoding: str, raw: int, sent: int):
+        RESPONSE_BYTES.labels(encoding, "raw").inc(raw)
+        RESPONSE_BYTES.labels(encoding, "sent").inc(sent)
+
+class TracingMiddleware:
+    """
+    链路追踪中间件
+
+    以请求的 traceparent 头为父span创建 server span，并设为当前span；跳过健康检查路径。
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope.get("state", {}).get("skip_logging"):
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = _get_header(scope["headers"], TRACEPARENT_HEADER)
+        server_span = start_span(
+            f"{scope['method']} {scope['path']}",
+            kind="server",
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+            traceparent=traceparent.decode("latin-1") if traceparent else None
+        )
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                server_span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    server_span.set_error(f"HTTP {message['status']}")
+            await send(message)
+
+        with use_span(server_span):
+            await self.app(scope, receive, send_wrapper)
+
+class ErrorHandlingMiddleware:
+    """全局错误处理：未捕获的异常记录日志并返回统一格式的500响应"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+
+        async def send_wrapper(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            state = scope.get("state") or {}
+            request_id = state.get("request_id", "unknown")
+            logger.error("未处理的异常", extra={
+                "event": "unhandled_exception",
+                "request_id": request_id,
+                "method": scope["method"],
+                "path": scope["path"],
+                "error_type": type(e).__name__,
+                "error_message": str(e),
+                "response_started": response_started
+            }, exc_info=True)
+
+            # 响应已经开始发送时无法再返回错误响应，交给服务器关闭连接
+            if response_started:
+                raise
+
+            body = (
+                '{"code":500,"msg":"服务器内部错误","data":{"request_id":"%s"}}' % request_id
+            ).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 500,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (REQUEST_ID_HEADER, request_id.encode("latin-1")),
+                ]
+            })
+            await send({"type": "http.response.body", "body": body})
+
+def request_timeout(headers, default: float = REQUEST_DEFAULT_TIMEOUT) -> float:
+    """读取客户端声明的超时（X-Request-Timeout，秒），缺失或不合法时使用默认值"""
+    value = _get_header(headers, REQUEST_TIMEOUT_HEADER)
+    if value is None:
+        return default
+    try:
+        timeout = float(value)
+    except ValueError:
+        return default
+    return min(timeout, default) if timeout > 0 else default
+
+class DeadlineMiddleware:
+    """
+    截止时间中间件
+
+    按 X-Request-Timeout（默认 REQUEST_DEFAULT_TIMEOUT，批量请求默认 BATCH_MAX_DEADLINE）设置
+    请求的截止时间，服务层的每次对外调用只使用剩余的时间。请求体读完后监听客户端断开，
+    断开时取消处理，不再继续调用爬虫服务和LLM。截止时间之后才完成的请求计入指标。
+    """
+
+    def __init__(
+        self,
+        app,
+        paths: Iterable[str] = URL_CRAWL_PATHS,
+        batch_paths: Iterable[str] = BATCH_CRAWL_PATHS
+    ):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.batch_paths = frozenset(batch_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if scope["path"] in self.paths:
+            timeout = request_timeout(scope["headers"])
+        elif scope["path"] in self.batch_paths:
+            # 批量请求的截止时间由请求体中的 deadline 决定（run_batch 中嵌套设置，取较早者）
+            timeout = request_timeout(scope["headers"], BATCH_MAX_DEADLINE)
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        task = asyncio.current_task()
+        body_done = asyncio.Event()
+        disconnected = asyncio.Event()
+        response_complete = False
+
+        async def wrapped_receive():
+            # 请求体读完后只由监听任务读取连接，应用再次读取时等待断开事件
+            if body_done.is_set():
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request" and not message.get("more_body", False):
+                body_done.set()
+            elif message["type"] == "http.disconnect":
+                disconnected.set()
+            return message
+
+        async def send_wrapper(message):
+            nonlocal response_complete
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        async def watch_disconnect():
+            await body_done.wait()
+            message = await receive()
+            # 响应发送完成后服务器同样返回 http.disconnect，此时不再取消
+            if message["type"] == "http.disconnect" and not response_complete:
+                disconnected.set()
+                task.cancel()
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            with deadline_scope(timeout) as deadline:
+                await self.app(scope, wrapped_receive, send_wrapper)
+        except asyncio.CancelledError:
+            if not disconnected.is_set():
+                raise
+            # 客户端已断开：吞掉本中间件发起的取消，响应无法再发送
+            # Task.uncancel 为 Python 3.11 新增，更早的版本没有取消计数，无需撤销
+            if hasattr(task, "uncancel"):
+                task.uncancel()
+            state["client_disconnected"] = True
+            CLIENT_DISCONNECTS.labels(scope["path"]).inc()
+            return
+        finally:
+            watcher.cancel()
+        batch_deadline = state.get("batch_deadline")
+        if deadline.expired() or (batch_deadline is not None and deadline.timeout - deadline.remaining() > batch_deadline):
+            state["past_deadline"] = True
+            REQUESTS_PAST_DEADLINE.labels(scope["path"]).inc()
+
+class AdmissionMiddleware:
+    """
+    准入控制中间件
+
+    超过并发上限的请求排队；预计无法在客户端超时（X-Request-Timeout）前完成的请求
+    直接返回429，不再进入爬取和LLM流程。批量请求（batch_paths）在已有请求排队时整批返回429，
+    否则直接放行，不占槽位（其中每个URL由批量服务各自获取槽位）。
+    """
+
+    def __init__(
+        self,
+        app,
+        controller: AdmissionController,
+        paths: Iterable[str] = URL_CRAWL_PATHS,
+        batch_paths: Iterable[str] = BATCH_CRAWL_PATHS
+    ):
+        self.app = app
+        self.controller = controller
+        self.paths = frozenset(paths)
+        self.batch_paths = frozenset(batch_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if path in self.batch_paths:
+            try:
+                self.controller.admit_batch()
+            except AdmissionRejected as e:
+                await self._send_rejected(scope, send, e)
+                return
+            await self.app(scope, receive, send)
+            return
+        if path not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        try:
+            deadline = current_deadline()
+            timeout = deadline.remaining() if deadline is not None else request_timeout(scope["headers"])
+            waited = await self.controller.acquire(timeout)
+        except AdmissionRejected as e:
+            await self._send_rejected(scope, send, e)
+            return
+
+        state["queue_wait_ms"] = waited * 1000
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(time.perf_counter() - start)
+
+    @staticmethod
+    async def _send_rejected(scope, send, error: AdmissionRejected):
+        state = scope.setdefault("state", {})
+        state["admission_rejected"] = error.reason
+        body = json.dumps({
+            "code": 429,
+            "msg": "服务繁忙，请稍后重试",
+            "data": {"request_id": state.get("request_id"), "retry_after": error.retry_after}
+        }, ensure_ascii=False).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 429,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                (b"retry-after", str(error.retry_after).encode("latin-1")),
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+class RequestLogMiddleware:
+    """
+    请求日志中间件
+
+    - 读取或生成请求ID（X-Request-ID），写入 request.state 并在响应头中返回
+    - 记录 request.state.start_time，供路由计算总耗时
+    - 请求结束时按采样规则输出一条请求日志，按需附带截断后的请求/响应体
+    - 缓冲请求期间的低级别日志，请求失败、过慢或被采样时才写出
+    """
+
+    def __init__(
+        self,
+        app,
+        sample_rate: float = LOG_SAMPLE_RATE,
+        slow_threshold: float = SLOW_REQUEST_THRESHOLD,
+        log_request_body: bool = LOG_REQUEST_BODY,
+        log_response_body: bool = LOG_RESPONSE_BODY,
+        max_body_size: int = MAX_BODY_LOG_SIZE,
+        buffer_logs: bool = LOG_BUFFER_ENABLED,
+        buffer_sample_rate: float = LOG_BUFFER_SAMPLE_RATE
+    ):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.log_request_body = log_request_body
+        self.log_response_body = log_response_body
+        self.max_body_size = max_body_size
+        self.buffer_logs = buffer_logs
+        self.buffer_sample_rate = buffer_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        state = scope.setdefault("state", {})
+        if state.get("skip_logging"):
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        incoming_id = _get_header(scope["headers"], REQUEST_ID_HEADER)
+        if incoming_id is not None and _REQUEST_ID_PATTERN.fullmatch(incoming_id):
+            request_id = incoming_id.decode("ascii")
+            request_id_header = incoming_id
+        else:
+            # 与uuid4().hex格式相同，但开销更低
+            request_id = os.urandom(16).hex()
+            request_id_header = request_id.encode("ascii")
+        state["request_id"] = request_id
+        state["start_time"] = time.time()
+        bind_task_context(request_id=request_id, path=scope["path"])
+
+        head_sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        max_body_size = self.max_body_size
+        request_chunks = []
+        request_size = 0
+        response_chunks = []
+        response_size = 0
+        status_code = 500
+
+        capture_request = self.log_request_body and max_body_size > 0
+        wrapped_receive = receive
+        if capture_request:
+            async def wrapped_receive():
+                nonlocal request_size
+                message = await receive()
+                if message["type"] == "http.request":
+                    chunk = message.get("body", b"")
+                    if chunk and request_size < max_body_size:
+                        request_chunks.append(chunk[:max_body_size - request_size])
+                    request_size += len(chunk)
+                return message
+
+        capture_response = self.log_response_body and max_body_size > 0
+        buffer_token = start_request_buffer() if self.buffer_logs else None
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", ())) + [(REQUEST_ID_HEADER, request_id_header)]
+            elif capture_response and message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                if chunk and response_size < max_body_size:
+                    response_chunks.append(chunk[:max_body_size - response_size])
+                response_size += len(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, wrapped_receive, send_wrapper)
+        finally:
+            duration = (time.perf_counter() - start) * 1000
+            if state.get("client_disconnected"):
+                status_code = 499
+            is_error = status_code >= 400
+            is_slow = duration > self.slow_threshold
+            buffer = None
+            if buffer_token is not None:
+                # 先结束缓冲，请求摘要本身不进入缓冲区
+                flush = is_error or is_slow or random.random() < self.buffer_sample_rate
+                buffer = end_request_buffer(buffer_token, flush)
+            if head_sampled or is_error or is_slow:
+                extra = {
+                    "event": "http_request",
+                    "request_id": request_id,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status_code": status_code,
+                    "duration_ms": duration,
+                    "client_ip": scope["client"][0] if scope.get("client") else "unknown"
+                }
+                active_span = current_span()
+                if active_span is not None:
+                    extra["trace_id"] = active_span.trace_id
+                if scope.get("query_string"):
+                    extra["query"] = scope["query_string"].decode("latin-1")
+                if request_chunks:
+                    extra["request_body"] = _body_preview(request_chunks, request_size > max_body_size)
+                if response_chunks:
+                    extra["response_body"] = _body_preview(response_chunks, response_size > max_body_size)
+                if state.get("client_disconnected"):
+                    extra["client_disconnected"] = True
+                if state.get("past_deadline"):
+                    extra["past_deadline"] = True
+                if "queue_wait_ms" in state:
+                    extra["queue_wait_ms"] = state["queue_wait_ms"]
+                if state.get("admission_rejected"):
+                    extra["admission_rejected"] = state["admission_rejected"]
+                if state.get("memory_peak_bytes"):
+                    extra["memory_peak_bytes"] = state["memory_peak_bytes"]
+                if buffer is not None and buffer.total:
+                    extra["buffered_logs"] = buffer.total
+                    extra["buffered_logs_flushed"] = flush
+                    if buffer.dropped:
+                        extra["buffered_logs_dropped"] = buffer.dropped
+
+                if status_code >= 500:
+                    level, message = logging.ERROR, "请求失败"
+                elif is_error or is_slow:
+                    extra["slow"] = is_slow
+                    level, message = logging.WARNING, "请求异常或过慢"
+                else:
+                    level, message = logging.INFO, "请求完成"
+                if logger.isEnabledFor(level):
+                    # 直接构造日志记录，跳过 findCaller 的栈回溯（调用位置总是这里）
+                    logger.handle(logger.makeRecord(
+                        logger.name, level, __file__, 0, message, (), None, extra=extra
+                    ))
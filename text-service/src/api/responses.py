@@ -0,0 +1,38 @@
+"""
+快速JSON响应
+
+路由直接返回 FastJSONResponse（而不是dict），跳过FastAPI按返回注解的校验和 jsonable_encoder
+的逐层转换，由 orjson 一次序列化；中文等非ASCII字符原样输出为UTF-8，不转义为 \\uXXXX。
+未安装orjson时退回标准库json（同样不转义、不加空格）。
+"""
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时退回标准库json
+    orjson = None
+
+def _json_default(value: Any):
+    return str(value)
+
+if orjson is not None:
+    def dumps_json(content: Any) -> bytes:
+        """序列化为UTF-8的JSON（非ASCII字符不转义）"""
+        return orjson.dumps(content, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+else:
+    def dumps_json(content: Any) -> bytes:
+        """序列化为UTF-8的JSON（非ASCII字符不转义）"""
+        return json.dumps(
+            content, ensure_ascii=False, separators=(",", ":"), default=_json_default
+        ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """用 dumps_json 序列化的JSON响应，也作为应用的默认响应类"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
@@ -1,13 +1,27 @@
+import os
+import hmac
 import time
+import asyncio
 import logging
-from fastapi import APIRouter, Request, HTTPException
-from typing import Dict, Any
-from pydantic import BaseModel
+from fastapi import APIRouter, Request, Response, HTTPException
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from typing import Dict, Any, List, Optional, Tuple
+from pydantic import BaseModel, Field
 
-from src.core.service.crawler_service import crawl_url, get_crawl_result
-from src.core.service.openai_service import process_with_openai, format_api_response
+from src.api.responses import FastJSONResponse, dumps_json
+from src.core.service.pipeline_service import run_url_pipeline
+from src.core.service.batch_service import run_batch
+from src.core.service.admission_service import admission_controller
+from src.core.service.llm_scheduler import PRIORITY_CLASSES, DEFAULT_TENANT, scheduling_scope
+from src.core.service.idempotency_service import run_idempotent
 from src.config.logging_config import get_context_logger
-from src.config.settings import SLOW_REQUEST_THRESHOLD
+from src.core.util.metrics import URL_REQUESTS, generate_latest
+from src.core.util.profiler import PROFILE_MODES, run_profile, cpu_mode_supported
+from src.config.settings import (
+    SLOW_REQUEST_THRESHOLD, BATCH_MAX_URLS, BATCH_DEFAULT_CONCURRENCY,
+    BATCH_MAX_CONCURRENCY, BATCH_DEFAULT_DEADLINE, BATCH_MAX_DEADLINE,
+    ADMIN_TOKEN, PROFILE_MAX_SECONDS, ADMISSION_ENABLED
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -16,14 +30,52 @@ router = APIRouter()
 class URLCrawlRequest(BaseModel):
     url: str
 
+class URLBatchCrawlRequest(BaseModel):
+    urls: List[str] = Field(..., min_length=1, max_length=BATCH_MAX_URLS)
+    concurrency: int = Field(BATCH_DEFAULT_CONCURRENCY, ge=1, le=BATCH_MAX_CONCURRENCY)
+    deadline: float = Field(BATCH_DEFAULT_DEADLINE, gt=0, le=BATCH_MAX_DEADLINE)  # 秒
+
+def request_work_class(request: Request, default_priority: str) -> Tuple[str, str]:
+    """
+    读取LLM调度的优先级和租户
+
+    租户来自 X-Tenant-ID（缺失时为default）；X-Priority 只能把优先级调低，
+    例如用单URL接口做回填的脚本可以声明 bulk 或 backfill，避免占用交互请求的槽位。
+    """
+    tenant = request.headers.get("x-tenant-id", "").strip()[:64] or DEFAULT_TENANT
+    priority = request.headers.get("x-priority", default_priority).strip().lower()
+    if priority not in PRIORITY_CLASSES:
+        raise HTTPException(status_code=400, detail=f"X-Priority 必须是 {', '.join(PRIORITY_CLASSES)} 之一")
+    if PRIORITY_CLASSES.index(priority) < PRIORITY_CLASSES.index(default_priority):
+        priority = default_priority
+    return priority, tenant
+
+def format_server_timing(timings: Dict[str, float], total_time: float) -> str:
+    """把步骤耗时（毫秒）格式化为Server-Timing头"""
+    metrics = [f"{name};dur={duration:.1f}" for name, duration in timings.items()]
+    metrics.append(f"total;dur={total_time:.1f}")
+    return ", ".join(metrics)
+
+def json_response(content: Dict[str, Any], response: Response) -> FastJSONResponse:
+    """
+    直接返回JSON响应，跳过FastAPI按返回值的 jsonable_encoder 转换
+
+    直接返回响应对象时FastAPI不再合并注入的 response 上的响应头，这里带上。
+    """
+    return FastJSONResponse(content, headers=dict(response.headers))
+
 @router.post("/api/v1/text/urlCrawl")
-async def url_crawl(request_data: URLCrawlRequest, request: Request) -> Dict[str, Any]:
+async def url_crawl(request_data: URLCrawlRequest, request: Request, response: Response) -> FastJSONResponse:
     """
     爬取URL并处理内容
     
+    带 Idempotency-Key 请求头时，相同键的重试复用第一次请求的结果或正在进行的处理，
+    复用的响应带 Idempotent-Replayed: true。
+    
     Args:
         request_data: 包含URL的请求体
         request: FastAPI请求对象
+        response: FastAPI响应对象（用于设置Server-Timing头）
         
     Returns:
         处理后的结构化数据
@@ -31,12 +83,14 @@ async def url_crawl(request_data: URLCrawlRequest, request: Request) -> Dict[str
     # 获取请求ID（由中间件设置）
     request_id = getattr(request.state, "request_id", "unknown")
     start_time = getattr(request.state, "start_time", time.time())
+    priority, tenant = request_work_class(request, "interactive")
     
     # 创建带上下文的logger
     context_logger = get_context_logger(
         "api.url_crawl",
         request_id=request_id,
-        url=request_data.url
+        url=request_data.url,
+        tenant=tenant
     )
     
     try:
@@ -44,101 +98,43 @@ async def url_crawl(request_data: URLCrawlRequest, request: Request) -> Dict[str
             "event": "crawl_start",
             "target_url": request_data.url,
             "user_agent": request.headers.get("user-agent", "unknown"),
-            "client_ip": request.client.host if request.client else "unknown"
-        })
-        
-        # 步骤1: 发送爬取请求
-        step_start = time.time()
-        context_logger.info("步骤1/4: 发送爬取请求", extra={"event": "step_1_start"})
-        
-        crawl_response = await crawl_url(request_data.url)
-        step_time = (time.time() - step_start) * 1000
-        
-        if not crawl_response:
-            context_logger.error("爬取请求失败", extra={
-                "event": "crawl_request_failed",
-                "step": 1,
-                "step_time": step_time
-            })
-            raise HTTPException(status_code=500, detail="爬取请求失败")
-        
-        result_url = crawl_response.get("url")
-        if not result_url:
-            context_logger.error("爬取响应中未找到结果URL", extra={
-                "event": "no_result_url",
-                "step": 1,
-                "response": crawl_response
-            })
-            raise HTTPException(status_code=500, detail="爬取响应中未找到结果URL")
-        
-        context_logger.info("爬取请求成功", extra={
-            "event": "step_1_complete",
-            "step_time": step_time,
-            "result_url": result_url
-        })
-        
-        # 步骤2: 获取爬取结果
-        step_start = time.time()
-        context_logger.info("步骤2/4: 获取爬取结果", extra={"event": "step_2_start"})
-        
-        crawl_result = await get_crawl_result(result_url)
-        step_time = (time.time() - step_start) * 1000
-        
-        if not crawl_result:
-            context_logger.error("获取爬取结果失败", extra={
-                "event": "get_result_failed",
-                "step": 2,
-                "step_time": step_time
-            })
-            raise HTTPException(status_code=500, detail="获取爬取结果失败")
-        
-        # 分析爬取结果
-        content_length = 0
-        if crawl_result.get("data") and crawl_result["data"]:
-            content_length = len(crawl_result["data"][0].get("markdown", ""))
-        
-        context_logger.info("获取爬取结果成功", extra={
-            "event": "step_2_complete",
-            "step_time": step_time,
-            "content_length": content_length,
-            "data_count": len(crawl_result.get("data", []))
-        })
-        
-        # 步骤3: 使用OpenAI处理数据
-        step_start = time.time()
-        context_logger.info("步骤3/4: 使用OpenAI处理数据", extra={"event": "step_3_start"})
-        
-        processed_data = await process_with_openai(crawl_result, request_id)
-        step_time = (time.time() - step_start) * 1000
-        
-        context_logger.info("OpenAI处理完成", extra={
-            "event": "step_3_complete",
-            "step_time": step_time,
-            "processed_items": len(processed_data.get("data", []))
+            "client_ip": request.client.host if request.client else "unknown",
+            "priority": priority
         })
         
-        # 步骤4: 格式化为API响应格式
-        step_start = time.time()
-        context_logger.info("步骤4/4: 格式化API响应", extra={"event": "step_4_start"})
-        
-        api_response = format_api_response(processed_data)
-        step_time = (time.time() - step_start) * 1000
-        
-        context_logger.info("响应格式化完成", extra={
-            "event": "step_4_complete",
-            "step_time": step_time,
-            "response_items": len(api_response.get("data", []))
-        })
+        idempotency_key = request.headers.get("idempotency-key")
+        with scheduling_scope(priority, tenant):
+            if idempotency_key is not None:
+                outcome, result = await run_idempotent(
+                    idempotency_key.strip(), tenant, request_data.url,
+                    lambda resume_url: run_url_pipeline(
+                        request_data.url, request_id, context_logger, resume_url=resume_url
+                    )
+                )
+                if outcome in ("joined", "replayed"):
+                    response.headers["Idempotent-Replayed"] = "true"
+            else:
+                result = await run_url_pipeline(request_data.url, request_id, context_logger)
+        api_response = result["response"]
         
         # 计算并记录总处理时间
         total_time = (time.time() - start_time) * 1000
         
+        # 各步骤耗时通过Server-Timing头返回，便于压测和浏览器开发者工具分析（复用的结果没有步骤耗时）
+        response.headers["Server-Timing"] = format_server_timing(result.get("timings", {}), total_time)
+        
+        # 被抽样做内存跟踪时，各步骤峰值内存随请求摘要日志输出
+        memory = result.get("memory")
+        if memory:
+            request.state.memory_peak_bytes = memory
+        
         # 性能警告
         if total_time > SLOW_REQUEST_THRESHOLD:
             context_logger.warning("请求处理时间过长", extra={
                 "event": "slow_request",
                 "total_time": total_time,
-                "threshold": SLOW_REQUEST_THRESHOLD
+                "threshold": SLOW_REQUEST_THRESHOLD,
+                "memory_peak_bytes": memory
             })
         
         context_logger.info("URL处理完成", extra={
@@ -147,8 +143,9 @@ async def url_crawl(request_data: URLCrawlRequest, request: Request) -> Dict[str
             "success": True,
             "response_code": 200
         })
+        URL_REQUESTS.labels("single", "success").inc()
         
-        return api_response
+        return json_response(api_response, response)
     
     except HTTPException as e:
         if e.status_code == 202:
@@ -157,17 +154,19 @@ async def url_crawl(request_data: URLCrawlRequest, request: Request) -> Dict[str
                 "status_code": 202,
                 "detail": e.detail
             })
-            return {
+            URL_REQUESTS.labels("single", "processing").inc()
+            return json_response({
                 "code": 202,
                 "msg": e.detail,
                 "data": {"status": "processing", "request_id": request_id}
-            }
+            }, response)
         
         context_logger.error("HTTP异常", extra={
             "event": "http_exception",
             "status_code": e.status_code,
             "detail": e.detail
         })
+        URL_REQUESTS.labels("single", "error").inc()
         raise
     
     except Exception as e:
@@ -178,13 +177,57 @@ async def url_crawl(request_data: URLCrawlRequest, request: Request) -> Dict[str
             "error_message": str(e),
             "total_time": total_time
         }, exc_info=True)
+        URL_REQUESTS.labels("single", "error").inc()
         raise HTTPException(
             status_code=500, 
             detail=f"处理URL时发生错误: {str(e)}"
         )
 
+@router.post("/api/v1/text/urlCrawl/batch")
+async def url_crawl_batch(request_data: URLBatchCrawlRequest, request: Request) -> StreamingResponse:
+    """
+    批量爬取URL并处理内容，以NDJSON流式返回
+    
+    每个URL完成后立即输出一行结果，最后一行为包含每个URL耗时和成本的汇总。
+    
+    Args:
+        request_data: 包含URL列表、并发数和截止时间的请求体
+        request: FastAPI请求对象
+        
+    Returns:
+        application/x-ndjson 流式响应
+    """
+    request_id = getattr(request.state, "request_id", "unknown")
+    priority, tenant = request_work_class(request, "bulk")
+    # DeadlineMiddleware 按整批的截止时间统计截止时间之后才完成的请求
+    request.state.batch_deadline = request_data.deadline
+    
+    context_logger = get_context_logger("api.url_crawl_batch", request_id=request_id, tenant=tenant)
+    context_logger.info("收到批量URL爬取请求", extra={
+        "event": "batch_request",
+        "url_count": len(request_data.urls),
+        "concurrency": request_data.concurrency,
+        "deadline": request_data.deadline,
+        "client_ip": request.client.host if request.client else "unknown",
+        "priority": priority
+    })
+    
+    async def stream_results():
+        async for item in run_batch(
+            request_data.urls,
+            request_id,
+            concurrency=request_data.concurrency,
+            deadline=request_data.deadline,
+            priority=priority,
+            tenant=tenant,
+            admission=admission_controller if ADMISSION_ENABLED else None
+        ):
+            yield dumps_json(item) + b"\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 @router.get("/health")
-async def health_check(request: Request) -> Dict[str, Any]:
+async def health_check(request: Request) -> FastJSONResponse:
     """健康检查端点"""
     # 健康检查使用简单日志，避免过多噪音
     if not getattr(request.state, "skip_logging", False):
@@ -193,9 +236,89 @@ async def health_check(request: Request) -> Dict[str, Any]:
             "client_ip": request.client.host if request.client else "unknown"
         })
     
-    return {
+    return FastJSONResponse({
         "status": "ok", 
         "timestamp": time.time(),
         "service": "text-processing-api",
         "version": "1.0.0"
-    } 
\ No newline at end of file
+    })
+
+@router.get("/metrics")
+async def metrics() -> PlainTextResponse:
+    """Prometheus指标端点（汇总所有worker进程）"""
+    content = await asyncio.to_thread(generate_latest)
+    return PlainTextResponse(content, media_type="text/plain; version=0.0.4")
+
+def require_admin(request: Request):
+    """校验管理接口的Bearer令牌；未配置 ADMIN_TOKEN 时管理接口不可用"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="未授权", headers={"WWW-Authenticate": "Bearer"})
+
+@router.post("/admin/profile")
+async def profile(
+    request: Request,
+    seconds: float = 10,
+    mode: str = "wall",
+    format: str = "collapsed",
+    interval_ms: float = 10,
+    request_id: Optional[str] = None
+) -> Response:
+    """
+    对当前worker进程进行限时采样分析
+
+    Args:
+        seconds: 采样时长（秒），不超过 PROFILE_MAX_SECONDS
+        mode: wall（墙钟，含等待中的线程）或 cpu（只统计正在运行的线程）
+        format: collapsed（火焰图折叠栈）或 speedscope（JSON）
+        interval_ms: 采样间隔（毫秒）
+        request_id: 可选，只统计该请求在事件循环线程上的执行
+    """
+    require_admin(request)
+    if mode not in PROFILE_MODES:
+        raise HTTPException(status_code=400, detail=f"mode 必须是 {', '.join(PROFILE_MODES)} 之一")
+    if mode == "cpu" and not cpu_mode_supported():
+        raise HTTPException(status_code=400, detail="当前系统不支持cpu模式（需要 /proc）")
+    if format not in ("collapsed", "speedscope"):
+        raise HTTPException(status_code=400, detail="format 必须是 collapsed 或 speedscope")
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds 必须在 (0, {PROFILE_MAX_SECONDS:g}] 之间")
+    if not 1 <= interval_ms <= 1000:
+        raise HTTPException(status_code=400, detail="interval_ms 必须在 [1, 1000] 之间")
+
+    profile_logger = get_context_logger(
+        "api.admin.profile", request_id=getattr(request.state, "request_id", None)
+    )
+    profile_logger.info("开始采样分析", extra={
+        "event": "profile_start",
+        "seconds": seconds,
+        "mode": mode,
+        "interval_ms": interval_ms,
+        "target_request_id": request_id
+    })
+
+    try:
+        profiler = await run_profile(seconds, mode=mode, interval=interval_ms / 1000, request_id=request_id)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    profile_logger.info("采样分析完成", extra={
+        "event": "profile_complete",
+        "samples": profiler.sample_count,
+        "unique_stacks": len(profiler.stacks),
+        "duration": profiler.duration
+    })
+
+    filename = f"profile-{os.getpid()}-{mode}-{int(profiler.started_at)}"
+    if format == "speedscope":
+        content = await asyncio.to_thread(profiler.speedscope)
+        return FastJSONResponse(content, headers={
+            "Content-Disposition": f'attachment; filename="{filename}.speedscope.json"'
+        })
+    content = await asyncio.to_thread(profiler.collapsed)
+    return PlainTextResponse(content, headers={
+        "Content-Disposition": f'attachment; filename="{filename}.folded"'
+    })
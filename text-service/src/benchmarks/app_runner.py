@@ -0,0 +1,93 @@
+"""
+基准测试中被测服务的运行入口（在独立子进程中运行）
+
+使用与生产相同的 create_app()（含中间件），并额外挂载 /__bench__/stats，
+返回被测进程的事件循环延迟（调度滞后）和RSS，避免压测端本身的开销污染这些指标。
+
+由 src.benchmarks.run 启动，一般不需要手动运行:
+    python -m src.benchmarks.app_runner --port 18008
+"""
+import os
+import sys
+import asyncio
+import argparse
+import resource
+from collections import deque
+
+import uvicorn
+from fastapi import FastAPI
+
+from src.benchmarks.stats import summarize
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+def current_rss_bytes() -> int:
+    """当前进程的常驻内存（字节）"""
+    with open("/proc/self/statm", "r") as f:
+        return int(f.read().split()[1]) * _PAGE_SIZE
+
+class LoopLagSampler:
+    """周期性测量事件循环调度滞后，并跟踪阶段内的RSS峰值"""
+
+    def __init__(self, interval: float = 0.01, max_samples: int = 200000):
+        self.interval = interval
+        self.samples = deque(maxlen=max_samples)
+        self.rss_peak = 0
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        ticks = 0
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append((loop.time() - start - self.interval) * 1000)
+            ticks += 1
+            if ticks % 10 == 0:
+                self.rss_peak = max(self.rss_peak, current_rss_bytes())
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def snapshot(self, reset: bool = False):
+        lag = summarize(list(self.samples))
+        rss = current_rss_bytes()
+        result = {
+            "loop_lag_ms": lag,
+            "rss_mb": {
+                "current": rss / 1024 / 1024,
+                "peak_phase": max(self.rss_peak, rss) / 1024 / 1024,
+                "peak_process": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            }
+        }
+        if reset:
+            self.samples.clear()
+            self.rss_peak = 0
+        return result
+
+def create_bench_app() -> FastAPI:
+    from src.main import create_app
+
+    app = create_app()
+
+    sampler = LoopLagSampler()
+
+    @app.on_event("startup")
+    async def start_sampler():
+        sampler.start()
+
+    @app.get("/__bench__/stats")
+    async def bench_stats(reset: bool = False):
+        return sampler.snapshot(reset=reset)
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="基准测试被测服务")
+    parser.add_argument("--port", type=int, required=True)
+    args = parser.parse_args()
+
+    uvicorn.run(create_bench_app(), host="127.0.0.1", port=args.port, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    sys.exit(main())
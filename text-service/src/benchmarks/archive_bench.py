@@ -0,0 +1,70 @@
+"""
+爬取归档基准测试：追加写入、按URL查找和顺序扫描的吞吐量
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.archive_bench --pages 20000 --page-kb 20
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import argparse
+
+from src.core.util.crawl_archive import CrawlArchive
+from src.benchmarks.stubs import sample_markdown
+
+def main():
+    parser = argparse.ArgumentParser(description="爬取归档基准测试")
+    parser.add_argument("--pages", type=int, default=20000, help="写入的页面数")
+    parser.add_argument("--page-kb", type=int, default=20, help="每页大约大小（KB）")
+    parser.add_argument("--lookups", type=int, default=100000, help="随机查找次数")
+    parser.add_argument("--dir", default=None, help="归档目录，默认使用临时目录")
+    args = parser.parse_args()
+
+    root = args.dir or tempfile.mkdtemp(prefix="crawl-archive-bench-")
+    base_page = sample_markdown(max(1, args.page_kb * 1024 // 400))
+    archive = CrawlArchive(root)
+    urls = [f"https://example.com/article/{index}" for index in range(args.pages)]
+
+    try:
+        raw_bytes = 0
+        start = time.perf_counter()
+        for index, url in enumerate(urls):
+            markdown = f"<!-- {index} -->\n" + base_page
+            raw_bytes += len(markdown.encode("utf-8"))
+            archive.append(url, markdown)
+        append_seconds = time.perf_counter() - start
+
+        disk_bytes = sum(
+            os.path.getsize(os.path.join(dirpath, name))
+            for dirpath, _, names in os.walk(root) for name in names
+        )
+
+        sample = [random.choice(urls) for _ in range(args.lookups)]
+        start = time.perf_counter()
+        for url in sample:
+            archive.lookup(url)
+        lookup_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scanned = 0
+        scanned_bytes = 0
+        for entry in archive.scan():
+            scanned += 1
+            scanned_bytes += len(archive.read(entry))
+        scan_seconds = time.perf_counter() - start
+
+        print(f"codec: {'zstd' if archive.codec == 2 else 'zlib'}")
+        print(f"append: {args.pages / append_seconds:,.0f} pages/s, {raw_bytes / append_seconds / 1e6:,.1f} MB/s raw")
+        print(f"size: {raw_bytes / 1e6:,.1f} MB raw -> {disk_bytes / 1e6:,.1f} MB on disk")
+        print(f"lookup: {lookup_seconds / args.lookups * 1e6:,.2f} us/op")
+        print(f"scan+read: {scanned / scan_seconds:,.0f} pages/s, {scanned_bytes / scan_seconds / 1e6:,.1f} M chars/s")
+    finally:
+        archive.close()
+        if args.dir is None:
+            shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+批量接口压测：验证吞吐量随 concurrency 设置增长
+
+使用本地爬虫桩和LLM桩，对 /api/v1/text/urlCrawl/batch 以不同并发数发送同一批URL，
+输出每个并发数下的吞吐量和延迟。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.batch_load --urls 64 --concurrency 1,2,4,8,16,32
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+
+from src.benchmarks.stubs import StubServer, create_crawler_stub, create_llm_stub, load_archive_pages
+
+async def run_batch_request(base_url: str, urls, concurrency: int, deadline: float):
+    import httpx
+
+    first_result_at = None
+    start = time.time()
+    summary = None
+    async with httpx.AsyncClient(timeout=deadline + 30) as client:
+        async with client.stream(
+            "POST",
+            f"{base_url}/api/v1/text/urlCrawl/batch",
+            json={"urls": urls, "concurrency": concurrency, "deadline": deadline}
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                item = json.loads(line)
+                if item["type"] == "result" and first_result_at is None:
+                    first_result_at = time.time() - start
+                elif item["type"] == "summary":
+                    summary = item
+    return summary, first_result_at, time.time() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="批量接口吞吐量压测")
+    parser.add_argument("--urls", type=int, default=64, help="每批URL数量")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32", help="逗号分隔的并发数列表")
+    parser.add_argument("--deadline", type=float, default=600, help="每批截止时间（秒）")
+    parser.add_argument("--crawler-latency", type=float, default=0.05, help="爬虫桩每次请求延迟（秒）")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="LLM桩每次调用延迟（秒）")
+    parser.add_argument("--archive", default=None, help="可选，使用爬取归档中的真实页面作为爬虫桩语料")
+    args = parser.parse_args()
+
+    pages = load_archive_pages(args.archive) if args.archive else None
+    crawler = StubServer(create_crawler_stub(latency=args.crawler_latency, pages=pages)).start()
+    llm = StubServer(create_llm_stub(latency=args.llm_latency)).start()
+
+    # 在导入服务模块之前把配置指向本地替身
+    os.environ["CRAWLER_API_IP"] = "127.0.0.1"
+    os.environ["CRAWLER_API_PORT"] = str(crawler.port)
+    os.environ["OPENAI_API_BASE"] = f"{llm.base_url}/v1"
+    os.environ.setdefault("OpenAI_API_KEY", "stub-key")
+
+    from fastapi import FastAPI
+    from src.api.routes import router
+
+    app = FastAPI()
+    app.include_router(router)
+    service = StubServer(app).start()
+
+    urls = [f"https://example.com/article/{index}" for index in range(args.urls)]
+    print(f"{'concurrency':>11} {'total_s':>8} {'urls/s':>8} {'first_ms':>9} {'p50_ms':>8} {'p95_ms':>8} {'ok':>4}")
+    try:
+        for concurrency in [int(value) for value in args.concurrency.split(",")]:
+            summary, first_result_at, elapsed = asyncio.run(
+                run_batch_request(service.base_url, urls, concurrency, args.deadline)
+            )
+            print(
+                f"{concurrency:>11} {elapsed:>8.2f} {len(urls) / elapsed:>8.2f} "
+                f"{(first_result_at or 0) * 1000:>9.1f} {summary['latency_ms']['p50']:>8.1f} "
+                f"{summary['latency_ms']['p95']:>8.1f} {summary['succeeded']:>4}"
+            )
+    finally:
+        service.stop()
+        crawler.stop()
+        llm.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""
+模型级联的收益
+
+两个LLM桩：较弱的模型（便宜、快，--cheap-degrade 比例的页面返回质量差的结果）和较强的模型
+（贵、慢，结果总是完整）。同一批页面分别用两种方式提取:
+    single   只使用较强的模型
+    cascade  先用较弱的模型，质量分低于 LLM_CASCADE_THRESHOLD 时交给较强的模型
+输出各方式的总成本、每页平均成本、延迟和最终结果的平均质量分，以及级联中各层的
+采用率、平均成本和平均延迟；并检查级联的最终结果与只用较强模型的结果相同
+（质量差的结果全部被升级）。不一致时退出码为1。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.cascade_bench --pages 100 --cheap-degrade 0.3
+    python -m src.benchmarks.cascade_bench --threshold 0.6 --cheap-latency fixed:0.1
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+
+from src.benchmarks.stubs import StubServer, create_llm_stub, sample_markdown
+from src.benchmarks.stats import summarize
+
+CHEAP_MODEL = "cheap-model"
+STRONG_MODEL = "strong-model"
+
+def build_pages(count: int, paragraphs: int):
+    return [sample_markdown(paragraphs).replace("示例内容", f"第{index}页的示例内容") for index in range(count)]
+
+async def run_mode(mode: str, tiers, pages, args, data_dir: str):
+    from src.core.service import openai_service
+    from src.core.service.model_cascade import parse_tier
+    from src.core.util.extraction_quality import score_extraction
+    from src.core.util.section_store import SectionStore
+
+    # 每种方式使用单独的小节存储，避免复用另一种方式的结果
+    if openai_service.get_section_store() is not None:
+        openai_service._section_store = SectionStore(os.path.join(data_dir, f"sections-{mode}.sqlite3"), 86400)
+    openai_service.model_tiers[:] = [parse_tier(spec) for spec in tiers]
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    records = []
+
+    async def one(index: int, markdown: str):
+        async with semaphore:
+            usage = {}
+            start = time.perf_counter()
+            result = await openai_service.process_with_openai(
+                {"data": [{"markdown": markdown}]}, f"cascade-bench-{mode}-{index}", usage=usage
+            )
+            records.append({
+                "index": index,
+                "latency": time.perf_counter() - start,
+                "cost": usage.get("cost", 0.0),
+                "model": usage.get("model"),
+                "score": score_extraction(result.get("data") or [], markdown).score,
+                "result": json.dumps(result.get("data"), ensure_ascii=False, sort_keys=True)
+            })
+
+    await asyncio.gather(*(one(index, markdown) for index, markdown in enumerate(pages)))
+    return sorted(records, key=lambda record: record["index"])
+
+async def run(args, cheap_url: str, strong_url: str, data_dir: str):
+    pages = build_pages(args.pages, args.paragraphs)
+    cheap = f"{CHEAP_MODEL}@{cheap_url}/v1={args.cheap_price}"
+    strong = f"{STRONG_MODEL}@{strong_url}/v1={args.strong_price}"
+    return {
+        "single": await run_mode("single", [strong], pages, args, data_dir),
+        "cascade": await run_mode("cascade", [cheap, strong], pages, args, data_dir)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="模型级联的收益")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--paragraphs", type=int, default=8, help="每个页面的小节数")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--threshold", type=float, default=0.8, help="质量分阈值（LLM_CASCADE_THRESHOLD）")
+    parser.add_argument("--cheap-latency", default="fixed:0.2")
+    parser.add_argument("--strong-latency", default="fixed:1.0")
+    parser.add_argument("--cheap-price", default="0.2/1", help="较弱模型的 输入价格/输出价格（每百万token）")
+    parser.add_argument("--strong-price", default="2/10")
+    parser.add_argument("--cheap-degrade", type=float, default=0.3, help="较弱模型返回质量差结果的页面比例")
+    args = parser.parse_args()
+
+    cheap = StubServer(create_llm_stub(latency=args.cheap_latency, degrade_rate=args.cheap_degrade)).start()
+    strong = StubServer(create_llm_stub(latency=args.strong_latency)).start()
+    data_dir = tempfile.mkdtemp(prefix="cascade-bench-")
+    try:
+        # 配置在导入服务模块之前设置
+        os.environ.update({
+            "OpenAI_API_KEY": os.environ.get("OpenAI_API_KEY") or "bench-key",
+            "LLM_CASCADE_THRESHOLD": str(args.threshold),
+            "TRAFFIC_RECORD_DIR": "",
+            "METRICS_DIR": os.path.join(data_dir, "metrics"),
+            "SECTION_STORE_PATH": os.path.join(data_dir, "sections.sqlite3"),
+        })
+        stats = asyncio.run(run(args, cheap.base_url, strong.base_url, data_dir))
+    finally:
+        cheap.stop()
+        strong.stop()
+
+    print(f"页面数 {args.pages}，较弱模型质量差的比例 {args.cheap_degrade:.0%}，阈值 {args.threshold}")
+    print(f"{'mode':>8} {'cost':>9} {'cost/page':>10} {'p50_ms':>7} {'p95_ms':>7} {'avg_ms':>7} {'score':>6}")
+    for mode, records in stats.items():
+        latency = summarize([record["latency"] for record in records])
+        cost = sum(record["cost"] for record in records)
+        score = sum(record["score"] for record in records) / len(records)
+        print(f"{mode:>8} {cost:>9.4f} {cost / len(records):>10.6f} {latency['p50'] * 1000:>7.0f} "
+              f"{latency['p95'] * 1000:>7.0f} {latency['avg'] * 1000:>7.0f} {score:>6.3f}")
+
+    # 级联各层：按最终采用的层分组
+    by_tier = defaultdict(list)
+    for record in stats["cascade"]:
+        by_tier[record["model"]].append(record)
+    print("级联各层（按最终采用的层）:")
+    print(f"{'tier':>13} {'pages':>6} {'rate':>6} {'avg_cost':>10} {'avg_ms':>7}")
+    for model in (CHEAP_MODEL, STRONG_MODEL):
+        records = by_tier.get(model, [])
+        if not records:
+            print(f"{model:>13} {0:>6} {0:>6.0%}")
+            continue
+        avg_cost = sum(record["cost"] for record in records) / len(records)
+        avg_latency = sum(record["latency"] for record in records) / len(records)
+        print(f"{model:>13} {len(records):>6} {len(records) / args.pages:>6.0%} {avg_cost:>10.6f} "
+              f"{avg_latency * 1000:>7.0f}")
+
+    mismatches = [
+        single["index"] for single, cascade in zip(stats["single"], stats["cascade"])
+        if single["result"] != cascade["result"]
+    ]
+    print("级联的最终结果与只用较强模型的结果一致" if not mismatches
+          else f"{len(mismatches)} 个页面的结果与只用较强模型的不一致: {mismatches[:10]}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
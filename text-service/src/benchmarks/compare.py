@@ -0,0 +1,96 @@
+"""
+基准结果与基线的对比
+
+按到达率匹配阶段，比较延迟分位数、各步骤p95、goodput、事件循环延迟和RSS，
+劣化超过阈值（相对比例）即视为回归。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.compare result.json baseline.json --threshold 0.1
+"""
+import sys
+import json
+import argparse
+from typing import Dict, Any, List, Tuple
+
+# (指标路径, 越大越差)；绝对值很小的延迟指标噪声大，低于 min_abs 毫秒时不判回归
+_METRICS: List[Tuple[Tuple[str, ...], bool]] = [
+    (("latency_ms", "p50"), True),
+    (("latency_ms", "p95"), True),
+    (("latency_ms", "p99"), True),
+    (("goodput",), False),
+    (("loop_lag_ms", "p99"), True),
+    (("rss_mb", "peak_phase"), True),
+]
+
+def _get(data: Dict[str, Any], path: Tuple[str, ...]):
+    for key in path:
+        if not isinstance(data, dict) or key not in data:
+            return None
+        data = data[key]
+    return data
+
+def compare(result: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_abs: float = 1.0) -> List[Dict[str, Any]]:
+    """
+    对比结果与基线
+
+    Returns:
+        每个指标一行的对比记录，regression为True表示超过阈值的劣化
+    """
+    rows = []
+    baseline_phases = {phase["rate"]: phase for phase in baseline.get("phases", [])}
+    for phase in result.get("phases", []):
+        base = baseline_phases.get(phase["rate"])
+        if base is None:
+            continue
+        metrics = list(_METRICS)
+        for step in phase.get("steps_ms", {}):
+            metrics.append((("steps_ms", step, "p95"), True))
+        for path, higher_is_worse in metrics:
+            current = _get(phase, path)
+            previous = _get(base, path)
+            if current is None or previous is None:
+                continue
+            if previous == 0:
+                change = 0.0 if current == 0 else float("inf")
+            else:
+                change = (current - previous) / previous
+            worse = change > threshold if higher_is_worse else change < -threshold
+            if path[0] in ("latency_ms", "loop_lag_ms", "steps_ms") and max(current, previous) < min_abs:
+                worse = False
+            rows.append({
+                "rate": phase["rate"],
+                "metric": ".".join(path),
+                "baseline": previous,
+                "current": current,
+                "change": change,
+                "regression": worse
+            })
+    return rows
+
+def print_comparison(rows: List[Dict[str, Any]]):
+    print(f"{'rate':>8} {'metric':<28} {'baseline':>12} {'current':>12} {'change':>9}")
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        print(
+            f"{row['rate']:>8} {row['metric']:<28} {row['baseline']:>12.2f} {row['current']:>12.2f} "
+            f"{row['change'] * 100:>8.1f}%{flag}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="基准结果与基线对比")
+    parser.add_argument("result", help="本次结果JSON")
+    parser.add_argument("baseline", help="基线结果JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="允许的相对劣化比例")
+    args = parser.parse_args()
+
+    with open(args.result, "r", encoding="utf-8") as f:
+        result = json.load(f)
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    rows = compare(result, baseline, args.threshold)
+    print_comparison(rows)
+    return 1 if any(row["regression"] for row in rows) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
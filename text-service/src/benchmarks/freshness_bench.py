@@ -0,0 +1,169 @@
+"""
+爬取前新鲜度检查的收益
+
+对本地源站桩（支持条件请求）、爬虫桩和LLM桩，把同一批URL处理两轮，第二轮之前修改其中一部分页面:
+    off         不做新鲜度检查，第二轮全部重新爬取
+    revalidate  第二轮先向源站发条件请求，只有修改过的页面重新爬取
+输出第二轮的爬取任务数、LLM调用数、源站请求数（其中304的个数）和延迟，并检查两种模式第二轮的
+结果相同（未修改的页面返回保存的结果，修改过的页面反映修改后的内容）。不一致时退出码为1。
+
+--validators none 时源站不返回校验器，按页面内容指纹判断；--dynamic 时页面每次渲染都不同，
+只能在爬取后按markdown指纹跳过LLM。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.freshness_bench --pages 40 --edit-ratio 0.1 --validators etag
+    python -m src.benchmarks.freshness_bench --validators none --dynamic
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+from src.benchmarks.stubs import StubServer, create_crawler_stub, create_llm_stub, create_origin_stub, sample_markdown
+from src.benchmarks.stats import summarize
+
+MODES = ("off", "revalidate")
+# 两种模式修改页面时使用的标记（等长，比较结果时互相替换）
+EDIT_TAGS = {"off": "甲", "revalidate": "乙"}
+
+def build_pages(count: int, paragraphs: int):
+    """生成 count 个页面（路径 -> markdown），每个页面的内容不同"""
+    return {
+        f"/page/{index}": sample_markdown(paragraphs).replace("示例内容", f"第{index}页的示例内容")
+        for index in range(count)
+    }
+
+async def run_round(urls, concurrency: int):
+    from src.core.service.pipeline_service import run_url_pipeline
+
+    semaphore = asyncio.Semaphore(concurrency)
+    results = {}
+    latencies = []
+    llm_calls = 0
+
+    async def one(url: str):
+        nonlocal llm_calls
+        async with semaphore:
+            start = time.perf_counter()
+            result = await run_url_pipeline(url, f"freshness-bench-{len(latencies)}")
+            latencies.append(time.perf_counter() - start)
+            results[url] = result["response"]
+            llm_calls += result["usage"].get("attempts", 0)
+
+    await asyncio.gather(*(one(url) for url in urls))
+    return results, latencies, llm_calls
+
+async def run_mode(mode: str, args, origin, origin_app, crawler_app, origin_pages, crawler_pages):
+    from src.core.service.freshness_service import freshness_checker, parse_domain_policies, parse_policy
+
+    freshness_checker.enabled = mode != "off"
+    freshness_checker.policies = parse_domain_policies(args.policies)
+    freshness_checker.default_policy = parse_policy(args.default_policy)
+
+    originals = build_pages(args.pages, args.paragraphs)
+    origin_pages.clear()
+    origin_pages.update(originals)
+    crawler_pages.clear()
+    crawler_pages.update({origin.base_url + path: markdown for path, markdown in originals.items()})
+    urls = list(crawler_pages)
+
+    await run_round(urls, args.concurrency)
+
+    # 均匀地修改一部分页面
+    edits = max(1, round(args.pages * args.edit_ratio))
+    step = args.pages / edits
+    for index in range(edits):
+        path = f"/page/{int(index * step)}"
+        edited = origin_pages[path].replace("这是第1段", f"这是{EDIT_TAGS[mode]}修改后的第1段", 1)
+        origin_pages[path] = edited
+        crawler_pages[origin.base_url + path] = edited
+
+    # 源站的Last-Modified为秒级精度，等到下一秒再处理第二轮
+    await asyncio.sleep(1.1)
+    jobs_before = len(crawler_app.state.jobs)
+    origin_before = dict(origin_app.state.requests)
+    results, latencies, llm_calls = await run_round(urls, args.concurrency)
+    return {
+        "results": {url.replace(origin.base_url, ""): response for url, response in results.items()},
+        "latency": summarize(latencies),
+        "crawl_jobs": len(crawler_app.state.jobs) - jobs_before,
+        "llm_calls": llm_calls,
+        "origin_requests": origin_app.state.requests["total"] - origin_before["total"],
+        "not_modified": origin_app.state.requests["not_modified"] - origin_before["not_modified"],
+        "edits": edits
+    }
+
+async def run(args, *servers):
+    return {mode: await run_mode(mode, args, *servers) for mode in MODES}
+
+def normalize(results, mode: str):
+    """去掉修改标记的差异，便于比较两种模式的结果"""
+    return {
+        path: json.dumps(response, ensure_ascii=False, sort_keys=True).replace(EDIT_TAGS[mode], EDIT_TAGS["off"])
+        for path, response in results.items()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="爬取前新鲜度检查的收益")
+    parser.add_argument("--pages", type=int, default=40)
+    parser.add_argument("--paragraphs", type=int, default=10, help="每个页面的小节数")
+    parser.add_argument("--edit-ratio", type=float, default=0.1, help="第二轮之前修改的页面比例")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--validators", default="etag", choices=("etag", "last-modified", "both", "none"),
+                        help="源站返回的校验器")
+    parser.add_argument("--dynamic", action="store_true", help="源站页面每次渲染都不同")
+    parser.add_argument("--default-policy", default="revalidate:0", help="新鲜度检查的默认策略")
+    parser.add_argument("--policies", default="", help="按域名的策略，如 127.0.0.1=recrawl:0")
+    parser.add_argument("--crawl-time", default="fixed:1.0", help="爬虫桩每个任务的完成时间")
+    parser.add_argument("--llm-latency", default="fixed:0.3")
+    args = parser.parse_args()
+
+    origin_pages = {}
+    crawler_pages = {}
+    origin_app = create_origin_stub(origin_pages, validators=args.validators, dynamic=args.dynamic)
+    crawler_app = create_crawler_stub(latency=0.01, job_time=args.crawl_time, pages=crawler_pages)
+    origin = StubServer(origin_app).start()
+    crawler = StubServer(crawler_app).start()
+    llm = StubServer(create_llm_stub(latency=args.llm_latency)).start()
+    data_dir = tempfile.mkdtemp(prefix="freshness-bench-")
+    try:
+        # 配置在导入服务模块之前设置
+        os.environ.update({
+            "CRAWLER_API_IP": "127.0.0.1",
+            "CRAWLER_API_PORT": str(crawler.port),
+            "OPENAI_API_BASE": f"{llm.base_url}/v1",
+            "OpenAI_API_KEY": os.environ.get("OpenAI_API_KEY") or "bench-key",
+            "CRAWL_CACHE_TTL": "0",
+            "CRAWL_ARCHIVE_ENABLED": "false",
+            "TRAFFIC_RECORD_DIR": "",
+            "METRICS_DIR": os.path.join(data_dir, "metrics"),
+            "SECTION_STORE_PATH": os.path.join(data_dir, "sections.sqlite3"),
+            "FRESHNESS_STORE_PATH": os.path.join(data_dir, "freshness.sqlite3"),
+        })
+        stats = asyncio.run(run(args, origin, origin_app, crawler_app, origin_pages, crawler_pages))
+    finally:
+        for server in (origin, crawler, llm):
+            server.stop()
+
+    edits = stats["off"]["edits"]
+    print(f"页面数 {args.pages}，第二轮前修改 {edits} 个，校验器 {args.validators}"
+          f"{'，动态页面' if args.dynamic else ''}")
+    print(f"{'mode':>10} {'crawl_jobs':>10} {'llm_calls':>9} {'origin':>7} {'304':>5} "
+          f"{'p50_ms':>8} {'p95_ms':>8}")
+    for mode, result in stats.items():
+        latency = result["latency"]
+        print(f"{mode:>10} {result['crawl_jobs']:>10} {result['llm_calls']:>9} {result['origin_requests']:>7} "
+              f"{result['not_modified']:>5} {latency['p50'] * 1000:>8.0f} {latency['p95'] * 1000:>8.0f}")
+
+    expected = normalize(stats["off"]["results"], "off")
+    actual = normalize(stats["revalidate"]["results"], "revalidate")
+    mismatches = [path for path in expected if expected[path] != actual.get(path)]
+    print("新鲜度检查的结果与全部重新爬取一致" if not mismatches
+          else f"{len(mismatches)} 个页面的结果与全部重新爬取不一致: {', '.join(mismatches[:5])}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
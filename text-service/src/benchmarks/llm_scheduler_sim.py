@@ -0,0 +1,160 @@
+"""
+LLM调度器模拟
+
+在进程内用 asyncio.sleep 模拟LLM调用（不启动服务和桩），验证 LLMScheduler:
+    alone       只有交互请求（泊松到达），作为基准
+    shared      交互请求 + 同时进行的批量回填（bulk优先级）
+    fifo        同样的负载但全部按同一优先级和租户排队（不做优先级调度时的情况）
+    tenants     两个bulk租户持续积压，权重2:1，检查完成数之比
+    starvation  交互请求超过容量，检查回填（backfill优先级）仍有进展
+检查项: shared 的交互p95不超过 alone 的 (1 + threshold) 倍，租户完成数之比接近权重之比，
+回填不被饿死。任一检查失败时退出码为1。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.llm_scheduler_sim --capacity 8 --service-time lognormal:0.05,0.3 --duration 8
+"""
+import os
+import sys
+import random
+import asyncio
+import argparse
+import tempfile
+
+from src.benchmarks.stubs import Latency
+from src.benchmarks.stats import summarize
+
+async def _interactive_stream(scheduler, scope_factory, rate: float, duration: float, service: Latency, seed: int):
+    """按泊松过程发起交互调用，返回每次调用的耗时（排队+处理，秒）"""
+    rng = random.Random(seed)
+    loop = asyncio.get_running_loop()
+    latencies = []
+
+    async def call():
+        start = loop.time()
+        with scope_factory():
+            async with scheduler.slot():
+                await service.wait()
+        latencies.append(loop.time() - start)
+
+    tasks = []
+    end = loop.time() + duration
+    while loop.time() < end:
+        tasks.append(asyncio.ensure_future(call()))
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+    return latencies
+
+async def _backlog_workers(scheduler, scope_factory, workers: int, service: Latency, stop: asyncio.Event):
+    """workers 个任务持续发起调用直到 stop，返回完成的调用数"""
+    completed = 0
+
+    async def worker():
+        nonlocal completed
+        while not stop.is_set():
+            with scope_factory():
+                async with scheduler.slot():
+                    await service.wait()
+            completed += 1
+
+    tasks = [asyncio.ensure_future(worker()) for _ in range(workers)]
+    await stop.wait()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return completed
+
+async def run_mixed(args, interactive_class: str, interactive_tenant: str, backlog_class,
+                    backlog_workers: int, rate: float):
+    from src.core.service.llm_scheduler import LLMScheduler, scheduling_scope
+
+    scheduler = LLMScheduler(max_concurrency=args.capacity, tenant_weights={}, aging=args.aging)
+    stop = asyncio.Event()
+    backlog = None
+    if backlog_class is not None:
+        backlog = asyncio.ensure_future(_backlog_workers(
+            scheduler, lambda: scheduling_scope(backlog_class, "campaign"),
+            backlog_workers, Latency(args.service_time, seed=args.seed + 1), stop
+        ))
+        await asyncio.sleep(0.2)  # 回填先积压起来
+    latencies = await _interactive_stream(
+        scheduler, lambda: scheduling_scope(interactive_class, interactive_tenant), rate, args.duration,
+        Latency(args.service_time, seed=args.seed), args.seed
+    )
+    stop.set()
+    completed = await backlog if backlog is not None else 0
+    return summarize(latencies), completed
+
+async def run_tenants(args):
+    from src.core.service.llm_scheduler import LLMScheduler, scheduling_scope
+
+    scheduler = LLMScheduler(max_concurrency=args.capacity, tenant_weights={"a": 2, "b": 1}, aging=args.aging)
+    stop = asyncio.Event()
+    counts = [
+        asyncio.ensure_future(_backlog_workers(
+            scheduler, lambda tenant=tenant: scheduling_scope("bulk", tenant), args.capacity * 4,
+            Latency(args.service_time, seed=args.seed + index), stop
+        ))
+        for index, tenant in enumerate(("a", "b"))
+    ]
+    await asyncio.sleep(args.duration / 2)
+    stop.set()
+    return await counts[0], await counts[1]
+
+def _print_row(name: str, summary, completed: int):
+    print(f"{name:>10} count={summary['count']:>5} p50={summary['p50'] * 1000:>7.1f}ms "
+          f"p95={summary['p95'] * 1000:>7.1f}ms p99={summary['p99'] * 1000:>7.1f}ms backlog_completed={completed}")
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM调度器模拟")
+    parser.add_argument("--capacity", type=int, default=8, help="同时进行的LLM调用数上限")
+    parser.add_argument("--service-time", default="lognormal:0.05,0.3", help="LLM调用耗时分布")
+    parser.add_argument("--interactive-load", type=float, default=0.4, help="交互请求负载（占容量的比例）")
+    parser.add_argument("--backlog-workers", type=int, default=200, help="回填并发任务数")
+    parser.add_argument("--duration", type=float, default=8, help="每个场景的时长（秒）")
+    parser.add_argument("--aging", type=float, default=2, help="防饥饿等待阈值（秒）")
+    parser.add_argument("--threshold", type=float, default=0.25, help="允许的交互p95增幅")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # 配置在导入服务模块之前设置
+    os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="llm-scheduler-sim-metrics-"))
+
+    mean_service = Latency(args.service_time, seed=0)
+    mean_service = sum(mean_service.sample() for _ in range(10000)) / 10000
+    capacity_rate = args.capacity / mean_service
+    rate = capacity_rate * args.interactive_load
+    print(f"容量约 {capacity_rate:.0f} 次/秒，交互请求 {rate:.0f} 次/秒")
+
+    alone, _ = asyncio.run(run_mixed(args, "interactive", "editor", None, 0, rate))
+    shared, shared_completed = asyncio.run(run_mixed(args, "interactive", "editor", "bulk", args.backlog_workers, rate))
+    fifo, fifo_completed = asyncio.run(run_mixed(args, "bulk", "campaign", "bulk", args.backlog_workers, rate))
+    _print_row("alone", alone, 0)
+    _print_row("shared", shared, shared_completed)
+    _print_row("fifo", fifo, fifo_completed)
+
+    tenant_a, tenant_b = asyncio.run(run_tenants(args))
+    ratio = tenant_a / tenant_b if tenant_b else float("inf")
+    print(f"{'tenants':>10} a(权重2)={tenant_a} b(权重1)={tenant_b} ratio={ratio:.2f}")
+
+    saturated, starved_completed = asyncio.run(
+        run_mixed(args, "interactive", "editor", "backfill", args.backlog_workers, capacity_rate * 1.2)
+    )
+    _print_row("starvation", saturated, starved_completed)
+
+    failures = []
+    if shared["p95"] > alone["p95"] * (1 + args.threshold):
+        failures.append(f"回填使交互p95从 {alone['p95'] * 1000:.1f}ms 增加到 {shared['p95'] * 1000:.1f}ms")
+    if shared_completed == 0:
+        failures.append("shared 场景中回填没有完成任何调用")
+    if not 1.6 <= ratio <= 2.4:
+        failures.append(f"租户完成数之比 {ratio:.2f} 偏离权重之比 2")
+    if starved_completed == 0:
+        failures.append("交互请求超过容量时回填被饿死")
+
+    for failure in failures:
+        print(f"失败: {failure}")
+    print("通过" if not failures else "未通过")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
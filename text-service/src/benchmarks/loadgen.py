@@ -0,0 +1,119 @@
+"""
+开环（固定到达率）负载生成器
+
+按固定到达率发送请求，不等待前一个请求完成，这样服务变慢时排队时间会真实地
+反映在延迟中（避免闭环压测的协调遗漏问题）。
+"""
+import time
+import random
+import asyncio
+from typing import Dict, Any, List, Optional
+
+from src.benchmarks.stats import summarize
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """解析Server-Timing头，返回 指标名 -> 毫秒"""
+    timings: Dict[str, float] = {}
+    if not header:
+        return timings
+    for metric in header.split(","):
+        parts = [part.strip() for part in metric.split(";")]
+        name = parts[0]
+        for part in parts[1:]:
+            if part.startswith("dur="):
+                try:
+                    timings[name] = float(part[4:])
+                except ValueError:
+                    pass
+    return timings
+
+async def run_phase(
+    base_url: str,
+    urls: List[str],
+    rate: float,
+    duration: float,
+    arrival: str = "constant",
+    timeout: float = 60.0,
+    headers: Optional[Dict[str, str]] = None,
+    seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    以固定到达率对 /api/v1/text/urlCrawl 施压一个阶段
+
+    Args:
+        base_url: 服务地址
+        urls: 轮流使用的URL列表
+        rate: 到达率（请求/秒）
+        duration: 阶段时长（秒）
+        arrival: constant（等间隔）或 poisson（指数间隔）
+        timeout: 单个请求的客户端超时（秒）
+        headers: 额外的请求头
+        seed: 随机种子（poisson到达）
+
+    Returns:
+        阶段统计：发送数、各结果数、吞吐量、总延迟和每个步骤的延迟分布
+    """
+    import httpx
+
+    rng = random.Random(seed)
+    total = max(1, int(rate * duration))
+    latencies: List[float] = []
+    steps: Dict[str, List[float]] = {}
+    outcomes: Dict[str, int] = {}
+    late_starts: List[float] = []
+
+    async def one(client, index: int):
+        url = urls[index % len(urls)]
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"{base_url}/api/v1/text/urlCrawl", json={"url": url}, headers=headers)
+        except httpx.TimeoutException:
+            outcomes["timeout"] = outcomes.get("timeout", 0) + 1
+            return
+        except httpx.HTTPError:
+            outcomes["connection_error"] = outcomes.get("connection_error", 0) + 1
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+
+        if response.status_code != 200:
+            outcome = f"http_{response.status_code}"
+        else:
+            code = response.json().get("code", 200)
+            outcome = "ok" if code == 200 else f"code_{code}"
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+        if outcome == "ok":
+            latencies.append(elapsed)
+            for name, value in parse_server_timing(response.headers.get("server-timing")).items():
+                steps.setdefault(name, []).append(value)
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=1000)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        tasks = []
+        phase_start = time.perf_counter()
+        next_at = 0.0
+        for index in range(total):
+            delay = phase_start + next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                late_starts.append(-delay * 1000)
+            tasks.append(asyncio.ensure_future(one(client, index)))
+            next_at += rng.expovariate(rate) if arrival == "poisson" else 1.0 / rate
+        send_seconds = time.perf_counter() - phase_start
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - phase_start
+
+    return {
+        "rate": rate,
+        "duration": duration,
+        "arrival": arrival,
+        "sent": total,
+        "send_seconds": send_seconds,
+        "elapsed_seconds": elapsed,
+        "outcomes": outcomes,
+        "goodput": outcomes.get("ok", 0) / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": summarize(latencies),
+        "steps_ms": {name: summarize(values) for name, values in steps.items()},
+        "generator_late_ms": summarize(late_starts)
+    }
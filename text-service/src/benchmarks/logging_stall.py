@@ -0,0 +1,126 @@
+"""
+日志对事件循环的阻塞测试
+
+模拟每个请求输出多条带 extra 的结构化日志，对比两种配置下事件循环线程的开销:
+    sync   处理器（JSON格式化、轮转文件、控制台）直接挂在根日志器上，在事件循环线程中执行
+    queue  setup_logging 使用的方式：DeferredQueueHandler 入队，QueueListener 在后台线程写出
+
+输出每条日志在事件循环线程上的耗时，以及事件循环调度延迟（10ms定时器的滞后）。
+使用较小的 --max-bytes 使测试过程中频繁发生文件轮转。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.logging_stall --rate 200 --records 20 --duration 5
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import logging.handlers
+import queue
+
+from src.config.logging_config import build_handlers, get_context_logger, DeferredQueueHandler
+from src.benchmarks.app_runner import LoopLagSampler
+from src.benchmarks.stats import summarize
+
+def configure(mode: str, log_dir: str, max_bytes: int):
+    """按模式配置根日志器，返回需要在结束时停止的监听器（sync模式为None）"""
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(logging.INFO)
+
+    handlers = build_handlers(
+        log_dir, max_bytes=max_bytes, backup_count=3, enable_json=True,
+        enable_console_colors=False, console_stream=open(os.devnull, "w")
+    )
+    if mode == "sync":
+        for handler in handlers:
+            root.addHandler(handler)
+        return None, handlers
+
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    root.addHandler(DeferredQueueHandler(log_queue))
+    return listener, handlers
+
+async def simulate_request(index: int, records: int, costs):
+    context_logger = get_context_logger("bench.request", request_id=f"req-{index}", url=f"https://example.com/{index}")
+    for step in range(records):
+        start = time.perf_counter()
+        context_logger.info("处理步骤完成", extra={
+            "event": f"step_{step}",
+            "step_time": 12.5,
+            "content_length": 48213,
+            "image_count": 7,
+            "success": True,
+            "payload": {"items": [{"title": "标题", "score": 0.93}] * 3}
+        })
+        costs.append((time.perf_counter() - start) * 1e6)
+        await asyncio.sleep(0)
+
+async def run_mode(rate: float, records: int, duration: float):
+    sampler = LoopLagSampler()
+    sampler.start()
+    costs = []
+    tasks = []
+    interval = 1.0 / rate
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    index = 0
+    while loop.time() - start < duration:
+        tasks.append(asyncio.create_task(simulate_request(index, records, costs)))
+        index += 1
+        next_at = start + index * interval
+        await asyncio.sleep(max(0.0, next_at - loop.time()))
+    await asyncio.gather(*tasks)
+    snapshot = sampler.snapshot()
+    return {
+        "requests": index,
+        "records": len(costs),
+        "record_cost_us": summarize(costs),
+        "loop_lag_ms": snapshot["loop_lag_ms"],
+        "loop_thread_ms_per_s": sum(costs) / 1000 / duration
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="日志对事件循环的阻塞测试")
+    parser.add_argument("--rate", type=float, default=200, help="每秒请求数")
+    parser.add_argument("--records", type=int, default=20, help="每个请求的日志条数")
+    parser.add_argument("--duration", type=float, default=5, help="每种模式的时长（秒）")
+    parser.add_argument("--max-bytes", type=int, default=2 * 1024 * 1024, help="日志文件轮转大小")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ("sync", "queue"):
+        with tempfile.TemporaryDirectory(prefix=f"log-bench-{mode}-") as log_dir:
+            listener, handlers = configure(mode, log_dir, args.max_bytes)
+            results[mode] = asyncio.run(run_mode(args.rate, args.records, args.duration))
+            drain_start = time.perf_counter()
+            if listener is not None:
+                listener.stop()
+            results[mode]["drain_ms"] = (time.perf_counter() - drain_start) * 1000
+            for handler in handlers:
+                handler.close()
+            logging.getLogger().handlers.clear()
+
+    print(f"rate={args.rate:g} req/s, {args.records} 条日志/请求, {args.duration:g}s/模式")
+    print(
+        f"{'mode':>6} {'records':>8} {'rec_p50_us':>10} {'rec_p99_us':>10} {'loop_ms/s':>9} "
+        f"{'lag_p50_ms':>10} {'lag_p99_ms':>10} {'lag_max_ms':>10} {'drain_ms':>8}"
+    )
+    for mode, result in results.items():
+        cost = result["record_cost_us"]
+        lag = result["loop_lag_ms"]
+        print(
+            f"{mode:>6} {result['records']:>8} {cost['p50']:>10.1f} {cost['p99']:>10.1f} "
+            f"{result['loop_thread_ms_per_s']:>9.1f} {lag['p50']:>10.2f} {lag['p99']:>10.2f} "
+            f"{lag['max']:>10.2f} {result['drain_ms']:>8.1f}"
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
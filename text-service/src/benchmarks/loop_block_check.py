@@ -0,0 +1,91 @@
+"""
+事件循环阻塞检测验证
+
+启动一个响应很慢的本地爬虫桩，分别在协程中:
+    blocking     直接调用 requests.post（阻塞事件循环线程）
+    nonblocking  通过线程池调用 requests.post（不阻塞）
+检查 LoopMonitor 是否只对前者报告阻塞，且报告中包含请求ID和指向阻塞调用的调用栈。
+任一检查失败时退出码为1。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.loop_block_check --delay 0.5 --threshold 100
+"""
+import sys
+import asyncio
+import logging
+import argparse
+
+import requests
+
+from src.benchmarks.stubs import StubServer, create_crawler_stub
+from src.core.util.loop_monitor import LoopMonitor, bind_task_context
+
+class _CaptureHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record: logging.LogRecord):
+        self.records.append(record)
+
+def _crawl(base_url: str):
+    return requests.post(f"{base_url}/v1/crawl", json={"url": "https://example.com/"}, timeout=10,
+                         proxies={"http": None, "https": None})
+
+async def _handle(request_id: str, base_url: str, blocking: bool):
+    bind_task_context(request_id=request_id)
+    if blocking:
+        _crawl(base_url)
+    else:
+        await asyncio.get_running_loop().run_in_executor(None, _crawl, base_url)
+
+async def run_case(base_url: str, blocking: bool, threshold: float):
+    monitor = LoopMonitor(interval=0.01, threshold=threshold)
+    monitor.start()
+    await asyncio.sleep(0.05)
+    request_id = "check-blocking" if blocking else "check-nonblocking"
+    await asyncio.create_task(_handle(request_id, base_url, blocking))
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+    return request_id
+
+def main():
+    parser = argparse.ArgumentParser(description="事件循环阻塞检测验证")
+    parser.add_argument("--delay", type=float, default=0.5, help="爬虫桩响应延迟（秒）")
+    parser.add_argument("--threshold", type=float, default=100, help="阻塞阈值（毫秒）")
+    args = parser.parse_args()
+
+    handler = _CaptureHandler()
+    monitor_logger = logging.getLogger("loop_monitor")
+    monitor_logger.addHandler(handler)
+    monitor_logger.setLevel(logging.INFO)
+
+    failures = []
+    with StubServer(create_crawler_stub(latency=args.delay)) as stub:
+        _crawl(stub.base_url)  # 预热连接和桩
+
+        request_id = asyncio.run(run_case(stub.base_url, True, args.threshold / 1000))
+        reports = [record for record in handler.records if getattr(record, "request_id", None) == request_id]
+        if len(reports) != 1:
+            failures.append(f"阻塞调用应报告1次，实际 {len(reports)} 次")
+        else:
+            report = reports[0]
+            print(f"blocking: 报告阻塞 {report.blocked_ms:.0f}ms, request_id={report.request_id}, task={report.task}")
+            print("阻塞位置调用栈（最内层）:")
+            print("".join(report.stack.splitlines(keepends=True)[-6:]))
+            if "_crawl" not in report.stack or "requests" not in report.stack:
+                failures.append("调用栈中未包含阻塞的 requests 调用")
+
+        handler.records.clear()
+        asyncio.run(run_case(stub.base_url, False, args.threshold / 1000))
+        print(f"nonblocking: 报告 {len(handler.records)} 次")
+        if handler.records:
+            failures.append(f"非阻塞调用不应报告，实际 {len(handler.records)} 次")
+
+    for failure in failures:
+        print(f"失败: {failure}")
+    print("通过" if not failures else "未通过")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""
+步骤峰值内存与页面大小的关系
+
+在进程内对本地爬虫桩和LLM桩依次执行完整的URL处理流程（全部抽样做内存跟踪），
+按页面大小输出各步骤的峰值内存增量，以及相对页面大小的倍数（倍数越大说明该步骤
+对页面内容的复制越多）。桩运行在子进程中，其分配不计入结果。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.memory_bench --sizes-kb 20,200,1000,4000 --repeats 3
+"""
+import os
+import sys
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+
+from src.benchmarks.stubs import StubServer, create_crawler_stub, create_llm_stub, sample_markdown
+
+STEPS = ("crawl", "poll", "llm", "format")
+
+def build_pages(sizes_kb):
+    """生成各目标大小（KB，UTF-8编码）的markdown页面"""
+    paragraph_bytes = len(sample_markdown(1).encode("utf-8")) - len(sample_markdown(0).encode("utf-8"))
+    pages = {}
+    for size_kb in sizes_kb:
+        paragraphs = max(1, int(size_kb * 1024 / paragraph_bytes))
+        pages[f"https://example.com/page-{size_kb}kb"] = sample_markdown(paragraphs)
+    return pages
+
+def _serve_stubs(pages, ports, stop):
+    crawler = StubServer(create_crawler_stub(latency=0.0, pages=pages)).start()
+    llm = StubServer(create_llm_stub(latency=0.0)).start()
+    ports.put((crawler.port, llm.port))
+    stop.wait()
+    crawler.stop()
+    llm.stop()
+
+async def measure(pages, repeats: int):
+    from src.core.service.pipeline_service import run_url_pipeline
+
+    # 预热：首次调用的模块导入、连接建立等分配不计入
+    await run_url_pipeline(next(iter(pages)), "memory-bench-warmup")
+
+    results = {}
+    for url, markdown in pages.items():
+        peaks = {step: 0 for step in STEPS}
+        for index in range(repeats):
+            result = await run_url_pipeline(url, f"memory-bench-{index}")
+            for step, peak in result.get("memory", {}).items():
+                peaks[step] = max(peaks[step], peak)
+        results[url] = (len(markdown.encode("utf-8")), peaks)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="步骤峰值内存与页面大小的关系")
+    parser.add_argument("--sizes-kb", default="20,200,1000,4000", help="页面大小列表（KB）")
+    parser.add_argument("--repeats", type=int, default=3, help="每种大小执行的次数（取最大值）")
+    args = parser.parse_args()
+
+    pages = build_pages([int(size) for size in args.sizes_kb.split(",")])
+    context = multiprocessing.get_context("spawn")
+    ports, stop = context.Queue(), context.Event()
+    stubs = context.Process(target=_serve_stubs, args=(pages, ports, stop), daemon=True)
+    stubs.start()
+    try:
+        crawler_port, llm_port = ports.get(timeout=30)
+        # 配置在导入服务模块之前设置
+        os.environ.update({
+            "CRAWLER_API_IP": "127.0.0.1",
+            "CRAWLER_API_PORT": str(crawler_port),
+            "OPENAI_API_BASE": f"http://127.0.0.1:{llm_port}/v1",
+            "OpenAI_API_KEY": os.environ.get("OpenAI_API_KEY") or "bench-key",
+            "CRAWL_CACHE_TTL": "0",
+            "CRAWL_ARCHIVE_ENABLED": "false",
+            "TRAFFIC_RECORD_DIR": "",
+            "METRICS_DIR": tempfile.mkdtemp(prefix="memory-bench-metrics-"),
+            "MEMORY_TRACE_SAMPLE_RATE": "1",
+        })
+        results = asyncio.run(measure(pages, args.repeats))
+    finally:
+        stop.set()
+        stubs.join(timeout=5)
+
+    print(f"{'page_kb':>8} " + " ".join(f"{step + '_kb':>10}" for step in STEPS)
+          + " " + " ".join(f"{step + '_x':>8}" for step in STEPS))
+    for page_bytes, peaks in results.values():
+        print(
+            f"{page_bytes / 1024:>8.0f} "
+            + " ".join(f"{peaks[step] / 1024:>10.1f}" for step in STEPS) + " "
+            + " ".join(f"{peaks[step] / page_bytes:>8.2f}" for step in STEPS)
+        )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
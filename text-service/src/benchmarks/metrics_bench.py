@@ -0,0 +1,80 @@
+"""
+指标记录开销和多进程聚合测试
+
+1. 测量热路径上 Counter.inc / Histogram.observe / Gauge.inc 的单次耗时
+2. 启动多个子进程分别记录样本，检查 /metrics 输出的汇总值是否等于各进程之和
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.metrics_bench --iterations 1000000 --processes 4
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+def _worker(count: int):
+    from src.core.util.metrics import URL_STEP_SECONDS, LLM_TOKENS
+
+    step = URL_STEP_SECONDS.labels("llm")
+    tokens = LLM_TOKENS.labels("input")
+    for index in range(count):
+        step.observe((index % 100) / 100)
+        tokens.inc(10)
+
+def _parse(text: str, sample: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="指标记录开销和多进程聚合测试")
+    parser.add_argument("--iterations", type=int, default=1000000)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--per-process", type=int, default=10000, help="每个子进程记录的样本数")
+    args = parser.parse_args()
+
+    # 指标目录在导入配置前指定，避免写入默认目录
+    os.environ["METRICS_DIR"] = tempfile.mkdtemp(prefix="metrics-bench-")
+
+    from src.core.util.metrics import URL_STEP_SECONDS, LLM_TOKENS, URL_INFLIGHT, generate_latest
+
+    counter = LLM_TOKENS.labels("output")
+    histogram = URL_STEP_SECONDS.labels("crawl")
+    for name, record in (
+        ("Counter.inc", lambda: counter.inc(1)),
+        ("Histogram.observe", lambda: histogram.observe(0.3)),
+        ("Gauge.inc", lambda: URL_INFLIGHT.inc()),
+    ):
+        start = time.perf_counter()
+        for _ in range(args.iterations):
+            record()
+        per_call = (time.perf_counter() - start) / args.iterations * 1e9
+        empty_start = time.perf_counter()
+        for _ in range(args.iterations):
+            pass
+        loop_overhead = (time.perf_counter() - empty_start) / args.iterations * 1e9
+        print(f"{name:>18}: {per_call - loop_overhead:7.1f} ns/次（含lambda调用）")
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_worker, args=(args.per_process,)) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    start = time.perf_counter()
+    text = generate_latest()
+    collect_ms = (time.perf_counter() - start) * 1000
+
+    expected_count = args.processes * args.per_process
+    count = _parse(text, 'text_service_url_step_seconds_count{step="llm"}')
+    tokens = _parse(text, 'text_service_llm_tokens_total{direction="input"}')
+    print(f"汇总 {args.processes + 1} 个进程的指标耗时: {collect_ms:.1f} ms")
+    print(f"llm步骤样本数: {count:.0f}（期望 {expected_count}），输入token: {tokens:.0f}（期望 {expected_count * 10}）")
+    return 0 if count == expected_count and tokens == expected_count * 10 else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
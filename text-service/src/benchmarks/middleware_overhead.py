@@ -0,0 +1,147 @@
+"""
+中间件开销微基准
+
+在进程内直接调用ASGI应用（不经过网络和服务器），以固定速率（默认5000 rps）请求一个空路由，
+对比"无中间件"和"健康检查+错误处理+请求日志中间件"两种配置的每请求耗时，差值即中间件开销。
+请求日志写入 os.devnull，包含格式化和写出的成本。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.middleware_overhead --rate 5000 --rounds 10
+    python -m src.benchmarks.middleware_overhead --sample-rate 0.1 --body-size 2000
+"""
+import os
+import sys
+import time
+import asyncio
+import logging
+import argparse
+
+from fastapi import FastAPI
+
+from src.api.middleware import RequestLogMiddleware, ErrorHandlingMiddleware, HealthCheckMiddleware
+from src.benchmarks.stats import summarize
+
+def create_noop_app(with_middleware: bool, sample_rate: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/noop")
+    async def noop():
+        return {"code": 200}
+
+    if with_middleware:
+        app.add_middleware(RequestLogMiddleware, sample_rate=sample_rate, log_response_body=True)
+        app.add_middleware(ErrorHandlingMiddleware)
+        app.add_middleware(HealthCheckMiddleware)
+    return app
+
+async def call(app, body: bytes):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/noop",
+        "raw_path": b"/noop",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [
+            (b"host", b"127.0.0.1"),
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8008),
+    }
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+async def run_paced(app, body: bytes, rate: float, duration: float):
+    """按固定速率顺序发送请求（忙等待定时），返回每请求耗时（微秒）和落后于计划的比例"""
+    interval = 1.0 / rate
+    total = int(rate * duration)
+    durations = []
+    late = 0
+    start = time.perf_counter()
+    for index in range(total):
+        target = start + index * interval
+        now = time.perf_counter()
+        if now > target + interval:
+            late += 1
+        while now < target:
+            now = time.perf_counter()
+        begin = time.perf_counter()
+        await call(app, body)
+        durations.append((time.perf_counter() - begin) * 1e6)
+    return durations, late / total if total else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="中间件开销微基准")
+    parser.add_argument("--rate", type=float, default=5000, help="请求速率（rps）")
+    parser.add_argument("--duration", type=float, default=1, help="每轮时长（秒）")
+    parser.add_argument("--rounds", type=int, default=10, help="两种配置交替运行的轮数（交替运行以抵消机器噪声）")
+    parser.add_argument("--sample-rate", type=float, default=1.0, help="请求日志头部采样率")
+    parser.add_argument("--body-size", type=int, default=200, help="请求体字节数")
+    args = parser.parse_args()
+
+    middleware_logger = logging.getLogger("api.middleware")
+    middleware_logger.handlers = [logging.StreamHandler(open(os.devnull, "w"))]
+    middleware_logger.setLevel(logging.INFO)
+    middleware_logger.propagate = False
+
+    body = b'{"url": "' + b"x" * max(args.body_size - 11, 0) + b'"}'
+    apps = {
+        "bare": create_noop_app(False, args.sample_rate),
+        "middleware": create_noop_app(True, args.sample_rate),
+    }
+
+    async def run():
+        for app in apps.values():
+            for _ in range(2000):
+                await call(app, body)
+
+        results = {name: [] for name in apps}
+        lateness = {name: [] for name in apps}
+        round_overheads = []
+        for _ in range(args.rounds):
+            round_avg = {}
+            for name, app in apps.items():
+                durations, late = await run_paced(app, body, args.rate, args.duration)
+                results[name].extend(durations)
+                lateness[name].append(late)
+                round_avg[name] = sum(durations) / len(durations)
+            round_overheads.append(round_avg["middleware"] - round_avg["bare"])
+        return results, lateness, round_overheads
+
+    results, lateness, round_overheads = asyncio.run(run())
+    stats = {name: summarize(values) for name, values in results.items()}
+
+    print(f"rate={args.rate:g} rps, sample_rate={args.sample_rate}, body={len(body)}B")
+    print(f"{'config':>12} {'avg_us':>8} {'p50_us':>8} {'p95_us':>8} {'p99_us':>8} {'late%':>6}")
+    for name, summary in stats.items():
+        late = max(lateness[name]) * 100
+        print(
+            f"{name:>12} {summary['avg']:>8.1f} {summary['p50']:>8.1f} "
+            f"{summary['p95']:>8.1f} {summary['p99']:>8.1f} {late:>6.2f}"
+        )
+    overhead = stats["middleware"]["p50"] - stats["bare"]["p50"]
+    round_overheads.sort()
+    print(
+        f"中间件开销: p50差值 {overhead:.1f}us/请求，"
+        f"各轮平均差值的中位数 {round_overheads[len(round_overheads) // 2]:.1f}us/请求"
+    )
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
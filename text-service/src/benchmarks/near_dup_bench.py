@@ -0,0 +1,163 @@
+"""
+近似重复页面索引的查找性能与判定效果
+
+index  向索引写入 --size 个指纹（默认一百万），重新打开后从文件加载，再做 --queries 次查找：
+       一半是已有指纹翻转 0..max_distance 位（应当全部找到），一半是随机指纹（应当找不到）。
+       输出加载时间、内存占用、文件大小和查找延迟（含核对SQLite记录），p99 超过 --budget-ms
+       或有应当找到的没有找到时退出码为1。
+pages  生成 --articles 篇合成文章，比较每篇与其变体的 SimHash 汉明距离:
+           syndicated  转载：页头页脚、图片地址不同，正文相同
+           edited      改写其中一个小节
+           unrelated   另一篇文章
+       输出各类距离的分布、落在 reuse_distance / max_distance 之内的比例和指纹的计算耗时。
+
+指纹在 index 中是均匀随机的；真实页面的指纹更集中（同一模板的页面），候选会更多，
+可用 pages 的距离分布估计。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.near_dup_bench index --size 1000000
+    python -m src.benchmarks.near_dup_bench pages --articles 200
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from typing import Dict, List
+
+from src.core.util.near_dup import NearDupIndex, simhash, hamming
+from src.benchmarks.stats import summarize, percentile
+
+VERSION = "bench"
+_WRITE_BATCH = 50000
+
+def run_index(args) -> int:
+    rng = random.Random(args.seed)
+    path = os.path.join(tempfile.mkdtemp(prefix="near-dup-bench-"), "near_dup.sqlite3")
+    fingerprints = [rng.getrandbits(64) for _ in range(args.size)]
+
+    writer = NearDupIndex(path, args.max_distance)
+    start = time.perf_counter()
+    for offset in range(0, args.size, _WRITE_BATCH):
+        writer.add_many(
+            (f"https://bench.example/page/{index}", fingerprints[index], VERSION, {"data": []})
+            for index in range(offset, min(args.size, offset + _WRITE_BATCH))
+        )
+    write_time = time.perf_counter() - start
+    writer.close()
+
+    index = NearDupIndex(path, args.max_distance)
+    start = time.perf_counter()
+    index.load()
+    load_time = time.perf_counter() - start
+
+    near, far = [], []
+    missed = false_matches = 0
+    for query in range(args.queries):
+        if query % 2 == 0:
+            target = rng.randrange(args.size)
+            value = fingerprints[target]
+            for bit in rng.sample(range(64), rng.randint(0, args.max_distance)):
+                value ^= 1 << bit
+        else:
+            target = None
+            value = rng.getrandbits(64)
+        start = time.perf_counter()
+        match = index.find(value, VERSION)
+        elapsed = time.perf_counter() - start
+        if target is not None:
+            near.append(elapsed)
+            if match is None or hamming(value, fingerprints[target]) < match.distance:
+                missed += 1
+        else:
+            far.append(elapsed)
+            false_matches += match is not None
+    index.close()
+
+    print(f"指纹数 {args.size}，max_distance {args.max_distance}（{args.max_distance + 1} 段）")
+    print(f"写入 {write_time:.1f}s，加载 {load_time:.1f}s，内存索引 {index.memory_bytes() / 1e6:.1f}MB，"
+          f"文件 {os.path.getsize(path) / 1e6:.1f}MB")
+    print(f"{'query':>8} {'count':>6} {'p50_us':>8} {'p95_us':>8} {'p99_us':>8} {'max_us':>8}")
+    for name, latencies in (("near", near), ("random", far)):
+        stats = summarize(latencies)
+        print(f"{name:>8} {stats['count']:>6} {stats['p50'] * 1e6:>8.0f} {stats['p95'] * 1e6:>8.0f} "
+              f"{stats['p99'] * 1e6:>8.0f} {stats['max'] * 1e6:>8.0f}")
+    print(f"近似重复未找到 {missed} 个，随机指纹误匹配 {false_matches} 个")
+
+    p99 = percentile(near + far, 99) * 1000
+    if missed or p99 > args.budget_ms:
+        print(f"未达标：p99 {p99:.3f}ms（预算 {args.budget_ms}ms），未找到 {missed} 个")
+        return 1
+    print(f"达标：p99 {p99:.3f}ms < {args.budget_ms}ms")
+    return 0
+
+def make_words(rng: random.Random, count: int) -> List[str]:
+    return ["".join(chr(rng.randrange(0x4e00, 0x4e00 + 3000)) for _ in range(rng.randint(1, 3))) for _ in range(count)]
+
+def make_article(rng: random.Random, words: List[str], sections: int, section_words: int) -> List[str]:
+    return [
+        f"## {''.join(rng.choices(words, k=4))}\n\n{''.join(rng.choices(words, k=section_words))}"
+        for _ in range(sections)
+    ]
+
+def render(sections: List[str], site: str, rng: random.Random) -> str:
+    """加上站点的页头页脚和图片地址"""
+    images = "\n\n".join(f"![](https://{site}/img/{rng.getrandbits(32):08x}.jpg)" for _ in range(3))
+    return "\n\n".join([f"[首页](https://{site}/) | [新闻](https://{site}/news)", *sections, images,
+                        f"本文来源：{site}，转载请注明出处"])
+
+def run_pages(args) -> int:
+    rng = random.Random(args.seed)
+    words = make_words(rng, 5000)
+    distances: Dict[str, List[int]] = {"syndicated": [], "edited": [], "unrelated": []}
+    costs = []
+    lengths = []
+    for _ in range(args.articles):
+        article = make_article(rng, words, args.sections, args.section_words)
+        original = render(article, "news.example", rng)
+        start = time.perf_counter()
+        value = simhash(original)
+        costs.append(time.perf_counter() - start)
+        lengths.append(len(original))
+
+        edited = list(article)
+        edited[rng.randrange(len(edited))] = make_article(rng, words, 1, args.section_words)[0]
+        variants = {
+            "syndicated": render(article, f"portal{rng.randrange(100)}.example", rng),
+            "edited": render(edited, "news.example", rng),
+            "unrelated": render(make_article(rng, words, args.sections, args.section_words), "news.example", rng)
+        }
+        for kind, text in variants.items():
+            distances[kind].append(hamming(value, simhash(text)))
+
+    print(f"文章数 {args.articles}，平均长度 {sum(lengths) / len(lengths):.0f} 字符，"
+          f"每篇 {args.sections} 个小节（edited 改写其中1个）")
+    cost = summarize(costs)
+    print(f"指纹计算 p50 {cost['p50'] * 1000:.2f}ms，p99 {cost['p99'] * 1000:.2f}ms")
+    print(f"{'variant':>11} {'p5':>4} {'p50':>4} {'p95':>4} {'max':>4} "
+          f"{'<=reuse':>8} {'<=max':>7}")
+    for kind, values in distances.items():
+        reuse = sum(1 for value in values if value <= args.reuse_distance) / len(values)
+        near = sum(1 for value in values if value <= args.max_distance) / len(values)
+        print(f"{kind:>11} {percentile(values, 5):>4.0f} {percentile(values, 50):>4.0f} "
+              f"{percentile(values, 95):>4.0f} {max(values):>4} {reuse:>8.1%} {near:>7.1%}")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="近似重复页面索引的查找性能与判定效果")
+    parser.add_argument("mode", choices=("index", "pages"))
+    parser.add_argument("--size", type=int, default=1000000, help="index: 索引中的指纹数")
+    parser.add_argument("--queries", type=int, default=10000, help="index: 查找次数")
+    parser.add_argument("--budget-ms", type=float, default=1.0, help="index: 查找延迟p99的预算（毫秒）")
+    parser.add_argument("--articles", type=int, default=200, help="pages: 文章数")
+    parser.add_argument("--sections", type=int, default=20, help="pages: 每篇文章的小节数")
+    parser.add_argument("--section-words", type=int, default=80, help="pages: 每个小节的词数")
+    parser.add_argument("--max-distance", type=int, default=int(os.getenv("NEAR_DUP_MAX_DISTANCE", "4")))
+    parser.add_argument("--reuse-distance", type=int, default=int(os.getenv("NEAR_DUP_REUSE_DISTANCE", "1")))
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    return run_index(args) if args.mode == "index" else run_pages(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+打包提取的收益
+
+对同一份语料分别用离线重处理（src.core.service.corpus_service）提取两次:
+    single  每个文档单独调用LLM
+    packed  启用打包提取（LLM_PACKING_ENABLED），短文档合并为一次调用
+语料为 --corpus 指定的爬取结果（爬取归档目录、.jsonl 或目录，格式同 src.tools.reprocess_corpus），
+未指定时生成 --pages 个合成页面（大部分为1到4个小节的短页面，--long-ratio 比例的页面较长，不打包）。
+LLM桩模拟服务商容量（--llm-concurrency）、固定延迟和按输入输出长度增长的耗时，--drop-rate 比例的文档
+在打包调用中被遗漏（校验不通过，单独重新提取）。输出两种方式的LLM调用数、token、成本和总耗时，
+以及打包节省的比例；并检查两种方式的提取结果相同。不一致时退出码为1。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.packing_bench --pages 200
+    python -m src.benchmarks.packing_bench --corpus data/crawl_archive --concurrency 64 --max-documents 16
+"""
+import os
+import sys
+import json
+import random
+import asyncio
+import argparse
+import tempfile
+
+from src.benchmarks.stubs import StubServer, create_llm_stub, sample_markdown
+
+MODES = ("single", "packed")
+
+def write_corpus(path: str, pages: int, long_ratio: float, seed: int):
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        for index in range(pages):
+            paragraphs = rng.randint(20, 40) if rng.random() < long_ratio else rng.randint(1, 4)
+            markdown = sample_markdown(paragraphs).replace("示例内容", f"第{index}页的示例内容")
+            f.write(json.dumps({"data": [{"markdown": markdown}]}, ensure_ascii=False) + "\n")
+
+def load_results(output_dir: str):
+    results = {}
+    with open(os.path.join(output_dir, "manifest.jsonl"), "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("status") == "done":
+                with open(os.path.join(output_dir, record["output"]), "r", encoding="utf-8") as result:
+                    results[record["item_id"]] = json.dumps(json.load(result), ensure_ascii=False, sort_keys=True)
+    return results
+
+async def run_mode(mode: str, base_url: str, corpus: str, work_dir: str, args):
+    from src.core.service import openai_service
+    from src.core.service.corpus_service import process_corpus
+    from src.core.service.document_packer import document_packer
+    from src.core.service.model_cascade import parse_tier
+    from src.core.util.section_store import SectionStore
+
+    # 每种方式使用单独的小节存储，避免复用另一种方式的结果
+    if openai_service.get_section_store() is not None:
+        openai_service._section_store = SectionStore(os.path.join(work_dir, f"sections-{mode}.sqlite3"), 86400)
+    openai_service.model_tiers[:] = [parse_tier(f"bench-model@{base_url}/v1")]
+    document_packer.enabled = mode == "packed"
+    document_packer.max_documents = args.max_documents
+    document_packer.max_chars = args.max_chars
+    output_dir = os.path.join(work_dir, mode)
+    stats = await process_corpus(corpus, output_dir, concurrency=args.concurrency)
+    return stats, output_dir
+
+def main():
+    parser = argparse.ArgumentParser(description="打包提取的收益")
+    parser.add_argument("--corpus", default=None, help="语料路径，默认生成合成页面")
+    parser.add_argument("--pages", type=int, default=200, help="合成页面数")
+    parser.add_argument("--long-ratio", type=float, default=0.1, help="合成语料中长页面的比例")
+    parser.add_argument("--concurrency", type=int, default=32, help="同时处理的文档数")
+    parser.add_argument("--max-documents", type=int, default=8, help="每次调用的最大文档数（LLM_PACKING_MAX_DOCUMENTS）")
+    parser.add_argument("--max-chars", type=int, default=2000, help="打包的文档最大字符数（LLM_PACKING_MAX_CHARS）")
+    parser.add_argument("--llm-concurrency", type=int, default=4, help="LLM桩同时处理的调用数")
+    parser.add_argument("--llm-latency", default="fixed:0.3")
+    parser.add_argument("--input-latency", type=float, default=0.05, help="每1000个输入字符增加的延迟（秒）")
+    parser.add_argument("--output-latency", type=float, default=0.3, help="每1000个输出字符增加的延迟（秒）")
+    parser.add_argument("--drop-rate", type=float, default=0.05, help="打包调用中被遗漏的文档比例")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="packing-bench-")
+    corpus = args.corpus
+    if corpus is None:
+        corpus = os.path.join(work_dir, "corpus.jsonl")
+        write_corpus(corpus, args.pages, args.long_ratio, args.seed)
+    # 配置在导入服务模块之前设置
+    os.environ.update({
+        "OpenAI_API_KEY": os.environ.get("OpenAI_API_KEY") or "bench-key",
+        "TRAFFIC_RECORD_DIR": "",
+        "METRICS_DIR": os.path.join(work_dir, "metrics"),
+        "SECTION_STORE_PATH": os.path.join(work_dir, "sections.sqlite3"),
+        "LLM_MAX_CONCURRENCY": str(args.llm_concurrency),
+    })
+
+    stats = {}
+    for mode in MODES:
+        app = create_llm_stub(
+            latency=args.llm_latency, concurrency=args.llm_concurrency, input_latency=args.input_latency,
+            output_latency=args.output_latency, drop_rate=args.drop_rate
+        )
+        llm = StubServer(app).start()
+        try:
+            corpus_stats, output_dir = asyncio.run(run_mode(mode, llm.base_url, corpus, work_dir, args))
+        finally:
+            llm.stop()
+        stats[mode] = dict(corpus_stats, calls=app.state.requests["total"], results=load_results(output_dir))
+
+    print(f"语料 {corpus}，每次调用最多 {args.max_documents} 个文档，打包的文档不超过 {args.max_chars} 字符")
+    print(f"{'mode':>7} {'docs':>5} {'failed':>6} {'calls':>6} {'input':>9} {'output':>8} {'cost':>8} {'wall_s':>7}")
+    for mode, mode_stats in stats.items():
+        print(f"{mode:>7} {mode_stats['processed']:>5} {mode_stats['failed']:>6} {mode_stats['calls']:>6} "
+              f"{mode_stats['input_tokens']:>9} {mode_stats['output_tokens']:>8} {mode_stats['cost']:>8.4f} "
+              f"{mode_stats['elapsed_seconds']:>7.2f}")
+    single, packed = stats["single"], stats["packed"]
+    saved = {
+        "calls": 1 - packed["calls"] / max(single["calls"], 1),
+        "input": 1 - packed["input_tokens"] / max(single["input_tokens"], 1),
+        "cost": 1 - packed["cost"] / max(single["cost"], 1e-12),
+        "wall": 1 - packed["elapsed_seconds"] / max(single["elapsed_seconds"], 1e-9)
+    }
+    print("打包节省: " + "，".join(f"{name} {value:.1%}" for name, value in saved.items()))
+
+    mismatches = sorted(
+        item_id for item_id in set(single["results"]) | set(packed["results"])
+        if single["results"].get(item_id) != packed["results"].get(item_id)
+    )
+    print("两种方式的提取结果一致" if not mismatches
+          else f"{len(mismatches)} 个文档的结果不一致: {mismatches[:10]}")
+    return 1 if mismatches or single["failed"] or packed["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+提示词缓存的收益
+
+同一批页面分别用三种方式提取（每种方式使用新的LLM桩，缓存状态互不影响）:
+    nocache  服务商没有提示词缓存
+    prefix   服务商自动缓存相同的提示词前缀（--prefix-min 个字符以上、按 --prefix-block 对齐才命中）
+    context  启用上下文缓存（PROMPT_CONTEXT_CACHE_ENABLED），固定前缀创建一次缓存，请求中以缓存引用代替
+桩的延迟为固定延迟加上未命中缓存的输入（--input-latency，每1000字符）和输出的生成耗时，
+token数按字符数计。输出各方式的输入token、命中缓存的token、命中率、成本、节省的成本和延迟，
+并检查三种方式的提取结果相同。不一致时退出码为1。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.prompt_cache_bench --pages 100
+    python -m src.benchmarks.prompt_cache_bench --paragraphs 40 --prefix-min 1024 --input-latency 0.1
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+
+from src.benchmarks.stubs import StubServer, create_llm_stub, sample_markdown
+from src.benchmarks.stats import summarize
+
+MODES = ("nocache", "prefix", "context")
+
+def build_pages(count: int, paragraphs: int):
+    return [sample_markdown(paragraphs).replace("示例内容", f"第{index}页的示例内容") for index in range(count)]
+
+async def run_mode(mode: str, base_url: str, pages, args):
+    from src.core.service import openai_service
+    from src.core.service.model_cascade import parse_tier
+    from src.core.service.prompt_cache import prompt_context_cache
+
+    spec = f"bench-model@{base_url}/v1" + (f"={args.price}" if args.price else "")
+    openai_service.model_tiers[:] = [parse_tier(spec)]
+    prompt_context_cache.enabled = mode == "context"
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    records = []
+
+    async def one(index: int, markdown: str):
+        async with semaphore:
+            usage = {}
+            start = time.perf_counter()
+            result = await openai_service.process_with_openai(
+                {"data": [{"markdown": markdown}]}, f"prompt-cache-bench-{mode}-{index}", usage=usage
+            )
+            records.append({
+                "index": index,
+                "latency": time.perf_counter() - start,
+                "input_tokens": usage.get("input_tokens", 0),
+                "cached_tokens": usage.get("cached_tokens", 0),
+                "cost": usage.get("cost", 0.0),
+                "savings": usage.get("cache_savings", 0.0),
+                "result": json.dumps(result.get("data"), ensure_ascii=False, sort_keys=True)
+            })
+
+    # 第一个页面单独提取（建立缓存），其余页面并发
+    await one(0, pages[0])
+    await asyncio.gather(*(one(index, markdown) for index, markdown in enumerate(pages) if index))
+    return sorted(records, key=lambda record: record["index"])
+
+def main():
+    parser = argparse.ArgumentParser(description="提示词缓存的收益")
+    parser.add_argument("--pages", type=int, default=100)
+    parser.add_argument("--paragraphs", type=int, default=8, help="每个页面的小节数")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-latency", default="fixed:0.2")
+    parser.add_argument("--input-latency", type=float, default=0.2, help="每1000个未命中缓存的输入字符增加的延迟（秒）")
+    parser.add_argument("--prefix-min", type=int, default=256, help="prefix: 最短命中长度（字符）")
+    parser.add_argument("--prefix-block", type=int, default=64, help="prefix: 对齐粒度（字符）")
+    parser.add_argument("--price", default="", help="输入价格/输出价格/缓存输入价格（每百万token），默认使用配置的价格")
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix="prompt-cache-bench-")
+    # 配置在导入服务模块之前设置；关闭按小节复用，每个页面都完整交给LLM
+    os.environ.update({
+        "OpenAI_API_KEY": os.environ.get("OpenAI_API_KEY") or "bench-key",
+        "SECTION_REUSE_ENABLED": "false",
+        "TRAFFIC_RECORD_DIR": "",
+        "METRICS_DIR": os.path.join(data_dir, "metrics"),
+    })
+    from src.core.service.openai_service import build_messages, PROMPT_PREFIX_MESSAGES
+
+    pages = build_pages(args.pages, args.paragraphs)
+    prefix_chars = sum(len(message["content"]) for message in build_messages("", False)[:PROMPT_PREFIX_MESSAGES])
+    stats = {}
+    for mode in MODES:
+        llm = StubServer(create_llm_stub(
+            latency=args.llm_latency, input_latency=args.input_latency, prefix_cache=mode == "prefix",
+            prefix_min=args.prefix_min, prefix_block=args.prefix_block
+        )).start()
+        try:
+            stats[mode] = asyncio.run(run_mode(mode, llm.base_url, pages, args))
+        finally:
+            llm.stop()
+
+    print(f"页面数 {args.pages}，固定前缀 {prefix_chars} 字符，页面平均 "
+          f"{sum(len(page) for page in pages) / len(pages):.0f} 字符")
+    print(f"{'mode':>8} {'input':>9} {'cached':>9} {'hit':>6} {'cost':>9} {'saved':>9} {'p50_ms':>7} {'p95_ms':>7}")
+    for mode, records in stats.items():
+        latency = summarize([record["latency"] for record in records])
+        input_tokens = sum(record["input_tokens"] for record in records)
+        cached_tokens = sum(record["cached_tokens"] for record in records)
+        print(f"{mode:>8} {input_tokens:>9} {cached_tokens:>9} {cached_tokens / max(input_tokens, 1):>6.1%} "
+              f"{sum(record['cost'] for record in records):>9.5f} {sum(record['savings'] for record in records):>9.5f} "
+              f"{latency['p50'] * 1000:>7.0f} {latency['p95'] * 1000:>7.0f}")
+
+    mismatches = sorted({
+        record["index"] for mode in MODES[1:]
+        for record, baseline in zip(stats[mode], stats["nocache"]) if record["result"] != baseline["result"]
+    })
+    print("三种方式的提取结果一致" if not mismatches
+          else f"{len(mismatches)} 个页面的结果与不使用缓存时不一致: {mismatches[:10]}")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
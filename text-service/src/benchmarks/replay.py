@@ -0,0 +1,244 @@
+"""
+爬虫和LLM流量回放
+
+读取录制的cassette（见 src.core.util.cassette），启动本地爬虫替身和OpenAI兼容替身，
+按录制时的耗时（可缩放）返回录制的响应，从而离线、可重复地对 /api/v1/text/urlCrawl
+全链路做吞吐量和延迟测试。
+
+用法（在 text-service 目录下）:
+    # 录制：正常运行服务，设置 TRAFFIC_RECORD_DIR=recordings
+    # 只启动替身服务，然后把 CRAWLER_API_IP/CRAWLER_API_PORT/OPENAI_API_BASE 指向它们
+    python -m src.benchmarks.replay serve recordings --scale 1.0
+    # 启动替身并对服务做基准测试
+    python -m src.benchmarks.replay bench recordings --scale 0.5 --concurrency 8 --rounds 3
+"""
+import os
+import sys
+import copy
+import time
+import uuid
+import asyncio
+import argparse
+from typing import Dict, Any, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# 注意：服务模块（src.config.settings 等）在导入时读取环境变量，
+# 因此只能在把环境变量指向替身之后再导入
+from src.benchmarks.stubs import StubServer, free_port
+from src.benchmarks.stats import summarize
+
+async def _replay_delay(exchange: Dict[str, Any], scale: float):
+    if scale > 0:
+        await asyncio.sleep(exchange.get("elapsed_ms", 0) / 1000 * scale)
+
+def recorded_urls(exchanges: List[Dict[str, Any]]) -> List[str]:
+    """录制中出现过的爬取URL（保持首次出现的顺序）"""
+    urls = []
+    seen = set()
+    for exchange in exchanges:
+        if exchange["kind"] == "crawler" and exchange["method"] == "POST":
+            url = (exchange.get("request") or {}).get("url")
+            if url and url not in seen:
+                seen.add(url)
+                urls.append(url)
+    return urls
+
+def create_crawler_replay_app(exchanges: List[Dict[str, Any]], scale: float = 1.0) -> FastAPI:
+    """
+    创建回放录制流量的爬虫替身
+
+    POST /v1/crawl 按请求中的url匹配录制的创建任务响应，并分配新的任务ID；
+    GET /v1/crawl/{id} 按顺序返回该任务录制时的轮询响应（最后一个重复返回）。
+    """
+    app = FastAPI()
+    crawls: Dict[str, List[Dict[str, Any]]] = {}
+    polls: Dict[str, List[Dict[str, Any]]] = {}
+    for exchange in exchanges:
+        if exchange["kind"] != "crawler":
+            continue
+        if exchange["method"] == "POST":
+            url = (exchange.get("request") or {}).get("url")
+            crawls.setdefault(url, []).append(exchange)
+        elif exchange["url"].startswith("/crawl/"):
+            polls.setdefault(exchange["url"][len("/crawl/"):], []).append(exchange)
+
+    rotation: Dict[str, int] = {}
+    jobs: Dict[str, Dict[str, Any]] = {}
+
+    @app.post("/v1/crawl")
+    async def create_crawl(request: Request):
+        payload = await request.json()
+        url = payload.get("url")
+        recorded = crawls.get(url)
+        if not recorded:
+            return JSONResponse({"success": False, "error": f"未录制的URL: {url}"}, status_code=404)
+
+        index = rotation.get(url, 0)
+        rotation[url] = index + 1
+        exchange = recorded[index % len(recorded)]
+        await _replay_delay(exchange, scale)
+
+        body = copy.deepcopy(exchange["response"])
+        if isinstance(body, dict) and body.get("id"):
+            job_id = str(uuid.uuid4())
+            jobs[job_id] = {"task_id": body["id"], "cursor": 0}
+            body["id"] = job_id
+        return JSONResponse(body, status_code=exchange["status"])
+
+    @app.get("/v1/crawl/{job_id}")
+    async def get_crawl(job_id: str):
+        job = jobs.get(job_id)
+        recorded = polls.get(job["task_id"]) if job else None
+        if not recorded:
+            return JSONResponse({"success": False, "error": f"未录制的任务: {job_id}"}, status_code=404)
+
+        exchange = recorded[min(job["cursor"], len(recorded) - 1)]
+        job["cursor"] += 1
+        await _replay_delay(exchange, scale)
+        return JSONResponse(exchange["response"], status_code=exchange["status"])
+
+    return app
+
+def create_llm_replay_app(exchanges: List[Dict[str, Any]], scale: float = 1.0, strict: bool = False) -> FastAPI:
+    """
+    创建回放录制流量的OpenAI兼容替身
+
+    按（模型, messages）匹配录制的响应；strict为False时，未匹配的请求轮流返回录制的响应，
+    便于提示词修改后仍能做吞吐量测试。
+    """
+    from src.core.util.cassette import llm_request_key
+
+    app = FastAPI()
+    by_key: Dict[str, List[Dict[str, Any]]] = {}
+    all_llm: List[Dict[str, Any]] = []
+    for exchange in exchanges:
+        if exchange["kind"] == "llm":
+            by_key.setdefault(exchange.get("key"), []).append(exchange)
+            all_llm.append(exchange)
+
+    counters = {"hits": 0, "misses": 0}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        recorded = by_key.get(llm_request_key(payload.get("model"), payload.get("messages", [])))
+        if recorded:
+            counters["hits"] += 1
+            exchange = recorded[(counters["hits"] - 1) % len(recorded)]
+        elif strict or not all_llm:
+            return JSONResponse(
+                {"error": {"message": "未录制的LLM请求", "type": "invalid_request_error"}},
+                status_code=404
+            )
+        else:
+            counters["misses"] += 1
+            exchange = all_llm[(counters["misses"] - 1) % len(all_llm)]
+
+        await _replay_delay(exchange, scale)
+        return JSONResponse(exchange["response"], status_code=exchange["status"])
+
+    @app.get("/replay/stats")
+    async def replay_stats():
+        return counters
+
+    return app
+
+def start_replay_servers(exchanges: List[Dict[str, Any]], scale: float, strict: bool,
+                         crawler_port: int = None, llm_port: int = None):
+    crawler = StubServer(create_crawler_replay_app(exchanges, scale), port=crawler_port).start()
+    llm = StubServer(create_llm_replay_app(exchanges, scale, strict), port=llm_port).start()
+    return crawler, llm
+
+async def drive_url_crawl(base_url: str, urls: List[str], concurrency: int, rounds: int) -> Dict[str, Any]:
+    """以固定并发对单URL接口发送请求，统计吞吐量和延迟"""
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    status_counts: Dict[int, int] = {}
+
+    async def one(client, url):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.post(f"{base_url}/api/v1/text/urlCrawl", json={"url": url})
+            latencies.append((time.perf_counter() - start) * 1000)
+            code = response.json().get("code", response.status_code) if response.status_code == 200 else response.status_code
+            status_counts[code] = status_counts.get(code, 0) + 1
+
+    start = time.perf_counter()
+    async with httpx.AsyncClient(timeout=300) as client:
+        await asyncio.gather(*(one(client, url) for _ in range(rounds) for url in urls))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": len(latencies),
+        "elapsed_seconds": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": summarize(latencies),
+        "status_counts": status_counts
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="爬虫和LLM流量回放")
+    parser.add_argument("mode", choices=["serve", "bench"], help="serve: 只启动替身；bench: 启动替身并压测服务")
+    parser.add_argument("cassettes", help="cassette文件或目录")
+    parser.add_argument("--scale", type=float, default=1.0, help="延迟缩放系数，0表示不等待")
+    parser.add_argument("--strict", action="store_true", help="LLM请求必须与录制完全一致")
+    parser.add_argument("--crawler-port", type=int, default=None)
+    parser.add_argument("--llm-port", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=4, help="bench模式的并发数")
+    parser.add_argument("--rounds", type=int, default=1, help="bench模式中每个URL的请求轮数")
+    args = parser.parse_args()
+
+    crawler_port = args.crawler_port or free_port()
+    llm_port = args.llm_port or free_port()
+    os.environ["CRAWLER_API_IP"] = "127.0.0.1"
+    os.environ["CRAWLER_API_PORT"] = str(crawler_port)
+    os.environ["OPENAI_API_BASE"] = f"http://127.0.0.1:{llm_port}/v1"
+    os.environ.setdefault("OpenAI_API_KEY", "replay-key")
+    # 回放时不录制、不复用爬取缓存，保证每次请求都走完整链路
+    os.environ["TRAFFIC_RECORD_DIR"] = ""
+    os.environ["CRAWL_CACHE_TTL"] = "0"
+
+    from src.core.util.cassette import load_cassettes
+
+    exchanges = load_cassettes(args.cassettes)
+    urls = recorded_urls(exchanges)
+    if not urls:
+        print(f"cassette中没有录制的爬取请求: {args.cassettes}")
+        return 1
+
+    crawler, llm = start_replay_servers(exchanges, args.scale, args.strict, crawler_port, llm_port)
+    print(f"已加载 {len(exchanges)} 条交互，{len(urls)} 个URL")
+    print(f"CRAWLER_API_IP=127.0.0.1 CRAWLER_API_PORT={crawler.port} OPENAI_API_BASE={llm.base_url}/v1")
+
+    try:
+        if args.mode == "serve":
+            while True:
+                time.sleep(3600)
+
+        from src.api.routes import router
+
+        app = FastAPI()
+        app.include_router(router)
+        service = StubServer(app).start()
+        try:
+            result = asyncio.run(drive_url_crawl(service.base_url, urls, args.concurrency, args.rounds))
+        finally:
+            service.stop()
+
+        latency = result["latency_ms"]
+        print(f"请求数: {result['requests']}，耗时: {result['elapsed_seconds']:.2f}s，吞吐量: {result['throughput']:.2f} req/s")
+        print(f"延迟(ms): p50={latency['p50']:.1f} p95={latency['p95']:.1f} p99={latency['p99']:.1f} max={latency['max']:.1f}")
+        print(f"状态码: {result['status_counts']}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        crawler.stop()
+        llm.stop()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+API响应的序列化耗时和传输字节数
+
+对 format_api_response 形式的响应（--segments 个中文文本段落，每段带图片URL）和批量接口的
+NDJSON流（--pages 个单URL结果 + 汇总行），比较:
+    序列化  改动前：jsonable_encoder + Starlette JSONResponse（json.dumps），批量行为 json.dumps
+            改动后：FastJSONResponse / dumps_json（orjson，未安装时为标准库json）
+    传输    未压缩，以及压缩中间件可协商的各编码（gzip / br / zstd）的字节数和压缩耗时；
+            NDJSON按中间件的流式方式逐行压缩并刷新
+两种序列化的结果解析后必须相同，不一致时退出码为1。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.response_bench --segments 300 --pages 50 --repeats 200
+"""
+import sys
+import json
+import time
+import argparse
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from src.api.responses import FastJSONResponse, dumps_json
+from src.core.util.http_compression import Compressor, available_encodings
+from src.config.settings import COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY, COMPRESSION_ZSTD_LEVEL
+
+LEVELS = {
+    "gzip_level": COMPRESSION_GZIP_LEVEL,
+    "brotli_quality": COMPRESSION_BROTLI_QUALITY,
+    "zstd_level": COMPRESSION_ZSTD_LEVEL
+}
+
+def build_response(segments: int, page: int = 0):
+    return {
+        "code": 200,
+        "data": [
+            {
+                "text": f"第{page}页第{index + 1}段：这是落地页中的正文文本，介绍产品的功能、价格和使用场景。" * 2,
+                "materials": [f"https://static.example.com/page/{page}/image/{index + 1}.png"]
+            }
+            for index in range(segments)
+        ],
+        "msg": "success"
+    }
+
+def build_batch(pages: int, segments: int):
+    items = [
+        {"type": "result", "url": f"https://example.com/landing/{page}", "status": 200,
+         "response": build_response(segments, page), "elapsed_ms": 1234.5, "cost": 0.0012}
+        for page in range(pages)
+    ]
+    items.append({"type": "summary", "total": pages, "succeeded": pages, "failed": 0})
+    return items
+
+def timed(func, repeats: int):
+    """返回每次调用的平均耗时（毫秒）和最后一次的结果"""
+    result = func()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        result = func()
+    return (time.perf_counter() - start) / repeats * 1000, result
+
+def compress_stream(encoding: str, chunks):
+    compressor = Compressor(encoding, **LEVELS)
+    last = len(chunks) - 1
+    return b"".join(compressor.compress(chunk, index == last) for index, chunk in enumerate(chunks))
+
+def main():
+    parser = argparse.ArgumentParser(description="API响应的序列化耗时和传输字节数")
+    parser.add_argument("--segments", type=int, default=300, help="单个响应的文本段落数")
+    parser.add_argument("--pages", type=int, default=50, help="批量响应的URL数")
+    parser.add_argument("--batch-segments", type=int, default=30, help="批量响应中每个URL的段落数")
+    parser.add_argument("--repeats", type=int, default=200)
+    args = parser.parse_args()
+
+    single = build_response(args.segments)
+    batch = build_batch(args.pages, args.batch_segments)
+
+    before_ms, before_body = timed(lambda: JSONResponse(jsonable_encoder(single)).body, args.repeats)
+    after_ms, after_body = timed(lambda: FastJSONResponse(single).body, args.repeats)
+    batch_repeats = max(1, args.repeats // 10)
+    before_batch_ms, before_lines = timed(
+        lambda: [(json.dumps(item, ensure_ascii=False) + "\n").encode("utf-8") for item in batch], batch_repeats
+    )
+    after_batch_ms, after_lines = timed(lambda: [dumps_json(item) + b"\n" for item in batch], batch_repeats)
+
+    print(f"单个响应 {args.segments} 段，批量响应 {args.pages} 个URL x {args.batch_segments} 段")
+    print(f"{'serialize':>12} {'before_ms':>10} {'after_ms':>9} {'speedup':>8} {'before_B':>9} {'after_B':>9}")
+    for name, before, after, before_size, after_size in (
+        ("single", before_ms, after_ms, len(before_body), len(after_body)),
+        ("batch", before_batch_ms, after_batch_ms,
+         sum(map(len, before_lines)), sum(map(len, after_lines))),
+    ):
+        print(f"{name:>12} {before:>10.3f} {after:>9.3f} {before / max(after, 1e-9):>7.1f}x "
+              f"{before_size:>9} {after_size:>9}")
+
+    print(f"{'wire':>12} {'encoding':>9} {'bytes':>9} {'ratio':>7} {'compress_ms':>12}")
+    for name, chunks in (("single", [after_body]), ("batch", after_lines)):
+        raw = sum(map(len, chunks))
+        print(f"{name:>12} {'identity':>9} {raw:>9} {1.0:>7.3f} {0.0:>12.3f}")
+        for encoding in available_encodings(("gzip", "br", "zstd")):
+            compress_ms, data = timed(lambda: compress_stream(encoding, chunks), max(1, args.repeats // 10))
+            print(f"{name:>12} {encoding:>9} {len(data):>9} {len(data) / raw:>7.3f} {compress_ms:>12.3f}")
+
+    mismatched = json.loads(before_body) != json.loads(after_body) or [
+        json.loads(line) for line in before_lines
+    ] != [json.loads(line) for line in after_lines]
+    print("两种序列化的结果不一致" if mismatched else "两种序列化的结果一致")
+    return 1 if mismatched else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,181 @@
+"""
+端到端基准测试
+
+启动本地爬虫桩和LLM桩（可配置延迟分布、错误率和负载大小），在独立子进程中运行服务，
+按固定到达率对 /api/v1/text/urlCrawl 施压，输出每个步骤（crawl、poll、llm、format）
+的p50/p95/p99、吞吐量、事件循环延迟和RSS，结果写入JSON，可与基线对比。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.run --rates 5,10,20 --duration 20 --output result.json
+    python -m src.benchmarks.run --rates 5,10,20 --duration 20 --output result.json \\
+        --baseline baseline.json --threshold 0.1
+    python -m src.benchmarks.run --llm-latency lognormal:0.8,0.5 --llm-error-rate 0.02
+    # 过载测试：LLM容量约 8/0.5=16 req/s，以3倍容量施压，对比开启和关闭准入控制
+    python -m src.benchmarks.run --rates 48 --llm-latency fixed:0.5 --llm-concurrency 8 --timeout 10 \
+        --service-env ADMISSION_MAX_INFLIGHT=8 --service-env ADMISSION_ENABLED=false
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+from pathlib import Path
+
+from src.benchmarks.stubs import StubServer, Latency, create_crawler_stub, create_llm_stub, load_archive_pages, free_port
+from src.benchmarks.loadgen import run_phase
+from src.benchmarks.compare import compare, print_comparison
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.absolute()
+
+def start_service(port: int, crawler: StubServer, llm: StubServer, extra_env=None) -> subprocess.Popen:
+    """在子进程中启动被测服务，并等待健康检查通过"""
+    import httpx
+
+    env = dict(os.environ)
+    env.update({
+        "CRAWLER_API_IP": "127.0.0.1",
+        "CRAWLER_API_PORT": str(crawler.port),
+        "OPENAI_API_BASE": f"{llm.base_url}/v1",
+        "OpenAI_API_KEY": env.get("OpenAI_API_KEY") or "bench-key",
+        "CRAWL_CACHE_TTL": "0",
+        "CRAWL_ARCHIVE_ENABLED": "false",
+        "TRAFFIC_RECORD_DIR": "",
+        "LOG_DIR": env.get("LOG_DIR") or tempfile.mkdtemp(prefix="bench-logs-"),
+        "METRICS_DIR": tempfile.mkdtemp(prefix="bench-metrics-"),
+    })
+    env.update(extra_env or {})
+    process = subprocess.Popen(
+        [sys.executable, "-m", "src.benchmarks.app_runner", "--port", str(port)],
+        cwd=str(PROJECT_ROOT),
+        env=env
+    )
+
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"被测服务启动失败，退出码 {process.returncode}")
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("等待被测服务启动超时")
+
+def fetch_stats(base_url: str, reset: bool = False):
+    import httpx
+
+    return httpx.get(f"{base_url}/__bench__/stats", params={"reset": str(reset).lower()}, timeout=10).json()
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端基准测试")
+    parser.add_argument("--rates", default="5,10,20", help="逗号分隔的到达率（请求/秒），每个到达率一个阶段")
+    parser.add_argument("--duration", type=float, default=20, help="每个阶段时长（秒）")
+    parser.add_argument("--warmup", type=float, default=2, help="预热时长（秒），不计入结果")
+    parser.add_argument("--arrival", choices=["constant", "poisson"], default="constant")
+    parser.add_argument("--urls", type=int, default=200, help="轮流请求的不同URL数量")
+    parser.add_argument("--timeout", type=float, default=60, help="客户端超时（秒）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--crawler-latency", default="fixed:0.02", help="爬虫桩每次请求的延迟分布")
+    parser.add_argument("--crawler-job-time", default="fixed:0", help="爬取任务完成时间分布")
+    parser.add_argument("--crawler-error-rate", type=float, default=0.0)
+    parser.add_argument("--page-paragraphs", type=int, default=30, help="页面段落数（每段约200字节）")
+    parser.add_argument("--archive", default=None, help="可选，使用爬取归档中的真实页面")
+    parser.add_argument("--llm-latency", default="lognormal:0.3,0.3", help="LLM桩每次调用的延迟分布")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-items", type=int, default=10, help="LLM返回的条目数")
+    parser.add_argument("--llm-item-chars", type=int, default=80, help="每个条目的文本长度")
+    parser.add_argument("--llm-concurrency", type=int, default=0, help="LLM桩同时处理的最大调用数，0为不限")
+    parser.add_argument("--service-env", action="append", default=[], metavar="KEY=VALUE",
+                        help="传给被测服务的环境变量，可重复")
+    parser.add_argument("--output", default="bench_result.json", help="结果JSON路径")
+    parser.add_argument("--baseline", default=None, help="可选，基线结果JSON")
+    parser.add_argument("--threshold", type=float, default=0.1, help="相对基线允许的劣化比例")
+    args = parser.parse_args()
+
+    pages = load_archive_pages(args.archive) if args.archive else None
+    crawler = StubServer(create_crawler_stub(
+        latency=Latency(args.crawler_latency, seed=args.seed),
+        job_time=Latency(args.crawler_job_time, seed=args.seed + 1),
+        paragraphs=args.page_paragraphs,
+        pages=pages,
+        error_rate=args.crawler_error_rate
+    )).start()
+    llm = StubServer(create_llm_stub(
+        latency=Latency(args.llm_latency, seed=args.seed + 2),
+        items=args.llm_items,
+        item_chars=args.llm_item_chars,
+        error_rate=args.llm_error_rate,
+        concurrency=args.llm_concurrency
+    )).start()
+
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    service_env = dict(item.split("=", 1) for item in args.service_env)
+    service = start_service(port, crawler, llm, extra_env=service_env)
+    urls = [f"https://example.com/landing/{index}" for index in range(args.urls)]
+    rates = [float(rate) for rate in args.rates.split(",")]
+    # 告知服务客户端超时，准入控制据此拒绝无法按时完成的请求
+    headers = {"X-Request-Timeout": f"{args.timeout:g}"}
+
+    result = {
+        "meta": {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args)
+        },
+        "phases": []
+    }
+
+    try:
+        if args.warmup > 0:
+            asyncio.run(run_phase(base_url, urls, rates[0], args.warmup, timeout=args.timeout, headers=headers))
+
+        for rate in rates:
+            fetch_stats(base_url, reset=True)
+            phase = asyncio.run(run_phase(
+                base_url, urls, rate, args.duration,
+                arrival=args.arrival, timeout=args.timeout, headers=headers, seed=args.seed
+            ))
+            phase.update(fetch_stats(base_url, reset=True))
+            result["phases"].append(phase)
+
+            latency = phase["latency_ms"]
+            steps = " ".join(f"{name}={stats['p95']:.0f}" for name, stats in phase["steps_ms"].items())
+            print(
+                f"rate={rate:g}/s goodput={phase['goodput']:.2f}/s outcomes={phase['outcomes']} "
+                f"p50={latency['p50']:.0f}ms p95={latency['p95']:.0f}ms p99={latency['p99']:.0f}ms "
+                f"steps_p95[{steps}] loop_lag_p99={phase['loop_lag_ms']['p99']:.1f}ms "
+                f"rss_peak={phase['rss_mb']['peak_phase']:.0f}MB"
+            )
+    finally:
+        service.terminate()
+        try:
+            service.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            service.kill()
+        crawler.stop()
+        llm.stop()
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(result, baseline, args.threshold)
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            print(f"存在超过 {args.threshold * 100:.0f}% 的性能回归")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
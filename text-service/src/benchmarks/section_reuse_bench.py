@@ -0,0 +1,113 @@
+"""
+按小节复用提取结果的收益
+
+对本地LLM桩（输出越长延迟越高）比较同一页面修改少量小节后:
+    full         小节结果存储为空，全部小节交给LLM（相当于没有复用）
+    incremental  先处理修改前的页面，再处理修改后的页面，只有修改过的小节交给LLM
+输出两者的LLM输入/输出token、成本和耗时，以及增量结果与全量结果是否一致。
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.section_reuse_bench --sections 60 --edit-ratio 0.05 --repeats 3
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+
+from src.benchmarks.stubs import StubServer, create_llm_stub, sample_markdown
+from src.benchmarks.stats import summarize
+
+def build_page(sections: int, version: str) -> str:
+    """生成 sections 个小节的页面，version 不同时所有小节的内容都不同"""
+    return sample_markdown(sections).replace("示例内容", f"示例内容（{version}）")
+
+def edit_page(markdown: str, sections: int, ratio: float) -> str:
+    """均匀地修改约 ratio 比例的小节正文"""
+    edits = max(1, round(sections * ratio))
+    step = sections / edits
+    for index in range(edits):
+        number = int(index * step) + 1
+        markdown = markdown.replace(f"这是第{number}段", f"这是修改后的第{number}段", 1)
+    return markdown
+
+def crawl_result(url: str, markdown: str):
+    return {"success": True, "status": "completed", "data": [{"markdown": markdown, "url": url}]}
+
+async def process(markdown: str, url: str, request_id: str):
+    from src.core.service.openai_service import process_with_openai
+
+    usage = {}
+    start = time.perf_counter()
+    result = await process_with_openai(crawl_result(url, markdown), request_id, usage=usage)
+    return result, usage, time.perf_counter() - start
+
+async def run(args):
+    results = {"full": [], "incremental": []}
+    mismatches = 0
+    for repeat in range(args.repeats):
+        original = build_page(args.sections, f"r{repeat}")
+        edited = edit_page(original, args.sections, args.edit_ratio)
+        url = f"https://example.com/landing-{repeat}"
+
+        # 全量：修改后的页面在空存储上处理（用单独的版本号保证没有可复用的小节，
+        # 版本号与原页面等长，两次提取的条目文本只有版本号不同）
+        full_page = build_page(args.sections, f"f{repeat}")
+        full_result, full_usage, full_time = await process(
+            edit_page(full_page, args.sections, args.edit_ratio), url, f"full-{repeat}"
+        )
+        results["full"].append((full_usage, full_time))
+
+        # 增量：先处理原页面（写入小节结果），再处理修改后的页面
+        await process(original, url, f"warm-{repeat}")
+        incremental_result, incremental_usage, incremental_time = await process(edited, url, f"incremental-{repeat}")
+        results["incremental"].append((incremental_usage, incremental_time))
+
+        # 与同一页面的全量提取比较（两者只有版本号不同）
+        expected = [item["text"].replace(f"f{repeat}", f"r{repeat}") for item in full_result["data"]]
+        if [item["text"] for item in incremental_result["data"]] != expected:
+            mismatches += 1
+    return results, mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="按小节复用提取结果的收益")
+    parser.add_argument("--sections", type=int, default=60, help="页面小节数（需在MAX_MARKDOWN_CHARS以内）")
+    parser.add_argument("--edit-ratio", type=float, default=0.05, help="修改的小节比例")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--llm-latency", default="fixed:0.3", help="LLM桩每次调用的基础延迟")
+    parser.add_argument("--llm-output-latency", type=float, default=0.5, help="LLM桩每1000个输出字符增加的延迟（秒）")
+    args = parser.parse_args()
+
+    llm = StubServer(create_llm_stub(latency=args.llm_latency, output_latency=args.llm_output_latency)).start()
+    try:
+        # 配置在导入服务模块之前设置
+        os.environ.update({
+            "OPENAI_API_BASE": f"{llm.base_url}/v1",
+            "OpenAI_API_KEY": os.environ.get("OpenAI_API_KEY") or "bench-key",
+            "TRAFFIC_RECORD_DIR": "",
+            "METRICS_DIR": tempfile.mkdtemp(prefix="section-bench-metrics-"),
+            "SECTION_REUSE_ENABLED": "true",
+            "SECTION_STORE_PATH": os.path.join(tempfile.mkdtemp(prefix="section-bench-"), "sections.sqlite3"),
+        })
+        results, mismatches = asyncio.run(run(args))
+    finally:
+        llm.stop()
+
+    print(f"小节数 {args.sections}，修改比例 {args.edit_ratio:.0%}，重复 {args.repeats} 次")
+    print(f"{'mode':>12} {'input_tok':>10} {'output_tok':>10} {'cost':>10} {'p50_ms':>8} {'max_ms':>8}")
+    for mode, runs in results.items():
+        times = summarize([elapsed for _, elapsed in runs])
+        count = len(runs)
+        print(
+            f"{mode:>12} "
+            f"{sum(usage.get('input_tokens', 0) for usage, _ in runs) / count:>10.0f} "
+            f"{sum(usage.get('output_tokens', 0) for usage, _ in runs) / count:>10.0f} "
+            f"{sum(usage.get('cost', 0.0) for usage, _ in runs) / count:>10.5f} "
+            f"{times['p50'] * 1000:>8.0f} {times['max'] * 1000:>8.0f}"
+        )
+    print("增量结果与全量结果一致" if not mismatches else f"{mismatches} 次增量结果与全量结果不一致")
+    return 1 if mismatches else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,24 @@
+"""
+基准测试的统计工具
+"""
+import math
+from typing import Dict, List
+
+def percentile(values: List[float], pct: float) -> float:
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """汇总一组耗时：次数、均值、p50/p95/p99、最大值"""
+    return {
+        "count": len(values),
+        "avg": sum(values) / len(values) if values else 0.0,
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0
+    }
@@ -0,0 +1,424 @@
+"""
+本地替身服务
+
+提供与Firecrawl兼容的爬虫桩、与OpenAI兼容的LLM桩和支持条件请求的源站桩，
+用于在不访问真实爬虫服务、Moonshot和目标网站的情况下进行压测和基准测试。
+"""
+import re
+import json
+import hashlib
+import time
+import uuid
+import zlib
+import socket
+import random
+import asyncio
+import threading
+from typing import Dict, Any, List, Optional, Union
+
+import uvicorn
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+class Latency:
+    """
+    延迟分布，规格字符串格式（单位秒）:
+        fixed:0.05            固定延迟
+        uniform:0.01,0.1      均匀分布
+        normal:0.1,0.02       正态分布（均值, 标准差，截断到0以上）
+        lognormal:0.1,0.5     对数正态分布（中位数, sigma），长尾
+        exp:0.1               指数分布（均值）
+    纯数字等价于fixed。
+    """
+
+    def __init__(self, spec: Union[str, float] = 0.0, seed: Optional[int] = None):
+        self.spec = str(spec)
+        self._random = random.Random(seed)
+        kind, _, params = self.spec.partition(":")
+        if not params:
+            kind, params = "fixed", kind
+        self.kind = kind
+        self.params = [float(value) for value in params.split(",")]
+        if kind not in ("fixed", "uniform", "normal", "lognormal", "exp"):
+            raise ValueError(f"未知的延迟分布: {self.spec}")
+
+    def sample(self) -> float:
+        params = self.params
+        if self.kind == "fixed":
+            return params[0]
+        if self.kind == "uniform":
+            return self._random.uniform(params[0], params[1])
+        if self.kind == "normal":
+            return max(0.0, self._random.gauss(params[0], params[1]))
+        if self.kind == "lognormal":
+            return params[0] * self._random.lognormvariate(0.0, params[1])
+        return self._random.expovariate(1.0 / params[0]) if params[0] > 0 else 0.0
+
+    async def wait(self):
+        delay = self.sample()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def __repr__(self) -> str:
+        return f"Latency({self.spec!r})"
+
+def _as_latency(value: Union[str, float, Latency]) -> Latency:
+    return value if isinstance(value, Latency) else Latency(value)
+
+def sample_markdown(paragraphs: int = 10) -> str:
+    """生成包含文本段落和图片的示例Markdown"""
+    parts = ["# 示例页面标题", ""]
+    for index in range(paragraphs):
+        parts.append(f"## 小节 {index + 1}")
+        parts.append("")
+        parts.append(f"这是第{index + 1}段示例内容，用于模拟真实落地页中的正文文本。" * 3)
+        parts.append("")
+        parts.append(f"![](https://static.example.com/image/{index + 1}.png)")
+        parts.append("")
+    return "\n".join(parts)
+
+def load_archive_pages(archive_dir: str, limit: Optional[int] = None) -> Dict[str, str]:
+    """从爬取归档读取每个URL最新的markdown，作为桩服务的真实页面语料"""
+    from src.core.util.crawl_archive import CrawlArchive
+
+    archive = CrawlArchive(archive_dir)
+    pages: Dict[str, str] = {}
+    try:
+        for entry in archive.scan(latest_only=True):
+            pages[entry.url] = archive.read(entry)
+            if limit is not None and len(pages) >= limit:
+                break
+    finally:
+        archive.close()
+    return pages
+
+def create_crawler_stub(
+    latency: Union[str, float, Latency] = 0.05,
+    job_time: Union[str, float, Latency] = 0.0,
+    paragraphs: int = 10,
+    pages: Optional[Dict[str, str]] = None,
+    error_rate: float = 0.0
+) -> FastAPI:
+    """
+    创建Firecrawl兼容的爬虫桩
+
+    Args:
+        latency: 每个HTTP请求的响应延迟（秒或延迟分布）
+        job_time: 爬取任务从创建到完成所需的时间（秒或延迟分布，每个任务采样一次）
+        paragraphs: 返回的Markdown段落数（控制页面大小，每段约200字节）
+        pages: 可选，URL -> markdown 的页面语料（如来自爬取归档），
+            未收录的URL按哈希从语料中选一页
+        error_rate: 请求返回HTTP 500的概率
+    """
+    app = FastAPI()
+    latency = _as_latency(latency)
+    job_time = _as_latency(job_time)
+    jobs: Dict[str, Dict[str, Any]] = {}
+    default_markdown = sample_markdown(paragraphs)
+    page_list: List[str] = list(pages.values()) if pages else []
+    # 创建过的爬取任务，测试可据此统计爬取次数
+    app.state.jobs = jobs
+
+    def markdown_for(url: str) -> str:
+        if pages and url in pages:
+            return pages[url]
+        if page_list:
+            return page_list[zlib.crc32(url.encode("utf-8")) % len(page_list)]
+        return default_markdown
+
+    @app.post("/v1/crawl")
+    async def create_crawl(request: Request):
+        payload = await request.json()
+        await latency.wait()
+        if error_rate and random.random() < error_rate:
+            return JSONResponse({"success": False, "error": "stub error"}, status_code=500)
+        job_id = str(uuid.uuid4())
+        jobs[job_id] = {"url": payload.get("url"), "ready_at": time.time() + job_time.sample()}
+        return {"success": True, "id": job_id, "url": f"/v1/crawl/{job_id}"}
+
+    @app.get("/v1/crawl/{job_id}")
+    async def get_crawl(job_id: str):
+        await latency.wait()
+        if error_rate and random.random() < error_rate:
+            return JSONResponse({"success": False, "error": "stub error"}, status_code=500)
+        job = jobs.get(job_id)
+        if job is None:
+            return {"success": False, "status": "failed", "error": "job not found"}
+        if time.time() < job["ready_at"]:
+            return {"success": True, "status": "scraping", "completed": 0, "total": 1, "data": []}
+        return {
+            "success": True,
+            "status": "completed",
+            "completed": 1,
+            "total": 1,
+            "data": [{
+                "markdown": markdown_for(job["url"]),
+                "sourceURL": job["url"],
+                "url": job["url"],
+                "statusCode": 200
+            }]
+        }
+
+    return app
+
+def create_llm_stub(
+    latency: Union[str, float, Latency] = 0.2,
+    items: int = 5,
+    item_chars: int = 20,
+    error_rate: float = 0.0,
+    concurrency: int = 0,
+    output_latency: float = 0.0,
+    degrade_rate: float = 0.0,
+    input_latency: float = 0.0,
+    prefix_cache: bool = False,
+    prefix_min: int = 1024,
+    prefix_block: int = 128,
+    drop_rate: float = 0.0
+) -> FastAPI:
+    """
+    创建OpenAI兼容的LLM桩（/v1/chat/completions）
+
+    提示词中有 <section id="N"> 小节时，每个小节返回一个带 section 编号的条目
+    （文本取自小节正文，图片为小节中的图片），否则返回 items 个固定条目。
+    提示词中有 <document id="N"> 文档（打包提取）时分别处理每个文档，条目带 document 编号。
+    app.state.requests 记录收到的调用数。
+
+    模拟两种提示词缓存（token数按字符数计），命中的字符数在 usage 的
+    prompt_tokens_details.cached_tokens 和 cached_tokens 中返回:
+    - 自动前缀缓存（prefix_cache）：与之前的某个提示词相同的最长前缀，按 prefix_block 个字符对齐，
+      不足 prefix_min 个字符时不命中
+    - 上下文缓存：POST /v1/caching 保存消息并返回缓存ID，之后 role 为 cache 的消息
+      （内容为 "cache_id=...;..."）展开为保存的消息，全部计为命中；缓存ID不存在时返回404
+
+    Args:
+        latency: 每次调用的响应延迟（秒或延迟分布）
+        items: 返回的提取条目数
+        item_chars: 每个条目的文本长度（字符）
+        error_rate: 调用返回HTTP 500的概率
+        concurrency: 同时处理的最大调用数（模拟服务商容量，超出的调用排队），0为不限
+        output_latency: 每1000个输出字符增加的延迟（秒），模拟生成耗时随输出长度增长
+        degrade_rate: 返回质量差的结果（只有第一个条目、没有图片、文本截短）的提示词比例，
+            按提示词内容决定，同一提示词每次的结果相同（模拟较弱的模型）
+        input_latency: 每1000个未命中缓存的输入字符增加的延迟（秒），模拟预填充耗时
+        prefix_cache: 是否模拟自动前缀缓存
+        prefix_min: 自动前缀缓存的最短命中长度（字符）
+        prefix_block: 自动前缀缓存的对齐粒度（字符）
+        drop_rate: 打包提取时遗漏文档（不返回其条目）的比例，按文档内容决定
+    """
+    app = FastAPI()
+    contexts: Dict[str, List[Dict[str, Any]]] = {}
+    prefixes = set()
+    app.state.context_caches = contexts
+    app.state.requests = {"total": 0}
+    document_pattern = re.compile(r'<document id="(\d+)">\n(.*?)\n</document>', re.S)
+    latency = _as_latency(latency)
+    semaphore = asyncio.Semaphore(concurrency) if concurrency > 0 else None
+    filler = "这是提取出的有意义的文本内容。"
+    section_pattern = re.compile(r'<section id="(\d+)">\n(.*?)\n</section>', re.S)
+    image_pattern = re.compile(r"!\[[^\]]*\]\(([^)]+)\)")
+
+    def extract(prompt: str) -> List[Dict[str, Any]]:
+        sections = section_pattern.findall(prompt)
+        if not sections:
+            return [
+                {
+                    "text": f"第{index + 1}段：" + (filler * (item_chars // len(filler) + 1))[:item_chars],
+                    "materials": [f"https://static.example.com/image/{index + 1}.png"]
+                }
+                for index in range(items)
+            ]
+        results = []
+        for section_id, body in sections:
+            lines = [line for line in body.splitlines() if line.strip() and not line.startswith(("#", "!["))]
+            results.append({
+                "section": int(section_id),
+                "text": (lines[0] if lines else filler)[:max(item_chars, 1) * 4],
+                "materials": image_pattern.findall(body)
+            })
+        return results
+
+    def extract_documents(prompt: str) -> List[Dict[str, Any]]:
+        documents = document_pattern.findall(prompt)
+        if not documents:
+            return extract(prompt)
+        results = []
+        for document_id, body in documents:
+            if drop_rate and zlib.crc32(body.encode("utf-8")) % 1000 < drop_rate * 1000:
+                continue
+            results.extend(dict(item, document=int(document_id)) for item in extract(body))
+        return results
+
+    def cached_prefix(contents: List[str]) -> int:
+        # 按块计算前缀的哈希，命中之前出现过的最长前缀；本次的各个前缀随后加入
+        text = "\x00".join(contents)
+        digest = hashlib.blake2b(digest_size=16)
+        hit = 0
+        for end in range(prefix_block, len(text) + 1, prefix_block):
+            digest.update(text[end - prefix_block:end].encode("utf-8"))
+            key = digest.copy().digest()
+            if key in prefixes:
+                hit = end
+            else:
+                prefixes.add(key)
+        return hit if hit >= prefix_min else 0
+
+    @app.post("/v1/caching")
+    async def create_cache(request: Request):
+        payload = await request.json()
+        cache_id = f"cache-{uuid.uuid4().hex[:16]}"
+        contexts[cache_id] = payload.get("messages", [])
+        return {"id": cache_id, "object": "context_cache", "ttl": payload.get("ttl")}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        messages = []
+        context_chars = 0
+        for message in payload.get("messages", []):
+            if message.get("role") != "cache":
+                messages.append(message)
+                continue
+            fields = dict(field.partition("=")[::2] for field in message.get("content", "").split(";"))
+            cached = contexts.get(fields.get("cache_id", ""))
+            if cached is None:
+                return JSONResponse(
+                    {"error": {"message": "context cache not found", "type": "invalid_request_error"}},
+                    status_code=404
+                )
+            messages.extend(cached)
+            context_chars += sum(len(item.get("content", "")) for item in cached)
+        contents = [message.get("content", "") for message in messages]
+        prompt = "\n".join(contents)
+        prompt_chars = sum(len(content) for content in contents)
+        cached_chars = min(prompt_chars, context_chars or (cached_prefix(contents) if prefix_cache else 0))
+        prefill = (prompt_chars - cached_chars) / 1000 * input_latency
+        app.state.requests["total"] += 1
+        items = extract_documents(prompt)
+        if degrade_rate and zlib.crc32(prompt.encode("utf-8")) % 1000 < degrade_rate * 1000:
+            items = [dict(item, text=item["text"][:len(item["text"]) // 3 + 1], materials=[]) for item in items[:1]]
+        content = json.dumps({"data": items}, ensure_ascii=False)
+        if semaphore is not None:
+            async with semaphore:
+                await latency.wait()
+                await asyncio.sleep(prefill + len(content) / 1000 * output_latency)
+        else:
+            await latency.wait()
+            await asyncio.sleep(prefill + len(content) / 1000 * output_latency)
+        if error_rate and random.random() < error_rate:
+            return JSONResponse(
+                {"error": {"message": "stub error", "type": "server_error"}},
+                status_code=500
+            )
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_chars,
+                "completion_tokens": len(content),
+                "total_tokens": prompt_chars + len(content),
+                "prompt_tokens_details": {"cached_tokens": cached_chars},
+                "cached_tokens": cached_chars
+            }
+        }
+
+    return app
+
+def create_origin_stub(
+    pages: Dict[str, str],
+    latency: Union[str, float, Latency] = 0.02,
+    validators: str = "etag",
+    dynamic: bool = False
+) -> FastAPI:
+    """
+    创建源站桩：按路径返回页面，支持条件请求（If-None-Match / If-Modified-Since 返回304）
+
+    ETag由页面内容计算；Last-Modified为桩第一次看到当前内容的时间（秒级精度）。
+
+    Args:
+        pages: 路径 -> 页面内容，测试修改其中的内容模拟页面更新
+        latency: 每个请求的响应延迟（秒或延迟分布）
+        validators: 返回的校验器，etag / last-modified / both / none
+        dynamic: 每次响应都嵌入当前时间（模拟页面内容指纹每次都不同的动态页面）
+    """
+    from email.utils import formatdate, parsedate_to_datetime
+
+    app = FastAPI()
+    latency = _as_latency(latency)
+    seen: Dict[str, Any] = {}
+    app.state.requests = {"total": 0, "not_modified": 0}
+
+    @app.get("/{path:path}")
+    async def get_page(path: str, request: Request):
+        await latency.wait()
+        app.state.requests["total"] += 1
+        content = pages.get("/" + path)
+        if content is None:
+            return JSONResponse({"error": "not found"}, status_code=404)
+        etag = f'"{zlib.crc32(content.encode("utf-8")):08x}"'
+        if seen.get(path, (None,))[0] != etag:
+            seen[path] = (etag, int(time.time()))
+        modified_at = seen[path][1]
+
+        headers = {}
+        if validators in ("etag", "both"):
+            headers["ETag"] = etag
+        if validators in ("last-modified", "both"):
+            headers["Last-Modified"] = formatdate(modified_at, usegmt=True)
+        if_none_match = request.headers.get("if-none-match")
+        if_modified_since = request.headers.get("if-modified-since")
+        not_modified = False
+        if if_none_match is not None and "ETag" in headers:
+            not_modified = if_none_match == etag
+        elif if_modified_since is not None and "Last-Modified" in headers:
+            try:
+                not_modified = modified_at <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                not_modified = False
+        if not_modified:
+            app.state.requests["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+
+        if dynamic:
+            content = f"<!-- rendered at {time.time()} -->\n{content}"
+        return Response(f"<html><body>{content}</body></html>", media_type="text/html", headers=headers)
+
+    return app
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+class StubServer:
+    """在后台线程中运行的uvicorn服务"""
+
+    def __init__(self, app: FastAPI, port: Optional[int] = None):
+        self.port = port or free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self._server = uvicorn.Server(uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, log_level="warning", access_log=False
+        ))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,191 @@
+"""
+URL规范键的缓存命中率报告
+
+按顺序回放一批爬取请求（假设缓存容量不限），比较三种缓存键的命中率:
+    raw        请求中的原URL
+    canonical  规范化后的URL（URL_CANON_RULES_FILE 规则）
+    alias      规范化 + 别名索引（未命中时按录制的最终URL学习别名，与服务的处理流程相同）
+并列出合并最多的规范键，便于检查规则是否把不同页面误合并。
+
+请求来源:
+    cassette 文件或目录（TRAFFIC_RECORD_DIR 录制，含爬虫返回的最终URL）
+    爬取归档目录（所有爬取记录的URL）
+    文本文件（每行一个URL，或 "请求URL<TAB>最终URL"）
+    --synthetic N  生成N个请求的合成语料（http/https、跟踪参数、移动版域名、锚点、旧域名跳转）
+
+用法（在 text-service 目录下）:
+    python -m src.benchmarks.url_key_report recordings --rules url_rules.json
+    python -m src.benchmarks.url_key_report --synthetic 20000
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import tempfile
+from collections import Counter as CounterDict
+from typing import Dict, List, Optional, Tuple
+
+from src.core.util.url_canonical import UrlCanonicalizer, AliasIndex, final_url, is_learnable_alias
+
+Request = Tuple[str, Optional[str]]
+
+# 合成语料使用的规则（与 --rules 的文件格式相同）
+SYNTHETIC_RULES = {
+    "www.news.example": {"aliases": ["m.news.example", "news.example"], "params": ["id"], "trailing_slash": "strip"},
+    "shop.example": {"drop_params": ["ref", "from"]}
+}
+
+def load_cassette_requests(path: str) -> List[Request]:
+    """cassette中的爬取请求及爬虫返回的最终URL（按录制顺序）"""
+    from src.core.util.cassette import load_cassettes
+
+    exchanges = load_cassettes(path)
+    finals: Dict[str, str] = {}
+    for exchange in exchanges:
+        response = exchange.get("response")
+        if exchange["kind"] == "crawler" and exchange["method"] == "GET" and isinstance(response, dict):
+            final = final_url(response) if response.get("status") == "completed" else None
+            if final:
+                finals[exchange["url"].rsplit("/", 1)[-1]] = final
+    requests = []
+    for exchange in exchanges:
+        if exchange["kind"] == "crawler" and exchange["method"] == "POST":
+            url = (exchange.get("request") or {}).get("url")
+            response = exchange.get("response")
+            task_id = response.get("id") if isinstance(response, dict) else None
+            if url:
+                requests.append((url, finals.get(task_id)))
+    return requests
+
+def load_archive_requests(path: str) -> List[Request]:
+    from src.core.util.crawl_archive import CrawlArchive
+
+    archive = CrawlArchive(path)
+    try:
+        return [(entry.url, None) for entry in archive.scan()]
+    finally:
+        archive.close()
+
+def load_text_requests(path: str) -> List[Request]:
+    requests = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            url, _, final = line.strip().partition("\t")
+            if url:
+                requests.append((url, final or None))
+    return requests
+
+def synthetic_requests(count: int, articles: int, seed: int) -> List[Request]:
+    """按Zipf分布抽取文章，每次随机生成一种URL变体"""
+    rng = random.Random(seed)
+    pages = []
+    for index in range(articles):
+        if index % 3 == 0:
+            pages.append((f"https://www.news.example/article/{index}", "news"))
+        elif index % 3 == 1:
+            pages.append((f"https://shop.example/item?sku={index}&color=red", "shop"))
+        else:
+            pages.append((f"https://blog.example/post/{index}/", "blog"))
+    weights = [1 / (rank + 1) for rank in range(articles)]
+
+    def variant(url: str, kind: str) -> Request:
+        if rng.random() < 0.1:
+            # 旧域名，爬虫跳转到同一路径的文章
+            return url.replace("://", "://legacy-", 1), url
+        if rng.random() < 0.3:
+            url = "http://" + url[len("https://"):]
+        if kind == "news" and rng.random() < 0.3:
+            url = url.replace("www.news.example", rng.choice(("m.news.example", "news.example")))
+        if kind == "news" and rng.random() < 0.2:
+            url += "/"
+        if rng.random() < 0.4:
+            separator = "&" if "?" in url else "?"
+            url += f"{separator}utm_source={rng.choice(('wx', 'weibo', 'mail'))}&utm_medium=share"
+        if kind == "shop" and rng.random() < 0.3:
+            url += f"&ref=home{rng.randrange(5)}"
+        if rng.random() < 0.2:
+            url += f"#comment-{rng.randrange(10)}"
+        return url, None
+
+    return [variant(*rng.choices(pages, weights)[0]) for _ in range(count)]
+
+def simulate(requests: List[Request], canonicalizer: UrlCanonicalizer, mode: str):
+    """返回（命中数, 缓存键数, 规范键 -> 原URL集合）"""
+    alias_index = AliasIndex(os.path.join(tempfile.mkdtemp(prefix="url-key-report-"), "aliases.sqlite3")) \
+        if mode == "alias" else None
+    cached = set()
+    variants: Dict[str, set] = {}
+    hits = 0
+    try:
+        for url, final in requests:
+            key = url if mode == "raw" else canonicalizer.canonicalize(url)
+            if alias_index is not None:
+                key = alias_index.get(key) or key
+            variants.setdefault(key, set()).add(url)
+            if key in cached:
+                hits += 1
+                continue
+            if alias_index is not None and final:
+                # 与 learn_url_alias 相同：结果按最终URL的规范键保存
+                variant_key = canonicalizer.canonicalize(url)
+                final_key = canonicalizer.canonicalize(final)
+                if is_learnable_alias(variant_key, final_key):
+                    alias_index.add(variant_key, final_key)
+                    key = alias_index.get(final_key) or final_key
+            cached.add(key)
+    finally:
+        if alias_index is not None:
+            alias_index.close()
+    return hits, len(cached), variants
+
+def main():
+    parser = argparse.ArgumentParser(description="URL规范键的缓存命中率报告")
+    parser.add_argument("source", nargs="?", help="cassette文件/目录、爬取归档目录或URL文本文件")
+    parser.add_argument("--rules", help="URL规范化规则文件（JSON），默认读取 URL_CANON_RULES_FILE")
+    parser.add_argument("--synthetic", type=int, default=0, help="生成合成语料的请求数")
+    parser.add_argument("--articles", type=int, default=2000, help="合成语料的文章数")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--show", type=int, default=5, help="列出合并最多的规范键个数")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        requests = synthetic_requests(args.synthetic, args.articles, args.seed)
+        canonicalizer = UrlCanonicalizer.from_config(SYNTHETIC_RULES)
+    elif args.source:
+        from src.core.util.crawl_archive import is_archive_dir
+
+        if os.path.isdir(args.source) and is_archive_dir(args.source):
+            requests = load_archive_requests(args.source)
+        elif os.path.isdir(args.source) or args.source.endswith(".jsonl"):
+            requests = load_cassette_requests(args.source)
+        else:
+            requests = load_text_requests(args.source)
+        rules = args.rules or os.getenv("URL_CANON_RULES_FILE")
+        canonicalizer = UrlCanonicalizer.from_file(rules) if rules else UrlCanonicalizer()
+    else:
+        parser.error("需要指定请求来源或 --synthetic")
+        return 2
+    if not requests:
+        print("没有找到爬取请求")
+        return 1
+
+    with_final = sum(1 for _, final in requests if final)
+    print(f"请求数 {len(requests)}，其中有最终URL的 {with_final} 个")
+    print(f"{'mode':>10} {'hits':>8} {'hit_rate':>9} {'keys':>8}")
+    results = {}
+    for mode in ("raw", "canonical", "alias"):
+        hits, keys, variants = simulate(requests, canonicalizer, mode)
+        results[mode] = variants
+        print(f"{mode:>10} {hits:>8} {hits / len(requests):>9.1%} {keys:>8}")
+
+    merged = CounterDict({key: len(urls) for key, urls in results["alias"].items() if len(urls) > 1})
+    if merged and args.show:
+        print("合并最多的规范键:")
+        for key, count in merged.most_common(args.show):
+            examples = sorted(results["alias"][key])[:3]
+            print(f"  {key}  {count} 种URL，例如 {json.dumps(examples, ensure_ascii=False)}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,308 @@
+"""
+日志配置
+
+所有日志记录先经 QueueHandler 放入内存队列，由 QueueListener 在后台线程中完成
+格式化（JSON）、写文件和轮转，事件循环线程上只剩创建日志记录和入队的开销。
+
+日志文件（位于 LOG_DIR）:
+    app.log          全部日志（JSON或文本）
+    error.log        ERROR及以上
+    performance.log  performance 日志器的性能日志（ENABLE_PERFORMANCE_LOGGING）
+
+请求日志缓冲:
+    请求处理期间（见 RequestLogMiddleware），低于 LOG_BUFFER_LEVEL 的日志记录先放入
+    该请求的环形缓冲区（最多 LOG_BUFFER_SIZE 条），请求结束时由中间件决定写出或丢弃。
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import logging
+import logging.handlers
+from collections import deque
+from contextvars import ContextVar, Token
+from typing import Any, Dict, List, Optional
+
+try:
+    import orjson
+except ImportError:  # 未安装orjson时退回标准库json
+    orjson = None
+
+from src.config.settings import ENABLE_PERFORMANCE_LOGGING, LOG_BUFFER_SIZE, LOG_BUFFER_LEVEL
+
+# LogRecord 自带的属性，其余属性均来自 extra
+_RESERVED_ATTRS = frozenset(
+    logging.LogRecord("", 0, "", 0, "", (), None).__dict__
+) | {"message", "asctime", "taskName"}
+
+def _json_default(value: Any):
+    return str(value)
+
+if orjson is not None:
+    def _dumps(data: Dict[str, Any]) -> str:
+        return orjson.dumps(data, default=_json_default, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+else:
+    def _dumps(data: Dict[str, Any]) -> str:
+        return json.dumps(data, ensure_ascii=False, default=_json_default)
+
+def _record_extra(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in record.__dict__.items() if key not in _RESERVED_ATTRS}
+
+class JSONFormatter(logging.Formatter):
+    """单行JSON格式，extra中的字段作为顶层字段输出"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+                         + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+        }
+        data.update(_record_extra(record))
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return _dumps(data)
+
+class ConsoleFormatter(logging.Formatter):
+    """控制台文本格式，附带请求ID和事件名，可选按级别着色"""
+
+    COLORS = {
+        "DEBUG": "\033[36m",
+        "INFO": "\033[32m",
+        "WARNING": "\033[33m",
+        "ERROR": "\033[31m",
+        "CRITICAL": "\033[35m",
+    }
+    RESET = "\033[0m"
+
+    def __init__(self, enable_colors: bool = True):
+        super().__init__("%(asctime)s [%(levelname)8s] %(name)s - %(message)s", datefmt="%H:%M:%S")
+        self.enable_colors = enable_colors
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        context = []
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            context.append(f"request_id={request_id}")
+        event = getattr(record, "event", None)
+        if event:
+            context.append(f"event={event}")
+        if context:
+            first_line, sep, rest = text.partition("\n")
+            text = f"{first_line} [{' '.join(context)}]{sep}{rest}"
+        if self.enable_colors:
+            color = self.COLORS.get(record.levelname)
+            if color:
+                text = f"{color}{text}{self.RESET}"
+        return text
+
+class _LoggerNameFilter(logging.Filter):
+    """只保留指定日志器（及其子日志器）的记录"""
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.logger_name = name
+        self.prefix = name + "."
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.name == self.logger_name or record.name.startswith(self.prefix)
+
+class RequestLogBuffer:
+    """单个请求的日志环形缓冲区，超出容量时丢弃最早的记录"""
+
+    __slots__ = ("records", "total")
+
+    def __init__(self, capacity: int = LOG_BUFFER_SIZE):
+        self.records = deque(maxlen=capacity)
+        self.total = 0
+
+    def add(self, record: logging.LogRecord):
+        self.records.append(record)
+        self.total += 1
+
+    @property
+    def dropped(self) -> int:
+        return self.total - len(self.records)
+
+_request_buffer: ContextVar[Optional[RequestLogBuffer]] = ContextVar("request_log_buffer", default=None)
+
+def start_request_buffer(capacity: int = LOG_BUFFER_SIZE) -> Token:
+    """开始缓冲当前上下文（请求）中的日志，返回用于结束缓冲的token"""
+    return _request_buffer.set(RequestLogBuffer(capacity))
+
+def end_request_buffer(token: Token, flush: bool) -> RequestLogBuffer:
+    """
+    结束当前请求的日志缓冲
+
+    Args:
+        token: start_request_buffer 返回的token
+        flush: 为True时按原顺序写出缓冲的日志，否则丢弃
+
+    Returns:
+        结束的缓冲区（用于在请求摘要中记录条数）
+    """
+    buffer = _request_buffer.get()
+    _request_buffer.reset(token)
+    if flush and buffer is not None and _queue_handler is not None:
+        for record in buffer.records:
+            _queue_handler.enqueue(record)
+    return buffer
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    不在调用线程上格式化的 QueueHandler
+
+    标准 QueueHandler.prepare() 会在入队前格式化消息（用于跨进程传递），
+    这里的队列只在进程内使用，格式化全部留给后台线程。
+    处于请求日志缓冲中时，低于 buffer_level 的记录放入缓冲区而不入队；
+    performance 日志器的记录（performance.log）不缓冲，始终写出。
+    """
+
+    def __init__(self, log_queue, buffer_level: int = logging.INFO):
+        super().__init__(log_queue)
+        self.buffer_level = buffer_level
+        self._unbuffered = _LoggerNameFilter("performance")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        if record.levelno < self.buffer_level and not self._unbuffered.filter(record):
+            buffer = _request_buffer.get()
+            if buffer is not None:
+                buffer.add(record)
+                return
+        self.enqueue(record)
+
+class ContextLogger(logging.LoggerAdapter):
+    """
+    绑定上下文的日志器
+
+    绑定的字段与每次调用的 extra 合并（调用时传入的字段优先），
+    日志级别未启用时不做任何合并。
+    """
+
+    def process(self, msg, kwargs):
+        extra = kwargs.get("extra")
+        kwargs["extra"] = {**self.extra, **extra} if extra else self.extra
+        return msg, kwargs
+
+    def bind(self, **context) -> "ContextLogger":
+        """在当前上下文基础上绑定更多字段"""
+        return ContextLogger(self.logger, {**self.extra, **context})
+
+def get_context_logger(name: str, **context) -> ContextLogger:
+    """
+    获取带上下文的日志器
+
+    Args:
+        name: 日志器名称
+        **context: 绑定到每条日志的字段，如 request_id、url
+
+    Returns:
+        ContextLogger
+    """
+    return ContextLogger(logging.getLogger(name), context)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[DeferredQueueHandler] = None
+
+def build_handlers(
+    log_dir: str,
+    max_bytes: int,
+    backup_count: int,
+    enable_json: bool,
+    enable_console_colors: bool,
+    console_stream=None
+) -> List[logging.Handler]:
+    """创建实际写出日志的处理器（由后台线程调用）"""
+    os.makedirs(log_dir, exist_ok=True)
+    file_formatter = JSONFormatter() if enable_json else logging.Formatter(
+        "%(asctime)s [%(levelname)s] %(name)s - %(message)s"
+    )
+
+    console_stream = console_stream or sys.stdout
+    console_handler = logging.StreamHandler(console_stream)
+    console_handler.setFormatter(ConsoleFormatter(
+        enable_colors=enable_console_colors and hasattr(console_stream, "isatty") and console_stream.isatty()
+    ))
+
+    app_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, "app.log"), maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    app_handler.setFormatter(file_formatter)
+
+    error_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, "error.log"), maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+    )
+    error_handler.setLevel(logging.ERROR)
+    error_handler.setFormatter(file_formatter)
+
+    handlers = [console_handler, app_handler, error_handler]
+
+    if ENABLE_PERFORMANCE_LOGGING:
+        performance_handler = logging.handlers.RotatingFileHandler(
+            os.path.join(log_dir, "performance.log"), maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        performance_handler.addFilter(_LoggerNameFilter("performance"))
+        performance_handler.setFormatter(file_formatter)
+        handlers.append(performance_handler)
+
+    return handlers
+
+def setup_logging(
+    log_dir: str = "logs",
+    log_level: str = "INFO",
+    max_bytes: int = 10485760,
+    backup_count: int = 5,
+    enable_json: bool = True,
+    enable_console_colors: bool = True
+):
+    """
+    配置日志系统
+
+    根日志器只挂一个 DeferredQueueHandler，文件和控制台处理器在 QueueListener
+    的后台线程中运行；重复调用会先停止上一次的监听线程。进程退出时自动刷新队列。
+    """
+    global _listener, _queue_handler
+
+    root = logging.getLogger()
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        root.removeHandler(_queue_handler)
+        _queue_handler = None
+
+    handlers = build_handlers(log_dir, max_bytes, backup_count, enable_json, enable_console_colors)
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _queue_handler = DeferredQueueHandler(
+        log_queue, buffer_level=getattr(logging, str(LOG_BUFFER_LEVEL).upper(), logging.INFO)
+    )
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    root.addHandler(_queue_handler)
+    root.setLevel(getattr(logging, str(log_level).upper(), logging.INFO))
+
+    if not ENABLE_PERFORMANCE_LOGGING:
+        logging.getLogger("performance").disabled = True
+
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """停止后台日志线程，并写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
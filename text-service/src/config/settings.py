@@ -2,10 +2,46 @@ import os
 
 # OpenAI API 配置
 API_KEY = os.getenv("OpenAI_API_KEY")
-API_BASE = "https://api.moonshot.cn/v1"
+API_BASE = os.getenv("OPENAI_API_BASE", "https://api.moonshot.cn/v1")
 MODEL = "moonshot-v1-8k"
 MAX_RETRIES = 3
 RETRY_DELAY = 2
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))  # 单次LLM调用的超时上限（秒）
+
+# 模型级联：依次使用的模型，格式为 "模型[@API地址][=输入价格/输出价格[/缓存输入价格]],..."（价格为每百万token，
+# 默认 INPUT_PRICE/OUTPUT_PRICE/CACHED_INPUT_PRICE；API地址默认 OPENAI_API_BASE，可指向本地的OpenAI兼容服务）。
+# 前面的模型提取结果的质量分低于 LLM_CASCADE_THRESHOLD 时交给下一个模型，最后一个模型的结果总是采用；
+# 为空时只使用 MODEL
+LLM_CASCADE = os.getenv("LLM_CASCADE", "")
+LLM_CASCADE_THRESHOLD = float(os.getenv("LLM_CASCADE_THRESHOLD", "0.8"))
+
+# 上下文缓存：提示词的固定前缀（系统提示词和提取说明）通过服务商的上下文缓存接口（Moonshot 的 /caching）
+# 创建缓存，请求中以缓存引用代替前缀；未启用时依赖服务商自动的前缀缓存。两种方式都按响应中的缓存token数计费和统计
+PROMPT_CONTEXT_CACHE_ENABLED = os.getenv("PROMPT_CONTEXT_CACHE_ENABLED", "false").lower() == "true"
+PROMPT_CONTEXT_CACHE_MODEL = os.getenv("PROMPT_CONTEXT_CACHE_MODEL", "moonshot-v1")  # 创建缓存时的模型系列
+PROMPT_CONTEXT_CACHE_TTL = int(os.getenv("PROMPT_CONTEXT_CACHE_TTL", "3600"))  # 缓存的有效期（秒），每次使用时重置
+
+# 按小节复用提取结果：markdown按标题切分，未变化的小节复用之前的提取结果，只把新增或修改的小节交给LLM
+SECTION_REUSE_ENABLED = os.getenv("SECTION_REUSE_ENABLED", "false").lower() == "true"
+SECTION_STORE_PATH = os.getenv("SECTION_STORE_PATH", "data/section_store.sqlite3")
+SECTION_STORE_MAX_AGE = float(os.getenv("SECTION_STORE_MAX_AGE", "2592000"))  # 结果保留时间（秒），默认30天
+
+# 打包提取：批量接口和离线重处理（LLM_PACKING_PRIORITIES 中的优先级）中不超过 LLM_PACKING_MAX_CHARS 个字符的短文档，
+# 在 LLM_PACKING_WAIT 秒内合并为一次LLM调用（最多 LLM_PACKING_MAX_DOCUMENTS 个文档、共 LLM_PACKING_BUDGET_CHARS 个字符），
+# 按文档拆分结果；某个文档的结果校验未通过（质量分低于 LLM_PACKING_MIN_SCORE、图片不属于该文档等）时单独重新提取
+LLM_PACKING_ENABLED = os.getenv("LLM_PACKING_ENABLED", "false").lower() == "true"
+LLM_PACKING_PRIORITIES = os.getenv("LLM_PACKING_PRIORITIES", "bulk,backfill")
+LLM_PACKING_MAX_CHARS = int(os.getenv("LLM_PACKING_MAX_CHARS", "2000"))
+LLM_PACKING_MAX_DOCUMENTS = int(os.getenv("LLM_PACKING_MAX_DOCUMENTS", "8"))
+LLM_PACKING_BUDGET_CHARS = int(os.getenv("LLM_PACKING_BUDGET_CHARS", "8000"))
+LLM_PACKING_WAIT = float(os.getenv("LLM_PACKING_WAIT", "0.05"))  # 秒
+LLM_PACKING_MIN_SCORE = float(os.getenv("LLM_PACKING_MIN_SCORE", "0.6"))  # 配置了模型级联时使用 LLM_CASCADE_THRESHOLD
+
+# LLM调用调度：同时进行的LLM调用数上限（0为不限制、不调度），超出的调用按优先级排队，
+# 同一优先级内按租户（X-Tenant-ID）加权公平排队，租户权重格式为 "租户=权重,..."（默认1）
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_TENANT_WEIGHTS = os.getenv("LLM_TENANT_WEIGHTS", "")
+LLM_SCHEDULER_AGING = float(os.getenv("LLM_SCHEDULER_AGING", "5"))  # 低优先级调用排队超过此时间（秒）后保证有槽位
 
 # 服务配置
 SERVICE_HOST = "0.0.0.0"
@@ -13,8 +49,62 @@ SERVICE_PORT = 8008
 
 # 爬虫服务配置
 CRAWLER_API_IP = os.getenv("CRAWLER_API_IP", "localhost")
-CRAWLER_API_PORT = "3002"
+CRAWLER_API_PORT = os.getenv("CRAWLER_API_PORT", "3002")
 CRAWLER_API_BASE_URL = f"http://{CRAWLER_API_IP}:{CRAWLER_API_PORT}/v1"
+CRAWLER_POOL_SIZE = int(os.getenv("CRAWLER_POOL_SIZE", "64"))  # 爬虫请求线程池/连接池大小
+
+# 批量爬取配置
+BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", "500"))
+BATCH_DEFAULT_CONCURRENCY = int(os.getenv("BATCH_DEFAULT_CONCURRENCY", "5"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "50"))
+BATCH_DEFAULT_DEADLINE = float(os.getenv("BATCH_DEFAULT_DEADLINE", "300"))  # 秒
+BATCH_MAX_DEADLINE = float(os.getenv("BATCH_MAX_DEADLINE", "1800"))  # 秒
+
+# 爬取归档与缓存配置（归档只追加、不自动清理，默认关闭）
+CRAWL_ARCHIVE_ENABLED = os.getenv("CRAWL_ARCHIVE_ENABLED", "false").lower() == "true"
+CRAWL_ARCHIVE_DIR = os.getenv("CRAWL_ARCHIVE_DIR", "data/crawl_archive")
+CRAWL_ARCHIVE_SEGMENT_MAX_BYTES = int(os.getenv("CRAWL_ARCHIVE_SEGMENT_MAX_BYTES", "268435456"))  # 256MB
+CRAWL_CACHE_TTL = float(os.getenv("CRAWL_CACHE_TTL", "0"))  # 秒，0表示不复用已有的爬取结果
+CRAWL_CACHE_MAX_ENTRIES = int(os.getenv("CRAWL_CACHE_MAX_ENTRIES", "1000"))
+
+# URL规范化：缓存、归档和新鲜度记录按规范化后的URL存取（规则文件格式见 src/core/util/url_canonical.py），
+# 别名索引从爬虫返回的最终URL学习跳转等规范化无法发现的别名（只学习路径相同的跳转），别名 URL_ALIAS_MAX_AGE 秒后过期
+URL_CANON_ENABLED = os.getenv("URL_CANON_ENABLED", "false").lower() == "true"
+URL_CANON_RULES_FILE = os.getenv("URL_CANON_RULES_FILE", "")
+URL_ALIAS_INDEX_PATH = os.getenv("URL_ALIAS_INDEX_PATH", "data/url_aliases.sqlite3")
+URL_ALIAS_MAX_AGE = float(os.getenv("URL_ALIAS_MAX_AGE", "604800"))  # 秒，默认7天，0表示不过期
+
+# 新鲜度检查：爬取前带 ETag/Last-Modified 向源站发条件请求，页面未变化时直接返回保存的提取结果；
+# 按域名的策略格式为 "域名=模式[:max_age],..."，模式为 revalidate / recrawl / off，max_age（秒）内不发请求
+FRESHNESS_ENABLED = os.getenv("FRESHNESS_ENABLED", "false").lower() == "true"
+FRESHNESS_STORE_PATH = os.getenv("FRESHNESS_STORE_PATH", "data/freshness.sqlite3")
+FRESHNESS_MAX_AGE = float(os.getenv("FRESHNESS_MAX_AGE", "604800"))  # 记录的最长使用时间（秒），超过后必须重新爬取，默认7天
+FRESHNESS_CHECK_TIMEOUT = float(os.getenv("FRESHNESS_CHECK_TIMEOUT", "5"))  # 条件请求的超时（秒）
+FRESHNESS_DEFAULT_POLICY = os.getenv("FRESHNESS_DEFAULT_POLICY", "revalidate:0")
+FRESHNESS_POLICIES = os.getenv("FRESHNESS_POLICIES", "")
+
+# 近似重复页面：按markdown的SimHash指纹查找之前提取过的相似页面（转载、模板页），
+# 汉明距离不超过 NEAR_DUP_REUSE_DISTANCE 时直接复用其提取结果，不超过 NEAR_DUP_MAX_DISTANCE 时
+# 照常交给LLM（按小节复用时只有不同的小节需要重新提取），-1 表示从不直接复用
+NEAR_DUP_ENABLED = os.getenv("NEAR_DUP_ENABLED", "false").lower() == "true"
+NEAR_DUP_INDEX_PATH = os.getenv("NEAR_DUP_INDEX_PATH", "data/near_dup.sqlite3")
+NEAR_DUP_MAX_DISTANCE = int(os.getenv("NEAR_DUP_MAX_DISTANCE", "4"))
+NEAR_DUP_REUSE_DISTANCE = int(os.getenv("NEAR_DUP_REUSE_DISTANCE", "1"))
+NEAR_DUP_MIN_LENGTH = int(os.getenv("NEAR_DUP_MIN_LENGTH", "500"))  # 短于此字符数的markdown不查找也不保存（指纹不可靠）
+NEAR_DUP_MAX_AGE = float(os.getenv("NEAR_DUP_MAX_AGE", "2592000"))  # 记录保留时间（秒），默认30天
+
+# 流量录制配置（设置目录后录制爬虫和LLM的请求/响应，用于离线回放）
+TRAFFIC_RECORD_DIR = os.getenv("TRAFFIC_RECORD_DIR", "")
+
+# 指标配置（各worker进程的指标文件目录，/metrics 汇总该目录下的全部文件）
+METRICS_DIR = os.getenv("METRICS_DIR", "data/metrics")
+
+# 链路追踪配置
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "")  # 空表示不导出，可选 file / otlp
+TRACE_FILE = os.getenv("TRACE_FILE", "logs/traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "http://127.0.0.1:4318/v1/traces")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))  # 新链路的采样率，上游传入的采样标志优先
+TRACE_SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "text-service")
 
 # 日志配置
 LOG_DIR = os.getenv("LOG_DIR", "logs")
@@ -27,6 +117,7 @@ LOG_ENABLE_CONSOLE_COLORS = os.getenv("LOG_ENABLE_CONSOLE_COLORS", "true").lower
 # Token价格配置（每百万token）
 INPUT_PRICE = 2.0  # ¥2/M tokens
 OUTPUT_PRICE = 10.0  # ¥10/M tokens
+CACHED_INPUT_PRICE = 1.0  # ¥1/M tokens（命中前缀缓存或上下文缓存的输入token）
 
 # 性能监控配置
 ENABLE_PERFORMANCE_LOGGING = os.getenv("ENABLE_PERFORMANCE_LOGGING", "true").lower() == "true"
@@ -35,4 +126,53 @@ SLOW_REQUEST_THRESHOLD = float(os.getenv("SLOW_REQUEST_THRESHOLD", "1000.0"))  #
 # 请求日志配置
 LOG_REQUEST_BODY = os.getenv("LOG_REQUEST_BODY", "true").lower() == "true"
 LOG_RESPONSE_BODY = os.getenv("LOG_RESPONSE_BODY", "false").lower() == "true"
-MAX_BODY_LOG_SIZE = int(os.getenv("MAX_BODY_LOG_SIZE", "1000"))  # 字符 
\ No newline at end of file
+MAX_BODY_LOG_SIZE = int(os.getenv("MAX_BODY_LOG_SIZE", "1000"))  # 字符 
+# 请求日志采样率（0-1）：成功且不慢的请求按此比例记录，错误和慢请求始终记录
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+# 请求日志缓冲：请求内低于 LOG_BUFFER_LEVEL 的日志（默认即DEBUG日志）先放入环形缓冲区，
+# 仅在请求失败、过慢或被采样时写出，否则只写一行请求摘要；performance 日志器的记录不缓冲
+LOG_BUFFER_ENABLED = os.getenv("LOG_BUFFER_ENABLED", "true").lower() == "true"
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "200"))  # 每个请求最多缓冲的日志条数
+LOG_BUFFER_LEVEL = os.getenv("LOG_BUFFER_LEVEL", "INFO")
+LOG_BUFFER_SAMPLE_RATE = float(os.getenv("LOG_BUFFER_SAMPLE_RATE", "0.01"))
+
+# 事件循环监控：心跳间隔和判定为阻塞的滞后阈值（毫秒），阻塞时记录事件循环线程的调用栈
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL", "50"))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", "200"))
+
+# 响应压缩：按请求的 Accept-Encoding 协商编码（多个编码可接受时按 COMPRESSION_ENCODINGS 的顺序优先），
+# 不小于 COMPRESSION_MIN_SIZE 字节的JSON/文本响应和流式响应（NDJSON）压缩；超过 COMPRESSION_THREAD_SIZE 字节的
+# 响应体在线程中压缩，避免阻塞事件循环。未安装 brotli / zstandard 时不提供对应编码
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip")
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # 字节
+COMPRESSION_THREAD_SIZE = int(os.getenv("COMPRESSION_THREAD_SIZE", "262144"))  # 字节
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+COMPRESSION_ZSTD_LEVEL = int(os.getenv("COMPRESSION_ZSTD_LEVEL", "3"))
+
+# 管理接口：Bearer令牌，为空时禁用 /admin/* 接口
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))  # 单次采样分析的最长时间（秒）
+
+# 步骤内存跟踪：按此比例抽样URL处理流程，用 tracemalloc 记录各步骤的峰值内存增量（0为关闭）
+MEMORY_TRACE_SAMPLE_RATE = float(os.getenv("MEMORY_TRACE_SAMPLE_RATE", "0"))
+MEMORY_TRACE_FRAMES = int(os.getenv("MEMORY_TRACE_FRAMES", "1"))  # 每次分配保存的栈帧数
+
+# 请求截止时间：客户端用 X-Request-Timeout（秒）声明，未声明时使用默认值，且不超过默认值
+REQUEST_DEFAULT_TIMEOUT = float(os.getenv("REQUEST_DEFAULT_TIMEOUT", "60"))
+
+# 幂等键（urlCrawl 的 Idempotency-Key 请求头）：配置Redis时各worker共享，否则使用进程内存储
+IDEMPOTENCY_REDIS_URL = os.getenv("IDEMPOTENCY_REDIS_URL", "")  # 如 redis://localhost:6379/0
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "3600"))  # 结果保留时间（秒）
+IDEMPOTENCY_LOCK_TTL = float(os.getenv("IDEMPOTENCY_LOCK_TTL", str(REQUEST_DEFAULT_TIMEOUT + 30)))  # 处理中标记的过期时间（秒）
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))  # 进程内存储的最大条目数
+
+# 准入控制（/api/v1/text/urlCrawl）：限制同时处理的请求数，预计无法在客户端超时前完成的请求返回429
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_INFLIGHT = int(os.getenv("ADMISSION_MAX_INFLIGHT", "32"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "128"))
+ADMISSION_MAX_QUEUE_WAIT = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT", "5"))  # 最长排队时间（秒），与客户端超时取较小者
+ADMISSION_INITIAL_SERVICE_TIME = float(os.getenv("ADMISSION_INITIAL_SERVICE_TIME", "5"))  # 秒
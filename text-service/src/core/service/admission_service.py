@@ -0,0 +1,160 @@
+import math
+import asyncio
+import logging
+from collections import deque
+from typing import Deque, Optional
+
+from src.config.settings import (
+    ADMISSION_MAX_INFLIGHT, ADMISSION_MAX_QUEUE, ADMISSION_MAX_QUEUE_WAIT, ADMISSION_INITIAL_SERVICE_TIME
+)
+from src.core.util.metrics import (
+    ADMISSION_INFLIGHT, ADMISSION_QUEUE_LENGTH, ADMISSION_QUEUE_SECONDS, ADMISSION_REJECTED
+)
+
+logger = logging.getLogger(__name__)
+
+class AdmissionRejected(Exception):
+    """请求未被接纳"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    """
+    准入控制：限制同时处理的请求数，超出的请求排队
+
+    用处理时间的指数移动平均估计排队等待时间，预计无法在客户端超时前完成的请求
+    立即拒绝（不占用爬虫和LLM资源），排队中的请求一旦剩余时间不足以完成处理也会被拒绝，
+    这样过载时已接纳的请求仍能按时完成，有效吞吐量保持在容量附近。
+
+    Args:
+        max_inflight: 同时处理的最大请求数
+        max_queue: 最大排队数
+        max_queue_wait: 最长排队时间（秒），限制过载时已接纳请求的延迟
+        initial_service_time: 没有样本时假设的单个请求处理时间（秒）
+        alpha: 处理时间移动平均的平滑系数
+    """
+
+    def __init__(
+        self,
+        max_inflight: int = ADMISSION_MAX_INFLIGHT,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        max_queue_wait: float = ADMISSION_MAX_QUEUE_WAIT,
+        initial_service_time: float = ADMISSION_INITIAL_SERVICE_TIME,
+        alpha: float = 0.1
+    ):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.max_queue_wait = max_queue_wait
+        self.service_time = initial_service_time
+        self.alpha = alpha
+        self.inflight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queue_length(self) -> int:
+        return len(self._waiters)
+
+    def estimate_wait(self, position: int) -> float:
+        """估计排在第 position 位（从0开始）的请求的等待时间（秒）"""
+        if self.inflight < self.max_inflight and position == 0:
+            return 0.0
+        # 所有处理槽位平均每 service_time / max_inflight 秒空出一个
+        return (position + 1) * self.service_time / self.max_inflight
+
+    def retry_after(self) -> int:
+        """建议客户端重试的等待时间（秒）：排队中的请求预计全部开始处理所需的时间"""
+        return max(1, math.ceil(self.estimate_wait(len(self._waiters))))
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTED.labels(reason).inc()
+        raise AdmissionRejected(reason, self.retry_after())
+
+    def admit_batch(self):
+        """
+        批量请求的入口检查：已有请求在排队（处理槽位已满）时拒绝整批
+
+        批量请求本身不占槽位，其中每个URL处理前各自获取槽位。
+
+        Raises:
+            AdmissionRejected: 已有请求在排队
+        """
+        if self._waiters:
+            self._reject("batch_busy")
+
+    async def acquire(self, timeout: float) -> float:
+        """
+        获取处理槽位
+
+        Args:
+            timeout: 客户端超时（秒），预计无法在此时间内完成时拒绝
+
+        Returns:
+            排队等待时间（秒）
+
+        Raises:
+            AdmissionRejected: 排队已满、预计超时或排队期间剩余时间不足
+        """
+        if self.inflight < self.max_inflight and not self._waiters:
+            self.inflight += 1
+            ADMISSION_INFLIGHT.set(self.inflight)
+            ADMISSION_QUEUE_SECONDS.observe(0.0)
+            return 0.0
+
+        position = len(self._waiters)
+        if position >= self.max_queue:
+            self._reject("queue_full")
+        max_wait = min(timeout - self.service_time, self.max_queue_wait)
+        if self.estimate_wait(position) > max_wait:
+            self._reject("deadline")
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        ADMISSION_QUEUE_LENGTH.set(len(self._waiters))
+        start = loop.time()
+        try:
+            await asyncio.wait_for(waiter, max_wait)
+        except asyncio.TimeoutError:
+            self._remove(waiter)
+            self._reject("queue_timeout")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 槽位已经交给本请求，但请求被取消（如客户端断开），归还槽位
+                self.release()
+            else:
+                self._remove(waiter)
+            raise
+        finally:
+            ADMISSION_QUEUE_LENGTH.set(len(self._waiters))
+        waited = loop.time() - start
+        ADMISSION_QUEUE_SECONDS.observe(waited)
+        return waited
+
+    def _remove(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self, service_time: Optional[float] = None):
+        """
+        归还处理槽位，有排队请求时直接交给队首
+
+        Args:
+            service_time: 可选，本次处理耗时（秒），用于更新处理时间估计
+        """
+        if service_time is not None:
+            self.service_time += self.alpha * (service_time - self.service_time)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                ADMISSION_QUEUE_LENGTH.set(len(self._waiters))
+                return
+        self.inflight -= 1
+        ADMISSION_INFLIGHT.set(self.inflight)
+
+admission_controller = AdmissionController()
@@ -0,0 +1,226 @@
+import math
+import time
+import asyncio
+import logging
+from typing import Dict, Any, List, AsyncIterator, Optional
+from fastapi import HTTPException
+
+from src.core.service.pipeline_service import run_url_pipeline
+from src.core.service.llm_scheduler import DEFAULT_TENANT, scheduling_scope
+from src.core.service.admission_service import AdmissionController, AdmissionRejected
+from src.config.logging_config import get_context_logger
+from src.core.util.metrics import URL_REQUESTS
+from src.core.util.deadline import deadline_scope, current_deadline
+
+logger = logging.getLogger(__name__)
+
+def _percentile(values: List[float], pct: float) -> float:
+    """计算百分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+async def run_batch(
+    urls: List[str],
+    request_id: str,
+    concurrency: int,
+    deadline: float,
+    priority: str = "bulk",
+    tenant: str = DEFAULT_TENANT,
+    admission: Optional[AdmissionController] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    以有界并发处理一批URL，按完成顺序逐条产出结果，最后产出汇总
+
+    Args:
+        urls: 要处理的URL列表
+        request_id: 批量请求ID，每个URL的请求ID为 {request_id}-{index}
+        concurrency: 最大并发数
+        deadline: 整批处理的截止时间（秒），超时未完成的URL会被取消
+        priority: LLM调用的调度优先级
+        tenant: LLM调用的调度租户
+        admission: 准入控制器，每个URL处理前获取一个槽位（与单URL请求共享 ADMISSION_MAX_INFLIGHT），
+            被拒绝的URL结果状态为 rejected（429）
+
+    Yields:
+        type为result的单URL结果，最后一条为type为summary的汇总
+    """
+    batch_logger = get_context_logger("batch.url_crawl", request_id=request_id)
+    semaphore = asyncio.Semaphore(concurrency)
+    batch_start = time.time()
+    loop = asyncio.get_running_loop()
+    # 请求头 X-Request-Timeout 声明的截止时间（见 DeadlineMiddleware）更早时以其为准
+    parent = current_deadline()
+    deadline_at = loop.time() + (min(deadline, parent.remaining()) if parent is not None else deadline)
+
+    batch_logger.info("开始批量处理URL", extra={
+        "event": "batch_start",
+        "url_count": len(urls),
+        "concurrency": concurrency,
+        "deadline": deadline
+    })
+
+    async def process_one(index: int, url: str) -> Dict[str, Any]:
+        item_request_id = f"{request_id}-{index}"
+        async with semaphore:
+            item_start = time.time()
+            if admission is not None:
+                try:
+                    await admission.acquire(deadline_at - loop.time())
+                except AdmissionRejected as e:
+                    return {
+                        "type": "result",
+                        "index": index,
+                        "url": url,
+                        "request_id": item_request_id,
+                        "status": "rejected",
+                        "code": 429,
+                        "msg": "服务繁忙，请稍后重试",
+                        "retry_after": e.retry_after,
+                        "latency_ms": (time.time() - item_start) * 1000,
+                        "cost": 0.0
+                    }
+            service_start = time.perf_counter()
+            try:
+                result = await run_url_pipeline(url, item_request_id)
+                return {
+                    "type": "result",
+                    "index": index,
+                    "url": url,
+                    "request_id": item_request_id,
+                    "status": "success",
+                    "code": 200,
+                    "data": result["response"].get("data", []),
+                    "latency_ms": (time.time() - item_start) * 1000,
+                    "timings": result["timings"],
+                    "cost": result["usage"].get("cost", 0.0),
+                    "usage": result["usage"]
+                }
+            except HTTPException as e:
+                return {
+                    "type": "result",
+                    "index": index,
+                    "url": url,
+                    "request_id": item_request_id,
+                    "status": "processing" if e.status_code == 202 else "error",
+                    "code": e.status_code,
+                    "msg": e.detail,
+                    "latency_ms": (time.time() - item_start) * 1000,
+                    "cost": 0.0
+                }
+            except Exception as e:
+                batch_logger.error("批量处理单个URL时发生未知错误", extra={
+                    "event": "batch_item_error",
+                    "index": index,
+                    "target_url": url,
+                    "error_type": type(e).__name__,
+                    "error_message": str(e)
+                }, exc_info=True)
+                return {
+                    "type": "result",
+                    "index": index,
+                    "url": url,
+                    "request_id": item_request_id,
+                    "status": "error",
+                    "code": 500,
+                    "msg": f"处理URL时发生错误: {str(e)}",
+                    "latency_ms": (time.time() - item_start) * 1000,
+                    "cost": 0.0
+                }
+            finally:
+                if admission is not None:
+                    admission.release(time.perf_counter() - service_start)
+
+    # 任务创建时继承截止时间和调度类别，各URL的爬取和LLM调用不会超出整批的截止时间
+    with deadline_scope(deadline), scheduling_scope(priority, tenant):
+        tasks = {asyncio.ensure_future(process_one(index, url)): (index, url) for index, url in enumerate(urls)}
+    pending = set(tasks)
+    results: List[Dict[str, Any]] = []
+
+    try:
+        while pending:
+            remaining = deadline_at - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                results.append(result)
+                URL_REQUESTS.labels("batch", result["status"]).inc()
+                yield result
+
+        # 截止时间到达，取消剩余任务
+        for task in pending:
+            task.cancel()
+            index, url = tasks[task]
+            result = {
+                "type": "result",
+                "index": index,
+                "url": url,
+                "request_id": f"{request_id}-{index}",
+                "status": "timeout",
+                "code": 504,
+                "msg": "批量处理截止时间已到",
+                "latency_ms": (time.time() - batch_start) * 1000,
+                "cost": 0.0
+            }
+            results.append(result)
+            URL_REQUESTS.labels("batch", "timeout").inc()
+            yield result
+    finally:
+        # 客户端断开时生成器被关闭，确保不遗留后台任务
+        for task in pending:
+            task.cancel()
+
+    total_time = (time.time() - batch_start) * 1000
+    latencies = [item["latency_ms"] for item in results]
+    total_cost = sum(item["cost"] for item in results)
+    status_counts: Dict[str, int] = {}
+    for item in results:
+        status_counts[item["status"]] = status_counts.get(item["status"], 0) + 1
+
+    summary = {
+        "type": "summary",
+        "request_id": request_id,
+        "total": len(urls),
+        "succeeded": status_counts.get("success", 0),
+        "failed": status_counts.get("error", 0),
+        "processing": status_counts.get("processing", 0),
+        "timed_out": status_counts.get("timeout", 0),
+        "rejected": status_counts.get("rejected", 0),
+        "concurrency": concurrency,
+        "total_time_ms": total_time,
+        "throughput": len(results) / (total_time / 1000) if total_time > 0 else 0.0,
+        "latency_ms": {
+            "avg": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": _percentile(latencies, 50),
+            "p95": _percentile(latencies, 95),
+            "max": max(latencies) if latencies else 0.0
+        },
+        "total_cost": total_cost,
+        "avg_cost": total_cost / len(results) if results else 0.0,
+        "per_url": [
+            {
+                "index": item["index"],
+                "url": item["url"],
+                "status": item["status"],
+                "latency_ms": item["latency_ms"],
+                "cost": item["cost"]
+            }
+            for item in sorted(results, key=lambda item: item["index"])
+        ]
+    }
+
+    batch_logger.info("批量处理完成", extra={
+        "event": "batch_complete",
+        "total": summary["total"],
+        "succeeded": summary["succeeded"],
+        "failed": summary["failed"],
+        "timed_out": summary["timed_out"],
+        "total_time": total_time,
+        "total_cost": total_cost
+    })
+
+    yield summary
@@ -0,0 +1,294 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import tarfile
+import zipfile
+import threading
+from contextlib import ExitStack, closing, suppress
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterator, AsyncIterator, Tuple, Callable, Optional, Set
+
+from src.core.service.openai_service import process_with_openai, format_api_response, PROMPT_VERSION
+from src.core.service.crawl_cache_service import build_crawl_result
+from src.core.service.llm_scheduler import scheduling_scope
+from src.core.util.crawl_archive import CrawlArchive, is_archive_dir
+from src.config.logging_config import get_context_logger
+
+logger = logging.getLogger(__name__)
+
+# (条目ID, 读取函数)；读取函数在线程池中执行，返回爬取结果字典
+CorpusItem = Tuple[str, Callable[[], Dict[str, Any]]]
+
+def _load_json_file(path: str) -> Callable[[], Dict[str, Any]]:
+    def load() -> Dict[str, Any]:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    return load
+
+def _load_zip_member(path: str, member: str) -> Callable[[], Dict[str, Any]]:
+    def load() -> Dict[str, Any]:
+        with zipfile.ZipFile(path) as archive:
+            return json.loads(archive.read(member).decode("utf-8"))
+    return load
+
+def _iter_jsonl(path: str, item_prefix: str) -> Iterator[CorpusItem]:
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if line:
+                yield f"{item_prefix}#{line_no}", (lambda line=line: json.loads(line))
+
+def _iter_file(path: str, item_id: str) -> Iterator[CorpusItem]:
+    lower = path.lower()
+    if lower.endswith(".json"):
+        yield item_id, _load_json_file(path)
+    elif lower.endswith(".jsonl"):
+        yield from _iter_jsonl(path, item_id)
+    elif lower.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for member in sorted(archive.namelist()):
+                if member.lower().endswith(".json"):
+                    yield f"{item_id}::{member}", _load_zip_member(path, member)
+    elif lower.endswith((".tar", ".tar.gz", ".tgz")):
+        # 压缩tar不支持随机访问，按顺序读取成员内容，JSON解析仍在线程池中进行
+        with tarfile.open(path, "r|*") as archive:
+            for member in archive:
+                if member.isfile() and member.name.lower().endswith(".json"):
+                    raw = archive.extractfile(member).read()
+                    yield f"{item_id}::{member.name}", (lambda raw=raw: json.loads(raw.decode("utf-8")))
+
+def _iter_archive(path: str, resources: ExitStack) -> Iterator[CorpusItem]:
+    # 读取函数在遍历结束后仍会执行，归档由调用方在所有读取完成后关闭
+    archive = resources.enter_context(closing(CrawlArchive(path)))
+    for entry in archive.scan(latest_only=True):
+        load = (lambda entry=entry: build_crawl_result(entry.url, archive.read(entry), entry.crawl_time))
+        # 条目ID包含内容哈希，页面内容变化后会重新处理
+        yield f"{entry.url}@{entry.content_hash[:16]}", load
+
+def iter_corpus(source: str, resources: ExitStack) -> Iterator[CorpusItem]:
+    """
+    遍历爬取结果语料
+
+    支持爬取归档目录（每个URL的最新版本）、单个文件或目录（递归），文件格式支持
+    .json、.jsonl（每行一个爬取结果）、.zip 和 .tar/.tar.gz/.tgz 归档（其中的 .json 成员）。
+
+    Args:
+        source: 文件或目录路径
+        resources: 读取函数依赖的资源（如打开的爬取归档）登记在此，调用方在所有读取函数执行完后关闭
+
+    Yields:
+        (条目ID, 读取函数)，条目ID相对于source，重跑时保持稳定
+    """
+    if os.path.isfile(source):
+        yield from _iter_file(source, os.path.basename(source))
+        return
+
+    if is_archive_dir(source):
+        yield from _iter_archive(source, resources)
+        return
+
+    for root, dirs, files in os.walk(source):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            yield from _iter_file(path, os.path.relpath(path, source))
+
+async def _iter_in_executor(executor: ThreadPoolExecutor, items: Iterator[CorpusItem]) -> AsyncIterator[CorpusItem]:
+    """在线程池中逐个取出条目：遍历目录、读取zip目录和tar成员不阻塞事件循环"""
+    loop = asyncio.get_running_loop()
+    while True:
+        item = await loop.run_in_executor(executor, next, items, None)
+        if item is None:
+            return
+        yield item
+
+class Manifest:
+    """
+    追加写的处理清单（JSONL）
+
+    每处理完一个条目追加一行记录，重跑时跳过当前提示词版本下已成功的条目。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.completed: Set[str] = set()
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 进程中断可能留下写了一半的最后一行
+                        continue
+                    if record.get("status") == "done":
+                        self.completed.add(record["key"])
+
+        self._file = open(path, "a", encoding="utf-8")
+
+    @staticmethod
+    def make_key(item_id: str, prompt_version: str) -> str:
+        return f"{prompt_version}:{item_id}"
+
+    def is_done(self, key: str) -> bool:
+        return key in self.completed
+
+    def append(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            if record.get("status") == "done":
+                self.completed.add(record["key"])
+
+    def close(self):
+        self._file.close()
+
+def _output_path(output_dir: str, item_id: str) -> str:
+    safe_name = re.sub(r"[^\w.\-]+", "_", item_id).strip("_") or "item"
+    if not safe_name.endswith(".json"):
+        safe_name += ".json"
+    return os.path.join(output_dir, "results", safe_name)
+
+def _write_json(path: str, data: Dict[str, Any]):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, path)
+
+async def process_corpus(
+    source: str,
+    output_dir: str,
+    concurrency: int = 8,
+    workers: int = 4,
+    limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    并发重处理语料中的爬取结果
+
+    语料遍历、文件读取和JSON解析在线程池中执行，LLM调用使用异步客户端并受 concurrency 限制。
+    进度写入 output_dir/manifest.jsonl，重跑时跳过已完成的条目。
+
+    Args:
+        source: 语料文件或目录
+        output_dir: 输出目录（结果文件和清单）
+        concurrency: 同时进行的LLM调用数
+        workers: 读取文件的线程数
+        limit: 最多处理的条目数（不含跳过的条目）
+
+    Returns:
+        汇总统计
+    """
+    corpus_logger = get_context_logger("corpus.process", source=source, prompt_version=PROMPT_VERSION)
+    os.makedirs(os.path.join(output_dir, "results"), exist_ok=True)
+    manifest = Manifest(os.path.join(output_dir, "manifest.jsonl"))
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="corpus-io")
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    stats = {
+        "prompt_version": PROMPT_VERSION,
+        "processed": 0,
+        "succeeded": 0,
+        "failed": 0,
+        "skipped": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cost": 0.0
+    }
+
+    corpus_logger.info("开始离线重处理", extra={
+        "event": "corpus_start",
+        "output_dir": output_dir,
+        "concurrency": concurrency,
+        "workers": workers
+    })
+
+    async def process_item(item_id: str, load: Callable[[], Dict[str, Any]]):
+        key = Manifest.make_key(item_id, PROMPT_VERSION)
+        item_start = time.time()
+        usage: Dict[str, Any] = {}
+        record = {"key": key, "item_id": item_id, "prompt_version": PROMPT_VERSION}
+        try:
+            crawl_result = await loop.run_in_executor(executor, load)
+            # 离线重处理的LLM调用使用最低优先级
+            with scheduling_scope("backfill", "corpus"):
+                processed_data = await process_with_openai(crawl_result, f"corpus-{item_id}", usage=usage)
+            api_response = format_api_response(processed_data)
+            output_path = _output_path(output_dir, item_id)
+            await loop.run_in_executor(executor, _write_json, output_path, api_response)
+            record.update({"status": "done", "output": os.path.relpath(output_path, output_dir)})
+            stats["succeeded"] += 1
+        except Exception as e:
+            error = getattr(e, "detail", None) or str(e)
+            record.update({"status": "failed", "error": f"{type(e).__name__}: {error}"})
+            stats["failed"] += 1
+            corpus_logger.error("条目处理失败", extra={
+                "event": "corpus_item_failed",
+                "item_id": item_id,
+                "error_type": type(e).__name__,
+                "error_message": str(error)
+            })
+
+        stats["processed"] += 1
+        stats["input_tokens"] += usage.get("input_tokens", 0)
+        stats["output_tokens"] += usage.get("output_tokens", 0)
+        stats["cost"] += usage.get("cost", 0.0)
+        record.update({
+            "input_tokens": usage.get("input_tokens", 0),
+            "output_tokens": usage.get("output_tokens", 0),
+            "cost": usage.get("cost", 0.0),
+            "elapsed_ms": (time.time() - item_start) * 1000,
+            "finished_at": time.time()
+        })
+        await loop.run_in_executor(executor, manifest.append, record)
+
+    async def bounded(item_id: str, load: Callable[[], Dict[str, Any]]):
+        try:
+            await process_item(item_id, load)
+        finally:
+            semaphore.release()
+
+    start_time = time.time()
+    tasks = set()
+    scheduled = 0
+    resources = ExitStack()
+    items = iter_corpus(source, resources)
+    try:
+        async for item_id, load in _iter_in_executor(executor, items):
+            if manifest.is_done(Manifest.make_key(item_id, PROMPT_VERSION)):
+                stats["skipped"] += 1
+                continue
+            if limit is not None and scheduled >= limit:
+                break
+            # 先获取信号量再创建任务，避免大语料一次性创建大量任务
+            await semaphore.acquire()
+            task = asyncio.ensure_future(bounded(item_id, load))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            scheduled += 1
+        if tasks:
+            await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        manifest.close()
+        executor.shutdown(wait=False)
+        # 处理被取消时线程池中可能仍在取下一个条目，此时无法关闭遍历，由垃圾回收关闭
+        with suppress(ValueError):
+            items.close()
+        resources.close()
+
+    elapsed = time.time() - start_time
+    stats["elapsed_seconds"] = elapsed
+    stats["throughput"] = stats["processed"] / elapsed if elapsed > 0 else 0.0
+
+    corpus_logger.info("离线重处理完成", extra={"event": "corpus_complete", **stats})
+    return stats
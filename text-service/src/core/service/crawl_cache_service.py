@@ -0,0 +1,115 @@
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from src.core.util.crawl_archive import CrawlArchive
+from src.config.logging_config import get_context_logger
+from src.config.settings import (
+    CRAWL_ARCHIVE_ENABLED, CRAWL_ARCHIVE_DIR, CRAWL_ARCHIVE_SEGMENT_MAX_BYTES,
+    CRAWL_CACHE_TTL, CRAWL_CACHE_MAX_ENTRIES
+)
+
+logger = logging.getLogger(__name__)
+
+_archive: Optional[CrawlArchive] = None
+
+def get_archive() -> Optional[CrawlArchive]:
+    """获取进程内共享的爬取归档，未启用时返回None"""
+    global _archive
+    if _archive is None and CRAWL_ARCHIVE_ENABLED:
+        _archive = CrawlArchive(CRAWL_ARCHIVE_DIR, segment_max_bytes=CRAWL_ARCHIVE_SEGMENT_MAX_BYTES)
+    return _archive
+
+def build_crawl_result(url: str, markdown: str, crawl_time: float) -> Dict[str, Any]:
+    """由归档内容构造与爬虫服务一致的爬取结果"""
+    return {
+        "success": True,
+        "status": "completed",
+        "completed": 1,
+        "total": 1,
+        "archived_at": crawl_time,
+        "data": [{"markdown": markdown, "url": url, "sourceURL": url}]
+    }
+
+class CrawlCache:
+    """
+    两级爬取结果缓存
+
+    热层为进程内LRU，冷层为磁盘归档（按URL的最新一次爬取）。
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._hot: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _put_hot(self, url: str, crawl_time: float, crawl_result: Dict[str, Any]):
+        self._hot[url] = (crawl_time, crawl_result)
+        self._hot.move_to_end(url)
+        while len(self._hot) > self.max_entries:
+            self._hot.popitem(last=False)
+
+    async def get(self, url: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        查找未过期的爬取结果
+
+        Returns:
+            (命中层级 hot/cold, 爬取结果)，未命中时返回None
+        """
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        cached = self._hot.get(url)
+        if cached is not None:
+            crawl_time, crawl_result = cached
+            if now - crawl_time <= self.ttl:
+                self._hot.move_to_end(url)
+                return "hot", crawl_result
+            del self._hot[url]
+
+        archive = get_archive()
+        if archive is None:
+            return None
+
+        found = await asyncio.to_thread(archive.get, url, self.ttl)
+        if found is None:
+            return None
+
+        entry, markdown = found
+        crawl_result = build_crawl_result(url, markdown, entry.crawl_time)
+        self._put_hot(url, entry.crawl_time, crawl_result)
+        return "cold", crawl_result
+
+    async def put(self, url: str, crawl_result: Dict[str, Any]):
+        """记录一次新的爬取结果（写入热层并追加到归档）"""
+        data = crawl_result.get("data") or []
+        if not data or "markdown" not in data[0]:
+            return
+
+        crawl_time = time.time()
+        if self.enabled:
+            self._put_hot(url, crawl_time, crawl_result)
+
+        archive = get_archive()
+        if archive is None:
+            return
+
+        try:
+            await asyncio.to_thread(archive.append, url, data[0]["markdown"], crawl_time)
+        except Exception as e:
+            # 归档失败不影响请求本身
+            cache_logger = get_context_logger("crawl_cache.archive", url=url)
+            cache_logger.error("爬取结果归档失败", extra={
+                "event": "crawl_archive_failed",
+                "error_type": type(e).__name__,
+                "error_message": str(e)
+            }, exc_info=True)
+
+crawl_cache = CrawlCache(ttl=CRAWL_CACHE_TTL, max_entries=CRAWL_CACHE_MAX_ENTRIES)
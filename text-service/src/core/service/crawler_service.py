@@ -2,12 +2,18 @@ import logging
 import json
 import requests
 import asyncio
+import functools
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any
 from fastapi import HTTPException
 
-from src.config.settings import CRAWLER_API_BASE_URL
+from src.config.settings import CRAWLER_API_BASE_URL, CRAWLER_POOL_SIZE
 from src.config.logging_config import get_context_logger
+from src.core.util.cassette import get_recorder
+from src.core.util.metrics import CRAWLER_REQUESTS, CRAWLER_POLLS_PER_JOB, DEADLINE_EXCEEDED
+from src.core.util.tracing import span, inject_headers
+from src.core.util.deadline import remaining_timeout, can_finish
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +23,32 @@ DISABLE_PROXIES = {
     'https': None
 }
 
+# 共享的HTTP会话（复用连接池）
+_session = requests.Session()
+_session.mount("http://", requests.adapters.HTTPAdapter(pool_maxsize=CRAWLER_POOL_SIZE))
+_session.mount("https://", requests.adapters.HTTPAdapter(pool_maxsize=CRAWLER_POOL_SIZE))
+
+# requests是阻塞库，放到专用线程池中执行，避免阻塞事件循环
+_executor = ThreadPoolExecutor(max_workers=CRAWLER_POOL_SIZE, thread_name_prefix="crawler")
+
+async def _run_blocking(func, *args, **kwargs):
+    """在爬虫线程池中执行阻塞的HTTP调用"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+def _response_body(response: requests.Response) -> Any:
+    """录制用：响应体能解析为JSON时返回对象，否则返回文本"""
+    try:
+        return response.json()
+    except ValueError:
+        return response.text
+
+def _relative_path(url: str) -> str:
+    """录制用：把结果URL转换为相对爬虫API的路径，便于回放时匹配"""
+    if "/crawl/" in url:
+        return "/crawl/" + url.rsplit("/crawl/", 1)[-1]
+    return url
+
 async def crawl_url(url: str, limit: int = 2000) -> Dict[str, Any]:
     """
     向爬虫API发送爬取请求
@@ -49,19 +81,24 @@ async def crawl_url(url: str, limit: int = 2000) -> Dict[str, Any]:
     start_time = time.time()
     
     try:
+        # 超时取剩余时间与30秒的较小者，超时日志记录实际使用的值
+        request_timeout = remaining_timeout(30, "crawl")
         crawler_logger.debug("发送HTTP请求", extra={
             "event": "http_request_start",
             "endpoint": f"{CRAWLER_API_BASE_URL}/crawl",
             "payload": payload
         })
         
-        response = requests.post(
-            f"{CRAWLER_API_BASE_URL}/crawl",
-            headers={"Content-Type": "application/json"},
-            json=payload,
-            timeout=30,
-            proxies=DISABLE_PROXIES
-        )
+        with span("crawler.create_job", kind="client", **{"http.method": "POST"}) as http_span:
+            response = await _run_blocking(
+                _session.post,
+                f"{CRAWLER_API_BASE_URL}/crawl",
+                headers=inject_headers({"Content-Type": "application/json"}),
+                json=payload,
+                timeout=request_timeout,
+                proxies=DISABLE_PROXIES
+            )
+            http_span.set_attribute("http.status_code", response.status_code)
         
         request_time = (time.time() - start_time) * 1000
         
@@ -72,6 +109,13 @@ async def crawl_url(url: str, limit: int = 2000) -> Dict[str, Any]:
             "response_size": len(response.content)
         })
         
+        CRAWLER_REQUESTS.labels("crawl", response.status_code).inc()
+        
+        recorder = get_recorder()
+        if recorder is not None:
+            recorder.record("crawler", "POST", "/crawl", payload, response.status_code,
+                            _response_body(response), request_time)
+        
         if response.status_code == 200:
             data = response.json()
             if data.get("success"):
@@ -109,11 +153,14 @@ async def crawl_url(url: str, limit: int = 2000) -> Dict[str, Any]:
         request_time = (time.time() - start_time) * 1000
         crawler_logger.error("爬取请求超时", extra={
             "event": "crawl_request_timeout",
-            "timeout": 30,
+            "timeout": request_timeout,
             "request_time": request_time
         })
         raise HTTPException(status_code=504, detail="爬虫服务请求超时")
         
+    except HTTPException:
+        raise
+        
     except requests.ConnectionError as e:
         request_time = (time.time() - start_time) * 1000
         crawler_logger.error("连接爬虫服务失败", extra={
@@ -181,17 +228,29 @@ async def get_crawl_result(result_url: str) -> Dict[str, Any]:
                 "elapsed_time": asyncio.get_event_loop().time() - start_time
             })
             
-            response = requests.get(
-                result_url, 
-                timeout=30,
-                proxies=DISABLE_PROXIES
-            )
+            request_timeout = remaining_timeout(30, "poll")
+            with span("crawler.poll", kind="client", attempt=retry_count, **{"http.method": "GET"}) as poll_span:
+                response = await _run_blocking(
+                    _session.get,
+                    result_url,
+                    headers=inject_headers(),
+                    timeout=request_timeout,
+                    proxies=DISABLE_PROXIES
+                )
+                poll_span.set_attribute("http.status_code", response.status_code)
             
             request_time = (time.time() - request_start) * 1000
+            CRAWLER_REQUESTS.labels("poll", response.status_code).inc()
+            
+            recorder = get_recorder()
+            if recorder is not None:
+                recorder.record("crawler", "GET", _relative_path(result_url), None, response.status_code,
+                                _response_body(response), request_time)
             
             if response.status_code == 200:
                 data = response.json()
                 status = data.get("status")
+                poll_span.set_attribute("crawl.status", str(status))
                 
                 result_logger.debug("收到轮询响应", extra={
                     "event": "polling_response",
@@ -202,6 +261,7 @@ async def get_crawl_result(result_url: str) -> Dict[str, Any]:
                 
                 if status == "completed":
                     total_time = asyncio.get_event_loop().time() - start_time
+                    CRAWLER_POLLS_PER_JOB.observe(retry_count)
                     
                     # 分析结果数据
                     data_count = len(data.get("data", []))
@@ -244,7 +304,18 @@ async def get_crawl_result(result_url: str) -> Dict[str, Any]:
                     "status": status,
                     "elapsed_time": elapsed_time
                 })
-                await asyncio.sleep(1)
+                # 剩余时间不够再轮询一次时按任务进行中返回202，客户端可以凭结果URL继续获取
+                if not can_finish(1):
+                    DEADLINE_EXCEEDED.labels("poll_wait").inc()
+                    result_logger.info("剩余时间不够再轮询一次，任务仍在进行中", extra={
+                        "event": "polling_deadline",
+                        "elapsed_time": elapsed_time,
+                        "retry_count": retry_count,
+                        "status": status
+                    })
+                    raise HTTPException(status_code=202, detail="爬取任务进行中")
+                with span("crawler.poll_wait", attempt=retry_count):
+                    await asyncio.sleep(1)
                 continue
                 
             else:
@@ -268,7 +339,7 @@ async def get_crawl_result(result_url: str) -> Dict[str, Any]:
             result_logger.error("获取结果请求超时", extra={
                 "event": "get_result_timeout",
                 "retry_count": retry_count,
-                "timeout": 30
+                "timeout": request_timeout
             })
             raise HTTPException(status_code=504, detail="获取爬取结果超时")
             
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from src.config.settings import (
+    LLM_PACKING_ENABLED, LLM_PACKING_PRIORITIES, LLM_PACKING_MAX_CHARS, LLM_PACKING_MAX_DOCUMENTS,
+    LLM_PACKING_BUDGET_CHARS, LLM_PACKING_WAIT
+)
+from src.core.service.llm_scheduler import current_work
+from src.core.util.metrics import LLM_PACKING_DOCUMENTS, LLM_PACKING_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+class PackedDocument:
+    """打包中的一个文档，flush 函数处理后设置 future 的结果"""
+
+    __slots__ = ("content", "context", "future")
+
+    def __init__(self, content: str, context: Any, future: asyncio.Future):
+        self.content = content
+        self.context = context
+        self.future = future
+
+# 一次打包调用：提取全部文档并设置各文档的结果
+Flush = Callable[[List[PackedDocument]], Awaitable[None]]
+
+class _Pack:
+    __slots__ = ("documents", "chars", "timer")
+
+    def __init__(self):
+        self.documents: List[PackedDocument] = []
+        self.chars = 0
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+class DocumentPacker:
+    """
+    短文档的打包提取
+
+    同一分组（提示词形式相同）的短文档在第一个文档到达后等待 wait 秒，合并为一次LLM调用，
+    文档数达到 max_documents 或内容超过 budget_chars 个字符时提前发出。窗口内只有一个文档时不打包，
+    由调用方照常提取。flush 函数负责调用和按文档拆分结果，没有设置结果的文档（包括调用失败时的
+    全部文档）结果为None，由调用方单独提取。只有 priorities 中的优先级（批量任务）打包，
+    交互请求不等待。
+
+    Args:
+        enabled: 是否启用
+        priorities: 打包的调度优先级，逗号分隔
+        max_chars: 超过此字符数的文档不打包
+        max_documents: 每次调用的最大文档数
+        budget_chars: 每次调用的文档内容总字符数上限
+        wait: 等待更多文档的时间（秒）
+    """
+
+    def __init__(
+        self,
+        enabled: bool = LLM_PACKING_ENABLED,
+        priorities: str = LLM_PACKING_PRIORITIES,
+        max_chars: int = LLM_PACKING_MAX_CHARS,
+        max_documents: int = LLM_PACKING_MAX_DOCUMENTS,
+        budget_chars: int = LLM_PACKING_BUDGET_CHARS,
+        wait: float = LLM_PACKING_WAIT
+    ):
+        self.enabled = enabled
+        self.priorities = {item.strip() for item in priorities.split(",") if item.strip()}
+        self.max_chars = max_chars
+        self.max_documents = max_documents
+        self.budget_chars = budget_chars
+        self.wait = wait
+        self._packs: Dict[Hashable, _Pack] = {}
+        # 进行中的打包调用，保持引用直到完成
+        self._tasks: Set[asyncio.Task] = set()
+
+    def accepts(self, content: str) -> bool:
+        """当前上下文中的这个文档是否打包"""
+        return (
+            self.enabled and self.max_documents > 1 and len(content) <= self.max_chars
+            and current_work()[0] in self.priorities
+        )
+
+    async def submit(self, group: Hashable, content: str, context: Any, flush: Flush) -> Any:
+        """
+        加入分组的下一次打包调用并等待结果
+
+        Args:
+            group: 分组键，只有同一分组的文档合并（同一分组的 flush 应当相同）
+            content: 文档内容
+            context: flush 函数拆分和校验结果所需的信息
+            flush: 打包调用函数
+
+        Returns:
+            flush 设置的结果；未打包或未设置结果时为None
+        """
+        loop = asyncio.get_running_loop()
+        pack = self._packs.get(group)
+        if pack is not None and pack.chars + len(content) > self.budget_chars:
+            self._flush(group, flush)
+            pack = None
+        if pack is None:
+            pack = self._packs[group] = _Pack()
+            # 定时器在当前上下文中触发，打包调用继承第一个文档的截止时间和调度类别
+            pack.timer = loop.call_later(self.wait, self._flush, group, flush, pack)
+        document = PackedDocument(content, context, loop.create_future())
+        pack.documents.append(document)
+        pack.chars += len(content)
+        if len(pack.documents) >= self.max_documents:
+            self._flush(group, flush)
+        return await document.future
+
+    def _flush(self, group: Hashable, flush: Flush, expected: Optional[_Pack] = None):
+        pack = self._packs.get(group)
+        if pack is None or (expected is not None and pack is not expected):
+            return
+        del self._packs[group]
+        if pack.timer is not None:
+            pack.timer.cancel()
+        documents = [document for document in pack.documents if not document.future.done()]
+        if len(documents) < 2:
+            LLM_PACKING_DOCUMENTS.labels("unpacked").inc(len(documents))
+            for document in documents:
+                document.future.set_result(None)
+            return
+        LLM_PACKING_BATCH_SIZE.observe(len(documents))
+        task = asyncio.ensure_future(self._run(flush, documents))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, flush: Flush, documents: List[PackedDocument]):
+        try:
+            await flush(documents)
+        except Exception as e:
+            LLM_PACKING_DOCUMENTS.labels("error").inc(len(documents))
+            logger.warning("打包提取失败，各文档单独提取", extra={
+                "event": "llm_packing_failed",
+                "documents": len(documents),
+                "error_type": type(e).__name__,
+                "error_message": str(getattr(e, "detail", None) or e)
+            })
+        finally:
+            for document in documents:
+                if not document.future.done():
+                    document.future.set_result(None)
+
+document_packer = DocumentPacker()
@@ -0,0 +1,286 @@
+import time
+import asyncio
+import logging
+from typing import Any, Dict, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from src.config.settings import (
+    FRESHNESS_ENABLED, FRESHNESS_STORE_PATH, FRESHNESS_MAX_AGE, FRESHNESS_CHECK_TIMEOUT,
+    FRESHNESS_POLICIES, FRESHNESS_DEFAULT_POLICY
+)
+from src.config.logging_config import get_context_logger
+from src.core.service.openai_service import PROMPT_VERSION
+from src.core.util.freshness_store import FreshnessStore, fingerprint
+from src.core.util.deadline import remaining_timeout
+from src.core.util.metrics import FRESHNESS_CHECKS
+
+logger = logging.getLogger(__name__)
+
+# revalidate: 超过 max_age 后向源站发条件请求，未变化时直接返回保存的提取结果
+# recrawl:    超过 max_age 后总是重新爬取（适用于校验器不可靠的站点），markdown未变化时仍跳过LLM
+# off:        不检查也不保存
+FRESHNESS_MODES = ("revalidate", "recrawl", "off")
+
+class FreshnessPolicy(NamedTuple):
+    mode: str
+    max_age: float  # 距上次确认新鲜的时间在此之内（秒）时不发任何请求，直接返回保存的结果
+
+def parse_policy(spec: str) -> FreshnessPolicy:
+    """解析 "模式[:max_age]" 格式的策略"""
+    mode, _, max_age = spec.strip().partition(":")
+    mode = mode.strip().lower()
+    if mode not in FRESHNESS_MODES:
+        raise ValueError(f"未知的新鲜度检查模式: {mode}")
+    return FreshnessPolicy(mode, float(max_age) if max_age.strip() else 0.0)
+
+def parse_domain_policies(spec: str) -> Dict[str, FreshnessPolicy]:
+    """解析 "域名=模式[:max_age],..." 格式的按域名策略，忽略不合法的条目"""
+    policies = {}
+    for item in spec.split(","):
+        domain, _, policy = item.partition("=")
+        domain = domain.strip().lower().lstrip(".")
+        if not domain:
+            continue
+        try:
+            policies[domain] = parse_policy(policy)
+        except ValueError:
+            logger.warning("忽略不合法的新鲜度策略", extra={
+                "event": "freshness_policy_invalid",
+                "policy": item.strip()
+            })
+    return policies
+
+class FreshnessCheck:
+    """一次新鲜度检查的结果，由 check() 返回，之后传给 content_unchanged() 和 record()"""
+
+    __slots__ = (
+        "url", "fetch_url", "result", "policy", "record", "response", "etag", "last_modified", "page_fingerprint", "probe"
+    )
+
+    def __init__(self, url: str, fetch_url: str, result: str, policy: FreshnessPolicy,
+                 record: Optional[Dict[str, Any]] = None):
+        # url 为记录的键（规范键），fetch_url 为向源站请求的地址（请求中的原URL）
+        self.url = url
+        self.fetch_url = fetch_url
+        self.result = result
+        self.policy = policy
+        self.record = record
+        # 页面未变化时为保存的提取结果，可直接返回
+        self.response: Optional[Dict[str, Any]] = None
+        # 本次向源站请求得到的校验器和页面指纹（爬取之前取得，保存后用于下次的条件请求）
+        self.etag: Optional[str] = None
+        self.last_modified: Optional[str] = None
+        self.page_fingerprint: Optional[str] = None
+        # 没有记录时与爬取并行获取校验器的任务
+        self.probe: Optional[asyncio.Task] = None
+
+class FreshnessChecker:
+    """
+    爬取前的新鲜度检查
+
+    URL有记录且提示词版本相同时，按域名策略判断是否可以直接返回保存的提取结果：
+    距上次确认新鲜不超过 max_age 时直接返回；否则（revalidate）带 If-None-Match /
+    If-Modified-Since 向源站发条件请求，源站返回304、ETag相同或页面内容指纹相同时视为未变化。
+    需要重新爬取时，爬取得到的markdown指纹与记录相同则跳过LLM。
+    源站请求失败时按页面已变化处理（重新爬取），不影响请求本身。
+
+    Args:
+        enabled: 是否启用（未启用时流程不调用检查）
+        store_path: 记录存储路径（SQLite）
+        max_age: 记录的最长使用时间（秒，从爬取时算起），超过后必须重新爬取
+        policies: 按域名的策略，子域名继承上级域名的策略
+        default_policy: 未配置域名的策略
+        check_timeout: 条件请求的超时（秒）
+    """
+
+    def __init__(
+        self,
+        enabled: bool = FRESHNESS_ENABLED,
+        store_path: str = FRESHNESS_STORE_PATH,
+        max_age: float = FRESHNESS_MAX_AGE,
+        policies: Optional[Dict[str, FreshnessPolicy]] = None,
+        default_policy: Optional[FreshnessPolicy] = None,
+        check_timeout: float = FRESHNESS_CHECK_TIMEOUT
+    ):
+        self.enabled = enabled
+        self.store_path = store_path
+        self.max_age = max_age
+        self.policies = parse_domain_policies(FRESHNESS_POLICIES) if policies is None else dict(policies)
+        self.default_policy = parse_policy(FRESHNESS_DEFAULT_POLICY) if default_policy is None else default_policy
+        self.check_timeout = check_timeout
+        self._store: Optional[FreshnessStore] = None
+        self._session = requests.Session()
+
+    def get_store(self) -> FreshnessStore:
+        if self._store is None:
+            self._store = FreshnessStore(self.store_path, self.max_age)
+        return self._store
+
+    def policy_for(self, url: str) -> FreshnessPolicy:
+        """按主机名匹配最具体的域名策略（a.b.example.com 依次匹配自身、b.example.com、example.com）"""
+        host = (urlsplit(url).hostname or "").lower()
+        while host:
+            policy = self.policies.get(host)
+            if policy is not None:
+                return policy
+            _, _, host = host.partition(".")
+        return self.default_policy
+
+    async def check(self, url: str, fetch_url: Optional[str] = None) -> FreshnessCheck:
+        """
+        爬取前检查URL的页面是否有变化
+
+        Args:
+            url: 记录的键（规范键）
+            fetch_url: 向源站发请求的地址，默认为 url
+
+        Returns:
+            FreshnessCheck，response 不为None时页面未变化，可直接返回；
+            result 为 fresh / not_modified / unchanged（未变化），changed / expired / unknown / error（需要爬取）或 off
+        """
+        policy = self.policy_for(url)
+        if policy.mode == "off":
+            return FreshnessCheck(url, fetch_url or url, "off", policy)
+
+        store = self.get_store()
+        record = await asyncio.to_thread(store.get, url)
+        if record is not None and record["prompt_version"] != PROMPT_VERSION:
+            record = None
+        check = FreshnessCheck(url, fetch_url or url, "unknown", policy, record)
+
+        if record is None:
+            if policy.mode == "revalidate":
+                # 与爬取并行取得校验器，供下次的条件请求使用（在爬取之前取得，不会比爬取的内容新）
+                check.probe = asyncio.ensure_future(self._probe(check))
+        elif time.time() - record["validated_at"] <= policy.max_age:
+            check.result = "fresh"
+        elif policy.mode == "revalidate":
+            await self._revalidate(check)
+        else:
+            check.result = "expired"
+
+        if check.result in ("fresh", "not_modified", "unchanged"):
+            check.response = record["response"]
+        FRESHNESS_CHECKS.labels(check.result).inc()
+        return check
+
+    async def _revalidate(self, check: FreshnessCheck):
+        record = check.record
+        headers = {}
+        if record["etag"]:
+            headers["If-None-Match"] = record["etag"]
+        if record["last_modified"]:
+            headers["If-Modified-Since"] = record["last_modified"]
+        try:
+            response = await asyncio.to_thread(
+                self._session.get, check.fetch_url, headers=headers,
+                timeout=remaining_timeout(self.check_timeout, "freshness")
+            )
+        except requests.RequestException as e:
+            check.result = "error"
+            freshness_logger = get_context_logger("freshness.check", url=check.fetch_url)
+            freshness_logger.warning("条件请求失败，重新爬取", extra={
+                "event": "freshness_check_failed",
+                "error_type": type(e).__name__,
+                "error_message": str(e)
+            })
+            return
+
+        if response.status_code == 304:
+            check.result = "not_modified"
+        elif response.status_code == 200:
+            self._capture(check, response)
+            if (
+                (record["etag"] and check.etag == record["etag"])
+                or (record["page_fingerprint"] and check.page_fingerprint == record["page_fingerprint"])
+            ):
+                check.result = "unchanged"
+            else:
+                check.result = "changed"
+        else:
+            check.result = "error"
+            return
+
+        if check.result != "changed":
+            await asyncio.to_thread(
+                self.get_store().touch, check.url, time.time(),
+                check.etag or response.headers.get("ETag"),
+                check.last_modified or response.headers.get("Last-Modified"),
+                check.page_fingerprint
+            )
+
+    async def _probe(self, check: FreshnessCheck):
+        try:
+            response = await asyncio.to_thread(
+                self._session.get, check.fetch_url, timeout=remaining_timeout(self.check_timeout, "freshness")
+            )
+        except Exception:
+            # 取不到校验器时下次只能按markdown指纹判断
+            return
+        if response.status_code == 200:
+            self._capture(check, response)
+
+    @staticmethod
+    def _capture(check: FreshnessCheck, response: requests.Response):
+        check.etag = response.headers.get("ETag")
+        check.last_modified = response.headers.get("Last-Modified")
+        check.page_fingerprint = fingerprint(response.content)
+
+    def content_unchanged(self, check: Optional[FreshnessCheck], crawl_result: Dict[str, Any]) -> bool:
+        """重新爬取得到的markdown与记录中的相同时返回True（可以复用保存的提取结果，跳过LLM）"""
+        if check is None or check.record is None:
+            return False
+        markdown = _markdown(crawl_result)
+        if markdown is None or fingerprint(markdown) != check.record["content_fingerprint"]:
+            return False
+        check.response = check.record["response"]
+        FRESHNESS_CHECKS.labels("content_unchanged").inc()
+        return True
+
+    async def record(self, check: Optional[FreshnessCheck], crawl_result: Dict[str, Any], response: Dict[str, Any]):
+        """保存本次爬取和提取的结果，以及爬取之前从源站取得的校验器"""
+        if check is None or check.result == "off":
+            return
+        markdown = _markdown(crawl_result)
+        if markdown is None:
+            return
+        if check.probe is not None:
+            try:
+                await check.probe
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                pass
+
+        now = time.time()
+        record = {
+            "url": check.url,
+            "etag": check.etag,
+            "last_modified": check.last_modified,
+            "page_fingerprint": check.page_fingerprint,
+            "content_fingerprint": fingerprint(markdown),
+            "prompt_version": PROMPT_VERSION,
+            "response": response,
+            "crawled_at": now,
+            "validated_at": now
+        }
+        try:
+            await asyncio.to_thread(self.get_store().put, record)
+        except Exception as e:
+            # 保存失败只影响下次的检查，不影响请求本身
+            freshness_logger = get_context_logger("freshness.record", url=check.url)
+            freshness_logger.error("保存新鲜度记录失败", extra={
+                "event": "freshness_record_failed",
+                "error_type": type(e).__name__,
+                "error_message": str(e)
+            }, exc_info=True)
+
+def _markdown(crawl_result: Dict[str, Any]) -> Optional[str]:
+    data = crawl_result.get("data") or []
+    if not data:
+        return None
+    return data[0].get("markdown")
+
+freshness_checker = FreshnessChecker()
@@ -0,0 +1,272 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # 未安装redis时只能使用进程内存储
+    aioredis = None
+
+from src.config.settings import (
+    IDEMPOTENCY_REDIS_URL, IDEMPOTENCY_TTL, IDEMPOTENCY_LOCK_TTL, IDEMPOTENCY_MAX_ENTRIES
+)
+from src.config.logging_config import get_context_logger
+from src.core.service.pipeline_service import CrawlInProgress
+from src.core.util.deadline import current_deadline
+from src.core.util.metrics import IDEMPOTENCY_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+# 等待其他worker处理同一个键时查询存储的间隔（秒）
+POLL_INTERVAL = 0.25
+
+def _dumps(record: Dict[str, Any]) -> str:
+    # 键排序保证同一记录的序列化结果相同，存储按序列化结果做比较交换
+    return json.dumps(record, ensure_ascii=False, sort_keys=True)
+
+class MemoryIdempotencyStore:
+    """进程内幂等记录存储（单进程部署或未配置Redis时使用），超过 max_entries 时淘汰最早写入的记录"""
+
+    def __init__(self, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._records: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def _get_raw(self, key: str) -> Optional[str]:
+        item = self._records.get(key)
+        if item is None:
+            return None
+        expires_at, raw = item
+        if expires_at <= time.monotonic():
+            del self._records[key]
+            return None
+        return raw
+
+    def _set_raw(self, key: str, raw: str, ttl: float):
+        self._records[key] = (time.monotonic() + ttl, raw)
+        self._records.move_to_end(key)
+        while len(self._records) > self.max_entries:
+            self._records.popitem(last=False)
+
+    async def claim(self, key: str, record: Dict[str, Any], ttl: float) -> Optional[Dict[str, Any]]:
+        raw = self._get_raw(key)
+        if raw is not None:
+            return json.loads(raw)
+        self._set_raw(key, _dumps(record), ttl)
+        return None
+
+    async def swap(self, key: str, expected: Dict[str, Any], record: Dict[str, Any], ttl: float) -> bool:
+        if self._get_raw(key) != _dumps(expected):
+            return False
+        self._set_raw(key, _dumps(record), ttl)
+        return True
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = self._get_raw(key)
+        return json.loads(raw) if raw is not None else None
+
+    async def put(self, key: str, record: Dict[str, Any], ttl: float):
+        self._set_raw(key, _dumps(record), ttl)
+
+    async def delete(self, key: str):
+        self._records.pop(key, None)
+
+# 值等于预期时替换（带过期时间），返回是否替换
+_SWAP_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    redis.call('SET', KEYS[1], ARGV[2], 'PX', ARGV[3])
+    return 1
+end
+return 0
+"""
+
+class RedisIdempotencyStore:
+    """基于Redis的幂等记录存储，多个worker进程（以及多台实例）共享"""
+
+    def __init__(self, url: str, prefix: str = "text-service:idempotency:"):
+        self.prefix = prefix
+        self._redis = aioredis.from_url(url)
+        self._swap = self._redis.register_script(_SWAP_SCRIPT)
+
+    async def claim(self, key: str, record: Dict[str, Any], ttl: float) -> Optional[Dict[str, Any]]:
+        name = self.prefix + key
+        while True:
+            if await self._redis.set(name, _dumps(record), nx=True, px=int(ttl * 1000)):
+                return None
+            raw = await self._redis.get(name)
+            if raw is not None:
+                return json.loads(raw)
+            # 记录恰好在两次操作之间过期，重新尝试占用
+
+    async def swap(self, key: str, expected: Dict[str, Any], record: Dict[str, Any], ttl: float) -> bool:
+        swapped = await self._swap(keys=[self.prefix + key], args=[_dumps(expected), _dumps(record), int(ttl * 1000)])
+        return bool(swapped)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        raw = await self._redis.get(self.prefix + key)
+        return json.loads(raw) if raw is not None else None
+
+    async def put(self, key: str, record: Dict[str, Any], ttl: float):
+        await self._redis.set(self.prefix + key, _dumps(record), px=int(ttl * 1000))
+
+    async def delete(self, key: str):
+        await self._redis.delete(self.prefix + key)
+
+def create_store():
+    """配置了 IDEMPOTENCY_REDIS_URL 且安装了redis时使用Redis存储，否则使用进程内存储"""
+    if IDEMPOTENCY_REDIS_URL:
+        if aioredis is not None:
+            return RedisIdempotencyStore(IDEMPOTENCY_REDIS_URL)
+        logger.warning("配置了IDEMPOTENCY_REDIS_URL但未安装redis，幂等键只在进程内生效", extra={
+            "event": "idempotency_redis_unavailable"
+        })
+    return MemoryIdempotencyStore()
+
+idempotency_store = create_store()
+
+# 本进程正在执行的幂等请求，同一进程内的重试直接等待同一个任务
+_inflight: Dict[str, asyncio.Task] = {}
+
+def _processing() -> HTTPException:
+    return HTTPException(status_code=202, detail="相同Idempotency-Key的请求正在处理中")
+
+async def run_idempotent(
+    idempotency_key: str,
+    tenant: str,
+    payload: str,
+    run: Callable[[Optional[str]], Awaitable[Dict[str, Any]]]
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    按幂等键执行一次URL处理，相同键的重试复用第一次的结果或正在进行的处理
+
+    处理在独立任务中执行，发起请求的客户端超时断开后仍会完成并保存结果；
+    成功结果保留 IDEMPOTENCY_TTL 秒。爬取任务仍在进行（202）时记录该任务，重试时继续轮询
+    同一任务而不是重新爬取；其他失败不保存，重试会重新执行。
+
+    Args:
+        idempotency_key: 客户端提供的 Idempotency-Key
+        tenant: 租户，不同租户的相同键互不影响
+        payload: 请求内容（URL），相同键对应不同内容时返回422
+        run: 执行处理的函数，参数为要继续轮询的爬取结果URL（没有时为None）
+
+    Returns:
+        (结果来源, 处理结果)，来源为 executed（本次执行）、resumed（继续之前的爬取任务）、
+        joined（等待了正在进行的处理）或 replayed（已保存的结果，只含 response）
+
+    Raises:
+        HTTPException: 键不合法（400）、键与请求内容不匹配（422）、
+                       等待其他请求的处理直到截止时间（202），以及处理本身的错误
+    """
+    if not idempotency_key or len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key 长度必须在 1 到 {MAX_KEY_LENGTH} 之间")
+
+    key = f"{tenant}:{idempotency_key}"
+    fingerprint = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    record = {"state": "in_progress", "fingerprint": fingerprint, "owner": os.getpid()}
+    idempotency_logger = get_context_logger("idempotency", idempotency_key=idempotency_key, tenant=tenant)
+
+    while True:
+        try:
+            existing = await idempotency_store.claim(key, record, IDEMPOTENCY_LOCK_TTL)
+        except Exception as e:
+            # 存储不可用时不影响请求本身，退化为不带幂等键的处理
+            idempotency_logger.warning("幂等存储不可用，直接处理请求", extra={
+                "event": "idempotency_store_error",
+                "error_type": type(e).__name__,
+                "error_message": str(e)
+            })
+            IDEMPOTENCY_REQUESTS.labels("store_error").inc()
+            return "executed", await run(None)
+
+        if existing is None:
+            IDEMPOTENCY_REQUESTS.labels("executed").inc()
+            return "executed", await _execute(key, record, run, None, idempotency_logger)
+
+        if existing.get("fingerprint") != fingerprint:
+            IDEMPOTENCY_REQUESTS.labels("conflict").inc()
+            raise HTTPException(status_code=422, detail="Idempotency-Key 已用于内容不同的请求")
+
+        state = existing.get("state")
+        if state == "done":
+            IDEMPOTENCY_REQUESTS.labels("replayed").inc()
+            idempotency_logger.info("返回已保存的幂等结果", extra={"event": "idempotency_replayed"})
+            return "replayed", existing["result"]
+
+        if state == "processing":
+            # 之前的处理返回了202，占用该键并继续轮询同一个爬取任务
+            resumed = dict(record, result_url=existing["result_url"])
+            if await idempotency_store.swap(key, existing, resumed, IDEMPOTENCY_LOCK_TTL):
+                IDEMPOTENCY_REQUESTS.labels("resumed").inc()
+                return "resumed", await _execute(key, resumed, run, existing["result_url"], idempotency_logger)
+            continue
+
+        task = _inflight.get(key)
+        if task is not None:
+            IDEMPOTENCY_REQUESTS.labels("joined").inc()
+            idempotency_logger.info("等待相同幂等键的处理", extra={"event": "idempotency_joined"})
+            return "joined", await _wait_task(task)
+
+        # 其他worker正在处理：等待其记录变化后重新判断
+        if not await _wait_other_worker(key):
+            IDEMPOTENCY_REQUESTS.labels("processing").inc()
+            raise _processing()
+
+async def _execute(key: str, record: Dict[str, Any], run, resume_url: Optional[str], idempotency_logger) -> Dict[str, Any]:
+    task = asyncio.ensure_future(_run_and_store(key, record, run, resume_url, idempotency_logger))
+    _inflight[key] = task
+    task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await _wait_task(task)
+
+async def _wait_task(task: asyncio.Task) -> Dict[str, Any]:
+    """等待处理任务；本请求被取消（如客户端断开）不会取消处理，截止时间到达时返回202"""
+    deadline = current_deadline()
+    timeout = deadline.remaining() if deadline is not None else None
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+    except asyncio.TimeoutError:
+        IDEMPOTENCY_REQUESTS.labels("processing").inc()
+        raise _processing()
+
+async def _run_and_store(key: str, record: Dict[str, Any], run, resume_url: Optional[str], idempotency_logger) -> Dict[str, Any]:
+    try:
+        result = await run(resume_url)
+    except CrawlInProgress as e:
+        await _store(idempotency_store.put, key, {
+            "state": "processing", "fingerprint": record["fingerprint"], "result_url": e.result_url
+        }, IDEMPOTENCY_LOCK_TTL, idempotency_logger=idempotency_logger)
+        raise
+    except BaseException:
+        # 失败不保存，重试时重新执行
+        await _store(idempotency_store.delete, key, idempotency_logger=idempotency_logger)
+        raise
+    await _store(idempotency_store.put, key, {
+        "state": "done", "fingerprint": record["fingerprint"], "result": {"response": result["response"]}
+    }, IDEMPOTENCY_TTL, idempotency_logger=idempotency_logger)
+    return result
+
+async def _store(operation, key: str, *args, idempotency_logger=None):
+    try:
+        await operation(key, *args)
+    except Exception as e:
+        (idempotency_logger or logger).warning("写入幂等记录失败", extra={
+            "event": "idempotency_store_error",
+            "error_type": type(e).__name__,
+            "error_message": str(e)
+        })
+
+async def _wait_other_worker(key: str) -> bool:
+    """等待其他worker的处理结束；记录状态变化时返回True，截止时间前未变化时返回False"""
+    deadline = current_deadline()
+    while deadline is None or deadline.remaining() > POLL_INTERVAL:
+        await asyncio.sleep(POLL_INTERVAL)
+        existing = await idempotency_store.get(key)
+        if existing is None or existing.get("state") != "in_progress":
+            return True
+    return False
@@ -0,0 +1,270 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Deque, Dict, Optional, Tuple
+
+from src.config.settings import LLM_MAX_CONCURRENCY, LLM_TENANT_WEIGHTS, LLM_SCHEDULER_AGING
+from src.core.util.deadline import DeadlineExceeded, current_deadline
+from src.core.util.metrics import (
+    DEADLINE_EXCEEDED, LLM_SCHEDULER_INFLIGHT, LLM_SCHEDULER_QUEUE_LENGTH, LLM_SCHEDULER_WAIT_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# 优先级从高到低：交互请求（单URL接口）、批量接口、离线重处理
+PRIORITY_CLASSES = ("interactive", "bulk", "backfill")
+DEFAULT_TENANT = "default"
+
+_current_work: ContextVar[Tuple[str, str]] = ContextVar("llm_work", default=("interactive", DEFAULT_TENANT))
+
+@contextmanager
+def scheduling_scope(priority: str, tenant: str = DEFAULT_TENANT):
+    """设置当前上下文（及其中创建的任务）发起的LLM调用的优先级和租户"""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"未知的优先级: {priority}")
+    token = _current_work.set((priority, tenant or DEFAULT_TENANT))
+    try:
+        yield
+    finally:
+        _current_work.reset(token)
+
+def current_work() -> Tuple[str, str]:
+    """当前上下文的（优先级, 租户）"""
+    return _current_work.get()
+
+def parse_tenant_weights(spec: str) -> Dict[str, float]:
+    """解析 "租户=权重,..." 格式的租户权重，忽略不合法的条目"""
+    weights = {}
+    for item in spec.split(","):
+        tenant, _, value = item.partition("=")
+        try:
+            weight = float(value)
+        except ValueError:
+            continue
+        if tenant.strip() and weight > 0:
+            weights[tenant.strip()] = weight
+    return weights
+
+class _Waiter:
+    __slots__ = ("future", "tenant", "start_tag", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, tenant: str, start_tag: float, enqueued_at: float):
+        self.future = future
+        self.tenant = tenant
+        self.start_tag = start_tag
+        self.enqueued_at = enqueued_at
+
+class _TenantQueue:
+    __slots__ = ("waiters", "finish_tag")
+
+    def __init__(self):
+        self.waiters: Deque[_Waiter] = deque()
+        self.finish_tag = 0.0
+
+class _ClassQueue:
+    """
+    一个优先级内的加权公平队列
+
+    按开始时间公平排队（SFQ）：调用入队时的开始标签为 max(虚拟时间, 该租户上一个调用的结束标签)，
+    结束标签为开始标签加上 成本/权重；每次调度开始标签最小的调用，并把虚拟时间推进到该标签。
+    持续排队的租户按权重比例分到槽位，空闲后再来的租户不会因为之前没用而积攒额度。
+    """
+
+    __slots__ = ("name", "tenants", "arrivals", "virtual_time", "length", "inflight")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.tenants: Dict[str, _TenantQueue] = {}
+        # 按到达顺序排列，用于判断最久的等待时间（已调度或已取消的条目惰性清除）
+        self.arrivals: Deque[_Waiter] = deque()
+        self.virtual_time = 0.0
+        self.length = 0
+        self.inflight = 0
+
+    def push(self, future: asyncio.Future, tenant: str, cost: float, weight: float) -> _Waiter:
+        queue = self.tenants.get(tenant)
+        if queue is None:
+            queue = self.tenants[tenant] = _TenantQueue()
+        start_tag = max(self.virtual_time, queue.finish_tag)
+        queue.finish_tag = start_tag + cost / weight
+        waiter = _Waiter(future, tenant, start_tag, time.monotonic())
+        queue.waiters.append(waiter)
+        self.arrivals.append(waiter)
+        self.length += 1
+        return waiter
+
+    def pop(self) -> _Waiter:
+        """取出开始标签最小的调用（调用前需确认 length > 0）"""
+        best: Optional[_TenantQueue] = None
+        for tenant, queue in list(self.tenants.items()):
+            if not queue.waiters:
+                # 结束标签已落后于虚拟时间的空闲租户不再影响排队，删除
+                if queue.finish_tag <= self.virtual_time:
+                    del self.tenants[tenant]
+                continue
+            if best is None or queue.waiters[0].start_tag < best.waiters[0].start_tag:
+                best = queue
+        waiter = best.waiters.popleft()
+        self.length -= 1
+        self.virtual_time = max(self.virtual_time, waiter.start_tag)
+        return waiter
+
+    def remove(self, waiter: _Waiter):
+        queue = self.tenants.get(waiter.tenant)
+        if queue is None:
+            return
+        try:
+            queue.waiters.remove(waiter)
+        except ValueError:
+            return
+        self.length -= 1
+
+    def oldest_wait(self, now: float) -> float:
+        while self.arrivals and self.arrivals[0].future.done():
+            self.arrivals.popleft()
+        return now - self.arrivals[0].enqueued_at if self.arrivals else 0.0
+
+class LLMScheduler:
+    """
+    LLM调用调度器：限制同时进行的LLM调用数，超出的调用按优先级和租户排队
+
+    优先级之间严格按 PRIORITY_CLASSES 的顺序调度，交互请求不会排在批量任务后面；
+    为防止低优先级饿死，某个低优先级的调用排队超过 aging 秒且该优先级没有进行中的调用时，
+    下一个空出的槽位先分给它（即每个优先级在积压时至少保有一个槽位）。
+    同一优先级内按租户加权公平排队，成本为调用的估算输入token数。
+
+    调用的优先级和租户来自 scheduling_scope 设置的上下文；排队时间受请求截止时间限制，
+    截止时间到达时抛出 DeadlineExceeded。
+
+    Args:
+        max_concurrency: 同时进行的最大调用数，0为不限制
+        tenant_weights: 租户权重，未列出的租户权重为1；默认读取 LLM_TENANT_WEIGHTS
+        aging: 低优先级调用的防饥饿等待阈值（秒）
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        tenant_weights: Optional[Dict[str, float]] = None,
+        aging: float = LLM_SCHEDULER_AGING
+    ):
+        self.max_concurrency = max_concurrency
+        self.tenant_weights = parse_tenant_weights(LLM_TENANT_WEIGHTS) if tenant_weights is None else dict(tenant_weights)
+        self.aging = aging
+        self.inflight = 0
+        self._classes = {name: _ClassQueue(name) for name in PRIORITY_CLASSES}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrency > 0
+
+    def queue_length(self, priority: Optional[str] = None) -> int:
+        if priority is not None:
+            return self._classes[priority].length
+        return sum(class_queue.length for class_queue in self._classes.values())
+
+    @asynccontextmanager
+    async def slot(self, cost: float = 1.0):
+        """
+        在调度槽位内执行一次LLM调用，产出排队时间（秒）
+
+        Args:
+            cost: 调用成本（估算输入token数），用于租户间的公平分配
+        """
+        if not self.enabled:
+            yield 0.0
+            return
+        priority, tenant = _current_work.get()
+        waited = await self.acquire(priority, tenant, cost)
+        try:
+            yield waited
+        finally:
+            self.release(priority)
+
+    async def acquire(self, priority: str, tenant: str = DEFAULT_TENANT, cost: float = 1.0) -> float:
+        """
+        获取调用槽位
+
+        Returns:
+            排队时间（秒）
+
+        Raises:
+            DeadlineExceeded: 排队期间请求截止时间到达
+        """
+        class_queue = self._classes[priority]
+        if self.inflight < self.max_concurrency and self.queue_length() == 0:
+            self._start(class_queue)
+            LLM_SCHEDULER_WAIT_SECONDS.labels(priority).observe(0.0)
+            return 0.0
+
+        deadline = current_deadline()
+        timeout = deadline.remaining() if deadline is not None else None
+        if timeout is not None and timeout <= 0:
+            DEADLINE_EXCEEDED.labels("llm_queue").inc()
+            raise DeadlineExceeded("llm_queue")
+
+        loop = asyncio.get_running_loop()
+        weight = self.tenant_weights.get(tenant, 1.0)
+        waiter = class_queue.push(loop.create_future(), tenant, max(cost, 1.0), weight)
+        LLM_SCHEDULER_QUEUE_LENGTH.labels(priority).set(class_queue.length)
+        try:
+            await asyncio.wait_for(waiter.future, timeout)
+        except asyncio.TimeoutError:
+            class_queue.remove(waiter)
+            DEADLINE_EXCEEDED.labels("llm_queue").inc()
+            raise DeadlineExceeded("llm_queue")
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # 槽位已经分给本调用，但调用被取消（如客户端断开），归还槽位
+                self.release(priority)
+            else:
+                class_queue.remove(waiter)
+            raise
+        finally:
+            LLM_SCHEDULER_QUEUE_LENGTH.labels(priority).set(class_queue.length)
+        waited = time.monotonic() - waiter.enqueued_at
+        LLM_SCHEDULER_WAIT_SECONDS.labels(priority).observe(waited)
+        return waited
+
+    def release(self, priority: str):
+        """归还槽位并调度排队中的调用"""
+        class_queue = self._classes[priority]
+        class_queue.inflight -= 1
+        self.inflight -= 1
+        LLM_SCHEDULER_INFLIGHT.labels(priority).set(class_queue.inflight)
+        self._dispatch()
+
+    def _start(self, class_queue: _ClassQueue):
+        class_queue.inflight += 1
+        self.inflight += 1
+        LLM_SCHEDULER_INFLIGHT.labels(class_queue.name).set(class_queue.inflight)
+
+    def _next_class(self) -> Optional[_ClassQueue]:
+        now = time.monotonic()
+        highest = None
+        for class_queue in self._classes.values():
+            if class_queue.length == 0:
+                continue
+            if highest is None:
+                highest = class_queue
+            elif class_queue.inflight == 0 and class_queue.oldest_wait(now) >= self.aging:
+                return class_queue
+        return highest
+
+    def _dispatch(self):
+        while self.inflight < self.max_concurrency:
+            class_queue = self._next_class()
+            if class_queue is None:
+                return
+            waiter = class_queue.pop()
+            LLM_SCHEDULER_QUEUE_LENGTH.labels(class_queue.name).set(class_queue.length)
+            if waiter.future.done():
+                # 等待已被取消、尚未从队列中移除
+                continue
+            waiter.future.set_result(None)
+            self._start(class_queue)
+
+llm_scheduler = LLMScheduler()
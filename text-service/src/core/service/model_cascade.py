@@ -0,0 +1,62 @@
+import re
+import logging
+from typing import List, NamedTuple
+
+from src.config.settings import (
+    API_BASE, MODEL, INPUT_PRICE, OUTPUT_PRICE, CACHED_INPUT_PRICE, LLM_CASCADE, LLM_CASCADE_THRESHOLD
+)
+
+logger = logging.getLogger(__name__)
+
+_PRICES = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)\s*(?:/\s*(\d+(?:\.\d+)?)\s*)?$")
+
+class ModelTier(NamedTuple):
+    model: str
+    api_base: str
+    input_price: float  # 每百万token
+    output_price: float
+    cached_input_price: float = CACHED_INPUT_PRICE  # 命中缓存的输入token
+
+def parse_tier(spec: str) -> ModelTier:
+    """解析 "模型[@API地址][=输入价格/输出价格[/缓存输入价格]]" 格式的一层"""
+    spec = spec.strip()
+    input_price, output_price, cached_input_price = INPUT_PRICE, OUTPUT_PRICE, CACHED_INPUT_PRICE
+    head, separator, prices = spec.rpartition("=")
+    if separator:
+        match = _PRICES.match(prices)
+        if match is None:
+            raise ValueError(f"价格格式应为 输入价格/输出价格[/缓存输入价格]: {prices}")
+        input_price, output_price = float(match.group(1)), float(match.group(2))
+        cached_input_price = float(match.group(3)) if match.group(3) else min(cached_input_price, input_price)
+        spec = head.strip()
+    model, _, api_base = spec.partition("@")
+    model = model.strip()
+    if not model:
+        raise ValueError(f"缺少模型名: {spec}")
+    return ModelTier(model, api_base.strip() or API_BASE, input_price, output_price, cached_input_price)
+
+def parse_cascade(spec: str) -> List[ModelTier]:
+    """解析 "层,层,..." 格式的级联配置，忽略不合法的层；没有合法的层时只使用 MODEL"""
+    tiers = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        try:
+            tiers.append(parse_tier(item))
+        except ValueError as e:
+            logger.warning("忽略不合法的模型级联配置", extra={
+                "event": "llm_cascade_tier_invalid",
+                "tier": item.strip(),
+                "error_message": str(e)
+            })
+    return tiers or [ModelTier(MODEL, API_BASE, INPUT_PRICE, OUTPUT_PRICE, CACHED_INPUT_PRICE)]
+
+# 按顺序尝试的模型，前面的层结果质量分低于阈值时交给下一层
+model_tiers = parse_cascade(LLM_CASCADE)
+cascade_threshold = LLM_CASCADE_THRESHOLD
+
+def cascade_signature() -> str:
+    """计入提示词版本的级联配置：只有一层时为模型名（与未启用级联时相同）"""
+    if len(model_tiers) == 1:
+        return model_tiers[0].model
+    return ",".join(tier.model for tier in model_tiers) + f"|{cascade_threshold}"
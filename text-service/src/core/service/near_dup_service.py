@@ -0,0 +1,128 @@
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+
+from src.config.settings import (
+    NEAR_DUP_ENABLED, NEAR_DUP_INDEX_PATH, NEAR_DUP_MAX_DISTANCE, NEAR_DUP_REUSE_DISTANCE,
+    NEAR_DUP_MIN_LENGTH, NEAR_DUP_MAX_AGE
+)
+from src.config.logging_config import get_context_logger
+from src.core.service.openai_service import PROMPT_VERSION
+from src.core.util.near_dup import NearDupIndex, NearDuplicate, simhash
+from src.core.util.metrics import NEAR_DUP_LOOKUPS
+
+class NearDupLookup:
+    """一次近似重复查找的结果，由 find() 返回，之后传给 record()"""
+
+    __slots__ = ("url", "simhash", "result", "match", "response")
+
+    def __init__(self, url: str, simhash: int, result: str, match: Optional[NearDuplicate] = None):
+        self.url = url
+        self.simhash = simhash
+        # reused: 直接复用 match 的提取结果；similar: 找到相似页面但仍交给LLM；miss: 没有找到
+        self.result = result
+        self.match = match
+        self.response: Optional[Dict[str, Any]] = match.response if result == "reused" else None
+
+class NearDupMatcher:
+    """
+    近似重复页面的提取结果复用
+
+    爬取之后、调用LLM之前按markdown的 SimHash 指纹查找之前提取过的页面：距离不超过
+    reuse_distance 时直接返回其提取结果；不超过 max_distance 时仍交给LLM，
+    启用按小节复用时相同的小节复用已有结果，只有不同的小节重新提取。
+    提取完成后保存本页面的指纹和结果；直接复用的结果不保存，避免指纹沿复用链漂移。
+    查找或保存失败时按没有近似重复处理，不影响请求本身。
+
+    Args:
+        enabled: 是否启用
+        index_path: 索引存储路径（SQLite）
+        max_distance: 视为近似重复的最大汉明距离
+        reuse_distance: 直接复用提取结果的最大汉明距离，-1 表示从不直接复用
+        min_length: 短于此字符数的markdown不查找也不保存
+        max_age: 记录保留时间（秒）
+    """
+
+    def __init__(
+        self,
+        enabled: bool = NEAR_DUP_ENABLED,
+        index_path: str = NEAR_DUP_INDEX_PATH,
+        max_distance: int = NEAR_DUP_MAX_DISTANCE,
+        reuse_distance: int = NEAR_DUP_REUSE_DISTANCE,
+        min_length: int = NEAR_DUP_MIN_LENGTH,
+        max_age: float = NEAR_DUP_MAX_AGE
+    ):
+        self.enabled = enabled
+        self.index_path = index_path
+        self.max_distance = max_distance
+        self.reuse_distance = reuse_distance
+        self.min_length = min_length
+        self.max_age = max_age
+        self._index: Optional[NearDupIndex] = None
+        self._index_lock = threading.Lock()
+
+    def get_index(self) -> NearDupIndex:
+        # 在线程中调用，并发的首次查找只创建一个索引
+        with self._index_lock:
+            if self._index is None:
+                self._index = NearDupIndex(self.index_path, self.max_distance, self.max_age)
+            return self._index
+
+    def _lookup(self, url: str, markdown: str) -> NearDupLookup:
+        value = simhash(markdown)
+        match = self.get_index().find(value, PROMPT_VERSION)
+        if match is None:
+            return NearDupLookup(url, value, "miss")
+        return NearDupLookup(url, value, "reused" if match.distance <= self.reuse_distance else "similar", match)
+
+    async def find(self, url: str, crawl_result: Dict[str, Any]) -> Optional[NearDupLookup]:
+        """
+        查找爬取结果的近似重复页面
+
+        Args:
+            url: 页面的规范键
+            crawl_result: 爬取结果
+
+        Returns:
+            NearDupLookup，response 不为None时可直接返回；markdown过短或查找失败时返回None
+        """
+        markdown = _markdown(crawl_result)
+        if markdown is None or len(markdown) < self.min_length:
+            NEAR_DUP_LOOKUPS.labels("skipped").inc()
+            return None
+        try:
+            # 首次查找时从文件加载索引，指纹计算和加载都在线程中进行
+            lookup = await asyncio.to_thread(self._lookup, url, markdown)
+        except Exception as e:
+            NEAR_DUP_LOOKUPS.labels("error").inc()
+            near_dup_logger = get_context_logger("near_dup.find", url=url)
+            near_dup_logger.error("查找近似重复页面失败", extra={
+                "event": "near_dup_find_failed",
+                "error_type": type(e).__name__,
+                "error_message": str(e)
+            }, exc_info=True)
+            return None
+        NEAR_DUP_LOOKUPS.labels(lookup.result).inc()
+        return lookup
+
+    async def record(self, lookup: Optional[NearDupLookup], response: Dict[str, Any]):
+        """保存本页面的指纹和提取结果（直接复用的结果不保存）"""
+        if lookup is None or lookup.response is not None:
+            return
+        try:
+            await asyncio.to_thread(self.get_index().add, lookup.url, lookup.simhash, PROMPT_VERSION, response)
+        except Exception as e:
+            near_dup_logger = get_context_logger("near_dup.record", url=lookup.url)
+            near_dup_logger.error("保存近似重复索引记录失败", extra={
+                "event": "near_dup_record_failed",
+                "error_type": type(e).__name__,
+                "error_message": str(e)
+            }, exc_info=True)
+
+def _markdown(crawl_result: Dict[str, Any]) -> Optional[str]:
+    data = crawl_result.get("data") or []
+    if not data:
+        return None
+    return data[0].get("markdown")
+
+near_dup_matcher = NearDupMatcher()
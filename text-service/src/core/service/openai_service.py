@@ -1,33 +1,238 @@
 import logging
 import json
+import hashlib
 import asyncio
 import time
-from typing import Dict, Any
+from typing import Dict, Any, List, NamedTuple, Optional
 from fastapi import HTTPException
-from openai import OpenAI
+from openai import AsyncOpenAI, APIStatusError
 
 from src.config.settings import (
-    API_KEY, API_BASE, MODEL,
-    MAX_RETRIES, RETRY_DELAY,
-    INPUT_PRICE, OUTPUT_PRICE
+    API_KEY, API_BASE,
+    MAX_RETRIES, RETRY_DELAY, LLM_REQUEST_TIMEOUT,
+    SECTION_REUSE_ENABLED, SECTION_STORE_PATH, SECTION_STORE_MAX_AGE, LLM_PACKING_MIN_SCORE
 )
 from src.config.logging_config import get_context_logger
+from src.core.util.cassette import get_recorder, llm_request_key
+from src.core.util.metrics import (
+    LLM_CALLS, LLM_COST, LLM_INFLIGHT, LLM_TOKENS, SECTION_REUSE, LLM_PROMPT_CACHE_SAVINGS,
+    LLM_CASCADE_RESULTS, LLM_CASCADE_COST, LLM_CASCADE_SECONDS, LLM_QUALITY_SCORE, LLM_PACKING_DOCUMENTS
+)
+from src.core.util.section_store import SectionStore, split_sections, section_key
+from src.core.util.extraction_quality import score_extraction, foreign_materials
+from src.core.util.tracing import span, inject_headers
+from src.core.util.deadline import remaining_timeout, check_deadline, can_finish, DeadlineExceeded
+from src.core.service.llm_scheduler import llm_scheduler
+from src.core.service.model_cascade import ModelTier, model_tiers, cascade_threshold, cascade_signature
+from src.core.service.prompt_cache import prompt_context_cache, cached_prompt_tokens
+from src.core.service.document_packer import PackedDocument, document_packer
 
 logger = logging.getLogger(__name__)
 
+# 提示词：系统提示词和提取说明组成固定前缀（所有请求逐字节相同，可以命中服务商的前缀缓存或上下文缓存），
+# 本次的markdown作为可变后缀放在最后一条消息中。前缀中不能出现任何随请求变化的内容
+SYSTEM_PROMPT = "你是一个专业的数据处理助手，擅长提取结构化数据并输出JSON格式。"
+
+EXTRACTION_INSTRUCTIONS = """你是一个专业的JSON数据处理助手。你的任务是从Markdown内容中提取有意义的文本段落和图片URL，并将它们按照要求的格式组织成JSON。
+
+请从用户消息中的Markdown内容中提取有意义的文本段落和图片URL，并按照指定格式返回JSON:
+
+1. 过滤掉导航链接、广告、页脚等无关内容
+2. 提取所有图片URL（格式为 `![](图片URL)` 的链接）
+3. 提取所有有意义的文本段落
+4. 将文本和图片智能配对组合成JSON
+
+只返回以下格式的JSON，不要有任何前缀、注释或额外文本:
+{
+    "data": [
+        {
+            "text": "文本段落1",
+            "materials": ["图片URL1", "图片URL2"]
+        }
+    ]
+}"""
+
+# 按小节提取的说明：用户消息只包含需要提取的小节，每个条目标注所在小节，便于按小节保存和复用结果
+SECTION_EXTRACTION_INSTRUCTIONS = """你是一个专业的JSON数据处理助手。你的任务是从Markdown内容中提取有意义的文本段落和图片URL，并将它们按照要求的格式组织成JSON。
+
+用户消息中的Markdown内容分为若干小节，每个小节位于 <section id="编号"> 和 </section> 之间。请从每个小节中提取有意义的文本段落和图片URL:
+
+1. 过滤掉导航链接、广告、页脚等无关内容
+2. 提取所有图片URL（格式为 `![](图片URL)` 的链接）
+3. 提取所有有意义的文本段落
+4. 将同一小节内的文本和图片智能配对组合成JSON，不要跨小节配对
+5. 每个条目的 section 字段为其所在小节的编号，按小节顺序输出
+
+只返回以下格式的JSON，不要有任何前缀、注释或额外文本:
+{
+    "data": [
+        {
+            "section": 小节编号,
+            "text": "文本段落1",
+            "materials": ["图片URL1", "图片URL2"]
+        }
+    ]
+}"""
+
+# 打包提取的说明：用户消息包含多个文档，每个条目标注所在文档，按文档拆分结果
+PACKED_EXTRACTION_INSTRUCTIONS = """你是一个专业的JSON数据处理助手。你的任务是从Markdown内容中提取有意义的文本段落和图片URL，并将它们按照要求的格式组织成JSON。
+
+用户消息中包含多个相互独立的文档，每个文档位于 <document id="编号"> 和 </document> 之间。请分别从每个文档中提取有意义的文本段落和图片URL:
+
+1. 过滤掉导航链接、广告、页脚等无关内容
+2. 提取所有图片URL（格式为 `![](图片URL)` 的链接）
+3. 提取所有有意义的文本段落
+4. 将同一文档内的文本和图片智能配对组合成JSON，不要跨文档配对
+5. 每个条目的 document 字段为其所在文档的编号，按文档顺序输出，不要遗漏任何文档
+
+只返回以下格式的JSON，不要有任何前缀、注释或额外文本:
+{
+    "data": [
+        {
+            "document": 文档编号,
+            "text": "文本段落1",
+            "materials": ["图片URL1", "图片URL2"]
+        }
+    ]
+}"""
+
+PACKED_SECTION_EXTRACTION_INSTRUCTIONS = """你是一个专业的JSON数据处理助手。你的任务是从Markdown内容中提取有意义的文本段落和图片URL，并将它们按照要求的格式组织成JSON。
+
+用户消息中包含多个相互独立的文档，每个文档位于 <document id="编号"> 和 </document> 之间；文档内容分为若干小节，每个小节位于 <section id="编号"> 和 </section> 之间（小节编号只在所在文档内有效）。请从每个小节中提取有意义的文本段落和图片URL:
+
+1. 过滤掉导航链接、广告、页脚等无关内容
+2. 提取所有图片URL（格式为 `![](图片URL)` 的链接）
+3. 提取所有有意义的文本段落
+4. 将同一小节内的文本和图片智能配对组合成JSON，不要跨小节或跨文档配对
+5. 每个条目的 document 字段为其所在文档的编号，section 字段为其在该文档中所在小节的编号，按文档和小节顺序输出，不要遗漏任何文档
+
+只返回以下格式的JSON，不要有任何前缀、注释或额外文本:
+{
+    "data": [
+        {
+            "document": 文档编号,
+            "section": 小节编号,
+            "text": "文本段落1",
+            "materials": ["图片URL1", "图片URL2"]
+        }
+    ]
+}"""
+
+# 固定前缀的消息数（build_messages 返回的前几条消息）
+PROMPT_PREFIX_MESSAGES = 1
+
+def build_messages(content: str, sectioned: bool, packed: bool = False) -> List[Dict[str, str]]:
+    """构造发给模型的消息：固定前缀（系统提示词和提取说明）+ 可变后缀（markdown内容）"""
+    if packed:
+        instructions = PACKED_SECTION_EXTRACTION_INSTRUCTIONS if sectioned else PACKED_EXTRACTION_INSTRUCTIONS
+    else:
+        instructions = SECTION_EXTRACTION_INSTRUCTIONS if sectioned else EXTRACTION_INSTRUCTIONS
+    return [
+        {"role": "system", "content": f"{SYSTEM_PROMPT}\n\n{instructions}"},
+        {"role": "user", "content": content}
+    ]
+
+# 提示词版本（含使用的模型），提示词变化后离线重处理据此判断是否需要重跑
+PROMPT_VERSION = hashlib.sha256(
+    (cascade_signature() + SYSTEM_PROMPT + EXTRACTION_INSTRUCTIONS
+     + (SECTION_EXTRACTION_INSTRUCTIONS if SECTION_REUSE_ENABLED else "")).encode("utf-8")
+).hexdigest()[:12]
+
+# 小节提取结果的版本，按小节提示词变化后不再复用之前的结果
+SECTION_PROMPT_VERSION = hashlib.sha256(
+    (cascade_signature() + SYSTEM_PROMPT + SECTION_EXTRACTION_INSTRUCTIONS).encode("utf-8")
+).hexdigest()[:12]
+
+# 发送给模型的Markdown最大字符数
+MAX_MARKDOWN_CHARS = 10000
+
+# 进程内共享的异步OpenAI客户端（按API地址，复用连接池）
+_clients: Dict[str, AsyncOpenAI] = {}
+
+def get_openai_client(api_base: str = API_BASE) -> AsyncOpenAI:
+    """获取共享的异步OpenAI客户端"""
+    client = _clients.get(api_base)
+    if client is None:
+        # 重试由 process_with_openai 按截止时间控制，关闭客户端内部重试
+        client = _clients[api_base] = AsyncOpenAI(base_url=api_base, api_key=API_KEY, max_retries=0)
+    return client
+
+_section_store: Optional[SectionStore] = None
+
+def get_section_store() -> Optional[SectionStore]:
+    """获取进程内共享的小节结果存储，未启用时返回None"""
+    global _section_store
+    if _section_store is None and SECTION_REUSE_ENABLED:
+        _section_store = SectionStore(SECTION_STORE_PATH, SECTION_STORE_MAX_AGE)
+    return _section_store
+
+def render_sections(sections: List[str], indexes: List[int]) -> str:
+    """把需要提取的小节按编号包装为提示词内容"""
+    return "\n\n".join(f'<section id="{index}">\n{sections[index]}\n</section>' for index in indexes)
+
+def render_documents(contents: List[str]) -> str:
+    """把打包的多个文档按编号包装为提示词内容"""
+    return "\n\n".join(f'<document id="{index}">\n{content}\n</document>' for index, content in enumerate(contents))
+
+def group_section_items(items: List[Any], indexes: List[int]) -> Optional[Dict[int, List[Dict[str, Any]]]]:
+    """
+    按 section 字段把模型返回的条目归到各小节（去掉 section 字段）；
+    有条目缺少或标错小节编号时返回None（这次的结果无法按小节保存）
+    """
+    grouped: Dict[int, List[Dict[str, Any]]] = {index: [] for index in indexes}
+    for item in items:
+        if not isinstance(item, dict):
+            return None
+        try:
+            index = int(item.get("section"))
+        except (TypeError, ValueError):
+            return None
+        if index not in grouped:
+            return None
+        grouped[index].append({key: value for key, value in item.items() if key != "section"})
+    return grouped
+
+class _PackedSource(NamedTuple):
+    """打包提取中一个文档的拆分和校验信息"""
+    request_id: str
+    source_markdown: str
+    pending: List[int]  # 按小节提取时交给LLM的小节编号
+
+class PackedResult(NamedTuple):
+    items: Optional[List[Dict[str, Any]]]  # 校验未通过时为None
+    usage: Dict[str, Any]  # 按内容长度分摊的本次调用用量
+
+def _add_usage(usage: Optional[Dict[str, Any]], extra: Dict[str, Any]):
+    if usage is None:
+        return
+    for key, value in extra.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            usage[key] = usage.get(key, 0) + value
+        else:
+            usage[key] = value
+
 def estimate_tokens(text: str) -> int:
     """估算token数量"""
     chinese_chars = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
     other_chars = len(text) - chinese_chars
     return chinese_chars * 2 + int(other_chars * 0.25)
 
-async def process_with_openai(crawl_result: Dict[str, Any], request_id: str) -> Dict[str, Any]:
+async def process_with_openai(
+    crawl_result: Dict[str, Any],
+    request_id: str,
+    usage: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
     """
     使用OpenAI处理爬取结果
     
+    配置了模型级联时依次使用各层模型，提取结果的质量分低于阈值（或调用失败）时交给下一层，
+    最后一层的结果总是采用。启用打包提取时，批量任务中的短文档先与其他文档合并为一次调用，
+    本文档的结果校验未通过时再照常提取。
+    
     Args:
         crawl_result: 爬取结果数据
         request_id: 请求ID
+        usage: 可选，用于回传token使用量和成本的字典
         
     Returns:
         处理后的数据
@@ -36,13 +241,14 @@ async def process_with_openai(crawl_result: Dict[str, Any], request_id: str) ->
     openai_logger = get_context_logger(
         "openai.process",
         request_id=request_id,
-        model=MODEL
+        model=model_tiers[0].model
     )
     
     openai_logger.info("开始OpenAI处理", extra={
         "event": "openai_process_start",
-        "model": MODEL,
-        "api_base": API_BASE
+        "model": model_tiers[0].model,
+        "api_base": model_tiers[0].api_base,
+        "cascade_tiers": [tier.model for tier in model_tiers]
     })
     
     if not (crawl_result and "data" in crawl_result and crawl_result["data"] and "markdown" in crawl_result["data"][0]):
@@ -62,35 +268,48 @@ async def process_with_openai(crawl_result: Dict[str, Any], request_id: str) ->
         "content_preview": markdown_content[:200] + "..." if content_length > 200 else markdown_content
     })
     
-    # 构造提示词
-    prompt = f"""你是一个专业的JSON数据处理助手。你的任务是从Markdown内容中提取有意义的文本段落和图片URL，并将它们按照要求的格式组织成JSON。
-
-请从以下Markdown内容中提取有意义的文本段落和图片URL，并按照指定格式返回JSON:
-
-1. 过滤掉导航链接、广告、页脚等无关内容
-2. 提取所有图片URL（格式为 `![](图片URL)` 的链接）
-3. 提取所有有意义的文本段落
-4. 将文本和图片智能配对组合成JSON
-
-只返回以下格式的JSON，不要有任何前缀、注释或额外文本:
-{{
-    "data": [
-        {{
-            "text": "文本段落1",
-            "materials": ["图片URL1", "图片URL2"]
-        }}
-    ]
-}}
-
-Markdown内容如下:
-{markdown_content[:10000]}
-"""
+    # 按小节复用：查找未变化小节之前的提取结果，只把其余小节交给LLM
+    section_store = get_section_store()
+    sections: List[str] = []
+    section_keys: List[str] = []
+    reused: Dict[str, List[Dict[str, Any]]] = {}
+    pending: List[int] = []
+    if section_store is not None:
+        sections = split_sections(markdown_content[:MAX_MARKDOWN_CHARS])
+        section_keys = [section_key(section, SECTION_PROMPT_VERSION) for section in sections]
+        try:
+            reused = await asyncio.to_thread(section_store.get_many, section_keys)
+        except Exception as e:
+            # 存储不可用时按全部小节提取
+            openai_logger.warning("读取小节提取结果失败", extra={
+                "event": "section_store_error",
+                "error_type": type(e).__name__,
+                "error_message": str(e)
+            })
+        pending = [index for index, key in enumerate(section_keys) if key not in reused]
+        SECTION_REUSE.labels("reused").inc(len(sections) - len(pending))
+        SECTION_REUSE.labels("extracted").inc(len(pending))
+        
+        openai_logger.info("小节复用检查", extra={
+            "event": "section_reuse",
+            "sections": len(sections),
+            "reused_sections": len(sections) - len(pending),
+            "pending_sections": len(pending)
+        })
+        
+        if not pending:
+            if usage is not None:
+                usage.setdefault("attempts", 0)
+            return {"data": [item for key in section_keys for item in reused[key]]}
     
-    # 构造messages
-    messages = [
-        {"role": "system", "content": "你是一个专业的数据处理助手，擅长提取结构化数据并输出JSON格式。"},
-        {"role": "user", "content": prompt}
-    ]
+    # 构造messages：固定前缀 + 本次的markdown
+    if section_store is not None:
+        prompt = render_sections(sections, pending)
+        source_markdown = "\n\n".join(sections[index] for index in pending)
+    else:
+        prompt = markdown_content[:MAX_MARKDOWN_CHARS]
+        source_markdown = prompt
+    messages = build_messages(prompt, sectioned=section_store is not None)
     
     # 估算token
     input_tokens = sum(estimate_tokens(msg["content"]) for msg in messages)
@@ -99,36 +318,281 @@ Markdown内容如下:
         "event": "prepare_openai_request",
         "estimated_input_tokens": input_tokens,
         "prompt_length": len(prompt),
-        "content_truncated": content_length > 10000
+        "content_truncated": content_length > MAX_MARKDOWN_CHARS
     })
     
-    # 初始化OpenAI客户端
-    client = OpenAI(base_url=API_BASE, api_key=API_KEY)
+    # 批量任务中的短文档与其他文档打包提取，结果校验未通过时照常单独提取
+    packed = None
+    if document_packer.accepts(prompt):
+        sectioned = section_store is not None
+        with span("llm.packed", prompt_length=len(prompt)):
+            packed = await document_packer.submit(
+                sectioned, prompt, _PackedSource(request_id, source_markdown, pending),
+                lambda documents: _extract_packed(documents, sectioned)
+            )
+    if packed is not None:
+        _add_usage(usage, packed.usage)
+    if packed is not None and packed.items is not None:
+        openai_logger.info("采用打包提取的结果", extra={
+            "event": "llm_packed_accepted",
+            "data_items": len(packed.items),
+            "packed_documents": packed.usage.get("packed_documents")
+        })
+        parsed_data = {"data": packed.items}
+    else:
+        if packed is not None:
+            openai_logger.info("打包提取的结果校验未通过，单独提取", extra={
+                "event": "llm_packed_retry",
+                "packed_documents": packed.usage.get("packed_documents")
+            })
+        parsed_data = await _extract_with_cascade(
+            messages, input_tokens, source_markdown, request_id, openai_logger, usage
+        )
     
+    if section_store is not None:
+        return await _merge_sections(
+            parsed_data, section_store, section_keys, reused, pending, openai_logger
+        )
+    return parsed_data
+
+async def _extract_with_cascade(
+    messages: List[Dict[str, str]],
+    input_tokens: int,
+    source_markdown: str,
+    request_id: str,
+    openai_logger,
+    usage: Optional[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """依次使用各层模型提取，返回采用的结果"""
     total_start_time = time.time()
+    parsed_data: Dict[str, Any] = {"data": []}
+    # 交给下一层之前质量分最高的结果，后面的层都调用失败时采用
+    fallback = None
+
+    for tier_index, tier in enumerate(model_tiers):
+        final_tier = tier_index == len(model_tiers) - 1
+        tier_start_time = time.time()
+        try:
+            # 后面还有更强的模型时不重试，失败直接交给下一层
+            parsed_data = await _extract_with_model(
+                tier, messages, input_tokens, request_id, openai_logger, usage,
+                max_attempts=MAX_RETRIES if final_tier else 1
+            )
+        except DeadlineExceeded:
+            raise
+        except HTTPException as e:
+            LLM_CASCADE_RESULTS.labels(tier.model, "error").inc()
+            if final_tier:
+                if fallback is None:
+                    raise
+                parsed_data, fallback_tier, fallback_score = fallback
+                openai_logger.warning("最后一层模型调用失败，采用之前的提取结果", extra={
+                    "event": "llm_cascade_fallback",
+                    "tier": fallback_tier,
+                    "quality_score": fallback_score,
+                    "error_message": e.detail
+                })
+                if usage is not None:
+                    usage["model"] = fallback_tier
+                break
+            openai_logger.warning("模型调用失败，交给下一层模型", extra={
+                "event": "llm_cascade_escalate",
+                "tier": tier.model,
+                "reason": "error",
+                "error_message": e.detail
+            })
+            continue
+        finally:
+            LLM_CASCADE_SECONDS.labels(tier.model).observe(time.time() - tier_start_time)
+
+        # 验证数据质量
+        items = parsed_data.get("data") or []
+        report = score_extraction(items, source_markdown)
+        LLM_QUALITY_SCORE.labels(tier.model).observe(report.score)
+
+        openai_logger.info("数据质量检查", extra={
+            "event": "data_quality_check",
+            "tier": tier.model,
+            "total_items": report.items,
+            "valid_items": report.valid_items,
+            "quality_ratio": report.valid_ratio,
+            "quality_score": report.score,
+            "item_coverage": report.item_coverage,
+            "material_coverage": report.material_coverage,
+            "text_coverage": report.text_coverage,
+            "paragraphs": report.paragraphs,
+            "images": report.images,
+            "total_time": (time.time() - total_start_time) * 1000
+        })
+
+        # 剩余时间不够再调用一次时采用当前结果
+        if final_tier or report.score >= cascade_threshold or not can_finish(time.time() - tier_start_time):
+            LLM_CASCADE_RESULTS.labels(tier.model, "accepted").inc()
+            if usage is not None:
+                usage["model"] = tier.model
+            break
+        LLM_CASCADE_RESULTS.labels(tier.model, "escalated").inc()
+        if fallback is None or report.score > fallback[2]:
+            fallback = (parsed_data, tier.model, report.score)
+        openai_logger.info("提取结果质量分低于阈值，交给下一层模型", extra={
+            "event": "llm_cascade_escalate",
+            "tier": tier.model,
+            "reason": "quality",
+            "quality_score": report.score,
+            "threshold": cascade_threshold
+        })
+    return parsed_data
+
+async def _extract_packed(documents: List[PackedDocument], sectioned: bool):
+    """
+    一次调用提取打包的多个文档，按 document 字段拆分结果
+
+    各文档的结果为 PackedResult：条目中有不属于该文档的图片、按小节提取时小节编号无效，
+    或质量分低于阈值（配置了模型级联时为级联阈值）时 items 为None，由调用方单独提取。
+    本次调用的用量按文档内容长度分摊。
+    """
+    tier = model_tiers[0]
+    sources: List[_PackedSource] = [document.context for document in documents]
+    request_id = f"{sources[0].request_id}+packed{len(documents)}"
+    packed_logger = get_context_logger("openai.packed", request_id=request_id, model=tier.model)
+    messages = build_messages(render_documents([document.content for document in documents]), sectioned, packed=True)
+    input_tokens = sum(estimate_tokens(msg["content"]) for msg in messages)
     
-    for attempt in range(MAX_RETRIES):
+    packed_logger.info("发送打包提取请求", extra={
+        "event": "llm_packed_request",
+        "documents": len(documents),
+        "request_ids": [source.request_id for source in sources],
+        "estimated_input_tokens": input_tokens
+    })
+    
+    # 失败的文档会单独提取（含重试），打包调用本身不重试
+    call_usage: Dict[str, Any] = {}
+    parsed_data = await _extract_with_model(
+        tier, messages, input_tokens, request_id, packed_logger, call_usage, max_attempts=1
+    )
+    
+    grouped: Dict[int, List[Dict[str, Any]]] = {index: [] for index in range(len(documents))}
+    for item in parsed_data.get("data") or []:
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get("document"))
+        except (TypeError, ValueError):
+            continue
+        if index in grouped:
+            grouped[index].append({key: value for key, value in item.items() if key != "document"})
+    
+    threshold = cascade_threshold if len(model_tiers) > 1 else LLM_PACKING_MIN_SCORE
+    total_chars = sum(len(document.content) for document in documents) or 1
+    rejected: Dict[str, str] = {}
+    for index, (document, source) in enumerate(zip(documents, sources)):
+        items = grouped[index]
+        share = len(document.content) / total_chars
+        document_usage: Dict[str, Any] = {
+            key: round(value * share) if isinstance(value, int) else value * share
+            for key, value in call_usage.items()
+            if key != "attempts" and isinstance(value, (int, float))
+        }
+        document_usage.update(attempts=1, model=tier.model, packed_documents=len(documents))
+        
+        if foreign_materials(items, source.source_markdown):
+            rejected[source.request_id] = "foreign_materials"
+        elif sectioned and group_section_items(items, source.pending) is None:
+            rejected[source.request_id] = "section"
+        elif score_extraction(items, source.source_markdown).score < threshold:
+            rejected[source.request_id] = "quality"
+        accepted = source.request_id not in rejected
+        LLM_PACKING_DOCUMENTS.labels("accepted" if accepted else "retried").inc()
+        if not document.future.done():
+            document.future.set_result(PackedResult(items if accepted else None, document_usage))
+    
+    packed_logger.info("打包提取完成", extra={
+        "event": "llm_packed_complete",
+        "documents": len(documents),
+        "accepted": len(documents) - len(rejected),
+        "rejected": rejected,
+        "cost": call_usage.get("cost", 0.0)
+    })
+
+async def _extract_with_model(
+    tier: ModelTier,
+    messages: List[Dict[str, str]],
+    input_tokens: int,
+    request_id: str,
+    openai_logger,
+    usage: Optional[Dict[str, Any]],
+    max_attempts: int = MAX_RETRIES
+) -> Dict[str, Any]:
+    """
+    用一个模型提取，调用失败或JSON解析失败时重试
+
+    Returns:
+        解析后的结果，总是包含 data 字段
+
+    Raises:
+        HTTPException: 重试用完仍然失败
+    """
+    client = get_openai_client(tier.api_base)
+    
+    total_start_time = time.time()
+    
+    for attempt in range(max_attempts):
+        cache_key = None
         try:
             attempt_start_time = time.time()
+            # 启用上下文缓存时用缓存引用代替固定前缀；录制和回放仍使用完整的消息
+            request_messages, cache_key = await prompt_context_cache.apply(
+                client, tier, messages, PROMPT_PREFIX_MESSAGES
+            )
             
             openai_logger.info("发送OpenAI API请求", extra={
                 "event": "openai_api_request",
                 "attempt": attempt + 1,
-                "max_retries": MAX_RETRIES,
-                "model": MODEL,
+                "max_retries": max_attempts,
+                "model": tier.model,
                 "temperature": 0.1,
-                "max_tokens": 4000
+                "max_tokens": 4000,
+                "context_cache": cache_key is not None
             })
             
-            response = client.chat.completions.create(
-                model=MODEL,
-                messages=messages,
-                temperature=0.1,
-                max_tokens=4000,
-                response_format={"type": "json_object"}
-            )
+            # 按优先级和租户排队获取调用槽位，排队时间不计入调用耗时
+            async with llm_scheduler.slot(cost=input_tokens) as scheduler_wait:
+                attempt_start_time = time.time()
+                LLM_INFLIGHT.inc()
+                try:
+                    with span("llm.request", kind="client", attempt=attempt + 1, model=tier.model) as llm_span:
+                        llm_span.set_attribute("llm.scheduler_wait_ms", scheduler_wait * 1000)
+                        response = await client.chat.completions.create(
+                            model=tier.model,
+                            messages=request_messages,
+                            temperature=0.1,
+                            max_tokens=4000,
+                            response_format={"type": "json_object"},
+                            extra_headers=inject_headers(),
+                            timeout=remaining_timeout(LLM_REQUEST_TIMEOUT, "llm")
+                        )
+                        if getattr(response, "usage", None) is not None:
+                            llm_span.set_attribute("llm.input_tokens", response.usage.prompt_tokens)
+                            llm_span.set_attribute("llm.output_tokens", response.usage.completion_tokens)
+                except Exception:
+                    LLM_CALLS.labels("error").inc()
+                    raise
+                finally:
+                    LLM_INFLIGHT.dec()
+            LLM_CALLS.labels("success").inc()
             
             request_time = (time.time() - attempt_start_time) * 1000
+            
+            recorder = get_recorder()
+            if recorder is not None:
+                recorder.record("llm", "POST", "/chat/completions", {
+                    "model": tier.model,
+                    "messages": messages,
+                    "temperature": 0.1,
+                    "max_tokens": 4000,
+                    "response_format": {"type": "json_object"}
+                }, 200, response.model_dump(), request_time, key=llm_request_key(tier.model, messages))
+            
             result_text = response.choices[0].message.content
             output_tokens = estimate_tokens(result_text)
             
@@ -136,15 +600,28 @@ Markdown内容如下:
             actual_input_tokens = getattr(response.usage, 'prompt_tokens', input_tokens) if hasattr(response, 'usage') else input_tokens
             actual_output_tokens = getattr(response.usage, 'completion_tokens', output_tokens) if hasattr(response, 'usage') else output_tokens
             
-            # 计算成本
-            cost = (actual_input_tokens / 1000000 * INPUT_PRICE + 
-                   actual_output_tokens / 1000000 * OUTPUT_PRICE)
+            cached_tokens = cached_prompt_tokens(response.usage.model_dump()) if getattr(response, "usage", None) else 0
+            
+            # 计算成本：命中缓存的输入token按缓存价格计
+            cost = ((actual_input_tokens - cached_tokens) / 1000000 * tier.input_price +
+                   cached_tokens / 1000000 * tier.cached_input_price +
+                   actual_output_tokens / 1000000 * tier.output_price)
+            cache_savings = cached_tokens / 1000000 * (tier.input_price - tier.cached_input_price)
+            LLM_TOKENS.labels("input").inc(actual_input_tokens)
+            LLM_TOKENS.labels("cached_input").inc(cached_tokens)
+            LLM_TOKENS.labels("output").inc(actual_output_tokens)
+            LLM_COST.inc(cost)
+            LLM_PROMPT_CACHE_SAVINGS.inc(cache_savings)
+            LLM_CASCADE_COST.labels(tier.model).inc(cost)
             
             openai_logger.info("收到OpenAI响应", extra={
                 "event": "openai_api_response",
                 "attempt": attempt + 1,
+                "model": tier.model,
                 "request_time": request_time,
+                "scheduler_wait": scheduler_wait * 1000,
                 "input_tokens": actual_input_tokens,
+                "cached_tokens": cached_tokens,
                 "output_tokens": actual_output_tokens,
                 "estimated_cost": cost,
                 "response_length": len(result_text)
@@ -155,19 +632,29 @@ Markdown内容如下:
             perf_logger.info("OpenAI API调用性能", extra={
                 "request_id": request_id,
                 "event": "openai_api_performance",
-                "model": MODEL,
+                "model": tier.model,
                 "input_tokens": actual_input_tokens,
+                "cached_tokens": cached_tokens,
                 "output_tokens": actual_output_tokens,
                 "request_time": request_time,
                 "cost": cost,
                 "attempt": attempt + 1
             })
             
+            if usage is not None:
+                usage["input_tokens"] = usage.get("input_tokens", 0) + actual_input_tokens
+                usage["output_tokens"] = usage.get("output_tokens", 0) + actual_output_tokens
+                usage["cached_tokens"] = usage.get("cached_tokens", 0) + cached_tokens
+                usage["cost"] = usage.get("cost", 0.0) + cost
+                usage["cache_savings"] = usage.get("cache_savings", 0.0) + cache_savings
+                usage["attempts"] = usage.get("attempts", 0) + attempt + 1
+            
             try:
-                parsed_data = json.loads(result_text)
+                with span("llm.parse", response_length=len(result_text)):
+                    parsed_data = json.loads(result_text)
                 
                 # 验证返回数据结构
-                data_items = len(parsed_data.get("data", []))
+                data_items = len(parsed_data.get("data", [])) if isinstance(parsed_data, dict) else len(parsed_data)
                 
                 openai_logger.info("成功解析JSON响应", extra={
                     "event": "json_parse_success",
@@ -175,26 +662,13 @@ Markdown内容如下:
                     "total_time": (time.time() - total_start_time) * 1000
                 })
                 
-                if "data" not in parsed_data:
+                if not isinstance(parsed_data, dict) or "data" not in parsed_data:
                     openai_logger.warning("响应缺少data字段", extra={
                         "event": "missing_data_field",
-                        "response_keys": list(parsed_data.keys())
+                        "response_keys": list(parsed_data.keys()) if isinstance(parsed_data, dict) else []
                     })
                     return {"data": parsed_data if isinstance(parsed_data, list) else []}
                 
-                # 验证数据质量
-                valid_items = 0
-                for item in parsed_data.get("data", []):
-                    if isinstance(item, dict) and "text" in item and len(item.get("text", "").strip()) > 0:
-                        valid_items += 1
-                
-                openai_logger.info("数据质量检查", extra={
-                    "event": "data_quality_check",
-                    "total_items": data_items,
-                    "valid_items": valid_items,
-                    "quality_ratio": valid_items / data_items if data_items > 0 else 0
-                })
-                
                 return parsed_data
                 
             except json.JSONDecodeError as e:
@@ -205,7 +679,7 @@ Markdown内容如下:
                     "response_preview": result_text[:500] + "..." if len(result_text) > 500 else result_text
                 })
                 
-                if attempt == MAX_RETRIES - 1:
+                if attempt == max_attempts - 1:
                     openai_logger.error("所有重试的JSON解析都失败", extra={
                         "event": "all_json_parse_failed",
                         "final_response": result_text
@@ -217,23 +691,34 @@ Markdown内容如下:
                     "delay": RETRY_DELAY,
                     "reason": "json_parse_error"
                 })
-                await asyncio.sleep(RETRY_DELAY)
+                # 剩余时间不够再调用一次时不再重试
+                check_deadline("llm_retry", RETRY_DELAY + (time.time() - attempt_start_time))
+                with span("llm.retry_wait", attempt=attempt + 1, reason="json_parse_error"):
+                    await asyncio.sleep(RETRY_DELAY)
+        
+        except HTTPException:
+            raise
         
         except Exception as e:
             request_time = (time.time() - attempt_start_time) * 1000 if 'attempt_start_time' in locals() else 0
+            # 缓存引用被拒绝（已过期或被删除）时丢弃缓存，重试时重新创建
+            if isinstance(e, APIStatusError) and e.status_code in (400, 404):
+                prompt_context_cache.invalidate(cache_key)
             
             openai_logger.error("OpenAI API请求异常", extra={
                 "event": "openai_api_error",
                 "attempt": attempt + 1,
+                "model": tier.model,
                 "error_type": type(e).__name__,
                 "error_message": str(e),
                 "request_time": request_time
             }, exc_info=True)
             
-            if attempt == MAX_RETRIES - 1:
+            if attempt == max_attempts - 1:
                 total_time = (time.time() - total_start_time) * 1000
                 openai_logger.error("所有OpenAI API重试都失败", extra={
                     "event": "all_openai_retries_failed",
+                    "model": tier.model,
                     "total_time": total_time,
                     "final_error": str(e)
                 })
@@ -244,12 +729,55 @@ Markdown内容如下:
                 "delay": RETRY_DELAY,
                 "reason": "api_error"
             })
-            await asyncio.sleep(RETRY_DELAY)
+            check_deadline("llm_retry", RETRY_DELAY + request_time / 1000)
+            with span("llm.retry_wait", attempt=attempt + 1, reason="api_error"):
+                await asyncio.sleep(RETRY_DELAY)
     
     # 这里不应该到达，但为了安全
     openai_logger.error("意外的代码路径", extra={"event": "unexpected_code_path"})
     raise HTTPException(status_code=500, detail="无法使用OpenAI API处理数据")
 
+async def _merge_sections(
+    parsed_data: Dict[str, Any],
+    section_store: SectionStore,
+    section_keys: List[str],
+    reused: Dict[str, List[Dict[str, Any]]],
+    pending: List[int],
+    openai_logger
+) -> Dict[str, Any]:
+    """保存本次提取的各小节结果，并与复用的结果按文档顺序合并"""
+    items = parsed_data.get("data") or []
+    grouped = group_section_items(items, pending)
+    if grouped is None:
+        # 无法按小节归属时不保存，本次提取的条目放在第一个提取的小节的位置
+        openai_logger.warning("模型返回的条目缺少有效的小节编号，结果不保存", extra={
+            "event": "section_attribution_failed",
+            "items": len(items)
+        })
+        new_items = [
+            {key: value for key, value in item.items() if key != "section"} if isinstance(item, dict) else item
+            for item in items
+        ]
+        merged = []
+        for index, key in enumerate(section_keys):
+            if index == pending[0]:
+                merged.extend(new_items)
+            merged.extend(reused.get(key, []))
+        return dict(parsed_data, data=merged)
+
+    try:
+        await asyncio.to_thread(section_store.put_many, {section_keys[index]: grouped[index] for index in pending})
+    except Exception as e:
+        openai_logger.warning("保存小节提取结果失败", extra={
+            "event": "section_store_error",
+            "error_type": type(e).__name__,
+            "error_message": str(e)
+        })
+    merged = []
+    for index, key in enumerate(section_keys):
+        merged.extend(grouped[index] if index in grouped else reused[key])
+    return dict(parsed_data, data=merged)
+
 def format_api_response(processed_data: Dict[str, Any]) -> Dict[str, Any]:
     """格式化API响应"""
     format_logger = get_context_logger("openai.format")
@@ -0,0 +1,252 @@
+import time
+import logging
+from typing import Dict, Any, Optional
+from fastapi import HTTPException
+
+from src.core.service.crawler_service import crawl_url, get_crawl_result
+from src.core.service.openai_service import process_with_openai, format_api_response
+from src.core.service.crawl_cache_service import crawl_cache
+from src.core.service.freshness_service import freshness_checker
+from src.core.service.url_key_service import resolve_url_key, learn_url_alias
+from src.core.service.near_dup_service import near_dup_matcher
+from src.config.logging_config import get_context_logger
+from src.core.util.metrics import URL_STEP_SECONDS, URL_STEP_PEAK_BYTES, URL_INFLIGHT, CRAWL_CACHE_REQUESTS
+from src.core.util.tracing import span
+from src.core.util.loop_monitor import bind_task_context
+from src.core.util.memory_tracker import start_tracking, stop_tracking, track_step
+
+logger = logging.getLogger(__name__)
+
+class CrawlInProgress(HTTPException):
+    """轮询超时时爬取任务仍在进行（HTTP 202），result_url 可用于之后继续轮询同一任务"""
+
+    def __init__(self, result_url: str, detail: str = "爬取任务进行中"):
+        super().__init__(status_code=202, detail=detail)
+        self.result_url = result_url
+
+async def run_url_pipeline(
+    url: str,
+    request_id: str,
+    context_logger=None,
+    resume_url: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    执行单个URL的完整处理流程：爬取 -> 轮询结果 -> OpenAI处理 -> 格式化
+
+    单URL接口和批量接口共用此流程。缓存、归档和新鲜度记录按URL的规范键存取，爬虫爬取原URL。
+    启用新鲜度检查时，页面未变化的URL直接返回保存的提取结果，
+    重新爬取得到的markdown未变化时跳过OpenAI处理；启用近似重复查找时，
+    与之前提取过的页面足够相似的直接复用其提取结果。
+
+    Args:
+        url: 要处理的URL
+        request_id: 请求ID
+        context_logger: 可选，带上下文的logger
+        resume_url: 可选，之前返回202的爬取任务的结果URL，指定时跳过爬取请求、继续轮询该任务
+
+    Returns:
+        包含 response（API响应）、timings（各步骤耗时，毫秒）和 usage（token和成本）的字典；
+        被抽样做内存跟踪时还包含 memory（各步骤峰值内存增量，字节）
+    """
+    if context_logger is None:
+        context_logger = get_context_logger("pipeline.url", request_id=request_id, url=url)
+
+    bind_task_context(request_id=request_id, url=url)
+    URL_INFLIGHT.inc()
+    memory_token = start_tracking()
+    try:
+        with span("pipeline.url", url=url, request_id=request_id):
+            result = await _run_steps(url, request_id, context_logger, resume_url)
+    finally:
+        URL_INFLIGHT.dec()
+        memory = stop_tracking(memory_token)
+
+    for step, duration in result["timings"].items():
+        URL_STEP_SECONDS.labels(step).observe(duration / 1000)
+    if memory:
+        result["memory"] = memory
+        for step, peak in memory.items():
+            URL_STEP_PEAK_BYTES.labels(step).observe(peak)
+    return result
+
+async def _run_steps(url: str, request_id: str, context_logger, resume_url: Optional[str]) -> Dict[str, Any]:
+    timings: Dict[str, float] = {}
+    usage: Dict[str, Any] = {}
+
+    key = await resolve_url_key(url)
+    if key != url:
+        context_logger.debug("URL规范键", extra={"event": "url_key_resolved", "url_key": key})
+
+    freshness = None
+    if resume_url is None and freshness_checker.enabled:
+        step_start = time.time()
+        with span("pipeline.freshness", url_key=key) as freshness_span:
+            freshness = await freshness_checker.check(key, fetch_url=url)
+            freshness_span.set_attribute("freshness.result", freshness.result)
+        timings["freshness"] = (time.time() - step_start) * 1000
+        if freshness.response is not None:
+            context_logger.info("页面未变化，返回保存的提取结果", extra={
+                "event": "freshness_hit",
+                "freshness": freshness.result,
+                "step_time": timings["freshness"]
+            })
+            return {"response": freshness.response, "timings": timings, "usage": usage}
+
+    with span("pipeline.cache_lookup", url_key=key) as lookup_span:
+        cached = await crawl_cache.get(key)
+        lookup_span.set_attribute("cache.result", cached[0] if cached is not None else "miss")
+    if crawl_cache.enabled:
+        CRAWL_CACHE_REQUESTS.labels(cached[0] if cached is not None else "miss").inc()
+    if cached is not None:
+        cache_tier, crawl_result = cached
+        timings["crawl"] = 0.0
+        timings["poll"] = 0.0
+        context_logger.info("命中爬取缓存，跳过爬取步骤", extra={
+            "event": "crawl_cache_hit",
+            "cache_tier": cache_tier,
+            "archived_at": crawl_result.get("archived_at")
+        })
+    else:
+        if resume_url is not None:
+            # 继续轮询之前返回202的爬取任务，不再创建新任务
+            result_url = resume_url
+            timings["crawl"] = 0.0
+            context_logger.info("继续轮询已有的爬取任务", extra={
+                "event": "crawl_resume",
+                "result_url": result_url
+            })
+        else:
+            # 步骤1: 发送爬取请求
+            step_start = time.time()
+            context_logger.info("步骤1/4: 发送爬取请求", extra={"event": "step_1_start"})
+
+            with span("pipeline.crawl"), track_step("crawl"):
+                crawl_response = await crawl_url(url)
+            step_time = (time.time() - step_start) * 1000
+            timings["crawl"] = step_time
+
+            if not crawl_response:
+                context_logger.error("爬取请求失败", extra={
+                    "event": "crawl_request_failed",
+                    "step": 1,
+                    "step_time": step_time
+                })
+                raise HTTPException(status_code=500, detail="爬取请求失败")
+
+            result_url = crawl_response.get("url")
+            if not result_url:
+                context_logger.error("爬取响应中未找到结果URL", extra={
+                    "event": "no_result_url",
+                    "step": 1,
+                    "response": crawl_response
+                })
+                raise HTTPException(status_code=500, detail="爬取响应中未找到结果URL")
+
+            context_logger.info("爬取请求成功", extra={
+                "event": "step_1_complete",
+                "step_time": step_time,
+                "result_url": result_url
+            })
+
+        # 步骤2: 获取爬取结果
+        step_start = time.time()
+        context_logger.info("步骤2/4: 获取爬取结果", extra={"event": "step_2_start"})
+
+        with span("pipeline.poll", result_url=result_url), track_step("poll"):
+            try:
+                crawl_result = await get_crawl_result(result_url)
+            except HTTPException as e:
+                if e.status_code == 202:
+                    raise CrawlInProgress(result_url, e.detail) from e
+                raise
+        step_time = (time.time() - step_start) * 1000
+        timings["poll"] = step_time
+
+        if not crawl_result:
+            context_logger.error("获取爬取结果失败", extra={
+                "event": "get_result_failed",
+                "step": 2,
+                "step_time": step_time
+            })
+            raise HTTPException(status_code=500, detail="获取爬取结果失败")
+
+        # 分析爬取结果
+        content_length = 0
+        if crawl_result.get("data") and crawl_result["data"]:
+            content_length = len(crawl_result["data"][0].get("markdown", ""))
+
+        context_logger.info("获取爬取结果成功", extra={
+            "event": "step_2_complete",
+            "step_time": step_time,
+            "content_length": content_length,
+            "data_count": len(crawl_result.get("data", []))
+        })
+
+        # 爬虫跳转到其他URL时记录别名，结果按最终URL的规范键保存
+        key = await learn_url_alias(url, key, crawl_result)
+        if freshness is not None:
+            freshness.url = key
+        await crawl_cache.put(key, crawl_result)
+
+    if freshness_checker.content_unchanged(freshness, crawl_result):
+        context_logger.info("爬取内容未变化，跳过OpenAI处理", extra={"event": "freshness_content_unchanged"})
+        await freshness_checker.record(freshness, crawl_result, freshness.response)
+        return {"response": freshness.response, "timings": timings, "usage": usage}
+
+    near_dup = None
+    if near_dup_matcher.enabled:
+        step_start = time.time()
+        with span("pipeline.near_dup", url_key=key) as near_dup_span:
+            near_dup = await near_dup_matcher.find(key, crawl_result)
+            near_dup_span.set_attribute("near_dup.result", near_dup.result if near_dup is not None else "skipped")
+        timings["near_dup"] = (time.time() - step_start) * 1000
+        if near_dup is not None and near_dup.match is not None:
+            context_logger.info("找到近似重复页面", extra={
+                "event": "near_dup_found",
+                "near_dup_url": near_dup.match.url,
+                "distance": near_dup.match.distance,
+                "reused": near_dup.response is not None,
+                "step_time": timings["near_dup"]
+            })
+        if near_dup is not None and near_dup.response is not None:
+            await freshness_checker.record(freshness, crawl_result, near_dup.response)
+            return {"response": near_dup.response, "timings": timings, "usage": usage}
+
+    # 步骤3: 使用OpenAI处理数据
+    step_start = time.time()
+    context_logger.info("步骤3/4: 使用OpenAI处理数据", extra={"event": "step_3_start"})
+
+    with span("pipeline.llm"), track_step("llm"):
+        processed_data = await process_with_openai(crawl_result, request_id, usage=usage)
+    step_time = (time.time() - step_start) * 1000
+    timings["llm"] = step_time
+
+    context_logger.info("OpenAI处理完成", extra={
+        "event": "step_3_complete",
+        "step_time": step_time,
+        "processed_items": len(processed_data.get("data", []))
+    })
+
+    # 步骤4: 格式化为API响应格式
+    step_start = time.time()
+    context_logger.info("步骤4/4: 格式化API响应", extra={"event": "step_4_start"})
+
+    with span("pipeline.format"), track_step("format"):
+        api_response = format_api_response(processed_data)
+    step_time = (time.time() - step_start) * 1000
+    timings["format"] = step_time
+
+    context_logger.info("响应格式化完成", extra={
+        "event": "step_4_complete",
+        "step_time": step_time,
+        "response_items": len(api_response.get("data", []))
+    })
+
+    await near_dup_matcher.record(near_dup, api_response)
+    await freshness_checker.record(freshness, crawl_result, api_response)
+
+    return {
+        "response": api_response,
+        "timings": timings,
+        "usage": usage
+    }
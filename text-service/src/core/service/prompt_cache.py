@@ -0,0 +1,154 @@
+import time
+import json
+import asyncio
+import hashlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+from src.config.settings import (
+    PROMPT_CONTEXT_CACHE_ENABLED, PROMPT_CONTEXT_CACHE_MODEL, PROMPT_CONTEXT_CACHE_TTL, LLM_REQUEST_TIMEOUT
+)
+from src.config.logging_config import get_context_logger
+from src.core.service.model_cascade import ModelTier
+from src.core.util.metrics import PROMPT_CONTEXT_CACHE
+
+# 创建缓存失败后，同一API地址在这段时间内（秒）不再尝试，直接发送完整提示词
+_FAILURE_COOLDOWN = 300.0
+# 缓存到期前这段时间（秒）内视为已过期，避免请求到达服务商时缓存恰好失效
+_EXPIRY_MARGIN = 30.0
+
+CacheKey = Tuple[str, str]
+
+def cached_prompt_tokens(usage: Dict[str, Any]) -> int:
+    """
+    响应 usage 中命中缓存的输入token数
+
+    兼容各服务商的字段：prompt_tokens_details.cached_tokens（OpenAI）、cached_tokens（Moonshot）、
+    prompt_cache_hit_tokens（DeepSeek）；都没有时为0
+    """
+    details = usage.get("prompt_tokens_details")
+    candidates = (
+        details.get("cached_tokens") if isinstance(details, dict) else None,
+        usage.get("cached_tokens"),
+        usage.get("prompt_cache_hit_tokens")
+    )
+    for value in candidates:
+        if isinstance(value, int) and value > 0:
+            return min(value, usage.get("prompt_tokens") or value)
+    return 0
+
+class _CacheEntry:
+    __slots__ = ("cache_id", "expires_at")
+
+    def __init__(self, cache_id: str, expires_at: float):
+        self.cache_id = cache_id
+        self.expires_at = expires_at
+
+class PromptContextCache:
+    """
+    提示词固定前缀的上下文缓存
+
+    按 (API地址, 前缀内容) 通过服务商的 /caching 接口创建一次缓存，之后的请求用
+    {"role": "cache", "content": "cache_id=...;reset_ttl=..."} 代替前缀消息，每次使用都重置有效期。
+    并发的首次请求只创建一个缓存；创建失败时该API地址冷却一段时间，期间发送完整提示词
+    （仍可命中服务商自动的前缀缓存）。调用因缓存无效被拒绝时丢弃缓存，下次重新创建。
+
+    Args:
+        enabled: 是否启用
+        model: 创建缓存时的模型系列
+        ttl: 缓存有效期（秒）
+    """
+
+    def __init__(
+        self,
+        enabled: bool = PROMPT_CONTEXT_CACHE_ENABLED,
+        model: str = PROMPT_CONTEXT_CACHE_MODEL,
+        ttl: int = PROMPT_CONTEXT_CACHE_TTL
+    ):
+        self.enabled = enabled
+        self.model = model
+        self.ttl = ttl
+        self._entries: Dict[CacheKey, _CacheEntry] = {}
+        self._locks: Dict[CacheKey, asyncio.Lock] = {}
+        self._failed_until: Dict[str, float] = {}
+
+    def _valid(self, entry: Optional[_CacheEntry]) -> bool:
+        return entry is not None and entry.expires_at - _EXPIRY_MARGIN > time.time()
+
+    async def apply(
+        self,
+        client: AsyncOpenAI,
+        tier: ModelTier,
+        messages: List[Dict[str, str]],
+        prefix_messages: int
+    ) -> Tuple[List[Dict[str, str]], Optional[CacheKey]]:
+        """
+        用缓存引用代替消息中的前 prefix_messages 条
+
+        Returns:
+            (实际发送的消息, 缓存键)；未启用、冷却中或创建失败时返回原消息和None
+        """
+        if not self.enabled or prefix_messages <= 0 or time.time() < self._failed_until.get(tier.api_base, 0.0):
+            return messages, None
+        prefix = messages[:prefix_messages]
+        digest = hashlib.sha256(json.dumps(prefix, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+        key = (tier.api_base, digest[:16])
+
+        entry = self._entries.get(key)
+        if not self._valid(entry):
+            lock = self._locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                entry = self._entries.get(key)
+                if not self._valid(entry):
+                    entry = await self._create(client, tier, prefix, key)
+            if entry is None:
+                return messages, None
+
+        entry.expires_at = time.time() + self.ttl
+        reference = {"role": "cache", "content": f"cache_id={entry.cache_id};reset_ttl={self.ttl}"}
+        return [reference, *messages[prefix_messages:]], key
+
+    async def _create(
+        self,
+        client: AsyncOpenAI,
+        tier: ModelTier,
+        prefix: List[Dict[str, str]],
+        key: CacheKey
+    ) -> Optional[_CacheEntry]:
+        cache_logger = get_context_logger("prompt_cache.create", api_base=tier.api_base)
+        try:
+            response = await client.post(
+                "/caching",
+                cast_to=httpx.Response,
+                body={"model": self.model, "messages": prefix, "ttl": self.ttl},
+                options={"timeout": LLM_REQUEST_TIMEOUT}
+            )
+            cache_id = response.json()["id"]
+        except Exception as e:
+            self._failed_until[tier.api_base] = time.time() + _FAILURE_COOLDOWN
+            PROMPT_CONTEXT_CACHE.labels("failed").inc()
+            cache_logger.warning("创建上下文缓存失败，暂时发送完整提示词", extra={
+                "event": "prompt_cache_create_failed",
+                "cooldown": _FAILURE_COOLDOWN,
+                "error_type": type(e).__name__,
+                "error_message": str(e)
+            })
+            return None
+
+        PROMPT_CONTEXT_CACHE.labels("created").inc()
+        cache_logger.info("已创建上下文缓存", extra={
+            "event": "prompt_cache_created",
+            "cache_id": cache_id,
+            "ttl": self.ttl
+        })
+        entry = self._entries[key] = _CacheEntry(cache_id, time.time() + self.ttl)
+        return entry
+
+    def invalidate(self, key: Optional[CacheKey]):
+        """丢弃缓存（服务商已删除或过期），下次调用重新创建"""
+        if key is not None and self._entries.pop(key, None) is not None:
+            PROMPT_CONTEXT_CACHE.labels("invalidated").inc()
+
+prompt_context_cache = PromptContextCache()
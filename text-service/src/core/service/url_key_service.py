@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+from src.config.settings import URL_CANON_ENABLED, URL_CANON_RULES_FILE, URL_ALIAS_INDEX_PATH, URL_ALIAS_MAX_AGE
+from src.config.logging_config import get_context_logger
+from src.core.util.url_canonical import UrlCanonicalizer, AliasIndex, final_url, is_learnable_alias
+from src.core.util.metrics import URL_KEYS
+
+logger = logging.getLogger(__name__)
+
+def create_canonicalizer() -> UrlCanonicalizer:
+    """按 URL_CANON_RULES_FILE 创建规范化器，规则文件不可用时只使用默认规则"""
+    if URL_CANON_RULES_FILE:
+        try:
+            return UrlCanonicalizer.from_file(URL_CANON_RULES_FILE)
+        except (OSError, ValueError, AttributeError) as e:
+            logger.error("URL规范化规则文件不可用，只使用默认规则", extra={
+                "event": "url_canon_rules_invalid",
+                "rules_file": URL_CANON_RULES_FILE,
+                "error_type": type(e).__name__,
+                "error_message": str(e)
+            })
+    return UrlCanonicalizer()
+
+canonicalizer = create_canonicalizer()
+
+_alias_index: Optional[AliasIndex] = None
+
+def get_alias_index() -> Optional[AliasIndex]:
+    """获取进程内共享的URL别名索引，未启用时返回None"""
+    global _alias_index
+    if _alias_index is None and URL_CANON_ENABLED:
+        _alias_index = AliasIndex(URL_ALIAS_INDEX_PATH, max_age=URL_ALIAS_MAX_AGE)
+    return _alias_index
+
+async def _follow_alias(key: str) -> Optional[str]:
+    alias_index = get_alias_index()
+    if alias_index is None:
+        return None
+    return await asyncio.to_thread(alias_index.get, key)
+
+async def resolve_url_key(url: str) -> str:
+    """
+    URL的规范键：规范化后再按别名索引解析；未启用URL规范化时返回原URL
+
+    缓存、归档和新鲜度记录都按规范键存取，爬虫仍然爬取请求中的原URL。
+    """
+    if not URL_CANON_ENABLED:
+        return url
+    key = canonicalizer.canonicalize(url)
+    target = await _follow_alias(key)
+    if target is not None:
+        URL_KEYS.labels("aliased").inc()
+        return target
+    URL_KEYS.labels("unchanged" if key == url else "canonicalized").inc()
+    return key
+
+async def learn_url_alias(url: str, key: str, crawl_result: Dict[str, Any]) -> str:
+    """
+    从爬虫返回的最终URL学习别名（请求URL的规范形式 -> 最终URL的规范形式）
+
+    只学习 is_learnable_alias 允许的跳转；没有跳转或跳转不可学习时删除之前学到的别名
+    （临时跳转消失后恢复按请求URL存取）。
+
+    Args:
+        url: 请求中的原URL
+        key: 爬取前解析出的规范键
+        crawl_result: 爬取结果
+
+    Returns:
+        爬取结果应存入的规范键（学到别名时为最终URL的规范键，删除了别名时为请求URL的规范键，否则为 key）
+    """
+    final = final_url(crawl_result)
+    alias_index = get_alias_index()
+    if final is None or alias_index is None:
+        return key
+    variant = canonicalizer.canonicalize(url)
+    final_key = canonicalizer.canonicalize(final)
+    learnable = is_learnable_alias(variant, final_key)
+
+    try:
+        if not learnable:
+            removed = await asyncio.to_thread(alias_index.remove, variant)
+            if removed:
+                URL_KEYS.labels("unlearned").inc()
+                return variant
+            return key
+        await asyncio.to_thread(alias_index.add, variant, final_key)
+    except Exception as e:
+        # 别名索引写入失败只影响之后的缓存命中率
+        alias_logger = get_context_logger("url_key.alias", url=url)
+        alias_logger.error("记录URL别名失败", extra={
+            "event": "url_alias_failed",
+            "final_url": final,
+            "error_type": type(e).__name__,
+            "error_message": str(e)
+        }, exc_info=True)
+        return final_key if learnable else key
+    URL_KEYS.labels("learned").inc()
+    return await _follow_alias(final_key) or final_key
@@ -0,0 +1,131 @@
+"""
+爬虫和LLM流量的录制
+
+设置 TRAFFIC_RECORD_DIR 后，爬虫服务和OpenAI的每次请求/响应（含耗时）都会追加写入
+该目录下的cassette文件（JSONL，每个进程一个文件），供 src.benchmarks.replay 离线回放。
+写入在后台线程进行，不阻塞事件循环；应用关闭和进程退出时（close_recorder）等待队列中的
+记录全部写出。请求头（含API Key）不会被录制。
+"""
+import os
+import json
+import glob
+import time
+import queue
+import atexit
+import hashlib
+import threading
+from typing import Dict, Any, List, Optional
+
+from src.config.settings import TRAFFIC_RECORD_DIR
+
+def llm_request_key(model: str, messages: List[Dict[str, Any]]) -> str:
+    """LLM请求的回放匹配键（模型+消息内容）"""
+    canonical = json.dumps({"model": model, "messages": messages}, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+class CassetteRecorder:
+    """把交互记录异步追加写入cassette文件"""
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(
+            directory, f"cassette-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl"
+        )
+        self._queue: "queue.SimpleQueue[Optional[Dict[str, Any]]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writer, name="cassette-writer", daemon=True)
+        self._thread.start()
+        self._closed = False
+
+    def _writer(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                exchange = self._queue.get()
+                if exchange is None:
+                    break
+                f.write(json.dumps(exchange, ensure_ascii=False) + "\n")
+                f.flush()
+
+    def record(
+        self,
+        kind: str,
+        method: str,
+        url: str,
+        request: Any,
+        status: int,
+        response: Any,
+        elapsed_ms: float,
+        key: Optional[str] = None
+    ):
+        """
+        记录一次请求/响应
+
+        Args:
+            kind: crawler 或 llm
+            method: HTTP方法
+            url: 请求地址（爬虫为相对CRAWLER_API_BASE_URL的路径）
+            request: 请求体
+            status: 响应状态码
+            response: 响应体（JSON可解析时为对象，否则为文本）
+            elapsed_ms: 请求耗时（毫秒）
+            key: 可选的回放匹配键
+        """
+        self._queue.put({
+            "kind": kind,
+            "method": method,
+            "url": url,
+            "key": key,
+            "request": request,
+            "status": status,
+            "response": response,
+            "elapsed_ms": elapsed_ms,
+            "recorded_at": time.time()
+        })
+
+    def close(self):
+        """写出队列中剩余的记录并停止写入线程"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+_recorder: Optional[CassetteRecorder] = None
+_recorder_lock = threading.Lock()
+
+def get_recorder() -> Optional[CassetteRecorder]:
+    """获取进程内的录制器，未开启录制时返回None"""
+    global _recorder
+    if not TRAFFIC_RECORD_DIR:
+        return None
+    if _recorder is None:
+        with _recorder_lock:
+            if _recorder is None:
+                _recorder = CassetteRecorder(TRAFFIC_RECORD_DIR)
+                atexit.register(close_recorder)
+    return _recorder
+
+def close_recorder():
+    """关闭进程内的录制器（应用关闭时和进程退出时调用），之后的记录写入新的cassette文件"""
+    global _recorder
+    with _recorder_lock:
+        recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.close()
+
+def load_cassettes(path: str) -> List[Dict[str, Any]]:
+    """读取cassette文件或目录中的全部交互记录（按录制时间排序）"""
+    files = [path] if os.path.isfile(path) else sorted(glob.glob(os.path.join(path, "*.jsonl")))
+    exchanges = []
+    for file_path in files:
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    exchanges.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # 录制进程被中断时可能留下不完整的最后一行
+                    continue
+    exchanges.sort(key=lambda exchange: exchange.get("recorded_at", 0))
+    return exchanges
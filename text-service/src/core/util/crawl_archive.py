@@ -0,0 +1,434 @@
+"""
+追加写的爬取结果归档
+
+- 段文件（segments/seg-NNNNNN.dat）：按内容寻址、压缩后的原始markdown，只追加，
+  相同内容只存一份
+- 条目索引（entries.idx）：每次爬取一条定长记录（URL哈希、爬取时间、内容哈希、
+  段内位置、同一URL上一版本的条目号），按时间顺序追加，用于顺序扫描
+- 哈希表（table.idx）：内存映射的开放寻址哈希表，URL哈希 -> 最新条目号，O(1)查找
+- URL表（urls.dat）：条目对应的原始URL
+
+多个worker进程共享同一归档目录时，写入通过文件锁串行化，读取通过mmap无锁进行。
+"""
+import os
+import mmap
+import time
+import zlib
+import fcntl
+import struct
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard为可选依赖
+    zstandard = None
+
+CODEC_RAW = 0
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+
+# 段内记录头: magic, codec, 原始长度, 压缩后长度, 内容sha256
+_BLOB_HEADER = struct.Struct("<4sB3xII32s")
+_BLOB_MAGIC = b"CRB1"
+
+# 条目: url_hash, crawl_time, blob_offset, prev_entry(+1, 0表示无), url_offset, segment_id, blob_length, url_length, 保留, content_hash
+_ENTRY = struct.Struct("<QdQQQIIII32s")
+
+# 哈希表头: magic, 保留, 容量, 已用槽数；槽: url_hash, entry_no + 1
+_TABLE_HEADER = struct.Struct("<4sIQQ")
+_TABLE_MAGIC = b"CRT1"
+_SLOT = struct.Struct("<QQ")
+_INITIAL_CAPACITY = 1 << 12
+_MAX_LOAD_FACTOR = 0.5
+
+class ArchiveEntry(NamedTuple):
+    entry_no: int
+    url: str
+    url_hash: int
+    crawl_time: float
+    content_hash: str
+    segment_id: int
+    blob_offset: int
+    blob_length: int
+    prev_entry: Optional[int]
+
+def url_hash(url: str) -> int:
+    """URL的64位哈希（0保留为空槽标记）"""
+    value = int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "little")
+    return value or 1
+
+class CrawlArchive:
+    """追加写的爬取结果归档"""
+
+    def __init__(self, root: str, segment_max_bytes: int = 256 * 1024 * 1024, compression_level: int = 3):
+        self.root = root
+        self.segment_max_bytes = segment_max_bytes
+        self.compression_level = compression_level
+        self.codec = CODEC_ZSTD if zstandard is not None else CODEC_ZLIB
+
+        os.makedirs(os.path.join(root, "segments"), exist_ok=True)
+        self._entries_path = os.path.join(root, "entries.idx")
+        self._table_path = os.path.join(root, "table.idx")
+        self._urls_path = os.path.join(root, "urls.dat")
+
+        self._lock = threading.RLock()
+        self._lock_fd = os.open(os.path.join(root, "archive.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+        self._entries_fd = os.open(self._entries_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._urls_fd = os.open(self._urls_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        self._segment_fds: Dict[int, int] = {}
+        self._closed = False
+
+        self._entries_map: Optional[mmap.mmap] = None
+        self._entries_mapped = 0
+        self._table_map: Optional[mmap.mmap] = None
+        self._table_inode = None
+        self._table_capacity = 0
+
+        self._segment_id: Optional[int] = None
+
+        # 内容哈希 -> 段内位置，首次写入时从条目索引构建，用于去重
+        self._blobs: Optional[Dict[bytes, Tuple[int, int, int]]] = None
+        self._blob_index_count = 0
+
+        with self._write_lock():
+            if not os.path.exists(self._table_path):
+                self._create_table(self._table_path, _INITIAL_CAPACITY)
+        self._open_table()
+
+    # ------------------------------------------------------------------
+    # 底层文件管理
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _write_lock(self):
+        """进程内线程锁 + 跨进程文件锁"""
+        with self._lock:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _create_table(path: str, capacity: int):
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_TABLE_HEADER.pack(_TABLE_MAGIC, 0, capacity, 0))
+            f.truncate(_TABLE_HEADER.size + capacity * _SLOT.size)
+        os.replace(tmp_path, path)
+
+    def _open_table(self):
+        with open(self._table_path, "r+b") as f:
+            table_map = mmap.mmap(f.fileno(), 0)
+            inode = os.fstat(f.fileno()).st_ino
+        magic, _, capacity, _ = _TABLE_HEADER.unpack_from(table_map, 0)
+        if magic != _TABLE_MAGIC:
+            raise ValueError(f"无效的归档哈希表文件: {self._table_path}")
+        if self._table_map is not None:
+            self._table_map.close()
+        self._table_map = table_map
+        self._table_inode = inode
+        self._table_capacity = capacity
+
+    def _refresh_table(self):
+        """其他进程扩容哈希表后会替换文件，检测到后重新映射"""
+        if os.stat(self._table_path).st_ino != self._table_inode:
+            self._open_table()
+
+    def _entry_count(self) -> int:
+        return os.fstat(self._entries_fd).st_size // _ENTRY.size
+
+    def _ensure_entries_mapped(self, count: int):
+        if count <= self._entries_mapped:
+            return
+        if self._entries_map is not None:
+            self._entries_map.close()
+        self._entries_map = mmap.mmap(self._entries_fd, count * _ENTRY.size, prot=mmap.PROT_READ)
+        self._entries_mapped = count
+
+    def _segment_fd(self, segment_id: int) -> int:
+        fd = self._segment_fds.get(segment_id)
+        if fd is None:
+            if self._closed:
+                raise ValueError(f"归档已关闭: {self.root}")
+            path = os.path.join(self.root, "segments", f"seg-{segment_id:06d}.dat")
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+            self._segment_fds[segment_id] = fd
+        return fd
+
+    def _current_segment(self) -> int:
+        if self._segment_id is None:
+            segment_ids = [
+                int(name[4:10]) for name in os.listdir(os.path.join(self.root, "segments"))
+                if name.startswith("seg-") and name.endswith(".dat")
+            ]
+            self._segment_id = max(segment_ids) if segment_ids else 1
+        while os.fstat(self._segment_fd(self._segment_id)).st_size >= self.segment_max_bytes:
+            self._segment_id += 1
+        return self._segment_id
+
+    # ------------------------------------------------------------------
+    # 哈希表
+    # ------------------------------------------------------------------
+
+    def _table_find(self, hash_value: int) -> Tuple[int, int]:
+        """返回 (槽位, entry_no+1)，未找到时entry为0、槽位为可插入的空槽"""
+        table_map = self._table_map
+        mask = self._table_capacity - 1
+        slot = hash_value & mask
+        while True:
+            offset = _TABLE_HEADER.size + slot * _SLOT.size
+            stored_hash, stored_entry = _SLOT.unpack_from(table_map, offset)
+            if stored_hash == hash_value or stored_hash == 0:
+                return slot, stored_entry
+            slot = (slot + 1) & mask
+
+    def _table_put(self, hash_value: int, entry_no: int):
+        slot, existing = self._table_find(hash_value)
+        _SLOT.pack_into(self._table_map, _TABLE_HEADER.size + slot * _SLOT.size, hash_value, entry_no + 1)
+        if existing == 0:
+            magic, reserved, capacity, used = _TABLE_HEADER.unpack_from(self._table_map, 0)
+            used += 1
+            _TABLE_HEADER.pack_into(self._table_map, 0, magic, reserved, capacity, used)
+            if used > capacity * _MAX_LOAD_FACTOR:
+                self._grow_table(capacity * 2)
+
+    def _grow_table(self, capacity: int):
+        tmp_path = self._table_path + ".grow"
+        self._create_table(tmp_path, capacity)
+        with open(tmp_path, "r+b") as f:
+            new_map = mmap.mmap(f.fileno(), 0)
+        mask = capacity - 1
+        used = 0
+        for slot in range(self._table_capacity):
+            hash_value, entry = _SLOT.unpack_from(self._table_map, _TABLE_HEADER.size + slot * _SLOT.size)
+            if hash_value == 0:
+                continue
+            new_slot = hash_value & mask
+            while _SLOT.unpack_from(new_map, _TABLE_HEADER.size + new_slot * _SLOT.size)[0] != 0:
+                new_slot = (new_slot + 1) & mask
+            _SLOT.pack_into(new_map, _TABLE_HEADER.size + new_slot * _SLOT.size, hash_value, entry)
+            used += 1
+        _TABLE_HEADER.pack_into(new_map, 0, _TABLE_MAGIC, 0, capacity, used)
+        new_map.flush()
+        new_map.close()
+        os.replace(tmp_path, self._table_path)
+        self._open_table()
+
+    # ------------------------------------------------------------------
+    # 条目读写
+    # ------------------------------------------------------------------
+
+    def _read_entry(self, entry_no: int) -> ArchiveEntry:
+        self._ensure_entries_mapped(entry_no + 1)
+        (hash_value, crawl_time, blob_offset, prev, url_offset, segment_id,
+         blob_length, url_length, _, content_hash) = _ENTRY.unpack_from(self._entries_map, entry_no * _ENTRY.size)
+        url = os.pread(self._urls_fd, url_length, url_offset).decode("utf-8")
+        return ArchiveEntry(
+            entry_no=entry_no,
+            url=url,
+            url_hash=hash_value,
+            crawl_time=crawl_time,
+            content_hash=content_hash.hex(),
+            segment_id=segment_id,
+            blob_offset=blob_offset,
+            blob_length=blob_length,
+            prev_entry=prev - 1 if prev else None
+        )
+
+    def _update_blob_index(self):
+        """从条目索引增量构建内容去重表（包括其他进程写入的条目）"""
+        if self._blobs is None:
+            self._blobs = {}
+        count = self._entry_count()
+        if count <= self._blob_index_count:
+            return
+        self._ensure_entries_mapped(count)
+        for entry_no in range(self._blob_index_count, count):
+            fields = _ENTRY.unpack_from(self._entries_map, entry_no * _ENTRY.size)
+            self._blobs[fields[9]] = (fields[5], fields[2], fields[6])
+        self._blob_index_count = count
+
+    def _compress(self, raw: bytes) -> Tuple[int, bytes]:
+        if self.codec == CODEC_ZSTD:
+            return CODEC_ZSTD, zstandard.ZstdCompressor(level=self.compression_level).compress(raw)
+        return CODEC_ZLIB, zlib.compress(raw, self.compression_level)
+
+    @staticmethod
+    def _decompress(codec: int, payload: bytes) -> bytes:
+        if codec == CODEC_ZSTD:
+            if zstandard is None:
+                raise RuntimeError("归档使用zstd压缩，但未安装zstandard")
+            return zstandard.ZstdDecompressor().decompress(payload)
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(payload)
+        return payload
+
+    def append(self, url: str, markdown: str, crawl_time: Optional[float] = None) -> ArchiveEntry:
+        """
+        追加一次爬取结果
+
+        Args:
+            url: 爬取的URL
+            markdown: 原始markdown内容
+            crawl_time: 爬取时间（Unix时间戳），默认当前时间
+
+        Returns:
+            新写入的条目
+        """
+        crawl_time = time.time() if crawl_time is None else crawl_time
+        raw = markdown.encode("utf-8")
+        content_hash = hashlib.sha256(raw).digest()
+        hash_value = url_hash(url)
+        url_bytes = url.encode("utf-8")
+
+        with self._write_lock():
+            self._refresh_table()
+            self._update_blob_index()
+
+            location = self._blobs.get(content_hash)
+            if location is None:
+                codec, payload = self._compress(raw)
+                segment_id = self._current_segment()
+                fd = self._segment_fd(segment_id)
+                blob_offset = os.fstat(fd).st_size
+                record = _BLOB_HEADER.pack(_BLOB_MAGIC, codec, len(raw), len(payload), content_hash) + payload
+                os.write(fd, record)
+                location = (segment_id, blob_offset, len(record))
+                self._blobs[content_hash] = location
+            segment_id, blob_offset, blob_length = location
+
+            url_offset = os.fstat(self._urls_fd).st_size
+            os.write(self._urls_fd, url_bytes)
+
+            _, prev = self._table_find(hash_value)
+            entry_no = self._entry_count()
+            os.write(self._entries_fd, _ENTRY.pack(
+                hash_value, crawl_time, blob_offset, prev, url_offset,
+                segment_id, blob_length, len(url_bytes), 0, content_hash
+            ))
+            self._blob_index_count = entry_no + 1
+            self._table_put(hash_value, entry_no)
+
+        return ArchiveEntry(
+            entry_no=entry_no,
+            url=url,
+            url_hash=hash_value,
+            crawl_time=crawl_time,
+            content_hash=content_hash.hex(),
+            segment_id=segment_id,
+            blob_offset=blob_offset,
+            blob_length=blob_length,
+            prev_entry=prev - 1 if prev else None
+        )
+
+    def read(self, entry: ArchiveEntry) -> str:
+        """读取条目对应的markdown内容"""
+        record = os.pread(self._segment_fd(entry.segment_id), entry.blob_length, entry.blob_offset)
+        magic, codec, raw_length, payload_length, _ = _BLOB_HEADER.unpack_from(record, 0)
+        if magic != _BLOB_MAGIC:
+            raise ValueError(f"归档段文件损坏: segment={entry.segment_id} offset={entry.blob_offset}")
+        payload = record[_BLOB_HEADER.size:_BLOB_HEADER.size + payload_length]
+        return self._decompress(codec, payload).decode("utf-8")
+
+    def lookup(self, url: str, at: Optional[float] = None) -> Optional[ArchiveEntry]:
+        """
+        按URL查找条目
+
+        Args:
+            url: URL
+            at: 可选，返回该时间点及之前最新的一次爬取；默认返回最新的
+
+        Returns:
+            条目，不存在时返回None
+        """
+        hash_value = url_hash(url)
+        with self._lock:
+            self._refresh_table()
+            _, stored = self._table_find(hash_value)
+            entry_no = stored - 1 if stored else None
+            while entry_no is not None:
+                entry = self._read_entry(entry_no)
+                if entry.url != url:
+                    # 64位哈希冲突，视为不存在
+                    return None
+                if at is None or entry.crawl_time <= at:
+                    return entry
+                entry_no = entry.prev_entry
+        return None
+
+    def get(self, url: str, max_age: Optional[float] = None) -> Optional[Tuple[ArchiveEntry, str]]:
+        """
+        获取URL最新的归档内容
+
+        Args:
+            url: URL
+            max_age: 可选，最大允许的内容年龄（秒），超过则视为不存在
+
+        Returns:
+            (条目, markdown)，不存在或过期时返回None
+        """
+        entry = self.lookup(url)
+        if entry is None:
+            return None
+        if max_age is not None and time.time() - entry.crawl_time > max_age:
+            return None
+        return entry, self.read(entry)
+
+    def history(self, url: str) -> Iterator[ArchiveEntry]:
+        """按时间倒序遍历URL的所有归档版本"""
+        entry = self.lookup(url)
+        while entry is not None:
+            yield entry
+            entry = self._read_entry(entry.prev_entry) if entry.prev_entry is not None else None
+
+    def scan(self, latest_only: bool = False, since: Optional[float] = None) -> Iterator[ArchiveEntry]:
+        """
+        按写入顺序顺序扫描条目
+
+        Args:
+            latest_only: 只返回每个URL的最新版本
+            since: 只返回该时间之后的爬取
+        """
+        with self._lock:
+            self._refresh_table()
+            count = self._entry_count()
+        for entry_no in range(count):
+            with self._lock:
+                entry = self._read_entry(entry_no)
+                if latest_only:
+                    _, stored = self._table_find(entry.url_hash)
+                    if stored - 1 != entry_no:
+                        continue
+            if since is not None and entry.crawl_time < since:
+                continue
+            yield entry
+
+    def __len__(self) -> int:
+        return self._entry_count()
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for fd in self._segment_fds.values():
+                os.close(fd)
+            self._segment_fds.clear()
+            if self._entries_map is not None:
+                self._entries_map.close()
+                self._entries_map = None
+                self._entries_mapped = 0
+            if self._table_map is not None:
+                self._table_map.close()
+                self._table_map = None
+            os.close(self._entries_fd)
+            os.close(self._urls_fd)
+            os.close(self._lock_fd)
+
+def is_archive_dir(path: str) -> bool:
+    """判断目录是否为归档目录"""
+    return os.path.isfile(os.path.join(path, "entries.idx")) and os.path.isfile(os.path.join(path, "table.idx"))
@@ -0,0 +1,88 @@
+"""
+请求截止时间
+
+每个请求的截止时间保存在 contextvar 中（由 DeadlineMiddleware 按 X-Request-Timeout 或
+默认超时设置，批量接口按请求体中的 deadline 设置），asyncio 任务创建时自动继承。
+对外调用用 remaining_timeout(上限) 取得本次调用的超时：剩余时间与上限取较小者，
+剩余时间已用完时直接抛出 DeadlineExceeded（HTTP 504），不再发起调用。
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import HTTPException
+
+from src.core.util.metrics import DEADLINE_EXCEEDED
+
+class DeadlineExceeded(HTTPException):
+    """请求截止时间已到"""
+
+    def __init__(self, stage: str):
+        super().__init__(status_code=504, detail=f"请求截止时间已到（{stage}）")
+        self.stage = stage
+
+class Deadline:
+    """基于单调时钟的截止时间"""
+
+    __slots__ = ("timeout", "expires_at")
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+@contextmanager
+def deadline_scope(timeout: float):
+    """
+    在当前上下文中设置截止时间；已有更早的截止时间时保留原值（嵌套调用不会延长截止时间）
+    """
+    parent = _current_deadline.get()
+    deadline = Deadline(timeout)
+    if parent is not None and parent.expires_at <= deadline.expires_at:
+        deadline = parent
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+def remaining_timeout(cap: float, stage: str) -> float:
+    """
+    对外调用的超时：剩余时间与 cap 取较小者；没有截止时间时返回 cap
+
+    Raises:
+        DeadlineExceeded: 截止时间已到
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return cap
+    remaining = deadline.remaining()
+    if remaining <= 0:
+        DEADLINE_EXCEEDED.labels(stage).inc()
+        raise DeadlineExceeded(stage)
+    return min(cap, remaining)
+
+def can_finish(seconds: float) -> bool:
+    """剩余时间是否足够完成预计耗时 seconds 秒的操作（没有截止时间时总是True）"""
+    deadline = _current_deadline.get()
+    return deadline is None or deadline.remaining() >= seconds
+
+def check_deadline(stage: str, needed: float = 0.0):
+    """
+    剩余时间不超过 needed 秒时抛出 DeadlineExceeded（用于跳过无法按时完成的重试和等待）
+    """
+    deadline = _current_deadline.get()
+    if deadline is not None and deadline.remaining() <= needed:
+        DEADLINE_EXCEEDED.labels(stage).inc()
+        raise DeadlineExceeded(stage)
@@ -0,0 +1,83 @@
+"""
+提取结果的质量评分
+
+对照交给模型的markdown，从四个方面给提取结果打分（各为0到1，总分为平均值）:
+- valid_ratio        有非空文本的条目占全部条目的比例
+- item_coverage      有效条目数相对原文段落数（每 ITEMS_PER_PARAGRAPH 个条目对应一个段落即满分，
+                     允许模型把相邻段落合并为一个条目）
+- material_coverage  条目中的图片与原文图片的重合度（交集/并集，遗漏和编造的图片都扣分）
+- text_coverage      条目文本总长度相对原文段落文本长度（达到 TEXT_RATIO 即满分）
+原文没有段落或图片时对应的分项为满分；没有有效条目时总分为0。
+"""
+import re
+from typing import Any, Iterable, List, NamedTuple, Set, Tuple
+
+ITEMS_PER_PARAGRAPH = 0.5
+TEXT_RATIO = 0.5
+# 去掉标记后短于此长度的块不算段落（导航、按钮文字等）
+MIN_PARAGRAPH_CHARS = 10
+
+_IMAGE = re.compile(r"!\[[^\]]*\]\(\s*([^)\s]+)[^)]*\)")
+_LINK = re.compile(r"\[([^\]]*)\]\([^)]*\)")
+_HEADING = re.compile(r"^#{1,6}\s")
+_MARKUP = re.compile(r"[*_`>|#-]+|<[^>]+>")
+_WHITESPACE = re.compile(r"\s+")
+
+class QualityReport(NamedTuple):
+    score: float
+    valid_ratio: float
+    item_coverage: float
+    material_coverage: float
+    text_coverage: float
+    items: int
+    valid_items: int
+    paragraphs: int
+    images: int
+
+def source_stats(markdown: str) -> Tuple[int, int, Set[str]]:
+    """原文的段落数、段落文本总长度和图片URL集合"""
+    images = set(_IMAGE.findall(markdown))
+    paragraphs = 0
+    text_chars = 0
+    for block in re.split(r"\n\s*\n", markdown):
+        lines = [line for line in block.splitlines() if line.strip() and not _HEADING.match(line.lstrip())]
+        text = _MARKUP.sub(" ", _LINK.sub(r"\1", _IMAGE.sub(" ", "\n".join(lines))))
+        text = _WHITESPACE.sub("", text)
+        if len(text) >= MIN_PARAGRAPH_CHARS:
+            paragraphs += 1
+            text_chars += len(text)
+    return paragraphs, text_chars, images
+
+def _materials(item: dict) -> Iterable[str]:
+    materials = item.get("materials") or []
+    if not isinstance(materials, list):
+        materials = [materials]
+    return (material.strip() for material in materials if isinstance(material, str) and material.strip())
+
+def foreign_materials(items: List[Any], markdown: str) -> Set[str]:
+    """条目中不在原文 markdown 里的图片（打包提取时用于发现混入其他文档的条目）"""
+    images = set(_IMAGE.findall(markdown))
+    found = {material for item in items if isinstance(item, dict) for material in _materials(item)}
+    return found - images
+
+def score_extraction(items: List[Any], markdown: str) -> QualityReport:
+    """按原文 markdown 给提取出的条目打分"""
+    paragraphs, source_chars, images = source_stats(markdown)
+    if not isinstance(items, list):
+        items = []
+    valid = [item for item in items if isinstance(item, dict) and str(item.get("text") or "").strip()]
+    if not valid:
+        return QualityReport(0.0, 0.0, 0.0, 0.0, 0.0, len(items), 0, paragraphs, len(images))
+
+    valid_ratio = len(valid) / len(items)
+    item_coverage = min(1.0, len(valid) / (paragraphs * ITEMS_PER_PARAGRAPH)) if paragraphs else 1.0
+    materials = {material for item in valid for material in _materials(item)}
+    material_coverage = len(materials & images) / len(materials | images) if materials | images else 1.0
+    text_chars = sum(len(_WHITESPACE.sub("", str(item["text"]))) for item in valid)
+    text_coverage = min(1.0, text_chars / (source_chars * TEXT_RATIO)) if source_chars else 1.0
+
+    score = (valid_ratio + item_coverage + material_coverage + text_coverage) / 4
+    return QualityReport(
+        round(score, 4), round(valid_ratio, 4), round(item_coverage, 4), round(material_coverage, 4),
+        round(text_coverage, 4), len(items), len(valid), paragraphs, len(images)
+    )
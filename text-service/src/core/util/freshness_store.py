@@ -0,0 +1,93 @@
+"""
+URL新鲜度记录
+
+每个URL保存最近一次处理时源站返回的校验器（ETag、Last-Modified）、源站页面内容的指纹、
+爬取得到的markdown的指纹以及当时的提取结果。再次请求同一URL时先向源站发条件请求，
+页面没有变化就直接返回保存的提取结果，不再创建爬取任务、不再调用LLM。
+
+存储为 SQLite（WAL模式），多个worker进程共享同一文件；爬取时间超过 max_age 的记录不再使用，
+并在写入时定期清理。
+"""
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Any, Dict, Optional, Union
+
+# 每写入这么多次清理一次过期记录
+_PRUNE_EVERY = 1000
+
+_COLUMNS = (
+    "url", "etag", "last_modified", "page_fingerprint", "content_fingerprint",
+    "prompt_version", "response", "crawled_at", "validated_at"
+)
+
+def fingerprint(content: Union[str, bytes]) -> str:
+    """内容指纹（sha256）"""
+    if isinstance(content, str):
+        content = content.encode("utf-8")
+    return hashlib.sha256(content).hexdigest()
+
+class FreshnessStore:
+    """URL新鲜度记录存储，记录为包含 _COLUMNS 各字段的字典（response 为提取结果）"""
+
+    def __init__(self, path: str, max_age: float):
+        self.path = path
+        self.max_age = max_age
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, page_fingerprint TEXT, "
+            "content_fingerprint TEXT NOT NULL, prompt_version TEXT NOT NULL, response TEXT NOT NULL, "
+            "crawled_at REAL NOT NULL, validated_at REAL NOT NULL)"
+        )
+        self._writes = 0
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """返回URL的记录，没有记录或已过期时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM pages WHERE url = ? AND crawled_at >= ?",
+                (url, time.time() - self.max_age)
+            ).fetchone()
+        if row is None:
+            return None
+        record = dict(zip(_COLUMNS, row))
+        record["response"] = json.loads(record["response"])
+        return record
+
+    def put(self, record: Dict[str, Any]):
+        """写入（覆盖）URL的记录"""
+        row = [record.get(column) for column in _COLUMNS]
+        row[_COLUMNS.index("response")] = json.dumps(record["response"], ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO pages ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                row
+            )
+            self._writes += 1
+            if self._writes % _PRUNE_EVERY == 0:
+                self._conn.execute("DELETE FROM pages WHERE crawled_at < ?", (time.time() - self.max_age,))
+
+    def touch(self, url: str, validated_at: float, etag: Optional[str], last_modified: Optional[str],
+              page_fingerprint: Optional[str]):
+        """源站确认页面未变化：更新校验时间和校验器，保留提取结果"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE pages SET validated_at = ?, etag = COALESCE(?, etag), "
+                "last_modified = COALESCE(?, last_modified), page_fingerprint = COALESCE(?, page_fingerprint) "
+                "WHERE url = ?",
+                (validated_at, etag, last_modified, page_fingerprint, url)
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,94 @@
+"""
+HTTP响应压缩的编码协商和流式压缩器
+
+支持 gzip（标准库）、br（brotli）和 zstd（zstandard），后两者为可选依赖，未安装时不参与协商。
+压缩器逐块压缩：非最后一块只做同步刷新（客户端可以立即解出已收到的内容，NDJSON流式响应
+每一行都能及时送达），最后一块结束压缩流。
+"""
+import zlib
+from typing import Dict, Iterable, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli为可选依赖
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard为可选依赖
+    zstandard = None
+
+ENCODING_GZIP = "gzip"
+ENCODING_BROTLI = "br"
+ENCODING_ZSTD = "zstd"
+
+def available_encodings(preferred: Iterable[str]) -> Tuple[str, ...]:
+    """按优先顺序返回已安装对应库的编码"""
+    installed = {ENCODING_GZIP: True, ENCODING_BROTLI: brotli is not None, ENCODING_ZSTD: zstandard is not None}
+    return tuple(encoding for encoding in preferred if installed.get(encoding))
+
+def parse_accept_encoding(value: str) -> Dict[str, float]:
+    """解析 Accept-Encoding 为 {编码: q值}，编码名小写"""
+    accepted = {}
+    for part in value.split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, number = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(number)
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+    return accepted
+
+def negotiate_encoding(accept_encoding: Optional[str], encodings: Tuple[str, ...]) -> Optional[str]:
+    """
+    选择响应的编码
+
+    客户端可接受（q>0，或由 * 覆盖）的编码中选q值最高的，q值相同时按 encodings 的顺序；
+    都不可接受时返回None（不压缩）。
+    """
+    if not accept_encoding:
+        return None
+    accepted = parse_accept_encoding(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+class Compressor:
+    """一个响应的流式压缩器"""
+
+    __slots__ = ("_compress", "_flush", "_finish")
+
+    def __init__(self, encoding: str, gzip_level: int = 6, brotli_quality: int = 4, zstd_level: int = 3):
+        if encoding == ENCODING_GZIP:
+            obj = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            self._compress = obj.compress
+            self._flush = lambda: obj.flush(zlib.Z_SYNC_FLUSH)
+            self._finish = obj.flush
+        elif encoding == ENCODING_BROTLI:
+            obj = brotli.Compressor(quality=brotli_quality)
+            self._compress = obj.process
+            self._flush = obj.flush
+            self._finish = obj.finish
+        elif encoding == ENCODING_ZSTD:
+            obj = zstandard.ZstdCompressor(level=zstd_level).compressobj()
+            self._compress = obj.compress
+            self._flush = lambda: obj.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            self._finish = obj.flush
+        else:
+            raise ValueError(f"不支持的压缩编码: {encoding}")
+
+    def compress(self, data: bytes, final: bool) -> bytes:
+        """压缩一块数据；final 为True时结束压缩流，否则刷新已压缩的内容"""
+        head = self._compress(data) if data else b""
+        return head + (self._finish() if final else self._flush())
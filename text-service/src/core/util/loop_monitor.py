@@ -0,0 +1,145 @@
+"""
+事件循环滞后监控与阻塞调用检测
+
+事件循环线程上运行一个心跳协程，每 LOOP_MONITOR_INTERVAL 毫秒醒来一次，醒来时间
+比预期晚的部分即调度滞后，记录到 text_service_event_loop_lag_seconds 直方图。
+
+另有一个看门狗线程检查心跳：心跳超过 LOOP_BLOCK_THRESHOLD 毫秒未按时醒来，说明事件
+循环线程正被同步代码占用，此时抓取事件循环线程的调用栈（即正在阻塞的代码位置），
+连同当时运行的任务所属请求的上下文（request_id、url等，由 bind_task_context 登记）
+写入一条WARNING日志。每次阻塞只报告一次。
+"""
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+import weakref
+from typing import Any, Dict, Optional
+
+from src.config.settings import LOOP_MONITOR_ENABLED, LOOP_MONITOR_INTERVAL, LOOP_BLOCK_THRESHOLD
+from src.core.util.metrics import EVENT_LOOP_LAG_SECONDS, EVENT_LOOP_BLOCKS
+
+logger = logging.getLogger("loop_monitor")
+
+# 任务 -> 日志上下文。看门狗线程无法读取事件循环线程中的contextvar，因此单独登记
+_task_context: "weakref.WeakKeyDictionary[asyncio.Task, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+def bind_task_context(**context):
+    """把上下文字段（如 request_id、url）登记到当前任务，阻塞报告中会带上这些字段"""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        return
+    if task is not None:
+        existing = _task_context.get(task)
+        _task_context[task] = {**existing, **context} if existing else context
+
+def get_task_context(task: Optional[asyncio.Task]) -> Dict[str, Any]:
+    """读取任务登记的上下文（可在其他线程中调用）"""
+    if task is None:
+        return {}
+    try:
+        return _task_context.get(task) or {}
+    except Exception:
+        return {}
+
+class LoopMonitor:
+    """
+    事件循环监控器
+
+    Args:
+        interval: 心跳间隔（秒）
+        threshold: 判定为阻塞的滞后阈值（秒）
+        stack_limit: 阻塞报告中保留的栈帧数（取最内层）
+    """
+
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL / 1000,
+                 threshold: float = LOOP_BLOCK_THRESHOLD / 1000, stack_limit: int = 30):
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_limit = stack_limit
+        self.blocks_detected = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._expected_at = 0.0
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._heartbeat is not None
+
+    def start(self):
+        """在事件循环线程中调用"""
+        if self.running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._expected_at = time.monotonic() + self.interval
+        self._stop.clear()
+        self._heartbeat = self._loop.create_task(self._beat(), name="loop-monitor-heartbeat")
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        if not self.running:
+            return
+        self._stop.set()
+        self._heartbeat.cancel()
+        try:
+            await self._heartbeat
+        except asyncio.CancelledError:
+            pass
+        self._heartbeat = None
+        self._watchdog.join(timeout=1)
+        self._watchdog = None
+
+    async def _beat(self):
+        while True:
+            self._expected_at = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - self._expected_at)
+            EVENT_LOOP_LAG_SECONDS.observe(lag)
+            if lag >= self.threshold:
+                EVENT_LOOP_BLOCKS.inc()
+
+    def _watch(self):
+        check_interval = max(0.005, self.threshold / 4)
+        reported_for = None
+        while not self._stop.wait(check_interval):
+            expected_at = self._expected_at
+            blocked = time.monotonic() - expected_at
+            if blocked >= self.threshold and expected_at != reported_for:
+                reported_for = expected_at
+                try:
+                    self._report(blocked)
+                except Exception as e:
+                    logger.debug("阻塞报告失败", extra={"event": "loop_block_report_failed", "error": str(e)})
+
+    def _report(self, blocked: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = "".join(traceback.format_stack(frame)[-self.stack_limit:]) if frame is not None else ""
+        task = asyncio.current_task(self._loop)
+        context = get_task_context(task)
+        self.blocks_detected += 1
+        logger.warning("检测到事件循环阻塞", extra={
+            **context,
+            "event": "event_loop_blocked",
+            "blocked_ms": blocked * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "task": task.get_name() if task is not None else None,
+            "stack": stack
+        })
+
+loop_monitor = LoopMonitor()
+
+def start_loop_monitor():
+    """按配置启动事件循环监控（在应用启动事件中调用）"""
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+
+async def stop_loop_monitor():
+    await loop_monitor.stop()
@@ -0,0 +1,76 @@
+"""
+流水线步骤内存分配跟踪
+
+按 MEMORY_TRACE_SAMPLE_RATE 抽样部分URL处理流程，在该流程执行期间开启 tracemalloc，
+记录每个步骤相对步骤开始时已分配内存的峰值增量（字节）。
+
+注意:
+    - tracemalloc 统计的是整个进程的分配，同时处理的其他请求（以及线程池中的调用）
+      的分配也会计入，因此同一时刻只跟踪一个流程，结果是近似值，适合比较步骤之间、
+      页面大小之间的差异
+    - tracemalloc 开启期间所有内存分配都会变慢，只在被抽样的流程执行期间开启
+"""
+import random
+import tracemalloc
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from src.config.settings import MEMORY_TRACE_SAMPLE_RATE, MEMORY_TRACE_FRAMES
+
+class StepMemoryTracker:
+    """记录一个流程中各步骤的峰值内存增量"""
+
+    __slots__ = ("peaks", "owns_tracing")
+
+    def __init__(self, owns_tracing: bool):
+        self.peaks: Dict[str, int] = {}
+        self.owns_tracing = owns_tracing
+
+_current_tracker: ContextVar[Optional[StepMemoryTracker]] = ContextVar("memory_tracker", default=None)
+_active_tracker: Optional[StepMemoryTracker] = None
+
+def start_tracking(sample_rate: float = MEMORY_TRACE_SAMPLE_RATE):
+    """
+    按采样率决定是否跟踪当前流程，已有流程在跟踪时不再跟踪
+
+    Returns:
+        传给 stop_tracking 的token，未跟踪时为None
+    """
+    global _active_tracker
+    if _active_tracker is not None or sample_rate <= 0 or random.random() >= sample_rate:
+        return None
+    owns_tracing = not tracemalloc.is_tracing()
+    if owns_tracing:
+        tracemalloc.start(MEMORY_TRACE_FRAMES)
+    _active_tracker = StepMemoryTracker(owns_tracing)
+    return _current_tracker.set(_active_tracker)
+
+def stop_tracking(token) -> Optional[Dict[str, int]]:
+    """结束跟踪，返回各步骤的峰值内存增量（字节）"""
+    global _active_tracker
+    if token is None:
+        return None
+    tracker = _current_tracker.get()
+    _current_tracker.reset(token)
+    _active_tracker = None
+    if tracker is None:
+        return None
+    if tracker.owns_tracing:
+        tracemalloc.stop()
+    return tracker.peaks
+
+@contextmanager
+def track_step(step: str):
+    """记录步骤执行期间已分配内存相对步骤开始时的峰值增量；当前流程未被跟踪时不做任何事"""
+    tracker = _current_tracker.get()
+    if tracker is None or not tracemalloc.is_tracing():
+        yield
+        return
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    try:
+        yield
+    finally:
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        tracker.peaks[step] = max(tracker.peaks.get(step, 0), peak)
@@ -0,0 +1,471 @@
+"""
+多进程指标（Prometheus文本格式）
+
+每个进程把指标值写入 METRICS_DIR 下自己的内存映射文件（<pid>.db），/metrics 读取目录中
+所有进程的文件并聚合，因此多个 uvicorn/gunicorn worker 进程暴露的是同一份汇总数据。
+
+记录一次样本只是对内存映射区域中一个 float64 的原地加法（无锁、无系统调用），
+只有首次出现的标签组合才需要在文件中追加一个条目。指标只应在事件循环线程上记录。
+
+文件格式:
+    [0:8)    已使用字节数（uint64），条目写完后才更新
+    之后依次为条目: uint32 键长度 | 键（UTF-8 JSON，填充到8字节对齐）| float64 值
+"""
+import os
+import json
+import mmap
+import glob
+import struct
+import bisect
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.config.settings import METRICS_DIR
+
+_INITIAL_SIZE = 64 * 1024
+_HEADER = struct.Struct("<Q")
+_KEY_LENGTH = struct.Struct("<I")
+
+def _align8(value: int) -> int:
+    return (value + 7) & ~7
+
+class _MmapValues:
+    """单个进程的指标值文件"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions: Dict[str, int] = {}
+        self._file = open(path, "a+b")
+        self._file.truncate(_INITIAL_SIZE)
+        self._map_file(_INITIAL_SIZE)
+        self._used = _HEADER.size
+        _HEADER.pack_into(self._mmap, 0, self._used)
+
+    def _map_file(self, size: int):
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        self.doubles = memoryview(self._mmap).cast("d")
+
+    def _grow(self, required: int):
+        size = len(self._mmap)
+        while size < required:
+            size *= 2
+        self.doubles.release()
+        self._mmap.close()
+        self._file.truncate(size)
+        self._map_file(size)
+
+    def index(self, key: str) -> int:
+        """返回键对应值在 doubles 中的下标，不存在时追加条目"""
+        position = self._positions.get(key)
+        if position is not None:
+            return position
+        with self._lock:
+            position = self._positions.get(key)
+            if position is not None:
+                return position
+            encoded = key.encode("utf-8")
+            value_offset = _align8(self._used + _KEY_LENGTH.size + len(encoded))
+            end = value_offset + 8
+            if end > len(self._mmap):
+                self._grow(end)
+            _KEY_LENGTH.pack_into(self._mmap, self._used, len(encoded))
+            self._mmap[self._used + _KEY_LENGTH.size:self._used + _KEY_LENGTH.size + len(encoded)] = encoded
+            position = value_offset // 8
+            self.doubles[position] = 0.0
+            self._used = end
+            _HEADER.pack_into(self._mmap, 0, self._used)
+            self._positions[key] = position
+            return position
+
+    def close(self):
+        self.doubles.release()
+        self._mmap.close()
+        self._file.close()
+
+def read_values_file(path: str) -> List[Tuple[str, float]]:
+    """读取一个进程的指标值文件，返回 (键, 值) 列表"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER.size:
+        return []
+    used = min(_HEADER.unpack_from(data, 0)[0], len(data))
+    entries = []
+    position = _HEADER.size
+    while position + _KEY_LENGTH.size <= used:
+        (length,) = _KEY_LENGTH.unpack_from(data, position)
+        key_start = position + _KEY_LENGTH.size
+        value_offset = _align8(key_start + length)
+        if value_offset + 8 > used:
+            break
+        key = data[key_start:key_start + length].decode("utf-8")
+        (value,) = struct.unpack_from("<d", data, value_offset)
+        entries.append((key, value))
+        position = value_offset + 8
+    return entries
+
+_values: Optional[_MmapValues] = None
+_values_lock = threading.Lock()
+_metrics: List["_Metric"] = []
+
+def _process_values() -> _MmapValues:
+    global _values
+    if _values is None:
+        with _values_lock:
+            if _values is None:
+                os.makedirs(METRICS_DIR, exist_ok=True)
+                _values = _MmapValues(os.path.join(METRICS_DIR, f"{os.getpid()}.db"))
+    return _values
+
+def _reset_after_fork():
+    """fork出的子进程使用自己的指标文件，已创建的子指标重新绑定"""
+    global _values
+    _values = None
+    for metric in _metrics:
+        for child in metric._children.values():
+            child._bind()
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def reset_metrics_dir():
+    """删除其他进程（上一次运行）留下的指标文件，服务启动时调用"""
+    own = f"{os.getpid()}.db"
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.db")):
+        if os.path.basename(path) != own:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+def _sample_key(metric_name: str, sample_name: str, labels: Sequence[Tuple[str, str]]) -> str:
+    return json.dumps([metric_name, sample_name, list(labels)], ensure_ascii=False, separators=(",", ":"))
+
+class _Metric:
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple, "_Child"] = {}
+        self._unlabeled: Optional["_Child"] = None
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def labels(self, *values) -> "_Child":
+        """获取标签组合对应的子指标（热路径上可缓存返回值）"""
+        child = self._children.get(values)
+        if child is not None:
+            return child
+        values = tuple(str(value) for value in values)
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._child_class(self, tuple(zip(self.labelnames, values)))
+                    self._children[values] = child
+        return child
+
+    def _default(self) -> "_Child":
+        child = self._unlabeled
+        if child is None:
+            child = self._unlabeled = self.labels()
+        return child
+
+class _Child:
+    def __init__(self, metric: _Metric, labels: Tuple[Tuple[str, str], ...]):
+        self._metric = metric
+        self._labels = labels
+        self._bind()
+
+    def _bind(self):
+        self._values = _process_values()
+
+class _CounterChild(_Child):
+    def _bind(self):
+        super()._bind()
+        self._index = self._values.index(_sample_key(self._metric.name, self._metric.name + "_total", self._labels))
+
+    def inc(self, amount: float = 1.0):
+        self._values.doubles[self._index] += amount
+
+class _GaugeChild(_Child):
+    def _bind(self):
+        super()._bind()
+        self._index = self._values.index(_sample_key(self._metric.name, self._metric.name, self._labels))
+
+    def inc(self, amount: float = 1.0):
+        self._values.doubles[self._index] += amount
+
+    def dec(self, amount: float = 1.0):
+        self._values.doubles[self._index] -= amount
+
+    def set(self, value: float):
+        self._values.doubles[self._index] = value
+
+class _HistogramChild(_Child):
+    def _bind(self):
+        super()._bind()
+        metric = self._metric
+        self._upper_bounds = metric.buckets
+        self._bucket_indexes = [
+            self._values.index(_sample_key(metric.name, metric.name + "_bucket", self._labels + (("le", _format_bound(bound)),)))
+            for bound in metric.buckets
+        ]
+        self._sum_index = self._values.index(_sample_key(metric.name, metric.name + "_sum", self._labels))
+
+    def observe(self, value: float):
+        doubles = self._values.doubles
+        doubles[self._bucket_indexes[bisect.bisect_left(self._upper_bounds, value)]] += 1.0
+        doubles[self._sum_index] += value
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+class Counter(_Metric):
+    """只增计数器，跨进程求和"""
+    type_name = "counter"
+    _child_class = _CounterChild
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+class Gauge(_Metric):
+    """仪表，跨进程对仍存活的进程求和（如进行中的请求数）"""
+    type_name = "gauge"
+    _child_class = _GaugeChild
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set(self, value: float):
+        self._default().set(value)
+
+class Histogram(_Metric):
+    """直方图，桶计数和总和跨进程求和"""
+    type_name = "histogram"
+    _child_class = _HistogramChild
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        bounds = sorted(float(bound) for bound in buckets)
+        if bounds[-1] != float("inf"):
+            bounds.append(float("inf"))
+        self.buckets = bounds
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Sequence[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+def generate_latest() -> str:
+    """聚合 METRICS_DIR 中所有进程的指标，返回Prometheus文本格式"""
+    metrics_by_name = {metric.name: metric for metric in _metrics}
+    totals: Dict[str, Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]] = {name: {} for name in metrics_by_name}
+
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.db")):
+        try:
+            pid = int(os.path.basename(path)[:-3])
+        except ValueError:
+            continue
+        alive = None
+        for key, value in read_values_file(path):
+            metric_name, sample_name, labels = json.loads(key)
+            metric = metrics_by_name.get(metric_name)
+            if metric is None:
+                continue
+            if metric.type_name == "gauge":
+                if alive is None:
+                    alive = _pid_alive(pid)
+                if not alive:
+                    continue
+            sample = (sample_name, tuple(tuple(pair) for pair in labels))
+            samples = totals[metric_name]
+            samples[sample] = samples.get(sample, 0.0) + value
+
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        samples = totals[metric.name]
+        if metric.type_name != "histogram":
+            for (sample_name, labels), value in sorted(samples.items()):
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+            continue
+
+        # 桶按非累计方式存储，输出时按 le 累加，并补出 _count
+        series: Dict[Tuple[Tuple[str, str], ...], Dict[str, object]] = {}
+        for (sample_name, labels), value in samples.items():
+            if sample_name.endswith("_bucket"):
+                base = labels[:-1]
+                series.setdefault(base, {"buckets": {}, "sum": 0.0})["buckets"][float(labels[-1][1])] = value
+            else:
+                series.setdefault(labels, {"buckets": {}, "sum": 0.0})["sum"] = value
+        for labels, data in sorted(series.items()):
+            cumulative = 0.0
+            for bound in metric.buckets:
+                cumulative += data["buckets"].get(bound, 0.0)
+                bucket_labels = labels + (("le", _format_bound(bound)),)
+                lines.append(f"{metric.name}_bucket{_format_labels(bucket_labels)} {_format_value(cumulative)}")
+            lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(data['sum'])}")
+            lines.append(f"{metric.name}_count{_format_labels(labels)} {_format_value(cumulative)}")
+    return "\n".join(lines) + "\n"
+
+# ---------------------------------------------------------------------------
+# 服务指标
+# ---------------------------------------------------------------------------
+
+URL_REQUESTS = Counter(
+    "text_service_url_requests", "urlCrawl处理结果计数", ["endpoint", "status"]
+)
+URL_STEP_SECONDS = Histogram(
+    "text_service_url_step_seconds", "urlCrawl各步骤耗时（秒）", ["step"]
+)
+URL_INFLIGHT = Gauge(
+    "text_service_url_inflight", "正在处理的URL数量"
+)
+CRAWLER_REQUESTS = Counter(
+    "text_service_crawler_requests", "对爬虫服务的HTTP请求数", ["kind", "status"]
+)
+CRAWLER_POLLS_PER_JOB = Histogram(
+    "text_service_crawler_polls_per_job", "每个爬取任务的轮询次数", buckets=(1, 2, 3, 5, 8, 13, 21)
+)
+CRAWL_CACHE_REQUESTS = Counter(
+    "text_service_crawl_cache_requests", "爬取缓存查询结果", ["result"]
+)
+LLM_TOKENS = Counter(
+    "text_service_llm_tokens", "LLM token用量（input/output，cached_input为其中命中缓存的输入）", ["direction"]
+)
+LLM_COST = Counter(
+    "text_service_llm_cost", "LLM估算成本（元）"
+)
+LLM_CALLS = Counter(
+    "text_service_llm_calls", "LLM调用次数（含重试）", ["status"]
+)
+LLM_INFLIGHT = Gauge(
+    "text_service_llm_inflight", "进行中的LLM调用数量"
+)
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "text_service_event_loop_lag_seconds", "事件循环调度滞后（秒）",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+EVENT_LOOP_BLOCKS = Counter(
+    "text_service_event_loop_blocks", "滞后超过阈值的事件循环阻塞次数"
+)
+URL_STEP_PEAK_BYTES = Histogram(
+    "text_service_url_step_peak_bytes", "被抽样的urlCrawl各步骤峰值内存增量（字节）", ["step"],
+    buckets=(65536, 262144, 1048576, 4194304, 16777216, 67108864, 268435456)
+)
+ADMISSION_INFLIGHT = Gauge(
+    "text_service_admission_inflight", "已接纳、正在处理的urlCrawl请求数"
+)
+ADMISSION_QUEUE_LENGTH = Gauge(
+    "text_service_admission_queue_length", "等待接纳的urlCrawl请求数"
+)
+ADMISSION_QUEUE_SECONDS = Histogram(
+    "text_service_admission_queue_seconds", "被接纳的请求的排队时间（秒）",
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+)
+ADMISSION_REJECTED = Counter(
+    "text_service_admission_rejected", "准入控制拒绝的请求数", ["reason"]
+)
+DEADLINE_EXCEEDED = Counter(
+    "text_service_deadline_exceeded", "因截止时间不足而放弃的调用、重试或等待", ["stage"]
+)
+REQUESTS_PAST_DEADLINE = Counter(
+    "text_service_requests_past_deadline", "截止时间之后才完成的请求数", ["path"]
+)
+CLIENT_DISCONNECTS = Counter(
+    "text_service_client_disconnects", "处理中客户端断开而被取消的请求数", ["path"]
+)
+LLM_SCHEDULER_INFLIGHT = Gauge(
+    "text_service_llm_scheduler_inflight", "各优先级正在进行的LLM调用数", ["priority"]
+)
+LLM_SCHEDULER_QUEUE_LENGTH = Gauge(
+    "text_service_llm_scheduler_queue_length", "各优先级等待调度的LLM调用数", ["priority"]
+)
+LLM_SCHEDULER_WAIT_SECONDS = Histogram(
+    "text_service_llm_scheduler_wait_seconds", "LLM调用的调度等待时间（秒）", ["priority"],
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+)
+IDEMPOTENCY_REQUESTS = Counter(
+    "text_service_idempotency_requests", "带Idempotency-Key的urlCrawl请求数", ["outcome"]
+)
+SECTION_REUSE = Counter(
+    "text_service_section_reuse", "LLM提取的小节数（reused为复用之前的结果，extracted为交给LLM）", ["result"]
+)
+FRESHNESS_CHECKS = Counter(
+    "text_service_freshness_checks", "爬取前新鲜度检查结果", ["result"]
+)
+URL_KEYS = Counter(
+    "text_service_url_keys", "URL规范键解析结果（unchanged/canonicalized/aliased）、学到的别名数（learned）和删除的别名数（unlearned）", ["result"]
+)
+NEAR_DUP_LOOKUPS = Counter(
+    "text_service_near_dup_lookups", "近似重复页面查找结果（reused/similar/miss/skipped/error）", ["result"]
+)
+LLM_CASCADE_RESULTS = Counter(
+    "text_service_llm_cascade_results", "模型级联各层的结果（accepted采用/escalated交给下一层/error调用失败）",
+    ["tier", "outcome"]
+)
+LLM_CASCADE_COST = Counter(
+    "text_service_llm_cascade_cost", "模型级联各层的LLM成本（元）", ["tier"]
+)
+LLM_CASCADE_SECONDS = Histogram(
+    "text_service_llm_cascade_seconds", "模型级联各层的提取耗时（秒，含重试）", ["tier"],
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+)
+LLM_QUALITY_SCORE = Histogram(
+    "text_service_llm_quality_score", "模型级联各层提取结果的质量分", ["tier"],
+    buckets=(0.2, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 1.0)
+)
+LLM_PROMPT_CACHE_SAVINGS = Counter(
+    "text_service_llm_prompt_cache_savings", "命中前缀缓存或上下文缓存节省的LLM成本（元）"
+)
+PROMPT_CONTEXT_CACHE = Counter(
+    "text_service_prompt_context_cache", "上下文缓存的创建结果（created/failed）和失效（invalidated）", ["result"]
+)
+LLM_PACKING_DOCUMENTS = Counter(
+    "text_service_llm_packing_documents",
+    "打包提取的文档数（accepted采用/retried校验未通过单独提取/unpacked窗口内只有一个文档/error调用失败）",
+    ["result"]
+)
+LLM_PACKING_BATCH_SIZE = Histogram(
+    "text_service_llm_packing_batch_size", "每次打包调用的文档数",
+    buckets=(2, 3, 4, 6, 8, 12, 16, 24, 32)
+)
+RESPONSE_BYTES = Counter(
+    "text_service_response_bytes",
+    "客户端接受压缩时的响应字节数（stage为raw压缩前/sent发送，encoding为identity时未压缩）", ["encoding", "stage"]
+)
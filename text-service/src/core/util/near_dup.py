@@ -0,0 +1,271 @@
+"""
+近似重复页面索引（SimHash）
+
+转载的文章、模板生成的页面在不同URL下内容几乎相同，但内容哈希完全不同。
+页面的 SimHash 指纹为64位：markdown 规范化（去掉链接和图片地址、小写、合并空白）后取
+字符5-gram作为特征，每个特征哈希为64位，各位按特征的多数决定。内容相近的页面指纹只有少数位不同，
+汉明距离近似反映页面的差异程度。
+
+索引按抽屉原理查找汉明距离不超过 k 的指纹：64位分成 k+1 段，距离不超过 k 的两个指纹
+至少有一段完全相同。每段一个按该段取值排序的位置数组，查找时对每段二分得到候选，再逐个计算距离。
+内存中只保存指纹、记录ID和各段的位置数组（k=4 时每个页面36字节），一百万个页面约36MB。
+
+记录（URL、指纹、提示词版本、提取结果）存储为 SQLite（WAL模式），多个worker进程共享同一文件；
+进程内的索引在首次使用时从文件加载，之后定期读入其他进程新增的记录。
+同一URL再次保存时旧记录被删除，内存中残留的旧位置在核对记录时跳过。
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from itertools import chain
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+SHINGLE_SIZE = 5
+
+_LINK_TARGET = re.compile(r"\]\([^)]*\)")
+_BARE_URL = re.compile(r"https?://\S+")
+_WHITESPACE = re.compile(r"\s+")
+# _BIT_TABLES[bit] 把字节映射为其第 bit 位（bytes.translate 后 count(1) 即该位为1的特征数）
+_BIT_TABLES = [bytes((value >> bit) & 1 for value in range(256)) for bit in range(8)]
+
+# 每写入这么多次清理一次过期记录
+_PRUNE_EVERY = 1000
+# 新增的位置先放在按段取值分组的字典中，超过这个数（且超过已排序部分的1/8）时合并进排序数组
+_MERGE_MIN = 4096
+# 单条SQL的参数个数上限以内核对候选
+_QUERY_BATCH = 500
+
+_SIGN_BIT = 1 << 63
+
+class NearDuplicate(NamedTuple):
+    url: str
+    distance: int
+    response: Dict[str, Any]
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set:
+    """规范化后的字符 size-gram 集合"""
+    text = _BARE_URL.sub(" ", _LINK_TARGET.sub("]", text))
+    text = _WHITESPACE.sub(" ", text.lower()).strip()
+    if len(text) <= size:
+        return {text} if text else set()
+    return {text[index:index + size] for index in range(len(text) - size + 1)}
+
+def simhash(text: str, size: int = SHINGLE_SIZE) -> int:
+    """文本的64位 SimHash 指纹（不依赖进程的哈希种子，可持久化）"""
+    features = shingles(text, size)
+    if not features:
+        return 0
+    blob = b"".join([hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest() for feature in features])
+    half = len(features) / 2
+    value = 0
+    for position in range(8):
+        column = blob[position::8]
+        for bit in range(8):
+            if column.translate(_BIT_TABLES[bit]).count(1) > half:
+                value |= 1 << (position * 8 + bit)
+    return value
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+def block_masks(max_distance: int) -> List[int]:
+    """把64位分成 max_distance+1 段，返回各段的掩码"""
+    blocks = max_distance + 1
+    if not 1 <= blocks <= 64:
+        raise ValueError("max_distance 必须在 0 到 63 之间")
+    masks = []
+    start = 0
+    for index in range(blocks):
+        width = 64 // blocks + (1 if index < 64 % blocks else 0)
+        masks.append(((1 << width) - 1) << start)
+        start += width
+    return masks
+
+def _to_signed(value: int) -> int:
+    return value - (1 << 64) if value & _SIGN_BIT else value
+
+def _to_unsigned(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+class NearDupIndex:
+    """
+    近似重复页面索引
+
+    Args:
+        path: SQLite文件路径
+        max_distance: 视为近似重复的最大汉明距离（决定分段数）
+        max_age: 记录的保留时间（秒），超过后不再返回，并在写入时定期清理
+        refresh_interval: 读入其他进程新增记录的最短间隔（秒）
+    """
+
+    def __init__(self, path: str, max_distance: int = 4, max_age: float = 2592000, refresh_interval: float = 1.0):
+        self.path = path
+        self.max_distance = max_distance
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self._masks = block_masks(max_distance)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL UNIQUE, simhash INTEGER NOT NULL, "
+            "prompt_version TEXT NOT NULL, response TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._writes = 0
+        # 内存索引：位置 -> 指纹、记录ID；每段一个按 指纹&掩码 排序的位置数组和未合并的位置
+        self._fingerprints = array("Q")
+        self._ids = array("q")
+        self._tables = [array("I") for _ in self._masks]
+        self._pending: List[Dict[int, List[int]]] = [{} for _ in self._masks]
+        self._pending_count = 0
+        self._last_id = 0
+        self._synced_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def memory_bytes(self) -> int:
+        """内存索引中数组占用的字节数（不含未合并的位置）"""
+        arrays = [self._fingerprints, self._ids, *self._tables]
+        return sum(item.itemsize * len(item) for item in arrays)
+
+    def _sync(self, force: bool = False):
+        """读入 _last_id 之后的记录（调用方持有锁）"""
+        now = time.monotonic()
+        if not force and now - self._synced_at < self.refresh_interval:
+            return
+        self._synced_at = now
+        rows = self._conn.execute(
+            "SELECT id, simhash FROM pages WHERE id > ? ORDER BY id", (self._last_id,)
+        ).fetchall()
+        if not rows:
+            return
+        start = len(self._fingerprints)
+        self._fingerprints.extend(_to_unsigned(value) for _, value in rows)
+        self._ids.extend(row_id for row_id, _ in rows)
+        self._last_id = rows[-1][0]
+
+        added = range(start, len(self._fingerprints))
+        if self._pending_count + len(added) >= max(_MERGE_MIN, len(self._tables[0]) // 8):
+            self._merge(added)
+            return
+        fingerprints = self._fingerprints
+        for position in added:
+            value = fingerprints[position]
+            for mask, pending in zip(self._masks, self._pending):
+                pending.setdefault(value & mask, []).append(position)
+        self._pending_count += len(added)
+
+    def _merge(self, added: Iterable[int] = ()):
+        """把未合并的位置和新增的位置并入各段的排序数组（调用方持有锁）"""
+        fingerprints = self._fingerprints
+        for index, mask in enumerate(self._masks):
+            positions = list(self._tables[index])
+            positions.extend(chain.from_iterable(self._pending[index].values()))
+            positions.extend(added)
+            # 已排序部分是一个有序段，timsort 只需排序新增部分再归并
+            positions.sort(key=lambda position: fingerprints[position] & mask)
+            self._tables[index] = array("I", positions)
+            self._pending[index] = {}
+        self._pending_count = 0
+
+    def _candidates(self, value: int, max_distance: int) -> Dict[int, int]:
+        """汉明距离不超过 max_distance 的位置 -> 距离（调用方持有锁）"""
+        fingerprints = self._fingerprints
+        found: Dict[int, int] = {}
+        for mask, table, pending in zip(self._masks, self._tables, self._pending):
+            block = value & mask
+            key = lambda position: fingerprints[position] & mask
+            low = bisect_left(table, block, key=key)
+            high = bisect_right(table, block, lo=low, key=key)
+            for position in chain(table[low:high], pending.get(block, ())):
+                if position not in found:
+                    distance = (fingerprints[position] ^ value).bit_count()
+                    if distance <= max_distance:
+                        found[position] = distance
+        return found
+
+    def find(self, value: int, version: str, max_distance: Optional[int] = None) -> Optional[NearDuplicate]:
+        """
+        查找与指纹最接近的近似重复页面
+
+        Args:
+            value: 页面的 SimHash 指纹
+            version: 提示词版本，只返回相同版本的提取结果
+            max_distance: 最大汉明距离，默认为索引的 max_distance（不能超过它）
+
+        Returns:
+            距离最小的未过期记录，没有时返回None
+        """
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        with self._lock:
+            self._sync()
+            found = self._candidates(value, max_distance)
+            if not found:
+                return None
+            ranked = sorted(found.items(), key=lambda item: item[1])
+            distances = {self._ids[position]: distance for position, distance in ranked}
+            oldest = time.time() - self.max_age
+            ids = list(distances)
+            for start in range(0, len(ids), _QUERY_BATCH):
+                batch = ids[start:start + _QUERY_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT id, url, response FROM pages WHERE id IN ({','.join('?' * len(batch))}) "
+                    "AND prompt_version = ? AND created_at >= ?",
+                    (*batch, version, oldest)
+                ).fetchall()
+                if rows:
+                    row_id, url, response = min(rows, key=lambda row: distances[row[0]])
+                    return NearDuplicate(url, distances[row_id], json.loads(response))
+        return None
+
+    def add_many(self, entries: Iterable[Tuple[str, int, str, Dict[str, Any]]]):
+        """保存多个 (URL, 指纹, 提示词版本, 提取结果)，同一URL的旧记录被替换"""
+        now = time.time()
+        rows = [
+            (url, _to_signed(value), version, json.dumps(response, ensure_ascii=False), now)
+            for url, value, version, response in entries
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("DELETE FROM pages WHERE url = ?", [(row[0],) for row in rows])
+                self._conn.executemany(
+                    "INSERT INTO pages (url, simhash, prompt_version, response, created_at) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._writes += 1
+                if self._writes % _PRUNE_EVERY == 0:
+                    self._conn.execute("DELETE FROM pages WHERE created_at < ?", (now - self.max_age,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._sync(force=True)
+
+    def add(self, url: str, value: int, version: str, response: Dict[str, Any]):
+        self.add_many([(url, value, version, response)])
+
+    def load(self):
+        """从文件加载全部记录并建立排序数组（首次查询时也会自动加载）"""
+        with self._lock:
+            self._sync(force=True)
+            if self._pending_count:
+                self._merge()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
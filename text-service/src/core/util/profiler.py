@@ -0,0 +1,191 @@
+"""
+进程内采样分析器
+
+后台线程按固定间隔读取所有线程的当前调用栈（sys._current_frames），按栈聚合计数，
+不需要额外的服务或系统权限。输出格式:
+    collapsed   每行 "线程;外层帧;...;内层帧 次数"，可直接交给 flamegraph.pl / speedscope
+    speedscope  speedscope（https://www.speedscope.app）的JSON格式，每个线程一个profile
+
+模式:
+    wall  每次采样记录所有线程，包括等待I/O和锁的线程（墙钟时间分布）
+    cpu   只记录正在运行的线程（Linux上读取 /proc/self/task/<tid>/stat 的状态字段）
+
+指定 request_id 时只记录事件循环线程正在执行该请求的任务时的栈
+（依赖 loop_monitor.bind_task_context 登记的任务上下文，线程池中的调用无法归属到请求）。
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.core.util.loop_monitor import get_task_context
+
+PROFILE_MODES = ("wall", "cpu")
+
+FrameKey = Tuple[str, str, int]
+
+def cpu_mode_supported() -> bool:
+    return os.path.isdir("/proc/self/task")
+
+def _thread_running(native_id: int) -> bool:
+    try:
+        with open(f"/proc/self/task/{native_id}/stat", "rb") as f:
+            stat = f.read()
+    except OSError:
+        return False
+    # 格式为 "pid (comm) state ..."，comm 中可能含空格和括号
+    return stat[stat.rindex(b")") + 2:stat.rindex(b")") + 3] == b"R"
+
+class SamplingProfiler:
+    """
+    采样分析器
+
+    Args:
+        mode: wall 或 cpu
+        interval: 采样间隔（秒）
+        request_id: 可选，只记录该请求的任务在事件循环线程上执行时的栈
+        max_depth: 每个栈最多保留的帧数（取最内层）
+    """
+
+    def __init__(self, mode: str = "wall", interval: float = 0.01,
+                 request_id: Optional[str] = None, max_depth: int = 128):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"未知的采样模式: {mode}")
+        self.mode = mode
+        self.interval = interval
+        self.request_id = request_id
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.sample_count = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """开始采样；在事件循环线程中调用时，可以按 request_id 过滤"""
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread_id = threading.get_ident()
+        except RuntimeError:
+            self._loop = None
+        self.started_at = time.time()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.duration = time.time() - self.started_at
+
+    def _run(self):
+        own_id = threading.get_ident()
+        next_at = time.monotonic()
+        while not self._stop.is_set():
+            self._sample(own_id)
+            next_at += self.interval
+            delay = next_at - time.monotonic()
+            if delay < 0:
+                # 采样落后时跳过错过的时刻，不连续补采
+                next_at = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    def _sample(self, own_id: int):
+        frames = sys._current_frames()
+        threads = {thread.ident: thread for thread in threading.enumerate()}
+        self.sample_count += 1
+        for thread_id, frame in frames.items():
+            if thread_id == own_id:
+                continue
+            if self.request_id is not None:
+                if thread_id != self._loop_thread_id:
+                    continue
+                task = asyncio.current_task(self._loop)
+                if get_task_context(task).get("request_id") != self.request_id:
+                    continue
+            thread = threads.get(thread_id)
+            if self.mode == "cpu":
+                native_id = getattr(thread, "native_id", None)
+                if native_id is None or not _thread_running(native_id):
+                    continue
+            stack: List[FrameKey] = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append((code.co_name, code.co_filename, code.co_firstlineno))
+                frame = frame.f_back
+            stack.reverse()
+            name = thread.name if thread is not None else f"thread-{thread_id}"
+            self.stacks[(name, tuple(stack))] += 1
+
+    @staticmethod
+    def _frame_label(frame: FrameKey) -> str:
+        name, filename, line = frame
+        return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ":")
+
+    def collapsed(self) -> str:
+        lines = []
+        for (thread_name, stack), count in self.stacks.most_common():
+            labels = [thread_name.replace(";", ":")] + [self._frame_label(frame) for frame in stack]
+            lines.append(f"{';'.join(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def speedscope(self) -> Dict[str, Any]:
+        frame_index: Dict[FrameKey, int] = {}
+        frames: List[Dict[str, Any]] = []
+        profiles: Dict[str, Dict[str, Any]] = {}
+        for (thread_name, stack), count in self.stacks.items():
+            indexes = []
+            for frame in stack:
+                index = frame_index.get(frame)
+                if index is None:
+                    index = frame_index[frame] = len(frames)
+                    frames.append({"name": frame[0], "file": frame[1], "line": frame[2]})
+                indexes.append(index)
+            profile = profiles.setdefault(thread_name, {
+                "type": "sampled",
+                "name": thread_name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": self.duration,
+                "samples": [],
+                "weights": []
+            })
+            profile["samples"].append(indexes)
+            profile["weights"].append(count * self.interval)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": sorted(profiles.values(), key=lambda item: -sum(item["weights"])),
+            "name": f"text-service {self.mode} profile (pid {os.getpid()})",
+            "activeProfileIndex": 0,
+            "exporter": "text-service"
+        }
+
+_profile_lock = asyncio.Lock()
+
+async def run_profile(seconds: float, mode: str = "wall", interval: float = 0.01,
+                      request_id: Optional[str] = None) -> SamplingProfiler:
+    """
+    在当前worker进程中采样 seconds 秒并返回结果；同一进程同时只允许一次采样
+
+    Raises:
+        RuntimeError: 已有采样正在进行
+    """
+    if _profile_lock.locked():
+        raise RuntimeError("已有采样正在进行")
+    async with _profile_lock:
+        profiler = SamplingProfiler(mode=mode, interval=interval, request_id=request_id)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(profiler.stop)
+        return profiler
@@ -0,0 +1,109 @@
+"""
+按小节复用的提取结果
+
+markdown 按标题行（# 到 ######，代码块内的除外）切分为小节，每个小节的内容哈希
+（连同提示词版本）作为键，对应该小节提取出的条目列表。页面重新爬取后只有新增或修改的
+小节需要交给LLM，其余小节直接复用之前的结果。
+
+存储为 SQLite（WAL模式），多个worker进程共享同一文件；超过 max_age 的结果不再使用，
+并在写入时定期清理。
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Iterable, List
+
+_HEADING = re.compile(r"^#{1,6}\s")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+
+# 单条SQL的参数个数上限以内分批查询
+_QUERY_BATCH = 500
+# 每写入这么多次清理一次过期结果
+_PRUNE_EVERY = 1000
+
+def split_sections(markdown: str) -> List[str]:
+    """
+    按标题切分小节，每个小节包含标题行及其后到下一个标题之前的内容；
+    第一个标题之前的内容为单独的小节，连续的标题（中间没有正文）合并到同一小节
+    """
+    sections: List[str] = []
+    current: List[str] = []
+    has_body = False
+    in_fence = False
+    for line in markdown.splitlines():
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        elif not in_fence and _HEADING.match(line) and has_body:
+            sections.append("\n".join(current).strip())
+            current, has_body = [], False
+        current.append(line)
+        if line.strip() and (in_fence or not _HEADING.match(line)):
+            has_body = True
+    if any(line.strip() for line in current):
+        sections.append("\n".join(current).strip())
+    return sections
+
+def section_key(section: str, version: str) -> str:
+    """小节的复用键：忽略空行和行尾空白，内容不变时键不变"""
+    normalized = "\n".join(line.rstrip() for line in section.splitlines() if line.strip())
+    return hashlib.sha256(f"{version}\0{normalized}".encode("utf-8")).hexdigest()
+
+class SectionStore:
+    """小节提取结果存储"""
+
+    def __init__(self, path: str, max_age: float):
+        self.path = path
+        self.max_age = max_age
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sections ("
+            "key TEXT PRIMARY KEY, items TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._writes = 0
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[dict]]:
+        """返回已保存且未过期的键 -> 条目列表"""
+        keys = list(dict.fromkeys(keys))
+        oldest = time.time() - self.max_age
+        found: Dict[str, List[dict]] = {}
+        with self._lock:
+            for start in range(0, len(keys), _QUERY_BATCH):
+                batch = keys[start:start + _QUERY_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, items FROM sections WHERE key IN ({','.join('?' * len(batch))}) AND created_at >= ?",
+                    (*batch, oldest)
+                ).fetchall()
+                for key, items in rows:
+                    found[key] = json.loads(items)
+        return found
+
+    def put_many(self, entries: Dict[str, List[dict]]):
+        if not entries:
+            return
+        now = time.time()
+        rows = [(key, json.dumps(items, ensure_ascii=False), now) for key, items in entries.items()]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO sections (key, items, created_at) VALUES (?, ?, ?)", rows)
+                self._writes += 1
+                if self._writes % _PRUNE_EVERY == 0:
+                    self._conn.execute("DELETE FROM sections WHERE created_at < ?", (now - self.max_age,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,275 @@
+"""
+轻量链路追踪
+
+span 通过 contextvar 形成父子关系（asyncio 任务创建时会复制上下文，批量接口中每个URL
+的span自动挂在批量请求之下），链路上下文按 W3C traceparent 格式从上游读取、向爬虫服务
+和LLM传递。
+
+采样在链路根部决定：有上游 traceparent 时沿用其采样标志，否则按 TRACE_SAMPLE_RATE。
+未采样的span只维护ID用于向下游传递，不记录也不导出。采样的span由后台线程批量导出:
+    TRACE_EXPORTER=file   每行一个span（OTLP JSON的span结构）写入 TRACE_FILE
+    TRACE_EXPORTER=otlp   以OTLP/HTTP JSON格式发送到 TRACE_OTLP_ENDPOINT（如 OpenTelemetry Collector）
+"""
+import os
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config.settings import (
+    TRACE_EXPORTER, TRACE_FILE, TRACE_OTLP_ENDPOINT, TRACE_SAMPLE_RATE, TRACE_SERVICE_NAME
+)
+
+logger = logging.getLogger(__name__)
+
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+
+class Span:
+    """一次操作的耗时记录"""
+
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "sampled",
+                 "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], sampled: bool,
+                 kind: str = "internal", attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.attributes = attributes if sampled and attributes else {}
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        if self.sampled:
+            self.attributes[key] = value
+
+    def set_error(self, message: str):
+        self.error = message
+
+    def end(self):
+        if self.end_ns:
+            return
+        self.end_ns = time.time_ns()
+        if self.sampled and _processor is not None:
+            _processor.submit(self)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """解析W3C traceparent，返回 (trace_id, parent_span_id, sampled)，格式不合法时返回None"""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+    version, trace_id, span_id, flags = parts[:4]
+    if version == "ff" or trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    try:
+        int(trace_id, 16)
+        int(span_id, 16)
+        sampled = bool(int(flags, 16) & 0x01)
+    except ValueError:
+        return None
+    return trace_id.lower(), span_id.lower(), sampled
+
+def _should_sample() -> bool:
+    return _processor is not None and random.random() < TRACE_SAMPLE_RATE
+
+def start_span(name: str, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None,
+               traceparent: Optional[str] = None) -> Span:
+    """
+    创建span（不设为当前span），父span依次取 traceparent 参数、当前上下文中的span
+
+    Args:
+        name: span名称
+        kind: internal / server / client
+        attributes: 属性
+        traceparent: 上游传入的 traceparent 头
+    """
+    remote = parse_traceparent(traceparent)
+    if remote is not None:
+        trace_id, parent_id, sampled = remote
+        sampled = sampled and _processor is not None
+    else:
+        parent = _current_span.get()
+        if parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        else:
+            trace_id, parent_id, sampled = os.urandom(16).hex(), None, _should_sample()
+    return Span(name, trace_id, parent_id, sampled, kind, attributes)
+
+@contextmanager
+def use_span(current: Span):
+    """把已创建的span设为当前span，退出时结束；异常（HTTP状态码<500的HTTPException除外）标记为错误"""
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        if getattr(e, "status_code", 500) >= 500:
+            current.set_error(f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+def span(name: str, kind: str = "internal", traceparent: Optional[str] = None, **attributes):
+    """
+    在当前上下文中创建子span并设为当前span
+
+    用法:
+        with span("crawler.poll", attempt=3) as poll_span:
+            ...
+            poll_span.set_attribute("http.status_code", 200)
+    """
+    return use_span(start_span(name, kind, attributes, traceparent))
+
+def inject_headers(headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """把当前链路上下文写入发往下游的请求头（traceparent）"""
+    headers = dict(headers) if headers else {}
+    current = _current_span.get()
+    if current is not None:
+        headers["traceparent"] = current.traceparent
+    return headers
+
+class FileSpanExporter:
+    """把span追加写入JSONL文件"""
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+
+    def export(self, spans: List[Span]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for item in spans:
+                record = item.to_otlp()
+                record["service"] = TRACE_SERVICE_NAME
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+class OTLPHttpExporter:
+    """以OTLP/HTTP JSON格式发送span"""
+
+    def __init__(self, endpoint: str):
+        import requests
+
+        self.endpoint = endpoint
+        self._session = requests.Session()
+
+    def export(self, spans: List[Span]):
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", TRACE_SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "text-service.tracing"},
+                    "spans": [item.to_otlp() for item in spans]
+                }]
+            }]
+        }
+        response = self._session.post(self.endpoint, json=payload, timeout=5, proxies={"http": None, "https": None})
+        if response.status_code >= 300:
+            raise RuntimeError(f"OTLP导出失败: HTTP {response.status_code}")
+
+class BatchSpanProcessor:
+    """在后台线程中批量导出span；队列超过上限时丢弃新span，不阻塞调用方"""
+
+    def __init__(self, exporter, max_batch: int = 512, interval: float = 1.0, max_queue: int = 20000):
+        self.exporter = exporter
+        self.max_batch = max_batch
+        self.interval = interval
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._queue: "queue.SimpleQueue[Optional[Span]]" = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._worker, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Span):
+        if self._queue.qsize() >= self.max_queue:
+            self.dropped += 1
+            return
+        self._queue.put(item)
+
+    def _worker(self):
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self.exporter.export(batch)
+                except Exception as e:
+                    logger.warning("span导出失败", extra={
+                        "event": "trace_export_failed",
+                        "span_count": len(batch),
+                        "error": str(e)
+                    })
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+def _create_processor() -> Optional[BatchSpanProcessor]:
+    if TRACE_EXPORTER == "file":
+        exporter = FileSpanExporter(TRACE_FILE)
+    elif TRACE_EXPORTER == "otlp":
+        exporter = OTLPHttpExporter(TRACE_OTLP_ENDPOINT)
+    else:
+        return None
+    processor = BatchSpanProcessor(exporter)
+    atexit.register(processor.shutdown)
+    return processor
+
+_processor: Optional[BatchSpanProcessor] = _create_processor()
@@ -0,0 +1,270 @@
+"""
+URL规范化与别名索引
+
+同一篇文章会以 http/https、带跟踪参数、移动版子域名、不同锚点等多种形式出现。
+缓存、归档和新鲜度记录都按规范化后的URL（规范键）存取:
+- scheme 统一为 https，主机名小写，去掉默认端口和锚点（#! 和 #/ 开头的前端路由除外）
+- 去掉常见的跟踪参数（utm_* 等），其余参数按名称排序
+- 按域名的规则：参数白名单、额外去掉的参数、主机别名（如 m.example.com -> www.example.com）、
+  路径末尾斜杠的处理（keep / strip / add）
+
+规则文件为JSON，键为规范主机名（规则同样适用于其子域名）:
+    {
+        "www.example.com": {
+            "aliases": ["m.example.com", "example.com"],
+            "params": ["id", "page"],
+            "drop_params": ["ref"],
+            "trailing_slash": "strip"
+        }
+    }
+
+规范化无法发现的别名（换域名、切换参数的跳转）由 AliasIndex 从爬虫返回的最终URL学习：
+请求URL的规范键 -> 最终URL的规范键，存储为 SQLite，多个worker进程共享。只学习路径相同、
+仅 scheme/主机名/参数不同的跳转（见 is_learnable_alias），跳转到首页、登录页等的临时跳转不学习；
+别名在 max_age 秒后过期，再次爬取时跳转消失则删除。
+"""
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+TRACKING_PARAMS = frozenset((
+    "gclid", "dclid", "gbraid", "wbraid", "fbclid", "msclkid", "yclid", "twclid", "ttclid",
+    "mc_cid", "mc_eid", "igshid", "_ga", "_gl", "spm", "scm", "share_token", "from_share"
+))
+TRACKING_PREFIXES = ("utm_",)
+TRAILING_SLASH_MODES = ("keep", "strip", "add")
+
+_DEFAULT_PORTS = {"http": "80", "https": "443"}
+_PERCENT_ESCAPE = re.compile(r"%[0-9a-fA-F]{2}")
+
+class DomainRules(NamedTuple):
+    params: Optional[FrozenSet[str]] = None  # 参数白名单，None表示只去掉跟踪参数
+    drop_params: FrozenSet[str] = frozenset()
+    trailing_slash: str = "keep"
+
+def _match_domain(host: str, table: Dict[str, Any]) -> Optional[Any]:
+    """按主机名及其上级域名依次查找（a.b.example.com -> b.example.com -> example.com）"""
+    while host:
+        value = table.get(host)
+        if value is not None:
+            return value
+        _, _, host = host.partition(".")
+    return None
+
+class UrlCanonicalizer:
+    """
+    URL规范化
+
+    Args:
+        rules: 规范主机名 -> DomainRules
+        host_aliases: 别名主机名 -> 规范主机名（精确匹配）
+    """
+
+    def __init__(self, rules: Optional[Dict[str, DomainRules]] = None, host_aliases: Optional[Dict[str, str]] = None):
+        self.rules = dict(rules or {})
+        self.host_aliases = dict(host_aliases or {})
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> "UrlCanonicalizer":
+        """由规则文件的内容构造（格式见模块说明）"""
+        rules: Dict[str, DomainRules] = {}
+        host_aliases: Dict[str, str] = {}
+        for host, spec in config.items():
+            host = host.strip().lower()
+            trailing_slash = spec.get("trailing_slash", "keep")
+            if trailing_slash not in TRAILING_SLASH_MODES:
+                raise ValueError(f"{host}: trailing_slash 必须是 {', '.join(TRAILING_SLASH_MODES)} 之一")
+            params = spec.get("params")
+            rules[host] = DomainRules(
+                params=frozenset(params) if params is not None else None,
+                drop_params=frozenset(spec.get("drop_params", ())),
+                trailing_slash=trailing_slash
+            )
+            for alias in spec.get("aliases", ()):
+                host_aliases[alias.strip().lower()] = host
+        return cls(rules, host_aliases)
+
+    @classmethod
+    def from_file(cls, path: str) -> "UrlCanonicalizer":
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.from_config(json.load(f))
+
+    def canonicalize(self, url: str) -> str:
+        """返回URL的规范形式；无法解析的URL（没有scheme或主机名）原样返回（去掉首尾空白）"""
+        url = url.strip()
+        try:
+            parts = urlsplit(url)
+            port = parts.port
+        except ValueError:
+            return url
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").rstrip(".")
+        if not scheme or not host:
+            return url
+
+        if scheme in _DEFAULT_PORTS:
+            if port is not None and str(port) == _DEFAULT_PORTS[scheme]:
+                port = None
+            scheme = "https"
+        host = self.host_aliases.get(host, host)
+        rules = _match_domain(host, self.rules) or DomainRules()
+        netloc = host if port is None else f"{host}:{port}"
+
+        path = _PERCENT_ESCAPE.sub(lambda match: match.group(0).upper(), parts.path) or "/"
+        if rules.trailing_slash == "strip" and len(path) > 1:
+            path = path.rstrip("/") or "/"
+        elif rules.trailing_slash == "add" and not path.endswith("/") and "." not in path.rsplit("/", 1)[-1]:
+            path += "/"
+
+        query = []
+        for name, value in parse_qsl(parts.query, keep_blank_values=True):
+            if rules.params is not None:
+                if name not in rules.params:
+                    continue
+            elif name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES):
+                continue
+            if name in rules.drop_params:
+                continue
+            query.append((name, value))
+        query.sort(key=lambda item: item[0])
+
+        # 前端路由的锚点（#!/path、#/path）决定页面内容，保留
+        fragment = parts.fragment if parts.fragment.startswith(("!", "/")) else ""
+        return urlunsplit((scheme, netloc, path, urlencode(query), fragment))
+
+def is_learnable_alias(variant: str, target: str) -> bool:
+    """
+    两个规范键之间的跳转是否可以学习为别名
+
+    目标不能是裸主机名或根路径（维护页、首页、同意/登录墙），且两者只能在 scheme、主机名或参数上不同；
+    路径或锚点不同的跳转（含短链接）可能是临时的，不学习。
+    """
+    if variant == target:
+        return False
+    try:
+        source_parts, target_parts = urlsplit(variant), urlsplit(target)
+    except ValueError:
+        return False
+    if not target_parts.netloc or target_parts.path in ("", "/"):
+        return False
+    return source_parts.path == target_parts.path and source_parts.fragment == target_parts.fragment
+
+def final_url(crawl_result: Dict[str, Any]) -> Optional[str]:
+    """爬虫返回的最终URL（跳转之后），依次取 metadata.url、url、metadata.sourceURL、sourceURL"""
+    data = crawl_result.get("data") or []
+    if not data or not isinstance(data[0], dict):
+        return None
+    item = data[0]
+    metadata = item.get("metadata") or {}
+    for value in (metadata.get("url"), item.get("url"), metadata.get("sourceURL"), item.get("sourceURL")):
+        if isinstance(value, str) and value:
+            return value
+    return None
+
+class AliasIndex:
+    """
+    URL别名索引：规范键 -> 指向的规范键
+
+    查询先查进程内LRU，再查 SQLite；没有别名的结果不缓存（其他worker可能随时学到新的别名）。
+    别名在最后一次学到（updated_at）max_age 秒后过期，再次学到时重新计时。
+
+    Args:
+        path: SQLite文件路径
+        cache_size: 进程内LRU的最大条目数
+        max_age: 别名的有效期（秒），0表示不过期
+    """
+
+    def __init__(self, path: str, cache_size: int = 10000, max_age: float = 0):
+        self.path = path
+        self.cache_size = cache_size
+        self.max_age = max_age
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS aliases (variant TEXT PRIMARY KEY, target TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS aliases_target ON aliases (target)")
+
+    def _remember(self, variant: str, target: str, updated_at: float):
+        self._cache[variant] = (target, updated_at)
+        self._cache.move_to_end(variant)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _expired(self, updated_at: float, now: float) -> bool:
+        return self.max_age > 0 and now - updated_at > self.max_age
+
+    def _lookup(self, variant: str, now: float) -> Optional[str]:
+        row = self._conn.execute("SELECT target, updated_at FROM aliases WHERE variant = ?", (variant,)).fetchone()
+        if row is None or self._expired(row[1], now):
+            return None
+        return row[0]
+
+    def get(self, variant: str) -> Optional[str]:
+        """别名指向的规范键，没有别名或已过期时返回None"""
+        now = time.time()
+        with self._lock:
+            cached = self._cache.get(variant)
+            if cached is not None:
+                if not self._expired(cached[1], now):
+                    self._cache.move_to_end(variant)
+                    return cached[0]
+                del self._cache[variant]
+            row = self._conn.execute("SELECT target, updated_at FROM aliases WHERE variant = ?", (variant,)).fetchone()
+            if row is None or self._expired(row[1], now):
+                return None
+            self._remember(variant, row[0], row[1])
+            return row[0]
+
+    def add(self, variant: str, target: str):
+        """记录别名；target 本身是别名时指向其最终目标，已指向 variant 的别名一并改为指向新目标"""
+        if variant == target:
+            return
+        now = time.time()
+        with self._lock:
+            final = self._lookup(target, now)
+            if final is not None:
+                target = final
+                if variant == target:
+                    return
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO aliases (variant, target, updated_at) VALUES (?, ?, ?)",
+                    (variant, target, now)
+                )
+                self._conn.execute(
+                    "UPDATE aliases SET target = ?, updated_at = ? WHERE target = ?", (target, now, variant)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            # 其他指向 variant 的别名在进程内LRU中的结果已过时
+            stale = [key for key, value in self._cache.items() if value[0] == variant]
+            for key in stale:
+                self._cache[key] = (target, now)
+            self._remember(variant, target, now)
+
+    def remove(self, variant: str) -> bool:
+        """删除 variant 的别名（跳转已消失），返回是否存在过别名"""
+        with self._lock:
+            self._cache.pop(variant, None)
+            cursor = self._conn.execute("DELETE FROM aliases WHERE variant = ?", (variant,))
+            return cursor.rowcount > 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
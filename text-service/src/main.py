@@ -12,12 +12,20 @@ if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
 from src.api.routes import router
-from src.api.middleware import RequestLogMiddleware, ErrorHandlingMiddleware, HealthCheckMiddleware
+from src.api.middleware import (
+    RequestLogMiddleware, TracingMiddleware, ErrorHandlingMiddleware, HealthCheckMiddleware,
+    AdmissionMiddleware, DeadlineMiddleware, CompressionMiddleware
+)
+from src.api.responses import FastJSONResponse
 from src.config.logging_config import setup_logging
+from src.core.util.metrics import reset_metrics_dir
+from src.core.util.loop_monitor import start_loop_monitor, stop_loop_monitor
+from src.core.util.cassette import close_recorder
+from src.core.service.admission_service import admission_controller
 from src.config.settings import (
     SERVICE_HOST, SERVICE_PORT, LOG_DIR, LOG_LEVEL, LOG_MAX_BYTES,
     LOG_BACKUP_COUNT, LOG_ENABLE_JSON, LOG_ENABLE_CONSOLE_COLORS,
-    ENABLE_PERFORMANCE_LOGGING, CRAWLER_API_BASE_URL
+    ENABLE_PERFORMANCE_LOGGING, CRAWLER_API_BASE_URL, ADMISSION_ENABLED, COMPRESSION_ENABLED
 )
 
 def create_app() -> FastAPI:
@@ -27,20 +35,13 @@ def create_app() -> FastAPI:
         description="API for crawling URLs and processing the content with OpenAI",
         version="1.0.0",
         docs_url="/docs",
-        redoc_url="/redoc"
+        redoc_url="/redoc",
+        default_response_class=FastJSONResponse
     )
     
     # 添加中间件（注意顺序很重要）
-    # 1. 健康检查中间件（最外层，避免健康检查产生过多日志）
-    app.add_middleware(HealthCheckMiddleware)
-    
-    # 2. 全局错误处理中间件
-    app.add_middleware(ErrorHandlingMiddleware)
-    
-    # 3. 请求日志中间件
-    app.add_middleware(RequestLogMiddleware)
-    
-    # 4. CORS中间件
+    # Starlette中后添加的中间件位于外层，因此按从内到外的顺序添加
+    # 8. CORS中间件
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -49,10 +50,35 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     
+    # 7. 准入控制中间件（在请求日志内层，被拒绝的请求也有请求ID和摘要日志）
+    if ADMISSION_ENABLED:
+        app.add_middleware(AdmissionMiddleware, controller=admission_controller)
+    
+    # 6. 截止时间中间件（在准入控制外层，排队时间也计入截止时间）
+    app.add_middleware(DeadlineMiddleware)
+    
+    # 5. 请求日志中间件
+    app.add_middleware(RequestLogMiddleware)
+    
+    # 4. 链路追踪中间件（位于请求日志外层，请求摘要可以带上trace_id）
+    app.add_middleware(TracingMiddleware)
+    
+    # 3. 全局错误处理中间件
+    app.add_middleware(ErrorHandlingMiddleware)
+    
+    # 2. 响应压缩中间件（错误响应和健康检查、指标响应也按需压缩）
+    if COMPRESSION_ENABLED:
+        app.add_middleware(CompressionMiddleware)
+    
+    # 1. 健康检查中间件（最外层，避免健康检查产生过多日志）
+    app.add_middleware(HealthCheckMiddleware)
+    
     # 添加启动和关闭事件
     @app.on_event("startup")
     async def startup_event():
         logger = logging.getLogger("app.startup")
+        # 启动事件循环滞后监控和阻塞检测
+        start_loop_monitor()
         logger.info("应用程序启动", extra={
             "event": "app_startup",
             "service_host": SERVICE_HOST,
@@ -69,6 +95,9 @@ def create_app() -> FastAPI:
         logger.info("应用程序关闭", extra={
             "event": "app_shutdown"
         })
+        await stop_loop_monitor()
+        # 写出流量录制队列中剩余的记录
+        close_recorder()
     
     # 注册路由
     app.include_router(router)
@@ -102,6 +131,9 @@ def main():
         }
     })
     
+    # 清理上一次运行留下的指标文件
+    reset_metrics_dir()
+    
     # 创建应用
     app = create_app()
     
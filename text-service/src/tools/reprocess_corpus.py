@@ -0,0 +1,66 @@
+"""
+离线语料重处理命令行工具
+
+遍历保存的爬取结果（目录、.jsonl 或 .zip/.tar 归档），使用当前提示词并发重新提取，
+进度记录在 <output>/manifest.jsonl 中，中断后重跑会跳过已完成的条目。
+
+用法（在 text-service 目录下）:
+    python -m src.tools.reprocess_corpus <语料路径> <输出目录> --concurrency 16 --workers 4
+"""
+import sys
+import asyncio
+import argparse
+import logging
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent.parent.absolute()
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from src.core.service.corpus_service import process_corpus
+from src.config.logging_config import setup_logging
+from src.config.settings import (
+    LOG_DIR, LOG_LEVEL, LOG_MAX_BYTES, LOG_BACKUP_COUNT,
+    LOG_ENABLE_JSON, LOG_ENABLE_CONSOLE_COLORS
+)
+
+def main():
+    parser = argparse.ArgumentParser(description="离线重处理爬取结果语料")
+    parser.add_argument("source", help="语料文件或目录")
+    parser.add_argument("output", help="输出目录（结果文件和manifest.jsonl）")
+    parser.add_argument("--concurrency", type=int, default=8, help="同时进行的LLM调用数")
+    parser.add_argument("--workers", type=int, default=4, help="读取文件的线程数")
+    parser.add_argument("--limit", type=int, default=None, help="本次最多处理的条目数")
+    args = parser.parse_args()
+
+    setup_logging(
+        log_dir=LOG_DIR,
+        log_level=LOG_LEVEL,
+        max_bytes=LOG_MAX_BYTES,
+        backup_count=LOG_BACKUP_COUNT,
+        enable_json=LOG_ENABLE_JSON,
+        enable_console_colors=LOG_ENABLE_CONSOLE_COLORS
+    )
+    logger = logging.getLogger(__name__)
+
+    try:
+        stats = asyncio.run(process_corpus(
+            args.source,
+            args.output,
+            concurrency=args.concurrency,
+            workers=args.workers,
+            limit=args.limit
+        ))
+    except KeyboardInterrupt:
+        logger.warning("重处理被中断，已完成的条目已记录在清单中，重跑将从断点继续")
+        return 130
+
+    print(f"提示词版本: {stats['prompt_version']}")
+    print(f"处理条目: {stats['processed']}（成功 {stats['succeeded']}，失败 {stats['failed']}，跳过 {stats['skipped']}）")
+    print(f"耗时: {stats['elapsed_seconds']:.2f}s，吞吐量: {stats['throughput']:.2f} 条/秒")
+    print(f"Token: 输入 {stats['input_tokens']}，输出 {stats['output_tokens']}")
+    print(f"成本: ¥{stats['cost']:.4f}")
+    return 1 if stats["failed"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())